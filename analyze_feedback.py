@@ -1,77 +1,75 @@
 #!/usr/bin/env python3
 """
-Simple script to analyze feedback data
+Analyze feedback data
+
+Ingests feedback submitted since the last run into the feedback store, then
+summarizes it:
+
+    python analyze_feedback.py
+    python analyze_feedback.py --since 7d --group-by angle
+    python analyze_feedback.py --since 2025-01-01 --group-by sender,message_type
 """
-import json
-import glob
-from collections import Counter
-from datetime import datetime
+import argparse
+import sys
+import time
 
-def analyze_feedback():
-    feedback_files = glob.glob('feedback/*.json')
-    
-    if not feedback_files:
-        print("No feedback files found!")
+from dotenv import load_dotenv
+
+# Load .env before the app modules read their settings (FEEDBACK_DIR, FEEDBACK_STORE_DB)
+load_dotenv()
+
+from app.feedback_store import (
+    ingest_feedback,
+    feedback_summary,
+    improvement_samples,
+    parse_since,
+    GROUP_BY_COLUMNS
+)
+
+
+def print_overview(since):
+    [total] = feedback_summary(since) or [None]
+    if not total:
+        print("No feedback found!")
         return
-    
-    print(f"📊 Feedback Analysis")
+
+    print(f"📊 Feedback Analysis" + (f" since {since}" if since else ""))
     print(f"=" * 50)
-    print(f"Total feedback submissions: {len(feedback_files)}")
+    print(f"Total feedback submissions: {total['count']}")
     print()
-    
-    feedback_types = []
-    message_types = []
-    has_improvements = 0
-    improvement_examples = []
-    
-    for file in sorted(feedback_files):
-        try:
-            with open(file) as f:
-                data = json.load(f)
-                feedback_types.append(data['feedback_type'])
-                message_types.append(data['metadata']['message_type'])
-                
-                if data.get('improved_version'):
-                    has_improvements += 1
-                    improvement_examples.append({
-                        'file': file,
-                        'type': data['feedback_type'],
-                        'original_subject': data['original_output']['subject'],
-                        'improved': data['improved_version'][:200] + '...' if len(data['improved_version']) > 200 else data['improved_version']
-                    })
-        except Exception as e:
-            print(f"Error reading {file}: {e}")
-    
+
     print(f"Feedback Types:")
-    for type, count in Counter(feedback_types).most_common():
-        percentage = (count / len(feedback_files)) * 100
-        print(f"  {type.capitalize()}: {count} ({percentage:.1f}%)")
+    for row in feedback_summary(since, ["feedback_type"]):
+        percentage = (row['count'] / total['count']) * 100
+        print(f"  {row['feedback_type'].capitalize()}: {row['count']} ({percentage:.1f}%)")
     print()
-    
+
     print(f"Message Types:")
-    for type, count in Counter(message_types).most_common():
-        percentage = (count / len(feedback_files)) * 100
-        print(f"  {type}: {count} ({percentage:.1f}%)")
+    for row in feedback_summary(since, ["message_type"]):
+        percentage = (row['count'] / total['count']) * 100
+        print(f"  {row['message_type']}: {row['count']} ({percentage:.1f}%)")
     print()
-    
-    print(f"Feedback with Improvements: {has_improvements} ({(has_improvements/len(feedback_files)*100):.1f}%)")
+
+    print(f"Feedback with Improvements: {total['improvements']} ({(total['improvements']/total['count']*100):.1f}%)")
     print()
-    
-    if improvement_examples:
+
+    examples = improvement_samples(since)
+    if examples:
         print(f"\n📝 Sample Improvements:")
         print(f"=" * 50)
-        for i, example in enumerate(improvement_examples[:3], 1):
-            print(f"\n{i}. {example['type'].upper()} - {example['original_subject']}")
+        for i, example in enumerate(examples, 1):
+            improved = example['improved_version']
+            print(f"\n{i}. {example['feedback_type'].upper()} - {example['original_subject']}")
             print(f"   Improved version:")
-            print(f"   {example['improved']}")
-    
+            print(f"   {improved[:200] + '...' if len(improved) > 200 else improved}")
+
     # Calculate positive/negative ratio
-    positive = feedback_types.count('positive')
-    negative = feedback_types.count('negative')
+    positive = total['positive']
+    negative = total['negative']
     if positive + negative > 0:
         ratio = positive / (positive + negative) * 100
         print(f"\n✨ Success Rate: {ratio:.1f}% positive feedback")
-        
+
         if ratio >= 80:
             print(f"   🎉 Excellent! Users love the output!")
         elif ratio >= 60:
@@ -79,5 +77,48 @@ def analyze_feedback():
         else:
             print(f"   ⚠️  Needs work. Review negative feedback.")
 
+
+def print_groups(since, group_by):
+    rows = feedback_summary(since, group_by)
+    if not rows:
+        print("No feedback found!")
+        return
+
+    headers = group_by + ["count", "positive %", "improvements"]
+    table = [
+        [row[column] or "-" for column in group_by]
+        + [str(row['count']), f"{row['positive'] / row['count'] * 100:.1f}", str(row['improvements'])]
+        for row in rows
+    ]
+    widths = [max(len(header), *(len(line[i]) for line in table)) for i, header in enumerate(headers)]
+    print("  ".join(header.ljust(width) for header, width in zip(headers, widths)))
+    for line in table:
+        print("  ".join(cell.ljust(width) for cell, width in zip(line, widths)))
+
+
+def analyze_feedback():
+    parser = argparse.ArgumentParser(description="Summarize feedback submissions")
+    parser.add_argument("--since", help="Only feedback from this day on: YYYY-MM-DD, or Nd for the last N days")
+    parser.add_argument("--group-by", help=f"Comma-separated columns to break counts down by: {', '.join(GROUP_BY_COLUMNS)}")
+    args = parser.parse_args()
+
+    try:
+        since = parse_since(args.since)
+    except ValueError as e:
+        parser.error(str(e))
+    group_by = [column.strip() for column in args.group_by.split(",") if column.strip()] if args.group_by else []
+    unknown = [column for column in group_by if column not in GROUP_BY_COLUMNS]
+    if unknown:
+        parser.error(f"Can't group by {', '.join(unknown)} (expected {', '.join(GROUP_BY_COLUMNS)})")
+
+    started = time.perf_counter()
+    added = ingest_feedback()
+    print(f"Ingested {added} new feedback records in {time.perf_counter() - started:.2f}s", file=sys.stderr)
+
+    if group_by:
+        print_groups(since, group_by)
+    else:
+        print_overview(since)
+
 if __name__ == "__main__":
     analyze_feedback()
@@ -1,124 +1,214 @@
 """
 Account knowledge system — reads company context from markdown files in accounts/
+
+Accounts are parsed once into an immutable snapshot (accounts + lookup index)
+that lookups read without touching the filesystem. A background watcher
+(inotify via watchfiles, or polling) marks changed files dirty, reparses just
+those files and publishes a new snapshot.
+
+Parsed accounts are also persisted to a versioned JSON snapshot keyed by each
+file's content hash, so a fresh process (or another uvicorn worker) only
+reparses files whose content changed since the snapshot was written. Accounts
+stay encoded individually until first used, so loading it is cheap. The
+snapshot lives next to the other caches rather than in accounts/, and being
+plain data, a tampered file can at worst mislead lookups, not run code.
 """
+import atexit
+import hashlib
+import json
 import os
 import re
-import glob
-import time
+import tempfile
+import threading
+import unicodedata
+from bisect import bisect_left
+from collections.abc import Mapping
 
 
 ACCOUNTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'accounts')
 
-# Module-level cache (None = never loaded, {} = loaded but empty)
-_cached_accounts: dict | None = None
-_cached_file_count: int = 0
-_cache_load_time: float = 0.0
+# auto (inotify, falling back to polling), inotify, poll, or off (call rescan_accounts() yourself)
+ACCOUNT_WATCH_MODE = os.getenv("ACCOUNT_WATCH_MODE", "auto").lower()
+ACCOUNT_POLL_INTERVAL = float(os.getenv("ACCOUNT_POLL_INTERVAL", "2"))
+
+# Persisted parse results (relative to the working directory, like the other caches); empty disables
+ACCOUNT_SNAPSHOT_FILE = os.getenv("ACCOUNT_SNAPSHOT_FILE", "account_snapshot.json")
+# Bump whenever the parsed account structure changes so older snapshots are ignored
+SNAPSHOT_VERSION = 5
+
+# Current snapshot: the lookup index for ACCOUNTS_DIR, None until first use.
+# Replaced wholesale on change, never mutated (apart from its resolution memo
+# and the all-accounts contact index, built on first use).
+_snapshot: dict | None = None
+# Per-file parse results: path -> ((mtime_ns, size), content hash, _ParsedAccount or None if it failed to parse)
+_file_accounts: dict[str, tuple] = {}
+_state_lock = threading.RLock()
+_watcher: threading.Thread | None = None
+_watcher_stop = threading.Event()
+
+# Legal-form words dropped from the end of company names ("Kroger Co" -> "KROGER")
+COMPANY_SUFFIXES = {
+    "INC", "INCORPORATED", "CORP", "CORPORATION", "CO", "COMPANY", "COMPANIES",
+    "LTD", "LIMITED", "LLC", "LP", "PLC", "SA", "AG", "NV", "HOLDINGS", "GROUP"
+}
+
+# Shortest query that may resolve by prefix ("Kimber" -> Kimberly-Clark)
+MIN_PREFIX_LENGTH = 3
+
+# Bound on memoized query resolutions per index (company names are free-form user input)
+MAX_RESOLVED_NAMES = 10_000
+
+# Words dropped from either end of contact names ("Dr. Ana Ruiz Jr." -> "ANA RUIZ")
+NAME_TITLES = {"MR", "MRS", "MS", "MISS", "MX", "DR", "PROF"}
+NAME_SUFFIXES = {"JR", "SR", "II", "III", "IV", "PHD", "MD", "MBA", "CPA"}
+
+# Common nicknames -> the given name they are matched as ("Bob Smith" finds "Robert Smith").
+# Nicknames shared by several names (Alex, Chris, Pat, Sam) are left alone.
+NICKNAMES = {
+    "BOB": "ROBERT", "BOBBY": "ROBERT", "ROB": "ROBERT", "ROBBIE": "ROBERT",
+    "BILL": "WILLIAM", "BILLY": "WILLIAM", "WILL": "WILLIAM", "LIAM": "WILLIAM",
+    "JIM": "JAMES", "JIMMY": "JAMES", "JAMIE": "JAMES",
+    "MIKE": "MICHAEL", "MIKEY": "MICHAEL", "MICK": "MICHAEL",
+    "DAVE": "DAVID", "DAN": "DANIEL", "DANNY": "DANIEL",
+    "TOM": "THOMAS", "TOMMY": "THOMAS", "MATT": "MATTHEW", "NICK": "NICHOLAS",
+    "TONY": "ANTHONY", "STEVE": "STEVEN", "STEPHEN": "STEVEN", "JOE": "JOSEPH", "JOEY": "JOSEPH",
+    "BEN": "BENJAMIN", "ANDY": "ANDREW", "DREW": "ANDREW", "ED": "EDWARD", "EDDIE": "EDWARD",
+    "TED": "EDWARD", "RICH": "RICHARD", "RICK": "RICHARD", "DICK": "RICHARD", "GREG": "GREGORY",
+    "JEFF": "JEFFREY", "JON": "JONATHAN", "JOSH": "JOSHUA", "PETE": "PETER", "RON": "RONALD",
+    "DON": "DONALD", "KEN": "KENNETH", "LARRY": "LAWRENCE", "JERRY": "GERALD",
+    "CHARLIE": "CHARLES", "CHUCK": "CHARLES",
+    "LIZ": "ELIZABETH", "BETH": "ELIZABETH", "BETTY": "ELIZABETH",
+    "KATE": "KATHERINE", "KATIE": "KATHERINE", "KATHY": "KATHERINE", "CATHY": "KATHERINE",
+    "CATHERINE": "KATHERINE", "KATHRYN": "KATHERINE",
+    "JEN": "JENNIFER", "JENNY": "JENNIFER", "SUE": "SUSAN", "SUSIE": "SUSAN",
+    "MEG": "MARGARET", "MAGGIE": "MARGARET", "PEGGY": "MARGARET", "BECKY": "REBECCA",
+    "VICKY": "VICTORIA", "ABBY": "ABIGAIL", "MANDY": "AMANDA", "DEB": "DEBORAH",
+    "DEBBIE": "DEBORAH", "PATTY": "PATRICIA", "TRISH": "PATRICIA", "JESS": "JESSICA",
+    "SANDY": "SANDRA", "CINDY": "CYNTHIA", "KIM": "KIMBERLY", "PAM": "PAMELA", "NIKKI": "NICOLE"
+}
+
+
+# Name normalization patterns
+_APOSTROPHE_RE = re.compile(r"['\u2019]")
+_NON_ALNUM_RE = re.compile(r"[^A-Z0-9]+")
+_NON_WORD_RE = re.compile(r"[\W_]+")
+
+# Account markdown patterns, compiled once
+_H1_RE = re.compile(r'^# (.+)', re.MULTILINE)
+_FIELD_RE = re.compile(r'\*\*(.+?):\*\*\s*(.+)')  # any `**Key:** value`
+_NAMED_FIELD_RES = {
+    name: re.compile(r'\*\*' + name + r':\*\*\s*(.+)')
+    for name in ("Industry", "Status", "Focus", "Recent Activity", "Competitive")
+}
+_ALIASES_RE = re.compile(r'\*\*Aliases:\*\*[ \t]*(.+)')
+_CHALLENGES_RE = re.compile(r'### Challenges\s*\n((?:- .+\n?)+)')
+_DIFFERENTIATORS_RE = re.compile(r'### Differentiators\s*\n((?:- .+\n?)+)')
+
+
+def _split_headed_blocks(text: str, marker: str):
+    """
+    Yield (header, body) for each line starting with `marker` ("## " or "### ")
+
+    Text before the first such line is skipped. Equivalent to splitting on the
+    multiline regex `^<marker>`, but done with one str.split.
+    """
+    parts = ('\n' + text).split('\n' + marker)
+    last = len(parts) - 1
+    for k in range(1, len(parts)):
+        # Each block but the last keeps the newline that ended it
+        header, _, body = (parts[k] if k == last else parts[k] + '\n').partition('\n')
+        yield header.strip(), body
+
+
+def _named_field(text: str, name: str) -> str:
+    m = _NAMED_FIELD_RES[name].search(text)
+    return m.group(1).strip() if m else ''
+
+
+def _bullet_list(pattern: re.Pattern, text: str) -> list[str]:
+    m = pattern.search(text)
+    if not m:
+        return []
+    return [
+        line.removeprefix('- ').strip()
+        for line in m.group(1).strip().split('\n')
+        if line.strip().startswith('-')
+    ]
 
 
-def _parse_account_markdown(file_path: str) -> dict:
+def _parse_account_markdown(file_path: str, content: str | None = None) -> dict:
     """
     Parse an account markdown file into the dict structure expected by the rest of the app.
+
+    Args:
+        file_path: Path of the file (its name is the fallback company name)
+        content: The file's text, if already read
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    if content is None:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            content = f.read()
 
     # Extract company name from H1
-    h1_match = re.search(r'^# (.+)', content, re.MULTILINE)
+    h1_match = _H1_RE.search(content)
     company_name = h1_match.group(1).strip() if h1_match else os.path.splitext(os.path.basename(file_path))[0]
 
     # Split into ## sections
-    sections: dict[str, str] = {}
-    parts = re.split(r'^## ', content, flags=re.MULTILINE)
-    for part in parts[1:]:  # skip preamble before first ##
-        lines = part.split('\n', 1)
-        header = lines[0].strip()
-        body = lines[1] if len(lines) > 1 else ''
-        sections[header.lower()] = body
+    sections = {header.lower(): body for header, body in _split_headed_blocks(content, '## ')}
 
     # --- Overview ---
     industry = ''
     status = ''
+    aliases: list[str] = []
     if 'overview' in sections:
         overview = sections['overview']
-        m = re.search(r'\*\*Industry:\*\*\s*(.+)', overview)
+        industry = _named_field(overview, 'Industry')
+        status = _named_field(overview, 'Status')
+        m = _ALIASES_RE.search(overview)
         if m:
-            industry = m.group(1).strip()
-        m = re.search(r'\*\*Status:\*\*\s*(.+)', overview)
-        if m:
-            status = m.group(1).strip()
+            aliases = [a.strip() for a in m.group(1).split(',') if a.strip()]
 
     # --- Situation ---
     situation: dict = {"focus": "", "challenges": [], "recent_activity": ""}
     if 'situation' in sections:
         sit_text = sections['situation']
-        m = re.search(r'\*\*Focus:\*\*\s*(.+)', sit_text)
-        if m:
-            situation['focus'] = m.group(1).strip()
-        m = re.search(r'\*\*Recent Activity:\*\*\s*(.+)', sit_text)
-        if m:
-            situation['recent_activity'] = m.group(1).strip()
-        # Challenges are bullet points under ### Challenges
-        challenges_match = re.search(r'### Challenges\s*\n((?:- .+\n?)+)', sit_text)
-        if challenges_match:
-            situation['challenges'] = [
-                line.removeprefix('- ').strip()
-                for line in challenges_match.group(1).strip().split('\n')
-                if line.strip().startswith('-')
-            ]
+        situation['focus'] = _named_field(sit_text, 'Focus')
+        situation['recent_activity'] = _named_field(sit_text, 'Recent Activity')
+        situation['challenges'] = _bullet_list(_CHALLENGES_RE, sit_text)
 
     # --- Key Initiatives ---
     key_initiatives: list[str] = []
-    if 'key initiatives' in sections:
-        for line in sections['key initiatives'].strip().split('\n'):
-            line = line.strip()
-            if line.startswith('-'):
-                key_initiatives.append(line.removeprefix('- ').strip())
+    for line in sections.get('key initiatives', '').split('\n'):
+        line = line.strip()
+        if line.startswith('-'):
+            key_initiatives.append(line.removeprefix('- ').strip())
 
     # --- Positioning ---
     positioning: dict = {"focus": "", "differentiators": [], "competitive": ""}
     if 'positioning' in sections:
         pos_text = sections['positioning']
-        m = re.search(r'\*\*Focus:\*\*\s*(.+)', pos_text)
-        if m:
-            positioning['focus'] = m.group(1).strip()
-        m = re.search(r'\*\*Competitive:\*\*\s*(.+)', pos_text)
-        if m:
-            positioning['competitive'] = m.group(1).strip()
-        diff_match = re.search(r'### Differentiators\s*\n((?:- .+\n?)+)', pos_text)
-        if diff_match:
-            positioning['differentiators'] = [
-                line.removeprefix('- ').strip()
-                for line in diff_match.group(1).strip().split('\n')
-                if line.strip().startswith('-')
-            ]
+        positioning['focus'] = _named_field(pos_text, 'Focus')
+        positioning['competitive'] = _named_field(pos_text, 'Competitive')
+        positioning['differentiators'] = _bullet_list(_DIFFERENTIATORS_RE, pos_text)
 
     # --- Team Contacts ---
     team_contacts: dict[str, list[str]] = {}
-    if 'team contacts' in sections:
-        for m in re.finditer(r'\*\*(.+?):\*\*\s*(.+)', sections['team contacts']):
-            team_key = m.group(1).strip().lower().replace(' ', '_')
-            contacts = [c.strip() for c in m.group(2).split(',')]
-            team_contacts[team_key] = contacts
+    for m in _FIELD_RE.finditer(sections.get('team contacts', '')):
+        team_key = m.group(1).strip().lower().replace(' ', '_')
+        team_contacts[team_key] = [c.strip() for c in m.group(2).split(',')]
 
     # --- Contact Notes ---
+    # One block per ### sub-header
     contact_notes: dict[str, dict] = {}
-    if 'contact notes' in sections:
-        cn_text = sections['contact notes']
-        # Split by ### sub-headers
-        contact_parts = re.split(r'^### ', cn_text, flags=re.MULTILINE)
-        for cp in contact_parts[1:]:  # skip preamble
-            cp_lines = cp.split('\n', 1)
-            contact_name = cp_lines[0].strip()
-            contact_body = cp_lines[1] if len(cp_lines) > 1 else ''
-            entry: dict[str, str] = {}
-            for field_match in re.finditer(r'\*\*(.+?):\*\*\s*(.+)', contact_body):
-                field_key = field_match.group(1).strip().lower().replace(' ', '_')
-                entry[field_key] = field_match.group(2).strip()
-            if entry:
-                contact_notes[contact_name] = entry
+    for contact_name, contact_body in _split_headed_blocks(sections.get('contact notes', ''), '### '):
+        entry: dict[str, str] = {}
+        for m in _FIELD_RE.finditer(contact_body):
+            entry[m.group(1).strip().lower().replace(' ', '_')] = m.group(2).strip()
+        if entry:
+            contact_notes[contact_name] = entry
 
     return {
         "company_name": company_name,
+        "aliases": aliases,
         "industry": industry,
         "status": status,
         "situation": situation,
@@ -129,61 +219,575 @@ def _parse_account_markdown(file_path: str) -> dict:
     }
 
 
-def _load_all_accounts() -> tuple[dict, int]:
+def _is_account_file(path: str) -> bool:
+    basename = os.path.basename(path)
+    return basename.endswith('.md') and basename.upper() != 'TEMPLATE.MD'
+
+
+def _file_signature(path: str) -> tuple[int, int] | None:
+    """(mtime_ns, size) of a file, or None if it no longer exists"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _scan_accounts_dir(accounts_dir: str) -> dict[str, tuple[int, int]]:
+    """Signatures of every account markdown file (excluding TEMPLATE.md) in accounts_dir"""
+    signatures = {}
+    if not os.path.isdir(accounts_dir):
+        return signatures
+    with os.scandir(accounts_dir) as entries:
+        for entry in entries:
+            if entry.is_file() and _is_account_file(entry.path):
+                st = entry.stat()
+                signatures[entry.path] = (st.st_mtime_ns, st.st_size)
+    return signatures
+
+
+class _ParsedAccount:
+    """A parsed account file; the account dict is decoded from the JSON in `blob` on first use"""
+
+    __slots__ = ("company_name", "aliases", "contacts", "blob", "_account", "_contact_index")
+
+    def __init__(
+        self,
+        company_name: str,
+        aliases: list[str],
+        contacts: list[tuple[str, str, str]],
+        blob: str,
+        account: dict | None = None
+    ):
+        self.company_name = company_name
+        self.aliases = aliases
+        self.contacts = contacts  # (contact name, full name key, first name key)
+        self.blob = blob
+        self._account = account
+        self._contact_index = None
+
+    @classmethod
+    def from_account(cls, account: dict) -> "_ParsedAccount":
+        blob = json.dumps(account, ensure_ascii=False, separators=(",", ":"))
+        contacts = [(name, *_person_name_keys(name)) for name in account['contact_notes']]
+        return cls(account['company_name'], account.get('aliases', []), contacts, blob, account)
+
+    @property
+    def account(self) -> dict:
+        if self._account is None:
+            self._account = json.loads(self.blob)
+        return self._account
+
+    @property
+    def contact_index(self) -> dict:
+        """This account's contacts indexed by name (see _build_contact_index)"""
+        if self._contact_index is None:
+            self._contact_index = _build_contact_index({self.company_name.upper(): self.contacts})
+        return self._contact_index
+
+
+class _AccountsView(Mapping):
+    """Read-only mapping of account key -> account dict over _ParsedAccount records"""
+
+    def __init__(self, parsed: dict[str, _ParsedAccount]):
+        self._parsed = parsed
+
+    def __getitem__(self, key: str) -> dict:
+        return self._parsed[key].account
+
+    def __iter__(self):
+        return iter(self._parsed)
+
+    def __len__(self) -> int:
+        return len(self._parsed)
+
+
+def _load_account_file(path: str, signature: tuple[int, int], previous: tuple | None) -> tuple[tuple, bool]:
     """
-    Scan accounts/ for *.md files (excluding TEMPLATE.md), parse each, and return
-    a tuple of (accounts dict keyed by uppercase company name, count of non-template files found).
+    Read an account file and parse it unless its content hash matches `previous`
+
+    Args:
+        path: Account markdown file
+        signature: Its (mtime_ns, size)
+        previous: (content hash, _ParsedAccount or None) from an earlier parse, if any
+
+    Returns:
+        (_file_accounts entry, whether the file was parsed)
     """
-    accounts: dict = {}
-    accounts_dir = os.path.normpath(ACCOUNTS_DIR)
-    if not os.path.isdir(accounts_dir):
-        return accounts, 0
-
-    file_count = 0
-    for md_path in glob.glob(os.path.join(accounts_dir, '*.md')):
-        basename = os.path.basename(md_path)
-        if basename.upper() == 'TEMPLATE.MD':
-            continue
-        file_count += 1
+    with open(path, 'rb') as f:
+        data = f.read()
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    if previous is not None and previous[0] == digest:
+        return (signature, digest, previous[1]), False
+    try:
+        # Same newline handling as reading the file in text mode
+        content = data.decode('utf-8').replace('\r\n', '\n').replace('\r', '\n')
+        parsed = _ParsedAccount.from_account(_parse_account_markdown(path, content))
+    except Exception:
+        # Skip files that fail to parse
+        parsed = None
+    return (signature, digest, parsed), True
+
+
+def _accounts_fingerprint() -> str:
+    """Hash of every account file's name and content hash, identifying the set of accounts"""
+    h = hashlib.blake2b(digest_size=16)
+    for path in sorted(_file_accounts):
+        h.update(f"{os.path.basename(path)}:{_file_accounts[path][1]}\n".encode())
+    return h.hexdigest()
+
+
+def _read_persisted_accounts(accounts_dir: str) -> dict:
+    """
+    Read the persisted snapshot, if it was written for accounts_dir
+
+    Returns:
+        {"files": file name -> ((mtime_ns, size), content hash, _ParsedAccount or None),
+         "index": (accounts fingerprint, index names, index prefixes) or None}
+    """
+    empty = {"files": {}, "index": None}
+    path = ACCOUNT_SNAPSHOT_FILE
+    if not path:
+        return empty
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            persisted = json.load(f)
+        if (
+            not isinstance(persisted, dict)
+            or persisted.get("version") != SNAPSHOT_VERSION
+            or persisted.get("dir") != accounts_dir
+        ):
+            return empty
+        # JSON arrays come back as lists; signatures, contacts and prefixes are compared as tuples
+        files = {}
+        for name, (signature, digest, record) in persisted["files"].items():
+            parsed = None
+            if record:
+                company_name, aliases, contacts, blob = record
+                parsed = _ParsedAccount(company_name, aliases, [tuple(contact) for contact in contacts], blob)
+            files[name] = (tuple(signature), digest, parsed)
+        index = persisted["index"]
+        if index is not None:
+            index = (index[0], index[1], [tuple(prefix) for prefix in index[2]])
+        return {"files": files, "index": index}
+    except FileNotFoundError:
+        return empty
+    except Exception as e:
+        print(f"Ignoring unreadable account snapshot {path}: {e}")
+        return empty
+
+
+def _persist_accounts(accounts_dir: str) -> None:
+    """Atomically write the current parse results and index, so readers never see a partial file"""
+    path = ACCOUNT_SNAPSHOT_FILE
+    if not path:
+        return
+    files = {
+        os.path.basename(p): (
+            signature, digest,
+            (parsed.company_name, parsed.aliases, parsed.contacts, parsed.blob) if parsed else None
+        )
+        for p, (signature, digest, parsed) in _file_accounts.items()
+    }
+    persisted = {
+        "version": SNAPSHOT_VERSION,
+        "dir": accounts_dir,
+        "files": files,
+        "index": (_accounts_fingerprint(), _snapshot["names"], _snapshot["prefixes"])
+    }
+    tmp_path = None
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".account_snapshot.", suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(persisted, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Could not write account snapshot {path}: {e}")
+        if tmp_path and os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+def _publish_snapshot(accounts_dir: str, index: tuple | None = None) -> dict:
+    """
+    Publish accounts (keyed by uppercase company name) and their index from _file_accounts
+
+    Args:
+        accounts_dir: Directory the accounts were read from
+        index: Prebuilt (names, prefixes) matching _file_accounts, to skip rebuilding it
+    """
+    global _snapshot
+    parsed_accounts: dict[str, _ParsedAccount] = {}
+    for path in sorted(_file_accounts):
+        parsed = _file_accounts[path][2]
+        if parsed is not None:
+            parsed_accounts[parsed.company_name.upper()] = parsed
+    if index is not None:
+        snapshot = {"names": index[0], "prefixes": index[1], "resolved": {}}
+    else:
+        snapshot = _build_account_index({
+            key: [parsed.company_name, *parsed.aliases] for key, parsed in parsed_accounts.items()
+        })
+    snapshot["records"] = parsed_accounts
+    snapshot["accounts"] = _AccountsView(parsed_accounts)
+    snapshot["contacts"] = None  # Index of every account's contacts, built on first use
+    snapshot["dir"] = accounts_dir
+    _snapshot = snapshot
+    return snapshot
+
+
+def _apply_changes(accounts_dir: str, paths: set[str] | None = None) -> list[str]:
+    """
+    Reparse changed account files and publish (and persist) a new snapshot if anything changed
+    
+    Args:
+        accounts_dir: Directory the caller is watching; ignored if it is no longer current
+        paths: Files reported changed by the watcher, or None to compare the whole directory
+    
+    Returns:
+        Paths that were reparsed or removed
+    """
+    with _state_lock:
+        if _snapshot is None or _snapshot["dir"] != accounts_dir:
+            return []
+        
+        if paths is None:
+            current = _scan_accounts_dir(accounts_dir)
+            candidates = set(current) | set(_file_accounts)
+        else:
+            candidates = {p for p in paths if _is_account_file(p)}
+            current = {p: _file_signature(p) for p in candidates}
+        
+        dirty = []
+        for path in sorted(candidates):
+            signature = current.get(path)
+            if signature is None:
+                if _file_accounts.pop(path, None) is not None:
+                    dirty.append(path)
+            elif path not in _file_accounts or _file_accounts[path][0] != signature:
+                # A touched but unchanged file keeps its parsed account
+                previous = _file_accounts[path][1:] if path in _file_accounts else None
+                try:
+                    _file_accounts[path], parsed = _load_account_file(path, signature, previous)
+                except FileNotFoundError:
+                    parsed = _file_accounts.pop(path, None) is not None
+                if parsed:
+                    dirty.append(path)
+        
+        if dirty:
+            _publish_snapshot(accounts_dir)
+            _persist_accounts(accounts_dir)
+        return dirty
+
+
+def _load_snapshot() -> dict:
+    """Load every account in ACCOUNTS_DIR (from the persisted snapshot where unchanged), publish and start watching"""
+    global _file_accounts
+    with _state_lock:
+        accounts_dir = os.path.normpath(ACCOUNTS_DIR)
+        if _snapshot is not None and _snapshot["dir"] == accounts_dir:
+            return _snapshot
+        
+        stop_account_watcher()
+        persisted = _read_persisted_accounts(accounts_dir)
+        _file_accounts = {}
+        changed = False
+        for path, signature in _scan_accounts_dir(accounts_dir).items():
+            entry = persisted["files"].get(os.path.basename(path))
+            if entry is not None and entry[0] == signature:
+                _file_accounts[path] = entry  # Untouched since persisted: not even read
+                continue
+            try:
+                _file_accounts[path], _ = _load_account_file(path, signature, entry[1:] if entry else None)
+            except FileNotFoundError:
+                continue
+            changed = True
+        changed = changed or len(persisted["files"]) != len(_file_accounts)
+        
+        index = persisted["index"]
+        if changed or index is None or index[0] != _accounts_fingerprint():
+            snapshot = _publish_snapshot(accounts_dir)
+            _persist_accounts(accounts_dir)
+        else:
+            snapshot = _publish_snapshot(accounts_dir, index[1:])
+        if ACCOUNT_WATCH_MODE != "off" and os.path.isdir(accounts_dir):
+            _start_watcher(accounts_dir)
+        return snapshot
+
+
+def _watch_accounts(accounts_dir: str, stop: threading.Event) -> None:
+    """Watcher thread: apply file changes until stopped, preferring inotify over polling"""
+    if ACCOUNT_WATCH_MODE in ("auto", "inotify"):
+        try:
+            import watchfiles
+            for changes in watchfiles.watch(
+                accounts_dir,
+                watch_filter=lambda change, path: _is_account_file(path),
+                debounce=200,
+                stop_event=stop,
+                recursive=False
+            ):
+                _apply_changes(accounts_dir, {path for _, path in changes})
+            return
+        except ImportError:
+            print("watchfiles not installed; polling accounts/ for changes")
+        except Exception as e:
+            if stop.is_set():
+                return
+            print(f"Account watcher failed ({e}); polling accounts/ for changes")
+    
+    while not stop.wait(ACCOUNT_POLL_INTERVAL):
         try:
-            account = _parse_account_markdown(md_path)
-            key = account['company_name'].upper()
-            accounts[key] = account
-        except Exception:
-            # Skip files that fail to parse
-            continue
+            _apply_changes(accounts_dir)
+        except OSError as e:
+            print(f"Account rescan failed: {e}")
 
-    return accounts, file_count
 
+def _start_watcher(accounts_dir: str) -> None:
+    global _watcher, _watcher_stop
+    _watcher_stop = threading.Event()
+    _watcher = threading.Thread(
+        target=_watch_accounts,
+        args=(accounts_dir, _watcher_stop),
+        name="account-watcher",
+        daemon=True
+    )
+    _watcher.start()
 
-def _get_accounts() -> dict:
+
+def stop_account_watcher() -> None:
+    """Stop the background watcher, if running (the current snapshot stays readable)"""
+    global _watcher
+    with _state_lock:
+        watcher, _watcher = _watcher, None
+        _watcher_stop.set()
+    if watcher is not None and watcher is not threading.current_thread():
+        watcher.join(timeout=5)
+
+
+# A native (watchfiles) watcher thread must not be torn down mid-call at interpreter exit
+atexit.register(stop_account_watcher)
+
+
+def rescan_accounts() -> list[str]:
     """
-    Return cached accounts, reloading if any .md file has been modified since last load.
+    Synchronously pick up changes in accounts/ (for ACCOUNT_WATCH_MODE=off, scripts and tests)
+    
+    Returns:
+        Paths that were reparsed or removed
     """
-    global _cached_accounts, _cached_file_count, _cache_load_time
+    snapshot = _get_account_index()
+    return _apply_changes(snapshot["dir"])
 
-    accounts_dir = os.path.normpath(ACCOUNTS_DIR)
-    if not os.path.isdir(accounts_dir):
-        return {}
-
-    # Check if cache needs to be initialized or refreshed
-    needs_reload = _cached_accounts is None
-    if not needs_reload:
-        md_paths = set(glob.glob(os.path.join(accounts_dir, '*.md')))
-        disk_file_count = len([p for p in md_paths if os.path.basename(p).upper() != 'TEMPLATE.MD'])
-        if disk_file_count != _cached_file_count:
-            needs_reload = True
-        else:
-            for md_path in md_paths:
-                if os.path.getmtime(md_path) > _cache_load_time:
-                    needs_reload = True
+
+def _strip_accents(name: str) -> str:
+    """Fold accented letters to their base letter ("Nestlé" -> "Nestle")"""
+    if name.isascii():
+        return name
+    return "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+
+
+def _normalize_company(name: str) -> str:
+    """
+    Normalize a company name for lookup: accents stripped, uppercase, punctuation
+    to spaces, leading "The" and trailing legal suffixes dropped
+    ("The Kroger Co." -> "KROGER", "Nestlé SA" -> "NESTLE")
+    """
+    tokens = _NON_ALNUM_RE.sub(" ", _APOSTROPHE_RE.sub("", _strip_accents(name).upper())).split()
+    if len(tokens) > 1 and tokens[0] == "THE":
+        tokens = tokens[1:]
+    while len(tokens) > 1 and tokens[-1] in COMPANY_SUFFIXES:
+        tokens.pop()
+    return " ".join(tokens)
+
+
+def _build_account_index(names_by_key: dict[str, list[str]]) -> dict:
+    """
+    Build the lookup index for get_account_context
+
+    Args:
+        names_by_key: Account key -> [company name, *aliases]
+
+    Returns:
+        {
+            "names": normalized name/alias (spaced and compact forms) -> account key,
+            "prefixes": sorted (normalized company name, account key) pairs for bisect
+                        prefix lookup; aliases are left out, as brand aliases such as
+                        "Pizza Hut" start with everyday words,
+            "resolved": memo of query -> account key (or None)
+        }
+    """
+    names: dict[str, str] = {}
+    prefixes: set[tuple[str, str]] = set()
+    for key, account_names in names_by_key.items():
+        for i, name in enumerate(account_names):
+            normalized = _normalize_company(name)
+            if not normalized:
+                continue
+            names.setdefault(normalized, key)
+            names.setdefault(normalized.replace(" ", ""), key)
+            if i == 0:
+                prefixes.add((normalized, key))
+    return {"names": names, "prefixes": sorted(prefixes), "resolved": {}}
+
+
+def _prefix_match(prefixes: list[tuple[str, str]], normalized: str) -> str | None:
+    """
+    Account whose company name starts with a normalized query, if exactly one does
+    and the query covers its first word or half its letters ("Colgate" and
+    "Kimber" resolve, "Kim" doesn't)
+    """
+    i = bisect_left(prefixes, (normalized, ""))
+    matches = []
+    while i < len(prefixes) and prefixes[i][0].startswith(normalized) and len(matches) < 2:
+        matches.append(prefixes[i])
+        i += 1
+    if len(matches) != 1:
+        return None
+    name, key = matches[0]
+    covers_word = len(name) == len(normalized) or name[len(normalized)] == " "
+    covers_half = 2 * len(normalized.replace(" ", "")) >= len(name.replace(" ", ""))
+    return key if covers_word or covers_half else None
+
+
+def _resolve_account_key(index: dict, company_name: str) -> str | None:
+    """
+    Resolve a free-form company name to an account key
+
+    Tries, in order: the whole normalized name (or its compact form), the longest
+    run of words in the name that is a known name ("BMO Financial" -> BMO), then the
+    start of a single company name (see _prefix_match).
+
+    Results are memoized in the index, shared by every request. That is safe because
+    resolution depends only on the index, which is never mutated: a changed account
+    publishes a new index with an empty memo, and MAX_RESOLVED_NAMES bounds its size.
+    """
+    resolved = index["resolved"]
+    if company_name in resolved:
+        return resolved[company_name]
+
+    names = index["names"]
+    normalized = _normalize_company(company_name)
+    key = names.get(normalized) or names.get(normalized.replace(" ", ""))
+
+    if key is None and normalized:
+        tokens = normalized.split()
+        for length in range(len(tokens) - 1, 0, -1):
+            for start in range(len(tokens) - length + 1):
+                key = names.get(" ".join(tokens[start:start + length]))
+                if key:
                     break
+            if key:
+                break
 
-    if needs_reload:
-        _cache_load_time = time.time()
-        _cached_accounts, _cached_file_count = _load_all_accounts()
+    if key is None and len(normalized) >= MIN_PREFIX_LENGTH:
+        key = _prefix_match(index["prefixes"], normalized)
 
-    return _cached_accounts
+    if len(resolved) >= MAX_RESOLVED_NAMES:
+        resolved.clear()
+    resolved[company_name] = key
+    return key
+
+
+def _person_name_keys(name: str) -> tuple[str, str]:
+    """
+    Normalize a contact name for lookup: accents stripped, uppercase, punctuation,
+    titles, suffixes and middle names dropped, nickname expanded
+    ("Dr. José-Luis M. Pérez" -> "JOSE LUIS PEREZ" -> ("JOSE PEREZ", "JOSE"))
+
+    Returns:
+        (full name key, first name key); the full key is just the first name for one-word names,
+        and both are "" if nothing is left
+    """
+    tokens = _NON_WORD_RE.sub(" ", _APOSTROPHE_RE.sub("", _strip_accents(name).upper())).split()
+    while len(tokens) > 1 and tokens[0] in NAME_TITLES:
+        tokens.pop(0)
+    while len(tokens) > 1 and tokens[-1] in NAME_SUFFIXES:
+        tokens.pop()
+    if not tokens:
+        return "", ""
+    first = NICKNAMES.get(tokens[0], tokens[0])
+    return (f"{first} {tokens[-1]}" if len(tokens) > 1 else first), first
+
+
+def _build_contact_index(contacts_by_key: dict[str, list[tuple[str, str, str]]]) -> dict:
+    """
+    Build a contact lookup index for get_contact_context and find_contact_candidates
+
+    Args:
+        contacts_by_key: Account key -> (contact name, full name key, first name key)
+                         for each contact in its Contact Notes
+
+    Returns:
+        {
+            "full": full name key -> [(account key, contact name, contact's full name key)],
+            "first": first name key -> same
+        }
+    """
+    full: dict[str, list[tuple[str, str, str]]] = {}
+    first: dict[str, list[tuple[str, str, str]]] = {}
+    for key, contacts in contacts_by_key.items():
+        for contact_name, full_key, first_key in contacts:
+            if not full_key:
+                continue
+            entry = (key, contact_name, full_key)
+            full.setdefault(full_key, []).append(entry)
+            first.setdefault(first_key, []).append(entry)
+    return {"full": full, "first": first}
+
+
+def _contact_matches(index: dict, prospect_name: str, account_key: str | None = None) -> list[tuple[str, str, str]]:
+    """
+    Contacts matching a prospect name, full name matches first
+
+    A first-name match is only made when one of the two names is a bare first
+    name ("Sarah" or a "### Sarah" heading), so "Sarah Kim" never matches "Sarah Chen".
+
+    Args:
+        index: Account snapshot
+        prospect_name: Name to look up
+        account_key: Only match this account's contacts (all accounts if None)
+
+    Returns:
+        [(account key, contact name, "full_name" or "first_name")]
+    """
+    full_key, first_key = _person_name_keys(prospect_name)
+    if not full_key:
+        return []
+    if account_key is not None:
+        contacts = index["records"][account_key].contact_index
+    else:
+        contacts = index["contacts"]
+        if contacts is None:
+            contacts = index["contacts"] = _build_contact_index({
+                key: parsed.contacts for key, parsed in index["records"].items()
+            })
+
+    matches = [(key, name, "full_name") for key, name, _ in contacts["full"].get(full_key, ())]
+    if full_key == first_key:
+        # Bare first name: any contact with that first name
+        matches += [
+            (key, name, "first_name") for key, name, contact_full_key in contacts["first"].get(first_key, ())
+            if contact_full_key != full_key
+        ]
+    else:
+        # Contacts listed by first name only
+        matches += [(key, name, "first_name") for key, name, _ in contacts["full"].get(first_key, ())]
+    return matches
+
+
+def _get_account_index() -> dict:
+    """Return the current snapshot, loading it on first use (no filesystem access after that)"""
+    snapshot = _snapshot
+    if snapshot is None or snapshot["dir"] != os.path.normpath(ACCOUNTS_DIR):
+        snapshot = _load_snapshot()
+    return snapshot
+
+
+def _get_accounts() -> dict:
+    """Return the current accounts (read-only mapping keyed by uppercase company name)"""
+    return _get_account_index()["accounts"]
 
 
 def get_account_context(company_name: str) -> dict:
@@ -196,20 +800,9 @@ def get_account_context(company_name: str) -> dict:
     Returns:
         Account context dict or None if not found
     """
-    # Normalize company name
-    company_key = company_name.upper().strip()
-    accounts = _get_accounts()
-    
-    # Try exact match first
-    if company_key in accounts:
-        return accounts[company_key]
-    
-    # Try partial match
-    for key in accounts:
-        if company_key in key or key in company_key:
-            return accounts[key]
-    
-    return None
+    index = _get_account_index()
+    key = _resolve_account_key(index, company_name.strip()) if company_name else None
+    return index["accounts"][key] if key else None
 
 
 def get_contact_context(prospect_name: str, company_name: str) -> dict:
@@ -217,28 +810,54 @@ def get_contact_context(prospect_name: str, company_name: str) -> dict:
     Get contact-specific notes
     
     Args:
-        prospect_name: Contact's name
+        prospect_name: Contact's name (accents, nicknames and middle names are ignored)
         company_name: Company name
     
     Returns:
-        Contact context dict or None if not found
+        Contact context dict or None if not found or ambiguous
     """
-    account = get_account_context(company_name)
-    if not account:
+    index = _get_account_index()
+    key = _resolve_account_key(index, company_name.strip()) if company_name else None
+    return _find_contact(index, key, prospect_name)
+
+
+def _find_contact(index: dict, account_key: str | None, prospect_name: str) -> dict | None:
+    """Look up a contact's notes in an already-resolved account, None unless one contact matches best"""
+    if not account_key or not prospect_name:
         return None
+    matches = _contact_matches(index, prospect_name, account_key)
+    if not matches or (len(matches) > 1 and matches[1][2] == matches[0][2]):
+        return None
+    return index["accounts"][account_key]["contact_notes"][matches[0][1]]
+
+
+def find_contact_candidates(prospect_name: str, company_name: str = "") -> list[dict]:
+    """
+    Find every known contact a prospect name could refer to
     
-    contact_notes = account.get("contact_notes", {})
-    
-    # Try exact match
-    if prospect_name in contact_notes:
-        return contact_notes[prospect_name]
-    
-    # Try first name match
-    first_name = prospect_name.split()[0] if prospect_name else ""
-    if first_name in contact_notes:
-        return contact_notes[first_name]
+    Args:
+        prospect_name: Contact's name
+        company_name: Optional company name; its contacts rank first
     
-    return None
+    Returns:
+        Ranked candidates: {"company_name", "contact_name", "match" ("full_name" or "first_name"), "contact"}
+    """
+    if not prospect_name:
+        return []
+    index = _get_account_index()
+    account_key = _resolve_account_key(index, company_name.strip()) if company_name else None
+    # Stable sort: full name matches stay ahead of first-name matches within each group
+    matches = sorted(_contact_matches(index, prospect_name), key=lambda m: m[0] != account_key)
+    accounts = index["accounts"]
+    return [
+        {
+            "company_name": accounts[key]["company_name"],
+            "contact_name": name,
+            "match": match,
+            "contact": accounts[key]["contact_notes"][name]
+        }
+        for key, name, match in matches
+    ]
 
 
 def format_account_context_for_prompt(company_name: str, prospect_name: str = "") -> str:
@@ -252,9 +871,11 @@ def format_account_context_for_prompt(company_name: str, prospect_name: str = ""
     Returns:
         Formatted context string
     """
-    account = get_account_context(company_name)
-    if not account:
+    index = _get_account_index()
+    key = _resolve_account_key(index, company_name.strip()) if company_name else None
+    if not key:
         return ""
+    account = index["accounts"][key]
     
     context_parts = []
     
@@ -285,7 +906,7 @@ def format_account_context_for_prompt(company_name: str, prospect_name: str = ""
     
     # Contact-specific notes
     if prospect_name:
-        contact = get_contact_context(prospect_name, company_name)
+        contact = _find_contact(index, key, prospect_name)  # Reuse the account resolved above
         if contact:
             context_parts.append(f"\nCONTACT CONTEXT ({prospect_name}):")
             if "title" in contact:
@@ -0,0 +1,408 @@
+"""
+Token-budget admission control for Anthropic calls
+
+Request-count rate limits don't reflect cost: an in_person_ask with long
+account context costs several times a bare cold outreach. Every model call
+first asks the admission controller for its estimated token cost (the
+assembled prompt's length, plus the output the same max_tokens has averaged
+so far) and is corrected with the response's actual usage when it finishes.
+
+Two tokens-per-minute budgets apply, both off (0) by default:
+
+    ADMISSION_TOKENS_PER_MINUTE         everything the deployment sends upstream
+    ADMISSION_TENANT_TOKENS_PER_MINUTE  each caller, identified the same way as
+                                        for rate limits (see app.rate_limit)
+
+The buckets live in this process, so each worker enforces its share: both
+budgets are divided by WEB_CONCURRENCY (the uvicorn worker count, 1 by
+default). That assumes requests are spread evenly across workers; a caller
+whose requests all land on one worker gets only that worker's share.
+
+Calls over budget wait in a per-caller queue instead of failing. Callers take
+turns at the worker budget, one call each, so one caller's backlog can't
+starve the others; a caller over its own budget is skipped until it refills.
+When Anthropic answers 429 (or 529, overloaded) anyway, the call's tokens are
+refunded, admission pauses for the Retry-After the upstream asked for, and the
+call rejoins its queue, up to ADMISSION_UPSTREAM_RETRIES times. While either
+budget is on, admission is the only layer that repeats those calls (the model
+client's retry policy leaves 429/529 to it); with both off it stays out of the
+way and the retry policy handles them.
+
+A call that can't be admitted within ADMISSION_MAX_WAIT seconds, or arrives
+with ADMISSION_MAX_QUEUE calls already waiting, raises AdmissionRejected
+(served as 503 with Retry-After). Waiting also stops at the request's
+deadline (DeadlineExceeded).
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from contextvars import ContextVar
+from typing import Callable, Optional, Union
+
+from starlette.requests import Request
+
+from app.resilience import TokenBucket, DeadlineExceeded, retry_after_header, time_remaining
+
+
+ADMISSION_TOKENS_PER_MINUTE = float(os.getenv("ADMISSION_TOKENS_PER_MINUTE", "0"))
+ADMISSION_TENANT_TOKENS_PER_MINUTE = float(os.getenv("ADMISSION_TENANT_TOKENS_PER_MINUTE", "0"))
+# Worker processes sharing those budgets; uvicorn reads the same variable as its --workers default
+ADMISSION_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "200"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "60"))
+ADMISSION_UPSTREAM_RETRIES = int(os.getenv("ADMISSION_UPSTREAM_RETRIES", "3"))
+# Pause after an upstream 429 that doesn't say how long to wait
+ADMISSION_RETRY_AFTER = float(os.getenv("ADMISSION_RETRY_AFTER", "5"))
+
+CHARS_PER_TOKEN = 4
+UPSTREAM_RATE_LIMIT_STATUSES = (429, 529)
+# Tenant buckets kept once idle; a full bucket is dropped without losing anything
+MAX_IDLE_TENANTS = 1024
+
+current_tenant: ContextVar[str] = ContextVar("admission_tenant", default="default")
+
+
+class AdmissionRejected(Exception):
+    """A model call couldn't be admitted in time; try again after `retry_after` seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_input_tokens(system_prompt: Union[str, list[dict]], user_prompt: str) -> int:
+    """Rough input token count for a prompt (system prompt blocks from build_prompt or a string)"""
+    system_text = system_prompt if isinstance(system_prompt, str) else "".join(block["text"] for block in system_prompt)
+    return (len(system_text) + len(user_prompt)) // CHARS_PER_TOKEN + 1
+
+
+def billable_tokens(usage: dict) -> int:
+    """Tokens a request counts against the rate limit (prompt cache reads don't)"""
+    return usage.get("input_tokens", 0) + usage.get("cache_creation_input_tokens", 0) + usage.get("output_tokens", 0)
+
+
+def upstream_retry_after(error: Exception) -> Optional[float]:
+    """
+    Seconds an upstream rate-limit error asks callers to wait
+
+    Returns:
+        The Retry-After (or ADMISSION_RETRY_AFTER if it has none) for a 429/529
+        API error, None for any other error
+    """
+    if getattr(error, "status_code", None) not in UPSTREAM_RATE_LIMIT_STATUSES:
+        return None
+    retry_after = retry_after_header(error)
+    return retry_after if retry_after is not None else ADMISSION_RETRY_AFTER
+
+
+class Ticket:
+    """An admitted call's reservation, settled once its usage is known"""
+
+    def __init__(self, tenant: str, tokens: int, max_tokens: int):
+        self.tenant = tenant
+        self.tokens = tokens
+        self.max_tokens = max_tokens
+        self.settled = False
+
+
+class _Waiter:
+    def __init__(self, tenant: str, tokens: int, future: asyncio.Future):
+        self.tenant = tenant
+        self.tokens = tokens
+        self.future = future
+        self.enqueued = time.monotonic()
+
+
+class AdmissionController:
+    """
+    Queues model calls until this worker's share of the token budgets covers them
+
+        ticket = await controller.admit(system_prompt, user_prompt, max_tokens)
+        ... call the model ...
+        controller.settle(ticket, usage)
+
+    Runs on the event loop; the waiting calls are futures resolved in turn by
+    _dispatch(), which is re-run whenever budget is returned and on a timer
+    for when the budget refills.
+    """
+
+    def __init__(
+        self,
+        worker_tokens_per_minute: float = ADMISSION_TOKENS_PER_MINUTE / ADMISSION_WORKERS,
+        tenant_tokens_per_minute: float = ADMISSION_TENANT_TOKENS_PER_MINUTE / ADMISSION_WORKERS,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        max_wait: float = ADMISSION_MAX_WAIT,
+        upstream_retries: int = ADMISSION_UPSTREAM_RETRIES
+    ):
+        self.worker_bucket = TokenBucket("admission:worker", worker_tokens_per_minute)
+        self.tenant_tokens_per_minute = tenant_tokens_per_minute
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.upstream_retries = upstream_retries
+        self._tenant_buckets: dict[str, TokenBucket] = {}
+        # tenant -> its waiting calls; the first tenant is next in turn
+        self._queues: "OrderedDict[str, deque[_Waiter]]" = OrderedDict()
+        self._queued = 0
+        self._paused_until = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # max_tokens -> [output tokens seen, responses seen]
+        self._output_seen: dict[int, list[int]] = {}
+        self._stats = {"admitted": 0, "waited": 0, "wait_seconds": 0.0, "rejected": 0, "upstream_rate_limited": 0}
+
+    @property
+    def enabled(self) -> bool:
+        """Whether either token budget is on"""
+        return self.worker_bucket.tokens_per_minute > 0 or self.tenant_tokens_per_minute > 0
+
+    def estimate(self, system_prompt: Union[str, list[dict]], user_prompt: str, max_tokens: int) -> int:
+        """Tokens to reserve for a call: its prompt plus the output seen for this max_tokens (max_tokens until then)"""
+        seen = self._output_seen.get(max_tokens)
+        output = seen[0] // seen[1] if seen and seen[1] else max_tokens
+        return estimate_input_tokens(system_prompt, user_prompt) + output
+
+    def _tenant_bucket(self, tenant: str) -> TokenBucket:
+        bucket = self._tenant_buckets.get(tenant)
+        if bucket is None:
+            if len(self._tenant_buckets) >= MAX_IDLE_TENANTS:
+                for name, idle in list(self._tenant_buckets.items()):
+                    if name not in self._queues and idle.wait_time(idle.capacity) == 0:
+                        del self._tenant_buckets[name]
+            bucket = self._tenant_buckets[tenant] = TokenBucket(f"tenant:{tenant}", self.tenant_tokens_per_minute)
+        return bucket
+
+    async def admit(
+        self,
+        system_prompt: Union[str, list[dict]],
+        user_prompt: str,
+        max_tokens: int,
+        tenant: Optional[str] = None
+    ) -> Ticket:
+        """
+        Wait until a call fits the token budgets and reserve its estimated cost
+
+        Args:
+            system_prompt: System prompt the call will send
+            user_prompt: User prompt the call will send
+            max_tokens: The call's output token limit
+            tenant: Caller to charge (defaults to the current request's caller)
+
+        Returns:
+            Ticket to pass to settle() (or requeue()) once the call finishes
+
+        Raises:
+            AdmissionRejected: The queue is full, or the call waited max_wait seconds
+            DeadlineExceeded: The request's deadline came first
+        """
+        tenant = tenant or current_tenant.get()
+        tokens = self.estimate(system_prompt, user_prompt, max_tokens)
+        if self._queued >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise AdmissionRejected(f"Too many model calls waiting for token budget ({self._queued})", self._retry_after())
+
+        waiter = _Waiter(tenant, tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(tenant, deque()).append(waiter)
+        self._queued += 1
+        self._dispatch()
+        if not waiter.future.done():
+            self._stats["waited"] += 1
+            remaining = time_remaining()
+            max_wait = self.max_wait if remaining is None else max(0.0, min(self.max_wait, remaining))
+            try:
+                await asyncio.wait_for(waiter.future, max_wait)
+            except asyncio.TimeoutError:
+                self._remove(waiter)
+                self._stats["rejected"] += 1
+                if max_wait < self.max_wait:
+                    raise DeadlineExceeded("Request deadline passed while waiting for token budget")
+                raise AdmissionRejected(f"No token budget for this model call within {self.max_wait:g}s", self._retry_after())
+            except asyncio.CancelledError:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    self._refund(Ticket(tenant, tokens, max_tokens))  # Admitted just as the caller gave up
+                self._remove(waiter)
+                raise
+            self._stats["wait_seconds"] += time.monotonic() - waiter.enqueued
+        return Ticket(tenant, tokens, max_tokens)
+
+    def try_admit(
+        self,
+        system_prompt: Union[str, list[dict]],
+        user_prompt: str,
+        max_tokens: int,
+        tenant: Optional[str] = None
+    ) -> Optional[Ticket]:
+        """
+        Reserve a call's estimated cost only if the budgets cover it right now
+
+        For optional extra requests such as hedges, which shouldn't wait or go
+        ahead of calls already queued.
+
+        Returns:
+            Ticket, or None if calls are waiting, admission is paused or a budget is short
+        """
+        tenant = tenant or current_tenant.get()
+        tokens = self.estimate(system_prompt, user_prompt, max_tokens)
+        tenant_bucket = self._tenant_bucket(tenant)
+        if (self._queues or self._paused_until > time.monotonic()
+                or self.worker_bucket.wait_time(tokens) > 0 or tenant_bucket.wait_time(tokens) > 0):
+            return None
+        self.worker_bucket.take(tokens)
+        tenant_bucket.take(tokens)
+        self._stats["admitted"] += 1
+        return Ticket(tenant, tokens, max_tokens)
+
+    def settle(self, ticket: Ticket, usage: Optional[dict] = None) -> None:
+        """
+        Correct a call's reservation with its actual usage
+
+        Args:
+            ticket: From admit()
+            usage: Response token usage; None (a failed call) keeps the estimate charged
+        """
+        if ticket.settled:
+            return
+        ticket.settled = True
+        if usage is None:
+            return
+        actual = billable_tokens(usage)
+        self.worker_bucket.settle(ticket.tokens, actual)
+        self._tenant_bucket(ticket.tenant).settle(ticket.tokens, actual)
+        seen = self._output_seen.setdefault(ticket.max_tokens, [0, 0])
+        seen[0] += usage.get("output_tokens", 0)
+        seen[1] += 1
+        self._dispatch()
+
+    def requeue(self, ticket: Ticket, error: Exception, attempt: int) -> bool:
+        """
+        Handle a failed call: upstream rate limiting pauses admission and refunds the call
+
+        Only while a budget is enabled; otherwise the error is raised to the
+        retry policy's decision like any other.
+
+        Args:
+            ticket: The failed call's ticket
+            error: What the call raised
+            attempt: How many times the call has been retried already
+
+        Returns:
+            True if the call should be admitted again and retried, False if the
+            error should be raised (the ticket is settled as estimated then)
+        """
+        retry_after = upstream_retry_after(error)
+        if retry_after is None or not self.enabled or attempt >= self.upstream_retries:
+            self.settle(ticket)
+            return False
+        self._stats["upstream_rate_limited"] += 1
+        self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+        ticket.settled = True
+        self._refund(ticket)
+        print(f"Anthropic rate limited a call ({getattr(error, 'status_code', '')}); pausing admission for {retry_after:g}s")
+        return True
+
+    def _refund(self, ticket: Ticket) -> None:
+        self.worker_bucket.settle(ticket.tokens, 0)
+        self._tenant_bucket(ticket.tenant).settle(ticket.tokens, 0)
+        self._dispatch()
+
+    def _remove(self, waiter: _Waiter) -> None:
+        queue = self._queues.get(waiter.tenant)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            self._queued -= 1
+            if not queue:
+                del self._queues[waiter.tenant]
+
+    def _retry_after(self) -> float:
+        """Rough time for the current backlog to clear, for Retry-After"""
+        paused = max(0.0, self._paused_until - time.monotonic())
+        if self.worker_bucket.tokens_per_minute <= 0:
+            return max(1.0, paused)
+        backlog = sum(waiter.tokens for queue in self._queues.values() for waiter in queue)
+        return max(1.0, paused, backlog * 60 / self.worker_bucket.tokens_per_minute)
+
+    def _dispatch(self) -> None:
+        """Admit waiting calls in turn while the budgets cover them, then schedule the next try"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        next_try = None
+        while self._queues:
+            next_try = self._paused_until - time.monotonic()
+            if next_try <= 0:
+                next_try = self._admit_next()
+            if next_try is not None:
+                break
+        if self._queues and next_try is not None:
+            self._timer = asyncio.get_running_loop().call_later(next_try, self._dispatch)
+
+    def _admit_next(self) -> Optional[float]:
+        """
+        Admit the next call in turn that fits its caller's budget
+
+        Returns:
+            None if a call was admitted, else seconds until one might fit
+        """
+        next_try = None
+        for tenant, queue in list(self._queues.items()):
+            waiter = queue[0]
+            tenant_wait = self._tenant_bucket(tenant).wait_time(waiter.tokens)
+            if tenant_wait > 0:
+                # Over its own budget: let the other callers go meanwhile
+                next_try = tenant_wait if next_try is None else min(next_try, tenant_wait)
+                continue
+            worker_wait = self.worker_bucket.wait_time(waiter.tokens)
+            if worker_wait > 0:
+                # Its turn at the worker budget: later callers wait behind it, so big calls aren't starved
+                return worker_wait if next_try is None else min(next_try, worker_wait)
+            queue.popleft()
+            self._queued -= 1
+            # This caller goes to the back of the line
+            del self._queues[tenant]
+            if queue:
+                self._queues[tenant] = queue
+            self.worker_bucket.take(waiter.tokens)
+            self._tenant_bucket(tenant).take(waiter.tokens)
+            self._stats["admitted"] += 1
+            waiter.future.set_result(None)
+            return None
+        return next_try
+
+    def snapshot(self) -> dict:
+        """Budgets, queue and counters, for the stats endpoint"""
+        bucket = self.worker_bucket.snapshot()
+        return {
+            "workers": ADMISSION_WORKERS,
+            "worker_tokens_per_minute": self.worker_bucket.tokens_per_minute,
+            "tenant_tokens_per_minute": self.tenant_tokens_per_minute,
+            "available": bucket["available"],
+            "queued": self._queued,
+            "queued_tenants": len(self._queues),
+            "paused_seconds": round(max(0.0, self._paused_until - time.monotonic()), 3),
+            **{key: round(value, 3) for key, value in self._stats.items()}
+        }
+
+
+admission = AdmissionController()
+
+
+class TenantMiddleware:
+    """
+    Pure ASGI middleware that charges each request's model calls to its caller
+
+    Args:
+        key_func: Maps a request to the caller id (the rate-limit key function)
+    """
+
+    def __init__(self, app, key_func: Callable[[Request], str]):
+        self.app = app
+        self.key_func = key_func
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_tenant.set(self.key_func(Request(scope)))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
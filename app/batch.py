@@ -0,0 +1,310 @@
+"""
+Batch generation for whole prospect lists
+
+Rows (CSV with a header, or JSONL) are generated concurrently with a bounded
+number of workers, paced by a shared token-per-minute budget, and yielded as
+each prospect completes. A failing row is reported and the rest carry on.
+With a checkpoint file, every result is appended as it completes, along with
+a hash of the row it was generated from, and a rerun replays the prospects
+that already succeeded instead of generating them again, as long as the row
+is unchanged. The endpoint keeps one checkpoint per caller and batch_id,
+deletes it once every row has succeeded and expires abandoned ones after
+BATCH_CHECKPOINT_TTL seconds.
+"""
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import re
+import time
+from typing import AsyncIterator, Optional
+
+from app.event_loop import run_io
+from app.generator import generate_outreach_emails, _sum_usage
+from app.resilience import TokenBucket
+from app.admission import billable_tokens
+
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+BATCH_MAX_ROWS = int(os.getenv("BATCH_MAX_ROWS", "500"))
+
+# Token budget shared by every batch in this process (0 disables pacing), and the
+# per-prospect estimate reserved before the first actual usage is known
+BATCH_TOKENS_PER_MINUTE = int(os.getenv("BATCH_TOKENS_PER_MINUTE", "80000"))
+BATCH_ESTIMATED_TOKENS = int(os.getenv("BATCH_ESTIMATED_TOKENS", "6000"))
+
+# Where /api/generate/batch keeps checkpoints, one file per caller and batch_id, and
+# how long one that is never resumed is kept
+BATCH_CHECKPOINT_DIR = os.getenv("BATCH_CHECKPOINT_DIR", os.path.join(os.path.dirname(__file__), "..", "batch_checkpoints"))
+BATCH_CHECKPOINT_TTL = float(os.getenv("BATCH_CHECKPOINT_TTL", str(24 * 3600)))
+
+REQUIRED_FIELDS = ("message_type", "prospect_name", "prospect_title", "prospect_company", "unique_fact", "business_initiative")
+OPTIONAL_FIELDS = ("manager_name", "meeting_purpose")
+
+_BATCH_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+token_bucket = TokenBucket("batch", BATCH_TOKENS_PER_MINUTE)
+
+
+def parse_batch_rows(data: str, fmt: str) -> list[dict]:
+    """
+    Parse a prospect list
+
+    Args:
+        data: CSV (header row with the generate request field names) or JSONL (one object per line)
+        fmt: "csv" or "jsonl"
+
+    Returns:
+        Row dicts, each with an "id" (the row's own "id" field, else its 1-based row number).
+        A JSONL line that isn't a JSON object becomes a row with an "error" instead of failing the batch.
+
+    Raises:
+        ValueError: For an unknown format or duplicate row ids
+    """
+    rows = []
+    if fmt == "csv":
+        for row in csv.DictReader(io.StringIO(data)):
+            row = {(key or "").strip(): (value or "").strip() for key, value in row.items() if isinstance(value, str)}
+            if any(row.values()):
+                rows.append(row)
+    elif fmt == "jsonl":
+        for line_no, line in enumerate(data.splitlines(), 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                row = {"error": f"Line {line_no}: {e}"}
+            rows.append(row)
+    else:
+        raise ValueError(f"Unknown batch format: {fmt} (expected csv or jsonl)")
+
+    seen = set()
+    for n, row in enumerate(rows, 1):
+        row["id"] = str(row.get("id") or n)
+        if row["id"] in seen:
+            raise ValueError(f"Duplicate row id: {row['id']}")
+        seen.add(row["id"])
+    return rows
+
+
+def batch_checkpoint_path(batch_id: str, caller: str) -> str:
+    """
+    Checkpoint file for a client-chosen batch id
+
+    Args:
+        batch_id: The client's id for the batch
+        caller: Who is running it (the rate-limit key), so two callers picking
+            the same batch_id never see each other's results
+
+    Raises:
+        ValueError: If the id isn't 1-64 letters, digits, '-' or '_'
+    """
+    if not _BATCH_ID_RE.match(batch_id):
+        raise ValueError("batch_id must be 1-64 letters, digits, '-' or '_'")
+    caller_digest = hashlib.sha256(caller.encode()).hexdigest()[:32]
+    return os.path.join(BATCH_CHECKPOINT_DIR, f"{caller_digest}-{batch_id}.jsonl")
+
+
+def row_hash(row: dict) -> str:
+    """Hash of the fields a row is generated from, so a changed row isn't replayed from a checkpoint"""
+    fields = {field: str(row.get(field) or "") for field in REQUIRED_FIELDS + OPTIONAL_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode()).hexdigest()
+
+
+def remove_checkpoint(path: str) -> None:
+    """Delete a checkpoint that's no longer needed (missing is fine)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def expire_checkpoints(max_age: float = BATCH_CHECKPOINT_TTL, directory: Optional[str] = None) -> int:
+    """
+    Delete checkpoints not written to for max_age seconds
+
+    Returns:
+        Number of checkpoints deleted
+    """
+    directory = directory or BATCH_CHECKPOINT_DIR
+    cutoff = time.time() - max_age
+    expired = 0
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.name.endswith(".jsonl") and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                expired += 1
+        except FileNotFoundError:
+            pass
+    return expired
+
+
+def load_checkpoint(path: str) -> dict[str, dict]:
+    """
+    Results of rows that already succeeded, by row id, each with the "row_hash"
+    of the row it was generated from
+
+    A line cut short by a crash mid-write is ignored.
+    """
+    done = {}
+    try:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if event.get("status") == "ok":
+                    done[event["id"]] = event
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _open_checkpoint(path: str):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    return open(path, 'a', encoding='utf-8')
+
+
+def _append_checkpoint(checkpoint, event: dict) -> None:
+    checkpoint.write(json.dumps(event) + "\n")
+    checkpoint.flush()
+
+
+def row_error(row: dict) -> Optional[str]:
+    """Why a row can't be generated, or None"""
+    if row.get("error"):
+        return str(row["error"])
+    missing = [field for field in REQUIRED_FIELDS if not str(row.get(field) or "").strip()]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+    return None
+
+
+async def _generate_row(row: dict, bucket: TokenBucket, usage_seen: dict) -> dict:
+    """
+    Generate one row, paced by the token bucket
+
+    Returns:
+        {"event": "result", "id": ..., "status": "ok", "result": {...}} or
+        {"event": "result", "id": ..., "status": "error", "error": "..."}
+    """
+    error = row_error(row)
+    if error:
+        return {"event": "result", "id": row["id"], "status": "error", "error": error}
+
+    # Reserve the average cost seen so far; the estimate is corrected once the actual usage is known
+    estimate = usage_seen["tokens"] / usage_seen["count"] if usage_seen["count"] else BATCH_ESTIMATED_TOKENS
+    await bucket.acquire(estimate)
+    try:
+        result = await generate_outreach_emails(**{
+            field: str(row[field]) for field in REQUIRED_FIELDS + OPTIONAL_FIELDS if row.get(field)
+        })
+    except Exception as e:
+        # The reservation stands: the failed request may still have used tokens
+        return {"event": "result", "id": row["id"], "status": "error", "error": str(e)}
+
+    actual = billable_tokens(result["metadata"].get("usage", {}))
+    if actual:
+        bucket.settle(estimate, actual)
+        usage_seen["tokens"] += actual
+        usage_seen["count"] += 1
+    return {"event": "result", "id": row["id"], "status": "ok", "result": result}
+
+
+async def run_batch(
+    rows: list[dict],
+    checkpoint_path: Optional[str] = None,
+    concurrency: Optional[int] = None,
+    bucket: Optional[TokenBucket] = None
+) -> AsyncIterator[dict]:
+    """
+    Generate outreach emails for every row, yielding each result as soon as it completes
+
+    Args:
+        rows: Rows from parse_batch_rows
+        checkpoint_path: Optional JSONL file results are appended to; rows that
+            already succeeded in it, and haven't changed since, are replayed
+            instead of generated again
+        concurrency: Rows generated at once (defaults to BATCH_CONCURRENCY)
+        bucket: Token budget to pace requests with (defaults to the shared batch budget)
+
+    Yields:
+        {"event": "result", "id": ..., "status": "ok" | "error", "result" | "error": ..., ["resumed": True]}
+        ... one per row, then
+        {"event": "done", "total": ..., "succeeded": ..., "failed": ..., "resumed": ..., "usage": {...}, "elapsed_ms": ...}
+    """
+    started = time.perf_counter()
+    bucket = bucket or token_bucket
+    done = await run_io(load_checkpoint, checkpoint_path) if checkpoint_path else {}
+    counts = {"succeeded": 0, "failed": 0, "resumed": 0}
+    usages = []
+
+    pending: asyncio.Queue = asyncio.Queue()
+    hashes = {row["id"]: row_hash(row) for row in rows}
+    for row in rows:
+        previous = done.get(row["id"])
+        if previous and previous.get("row_hash") == hashes[row["id"]]:
+            counts["resumed"] += 1
+            previous = {key: value for key, value in previous.items() if key != "row_hash"}
+            yield dict(previous, resumed=True)
+        else:
+            pending.put_nowait(row)
+    total_pending = pending.qsize()
+
+    completed: asyncio.Queue = asyncio.Queue()
+    usage_seen = {"tokens": 0, "count": 0}
+
+    async def worker() -> None:
+        while not pending.empty():
+            row = pending.get_nowait()
+            try:
+                event = await _generate_row(row, bucket, usage_seen)
+            except Exception as e:
+                event = {"event": "result", "id": row["id"], "status": "error", "error": str(e)}
+            await completed.put(event)
+
+    workers = [
+        asyncio.create_task(worker())
+        for _ in range(min(max(1, concurrency or BATCH_CONCURRENCY), total_pending))
+    ]
+    checkpoint = None
+    try:
+        # Checkpoint file I/O happens on its owner thread, in order, off the event loop
+        if checkpoint_path and total_pending:
+            checkpoint = await run_io(_open_checkpoint, checkpoint_path, store="batch_checkpoints")
+        for _ in range(total_pending):
+            event = await completed.get()
+            if checkpoint:
+                await run_io(_append_checkpoint, checkpoint, dict(event, row_hash=hashes[event["id"]]), store="batch_checkpoints")
+            if event["status"] == "ok":
+                counts["succeeded"] += 1
+                usages.append(event["result"]["metadata"].get("usage", {}))
+            else:
+                counts["failed"] += 1
+            yield event
+    finally:
+        # Stop generating if the consumer went away (e.g. the client disconnected)
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if checkpoint:
+            await run_io(checkpoint.close, store="batch_checkpoints")
+
+    yield {
+        "event": "done",
+        "total": len(rows),
+        **counts,
+        "usage": _sum_usage(usages),
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
@@ -0,0 +1,345 @@
+"""
+Offline bulk generation through the Anthropic Message Batches API
+
+For overnight campaign runs, where cost and throughput matter more than
+latency. Every prospect's prompt (from build_prompt) is packed into Message
+Batches submissions that are polled until they end. Each result is parsed
+with parse_json_response and validated like an interactive generation before
+it is stored with the job.
+
+Job state (rows, the params sent for each, submitted batch ids and per-row
+results) lives in SQLite, so a job interrupted by a restart picks up where
+it left off. Submitted rows are not resubmitted, and a batch's results are
+stored in the same transaction that marks it finished.
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+from app.batch import row_error, REQUIRED_FIELDS, OPTIONAL_FIELDS
+from app.generator import templates_result
+from app.model_client import DEFAULT_MODEL, get_anthropic_client, message_params, parse_json_response, usage_to_dict
+from app.prompts_v2 import build_prompt
+
+
+BULK_JOBS_DB = os.getenv("BULK_JOBS_DB", "bulk_jobs.db")
+BULK_POLL_INTERVAL = float(os.getenv("BULK_POLL_INTERVAL", "60"))
+
+# Limits per Message Batches submission (the API allows up to 100,000 requests / 256 MB)
+BULK_MAX_BATCH_REQUESTS = int(os.getenv("BULK_MAX_BATCH_REQUESTS", "10000"))
+BULK_MAX_BATCH_BYTES = int(os.getenv("BULK_MAX_BATCH_BYTES", str(100 * 1024 * 1024)))
+
+# Row statuses: pending -> submitted -> succeeded | errored | expired | canceled,
+# or invalid for rows that can't be generated at all
+FAILED_STATUSES = ("errored", "expired", "canceled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bulk_jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bulk_items (
+    job_id TEXT NOT NULL,
+    custom_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    row_id TEXT NOT NULL,
+    row TEXT NOT NULL,
+    params TEXT,
+    batch_id TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    result TEXT,
+    PRIMARY KEY (job_id, custom_id)
+);
+CREATE INDEX IF NOT EXISTS idx_bulk_items_status ON bulk_items (job_id, status);
+CREATE INDEX IF NOT EXISTS idx_bulk_items_batch ON bulk_items (batch_id);
+CREATE TABLE IF NOT EXISTS bulk_batches (
+    batch_id TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    request_count INTEGER NOT NULL,
+    submitted_at REAL NOT NULL,
+    ended_at REAL
+);
+"""
+
+# One connection per thread (sqlite3 connections are not shareable across threads)
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Get this thread's connection to BULK_JOBS_DB, creating the schema on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.db_path == BULK_JOBS_DB:
+        return conn
+
+    conn = sqlite3.connect(BULK_JOBS_DB, timeout=10.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    _local.conn = conn
+    _local.db_path = BULK_JOBS_DB
+    return conn
+
+
+@contextmanager
+def _transaction() -> Iterator[sqlite3.Connection]:
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def _row_fields(row: dict) -> dict:
+    return {field: str(row[field]) for field in REQUIRED_FIELDS + OPTIONAL_FIELDS if row.get(field)}
+
+
+def create_job(rows: list[dict], job_id: Optional[str] = None, model: Optional[str] = None) -> str:
+    """
+    Create a bulk job, building the prompt for every row up front
+
+    Args:
+        rows: Rows from app.batch.parse_batch_rows
+        job_id: Optional job id (generated if omitted)
+        model: Optional model override
+
+    Returns:
+        The job id
+
+    Raises:
+        ValueError: If a job with that id already exists
+    """
+    job_id = job_id or f"bulk-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    items = []
+    for position, row in enumerate(rows):
+        error = row_error(row)
+        params = None
+        if error is None:
+            system_prompt, user_prompt = build_prompt(**_row_fields(row))
+            params = json.dumps(message_params(system_prompt, user_prompt, model or DEFAULT_MODEL))
+        items.append((
+            job_id, f"row-{position}", position, row["id"], json.dumps(row), params,
+            "invalid" if error else "pending", error
+        ))
+
+    now = time.time()
+    with _transaction() as conn:
+        if conn.execute("SELECT 1 FROM bulk_jobs WHERE job_id = ?", (job_id,)).fetchone():
+            raise ValueError(f"Bulk job {job_id} already exists")
+        conn.execute("INSERT INTO bulk_jobs VALUES (?, 'running', ?, ?)", (job_id, now, now))
+        conn.executemany(
+            "INSERT INTO bulk_items (job_id, custom_id, position, row_id, row, params, status, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            items
+        )
+    return job_id
+
+
+def _pack(pending: list[tuple[str, str]]) -> Iterator[list[tuple[str, str]]]:
+    """Split (custom_id, params) pairs into submissions within the request count and size limits"""
+    chunk: list[tuple[str, str]] = []
+    size = 0
+    for custom_id, params in pending:
+        request_size = len(params) + len(custom_id) + 64
+        if chunk and (len(chunk) >= BULK_MAX_BATCH_REQUESTS or size + request_size > BULK_MAX_BATCH_BYTES):
+            yield chunk
+            chunk, size = [], 0
+        chunk.append((custom_id, params))
+        size += request_size
+    if chunk:
+        yield chunk
+
+
+async def submit_pending(job_id: str) -> list[str]:
+    """
+    Submit the job's pending rows as one or more Message Batches
+
+    A submission is recorded in the same transaction that marks its rows
+    submitted. If the process dies between the API call and that commit, the
+    rows are still pending and are submitted again on restart.
+
+    Returns:
+        Ids of the batches created
+    """
+    pending = _connect().execute(
+        "SELECT custom_id, params FROM bulk_items WHERE job_id = ? AND status = 'pending' ORDER BY position", (job_id,)
+    ).fetchall()
+    client = get_anthropic_client()
+    batch_ids = []
+    for chunk in _pack(pending):
+        batch = await client.messages.batches.create(
+            requests=[{"custom_id": custom_id, "params": json.loads(params)} for custom_id, params in chunk]
+        )
+        with _transaction() as conn:
+            conn.execute(
+                "INSERT INTO bulk_batches VALUES (?, ?, 'in_progress', ?, ?, NULL)",
+                (batch.id, job_id, len(chunk), time.time())
+            )
+            conn.executemany(
+                "UPDATE bulk_items SET status = 'submitted', batch_id = ? WHERE job_id = ? AND custom_id = ?",
+                [(batch.id, job_id, custom_id) for custom_id, _ in chunk]
+            )
+        batch_ids.append(batch.id)
+    return batch_ids
+
+
+def _outcome(entry, row: dict, batch_id: str) -> tuple[str, Optional[str], Optional[str]]:
+    """
+    (status, error, result JSON) for one Message Batches result line
+    """
+    result = entry.result
+    if result.type == "succeeded":
+        try:
+            response = parse_json_response(result.message.content[0].text)
+            response["usage"] = usage_to_dict(result.message.usage)
+            generated = templates_result(
+                response, row["message_type"], row["prospect_name"], row["prospect_company"],
+                row.get("manager_name") or "[Manager's Name]"
+            )
+        except (ValueError, IndexError, AttributeError) as e:
+            return "errored", str(e), None
+        generated["metadata"]["generation_mode"] = "message_batches"
+        generated["metadata"]["batch_id"] = batch_id
+        return "succeeded", None, json.dumps(generated)
+    if result.type == "errored":
+        error = getattr(result.error, "error", None)
+        return "errored", getattr(error, "message", None) or str(result.error), None
+    return result.type, f"Batch request {result.type}", None
+
+
+async def _collect_results(job_id: str, batch_id: str) -> None:
+    """Fetch an ended batch's results and store them, marking the batch finished"""
+    rows = {
+        custom_id: json.loads(row)
+        for custom_id, row in _connect().execute(
+            "SELECT custom_id, row FROM bulk_items WHERE batch_id = ? AND status = 'submitted'", (batch_id,)
+        )
+    }
+    updates = []
+    async for entry in await get_anthropic_client().messages.batches.results(batch_id):
+        if entry.custom_id in rows:
+            status, error, result = _outcome(entry, rows.pop(entry.custom_id), batch_id)
+            updates.append((status, error, result, job_id, entry.custom_id))
+    updates += [("errored", "Missing from batch results", None, job_id, custom_id) for custom_id in rows]
+
+    with _transaction() as conn:
+        conn.executemany("UPDATE bulk_items SET status = ?, error = ?, result = ? WHERE job_id = ? AND custom_id = ?", updates)
+        conn.execute("UPDATE bulk_batches SET status = 'ended', ended_at = ? WHERE batch_id = ?", (time.time(), batch_id))
+
+
+async def poll_batches(job_id: str) -> int:
+    """
+    Check the job's in-progress batches, storing the results of any that ended
+
+    Returns:
+        Number of batches still in progress
+    """
+    in_progress = 0
+    client = get_anthropic_client()
+    for (batch_id,) in _connect().execute(
+        "SELECT batch_id FROM bulk_batches WHERE job_id = ? AND status = 'in_progress'", (job_id,)
+    ).fetchall():
+        batch = await client.messages.batches.retrieve(batch_id)
+        if batch.processing_status == "ended":
+            await _collect_results(job_id, batch_id)
+        else:
+            in_progress += 1
+    return in_progress
+
+
+async def run_job(
+    job_id: str,
+    poll_interval: Optional[float] = None,
+    on_poll: Optional[Callable[[dict], None]] = None
+) -> dict:
+    """
+    Submit the job's pending rows and poll until every batch has ended
+
+    Safe to call again after a restart: it resumes from the stored state.
+
+    Args:
+        job_id: Job from create_job
+        poll_interval: Seconds between polls (defaults to BULK_POLL_INTERVAL)
+        on_poll: Optional callback given job_status() after each poll
+
+    Returns:
+        Final job_status()
+    """
+    if job_status(job_id) is None:
+        raise ValueError(f"Unknown bulk job: {job_id}")
+    while True:
+        await submit_pending(job_id)
+        in_progress = await poll_batches(job_id)
+        if on_poll:
+            on_poll(job_status(job_id))
+        if not in_progress:
+            break
+        await asyncio.sleep(BULK_POLL_INTERVAL if poll_interval is None else poll_interval)
+
+    with _transaction() as conn:
+        conn.execute("UPDATE bulk_jobs SET status = 'ended', updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+    return job_status(job_id)
+
+
+def requeue_failed(job_id: str) -> int:
+    """
+    Mark the job's errored, expired and canceled rows pending again, for the next run_job
+
+    Returns:
+        Number of rows requeued
+    """
+    with _transaction() as conn:
+        cursor = conn.execute(
+            f"UPDATE bulk_items SET status = 'pending', batch_id = NULL, error = NULL "
+            f"WHERE job_id = ? AND status IN ({', '.join('?' * len(FAILED_STATUSES))})",
+            (job_id, *FAILED_STATUSES)
+        )
+        conn.execute("UPDATE bulk_jobs SET status = 'running', updated_at = ? WHERE job_id = ?", (time.time(), job_id))
+        return cursor.rowcount
+
+
+def job_status(job_id: str) -> Optional[dict]:
+    """
+    Job state and row/batch counts by status, or None if there is no such job
+    """
+    conn = _connect()
+    job = conn.execute("SELECT status, created_at, updated_at FROM bulk_jobs WHERE job_id = ?", (job_id,)).fetchone()
+    if job is None:
+        return None
+    rows = dict(conn.execute("SELECT status, COUNT(*) FROM bulk_items WHERE job_id = ? GROUP BY status", (job_id,)))
+    batches = dict(conn.execute("SELECT status, COUNT(*) FROM bulk_batches WHERE job_id = ? GROUP BY status", (job_id,)))
+    return {
+        "job_id": job_id,
+        "status": job[0],
+        "created_at": job[1],
+        "updated_at": job[2],
+        "rows": rows,
+        "batches": batches
+    }
+
+
+def iter_results(job_id: str) -> Iterator[dict]:
+    """
+    Finished rows in input order, in the same shape as app.batch results:
+    {"event": "result", "id": ..., "status": "ok", "result": {...}} or
+    {"event": "result", "id": ..., "status": "error", "error": "..."}
+    """
+    for row_id, status, error, result in _connect().execute(
+        "SELECT row_id, status, error, result FROM bulk_items "
+        "WHERE job_id = ? AND status NOT IN ('pending', 'submitted') ORDER BY position",
+        (job_id,)
+    ):
+        if status == "succeeded":
+            yield {"event": "result", "id": row_id, "status": "ok", "result": json.loads(result)}
+        else:
+            yield {"event": "result", "id": row_id, "status": "error", "error": error}
@@ -1,15 +1,68 @@
 """
-Simple cache for LinkedIn enrichment results
+Cache for LinkedIn enrichment results, backed by SQLite in WAL mode
+
+Safe for concurrent uvicorn workers: every write is a single atomic upsert and
+readers never block writers. Expired entries are ignored on read and removed
+by a periodic batched sweep rather than on the request path.
+
+A bounded in-process LRU sits in front of SQLite so repeat lookups for the
+same profile don't touch disk. It is per worker, so entries written by another
+worker become visible here once the local copy's TTL lapses.
+
+Failed and low-confidence lookups go into a separate, short-TTL negative cache
+(also per worker) so a bad URL isn't retried against Perplexity on every
+request, while still being retried well before a normal entry would expire.
+
+Async code uses get_cached_enrichment_async/cache_enrichment_async, which do
+their SQLite reads on the I/O thread pool and writes on the cache's owner
+thread (see app.event_loop) so a slow disk never stalls the event loop.
 """
+import asyncio
 import json
 import os
+import sqlite3
 import hashlib
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
 from typing import Optional
 
+from app.event_loop import run_io
 
-CACHE_FILE = "enrichment_cache.json"
+CACHE_DB = os.getenv("ENRICHMENT_CACHE_DB", "enrichment_cache.db")
+CACHE_FILE = "enrichment_cache.json"  # Legacy JSON cache, imported into CACHE_DB on first use
 CACHE_DURATION_DAYS = 30
+SWEEP_INTERVAL_SECONDS = float(os.getenv("ENRICHMENT_CACHE_SWEEP_INTERVAL", "3600"))
+SWEEP_BATCH_SIZE = 500
+LRU_MAX_ENTRIES = int(os.getenv("ENRICHMENT_LRU_SIZE", "1024"))
+LRU_TTL_SECONDS = float(os.getenv("ENRICHMENT_LRU_TTL", "300"))
+NEGATIVE_TTL_SECONDS = float(os.getenv("ENRICHMENT_NEGATIVE_TTL", "600"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS enrichment_cache (
+    cache_key TEXT PRIMARY KEY,
+    linkedin_url TEXT NOT NULL,
+    prospect_name TEXT NOT NULL,
+    result TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_enrichment_cache_cached_at ON enrichment_cache (cached_at);
+"""
+
+# One connection per thread (sqlite3 connections are not shareable across threads)
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_dbs: set[str] = set()
+
+# In-process LRU tier: cache_key -> (expires_at, result)
+_lru: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_lru_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+# Negative cache: cache_key -> (expires_at, fallback result), bounded like the LRU tier
+_negative: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_negative_stats = {"hits": 0, "stores": 0}
 
 
 def _get_cache_key(linkedin_url: str, prospect_name: str) -> str:
@@ -18,82 +71,293 @@ def _get_cache_key(linkedin_url: str, prospect_name: str) -> str:
     return hashlib.md5(key_string.encode()).hexdigest()
 
 
-def _load_cache() -> dict:
-    """Load cache from file"""
-    if not os.path.exists(CACHE_FILE):
-        return {}
-    
+def _connect() -> sqlite3.Connection:
+    """Get this thread's connection to CACHE_DB, creating the schema on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.db_path == CACHE_DB:
+        return conn
+
+    conn = sqlite3.connect(CACHE_DB, timeout=10.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+    with _init_lock:
+        if CACHE_DB not in _initialized_dbs:
+            conn.executescript(_SCHEMA)
+            migrate_json_cache(conn)
+            _initialized_dbs.add(CACHE_DB)
+
+    _local.conn = conn
+    _local.db_path = CACHE_DB
+    return conn
+
+
+def _expiry_cutoff() -> float:
+    """Entries cached before this timestamp are expired"""
+    return time.time() - CACHE_DURATION_DAYS * 86400
+
+
+def _lru_get(cache_key: str) -> Optional[dict]:
+    """Look up the LRU tier, dropping the entry if its TTL has lapsed"""
+    with _lru_lock:
+        entry = _lru.get(cache_key)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        expires_at, result = entry
+        if time.time() >= expires_at:
+            del _lru[cache_key]
+            _stats["expirations"] += 1
+            _stats["misses"] += 1
+            return None
+        _lru.move_to_end(cache_key)
+        _stats["hits"] += 1
+        return result
+
+
+def _lru_put(cache_key: str, result: dict, cached_at: float) -> None:
+    """Insert into the LRU tier, never outliving the persistent entry's expiry"""
+    expires_at = min(time.time() + LRU_TTL_SECONDS, cached_at + CACHE_DURATION_DAYS * 86400)
+    with _lru_lock:
+        _lru[cache_key] = (expires_at, result)
+        _lru.move_to_end(cache_key)
+        while len(_lru) > LRU_MAX_ENTRIES:
+            _lru.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def get_cache_stats() -> dict:
+    """Hit/miss/eviction counters for the in-process LRU tier and the negative cache"""
+    with _lru_lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "size": len(_lru),
+            "max_size": LRU_MAX_ENTRIES,
+            "ttl_seconds": LRU_TTL_SECONDS,
+            "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+            "negative": {
+                **_negative_stats,
+                "size": len(_negative),
+                "ttl_seconds": NEGATIVE_TTL_SECONDS
+            }
+        }
+
+
+def get_negative_enrichment(linkedin_url: str, prospect_name: str) -> Optional[dict]:
+    """
+    Get the recent failed/low-confidence result for a profile, if any
+
+    Returns:
+        Copy of the negatively cached result, or None
+    """
+    cache_key = _get_cache_key(linkedin_url, prospect_name)
+    with _lru_lock:
+        entry = _negative.get(cache_key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if time.time() >= expires_at:
+            del _negative[cache_key]
+            return None
+        _negative_stats["hits"] += 1
+        return dict(result)
+
+
+def cache_negative_enrichment(linkedin_url: str, prospect_name: str, result: dict) -> None:
+    """
+    Remember a failed or low-confidence result for NEGATIVE_TTL_SECONDS
+
+    Args:
+        linkedin_url: LinkedIn profile URL
+        prospect_name: Prospect's name
+        result: Fallback or low-confidence result to serve until the entry expires
+    """
+    cache_key = _get_cache_key(linkedin_url, prospect_name)
+    with _lru_lock:
+        _negative[cache_key] = (time.time() + NEGATIVE_TTL_SECONDS, dict(result))
+        _negative.move_to_end(cache_key)
+        _negative_stats["stores"] += 1
+        while len(_negative) > LRU_MAX_ENTRIES:
+            _negative.popitem(last=False)
+
+
+def migrate_json_cache(conn: sqlite3.Connection, json_path: Optional[str] = None) -> int:
+    """
+    Import entries from the legacy JSON cache file, then rename it to *.migrated
+
+    Existing rows win, so running this more than once (e.g. from several workers) is harmless.
+
+    Returns:
+        Number of entries imported
+    """
+    json_path = json_path or CACHE_FILE
+    if not os.path.exists(json_path):
+        return 0
+
     try:
-        with open(CACHE_FILE, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            legacy = json.load(f)
     except (json.JSONDecodeError, IOError):
-        return {}
+        return 0
+
+    rows = []
+    for cache_key, entry in legacy.items():
+        try:
+            cached_at = datetime.fromisoformat(entry['cached_at']).timestamp()
+            rows.append((cache_key, entry['linkedin_url'], entry['prospect_name'], json.dumps(entry['result']), cached_at))
+        except (KeyError, TypeError, ValueError):
+            continue  # Skip malformed entries
+
+    with conn:
+        conn.execute("BEGIN")
+        conn.executemany(
+            "INSERT OR IGNORE INTO enrichment_cache (cache_key, linkedin_url, prospect_name, result, cached_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+    try:
+        os.replace(json_path, json_path + ".migrated")
+    except OSError:
+        pass  # Another worker already moved it
+
+    return len(rows)
+
 
+def _read_persisted(cache_key: str) -> Optional[dict]:
+    """Read an unexpired entry from CACHE_DB into the LRU tier (blocking)"""
+    try:
+        row = _connect().execute(
+            "SELECT result, cached_at FROM enrichment_cache WHERE cache_key = ? AND cached_at >= ?",
+            (cache_key, _expiry_cutoff())
+        ).fetchone()
+    except sqlite3.Error:
+        return None  # Treat an unavailable cache as a miss
+
+    if row is None:
+        return None
+    result = json.loads(row[0])
+    _lru_put(cache_key, result, row[1])
+    return dict(result)
+
+
+def _remember(cache_key: str, result: dict) -> float:
+    """Put a fresh result in the LRU tier, replacing any negative entry; returns its cached_at"""
+    cached_at = time.time()
+    _lru_put(cache_key, dict(result), cached_at)
+    with _lru_lock:
+        _negative.pop(cache_key, None)
+    return cached_at
 
-def _save_cache(cache: dict) -> None:
-    """Save cache to file"""
+
+def _write_persisted(cache_key: str, linkedin_url: str, prospect_name: str, result: dict, cached_at: float) -> None:
+    """Upsert an entry into CACHE_DB (blocking)"""
     try:
-        with open(CACHE_FILE, 'w', encoding='utf-8') as f:
-            json.dump(cache, f, indent=2)
-    except IOError:
+        _connect().execute(
+            "INSERT INTO enrichment_cache (cache_key, linkedin_url, prospect_name, result, cached_at) "
+            "VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (cache_key) DO UPDATE SET "
+            "linkedin_url = excluded.linkedin_url, prospect_name = excluded.prospect_name, "
+            "result = excluded.result, cached_at = excluded.cached_at",
+            (cache_key, linkedin_url, prospect_name, json.dumps(result), cached_at)
+        )
+    except sqlite3.Error:
         pass  # Fail silently if we can't write cache
 
 
 def get_cached_enrichment(linkedin_url: str, prospect_name: str) -> Optional[dict]:
     """
     Get cached enrichment result if available and not expired
-    
+
+    Blocks on SQLite when the profile isn't in the LRU tier; from async code
+    use get_cached_enrichment_async.
+
     Args:
         linkedin_url: LinkedIn profile URL
         prospect_name: Prospect's name
-    
+
     Returns:
         Cached result dict or None if not found/expired
     """
-    cache = _load_cache()
     cache_key = _get_cache_key(linkedin_url, prospect_name)
-    
-    if cache_key not in cache:
-        return None
-    
-    entry = cache[cache_key]
-    
-    # Check if expired
-    cached_date = datetime.fromisoformat(entry['cached_at'])
-    expiry_date = cached_date + timedelta(days=CACHE_DURATION_DAYS)
-    
-    if datetime.now() > expiry_date:
-        # Expired, remove from cache
-        del cache[cache_key]
-        _save_cache(cache)
-        return None
-    
-    return entry['result']
+    result = _lru_get(cache_key)
+    if result is not None:
+        return dict(result)
+    return _read_persisted(cache_key)
+
+
+async def get_cached_enrichment_async(linkedin_url: str, prospect_name: str) -> Optional[dict]:
+    """get_cached_enrichment, reading SQLite on the I/O thread pool instead of the event loop"""
+    cache_key = _get_cache_key(linkedin_url, prospect_name)
+    result = _lru_get(cache_key)
+    if result is not None:
+        return dict(result)
+    return await run_io(_read_persisted, cache_key)
 
 
 def cache_enrichment(linkedin_url: str, prospect_name: str, result: dict) -> None:
     """
     Cache an enrichment result
-    
+
+    Blocks on the SQLite write; from async code use cache_enrichment_async.
+
     Args:
         linkedin_url: LinkedIn profile URL
         prospect_name: Prospect's name
         result: Enrichment result to cache
     """
-    cache = _load_cache()
     cache_key = _get_cache_key(linkedin_url, prospect_name)
-    
-    cache[cache_key] = {
-        'linkedin_url': linkedin_url,
-        'prospect_name': prospect_name,
-        'result': result,
-        'cached_at': datetime.now().isoformat()
-    }
-    
-    _save_cache(cache)
+    cached_at = _remember(cache_key, result)
+    _write_persisted(cache_key, linkedin_url, prospect_name, result, cached_at)
+
+
+async def cache_enrichment_async(linkedin_url: str, prospect_name: str, result: dict) -> None:
+    """
+    cache_enrichment, writing SQLite on the cache's owner thread instead of the event loop
+
+    The in-process tiers are updated before this yields, so lookups in this
+    worker see the result immediately.
+    """
+    cache_key = _get_cache_key(linkedin_url, prospect_name)
+    cached_at = _remember(cache_key, result)
+    await run_io(_write_persisted, cache_key, linkedin_url, prospect_name, dict(result), cached_at, store="enrichment_cache")
+
+
+def sweep_expired(batch_size: int = SWEEP_BATCH_SIZE) -> int:
+    """
+    Delete expired entries in batches so the write lock is held only briefly
+
+    Returns:
+        Number of entries deleted
+    """
+    conn = _connect()
+    cutoff = _expiry_cutoff()
+    deleted = 0
+    while True:
+        cursor = conn.execute(
+            "DELETE FROM enrichment_cache WHERE rowid IN "
+            "(SELECT rowid FROM enrichment_cache WHERE cached_at < ? LIMIT ?)",
+            (cutoff, batch_size)
+        )
+        deleted += cursor.rowcount
+        if cursor.rowcount < batch_size:
+            return deleted
+
+
+async def run_expiry_sweeper(interval: float = SWEEP_INTERVAL_SECONDS) -> None:
+    """Background task: sweep expired entries every `interval` seconds until cancelled"""
+    while True:
+        try:
+            await run_io(sweep_expired, store="enrichment_cache")
+        except sqlite3.Error as e:
+            print(f"Enrichment cache sweep failed: {e}")
+        await asyncio.sleep(interval)
 
 
 def clear_cache() -> None:
     """Clear all cached enrichment results"""
-    if os.path.exists(CACHE_FILE):
-        os.remove(CACHE_FILE)
+    with _lru_lock:
+        _lru.clear()
+        _negative.clear()
+    _connect().execute("DELETE FROM enrichment_cache")
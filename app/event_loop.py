@@ -0,0 +1,155 @@
+"""
+Keeping blocking work off the event loop
+
+run_io() runs a blocking call (disk, SQLite, a synchronous network client) on
+a bounded thread pool shared by the whole process, so a slow disk ties up at
+most IO_THREADS threads instead of stalling every in-flight request. Calls
+that mutate a store pass store="<name>" and run on that store's single owner
+thread instead, so writes to it are serialized in submission order and never
+contend with each other for locks.
+
+LOOP_BLOCK_WARN_MS > 0 turns on a debug watchdog that prints the event loop
+thread's stack whenever the loop has been blocked for longer than that, and
+how long the stall lasted once it ends.
+"""
+import asyncio
+import functools
+import os
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+from app.metrics import LOOP_BLOCKS
+
+
+IO_THREADS = int(os.getenv("IO_THREADS", "8"))
+LOOP_BLOCK_WARN_MS = float(os.getenv("LOOP_BLOCK_WARN_MS", "0"))
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_pool: Optional[ThreadPoolExecutor] = None
+_owners: dict[str, ThreadPoolExecutor] = {}
+_stats = {"calls": 0, "pending": 0, "max_pending": 0}
+
+
+def _executor(store: Optional[str]) -> ThreadPoolExecutor:
+    """The shared I/O pool, or the owner thread for a store, created on first use"""
+    global _pool
+    with _lock:
+        if store is None:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=max(1, IO_THREADS), thread_name_prefix="io")
+            return _pool
+        owner = _owners.get(store)
+        if owner is None:
+            owner = _owners[store] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"{store}-owner")
+        return owner
+
+
+def _done(_future) -> None:
+    with _lock:
+        _stats["pending"] -= 1
+
+
+async def run_io(fn: Callable[..., T], *args, store: Optional[str] = None, **kwargs) -> T:
+    """
+    Run a blocking call without blocking the event loop
+
+    Args:
+        fn: Function to call with *args and **kwargs
+        store: Name of the store fn mutates; calls for the same store run one
+            at a time, in order, on its owner thread
+
+    Returns:
+        fn's return value (its exception is raised here)
+    """
+    executor = _executor(store)
+    with _lock:
+        _stats["calls"] += 1
+        _stats["pending"] += 1
+        _stats["max_pending"] = max(_stats["max_pending"], _stats["pending"])
+    try:
+        future = executor.submit(functools.partial(fn, *args, **kwargs))
+    except BaseException:
+        _done(None)
+        raise
+    future.add_done_callback(_done)
+    # A cancelled caller stops waiting; the call itself still finishes on its thread
+    return await asyncio.wrap_future(future)
+
+
+def io_stats() -> dict:
+    """Blocking calls made, waiting or running now, and the most at once, for the stats endpoint"""
+    with _lock:
+        return {**_stats, "threads": IO_THREADS, "owners": sorted(_owners)}
+
+
+def shutdown_io() -> None:
+    """Finish queued calls (including pending store writes) and stop the threads; later calls start new ones"""
+    global _pool
+    with _lock:
+        executors = [_pool, *_owners.values()]
+        _pool = None
+        _owners.clear()
+    for executor in executors:
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+class LoopWatchdog:
+    """
+    Debug aid that reports event loop stalls longer than a threshold
+
+    A heartbeat task on the loop records when it last ran; a watchdog thread
+    notices when it is overdue and prints the loop thread's current stack,
+    i.e. the code blocking the loop. When the heartbeat runs again it prints
+    the stall's total duration and counts it in the metrics.
+
+        watchdog = LoopWatchdog(100)
+        task = asyncio.create_task(watchdog.run())
+    """
+
+    def __init__(self, threshold_ms: float, interval: Optional[float] = None):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval if interval is not None else max(0.005, self.threshold / 4)
+        self.stalls = 0
+        self._beat = time.monotonic()
+        self._reported = False
+        self._loop_thread: Optional[int] = None
+        self._stop = threading.Event()
+
+    async def run(self) -> None:
+        """Heartbeat until cancelled, with the watchdog thread running alongside"""
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        thread.start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                blocked = now - self._beat - self.interval
+                self._beat = now
+                if blocked > self.threshold:
+                    self.stalls += 1
+                    LOOP_BLOCKS.inc()
+                    print(f"Event loop was blocked for {blocked * 1000:.0f}ms")
+                self._reported = False
+        finally:
+            self._stop.set()
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval):
+            blocked = time.monotonic() - self._beat - self.interval
+            if blocked <= self.threshold or self._reported:
+                continue
+            self._reported = True
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "  (stack unavailable)\n"
+            print(f"Event loop blocked for over {blocked * 1000:.0f}ms (LOOP_BLOCK_WARN_MS={self.threshold * 1000:g}), "
+                  f"currently in:\n{stack}", end="")
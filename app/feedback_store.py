@@ -0,0 +1,273 @@
+"""
+Queryable feedback store, ingested incrementally from the feedback log
+
+The JSONL segments written by app.feedback_writer stay the source of truth
+(and the only copy of the full records); ingest_feedback() copies the fields
+the analysis slices by into indexed SQLite columns (FEEDBACK_STORE_DB). Each run only reads
+files that changed since the last one, skipping the records it already has.
+Ingested rows are also folded into a rollup of counts per
+(day, feedback_type, message_type, angle, sender), so summaries over any
+date range and grouping read the small rollup instead of every record.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from app.feedback_writer import FEEDBACK_DIR, feedback_files, read_feedback_file
+
+
+FEEDBACK_STORE_DB = os.getenv("FEEDBACK_STORE_DB", os.path.join(FEEDBACK_DIR, "feedback.db"))
+
+# Columns summaries can be grouped by
+GROUP_BY_COLUMNS = ("feedback_type", "message_type", "angle", "sender", "day")
+
+_SINCE_RE = re.compile(r'^(\d+)d$')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS feedback (
+    id INTEGER PRIMARY KEY,
+    feedback_id TEXT NOT NULL UNIQUE,
+    day TEXT NOT NULL,
+    received_at TEXT NOT NULL,
+    feedback_type TEXT NOT NULL,
+    message_type TEXT NOT NULL,
+    angle TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    original_subject TEXT NOT NULL,
+    improved_version TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_feedback_feedback_type ON feedback (feedback_type);
+CREATE INDEX IF NOT EXISTS idx_feedback_message_type ON feedback (message_type);
+CREATE INDEX IF NOT EXISTS idx_feedback_angle ON feedback (angle);
+CREATE INDEX IF NOT EXISTS idx_feedback_sender ON feedback (sender);
+CREATE INDEX IF NOT EXISTS idx_feedback_day ON feedback (day);
+
+CREATE TABLE IF NOT EXISTS feedback_rollup (
+    day TEXT NOT NULL,
+    feedback_type TEXT NOT NULL,
+    message_type TEXT NOT NULL,
+    angle TEXT NOT NULL,
+    sender TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    improvements INTEGER NOT NULL,
+    PRIMARY KEY (day, feedback_type, message_type, angle, sender)
+);
+
+-- How far each log file has been ingested
+CREATE TABLE IF NOT EXISTS feedback_sources (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    records INTEGER NOT NULL
+);
+
+-- Highest feedback.id already folded into feedback_rollup
+CREATE TABLE IF NOT EXISTS feedback_rollup_state (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    last_id INTEGER NOT NULL
+);
+"""
+
+# One connection per thread (sqlite3 connections are not shareable across threads)
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Get this thread's connection to FEEDBACK_STORE_DB, creating the schema on first use"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.db_path == FEEDBACK_STORE_DB:
+        return conn
+
+    os.makedirs(os.path.dirname(os.path.abspath(FEEDBACK_STORE_DB)), exist_ok=True)
+    conn = sqlite3.connect(FEEDBACK_STORE_DB, timeout=10.0, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-65536")  # 64 MB: keeps index maintenance in memory during large ingests
+    conn.executescript(_SCHEMA)
+
+    _local.conn = conn
+    _local.db_path = FEEDBACK_STORE_DB
+    return conn
+
+
+def _row(record: dict, fallback_id: str) -> tuple:
+    """Column values for a feedback record"""
+    metadata = record.get("metadata") or {}
+    original = record.get("original_output") or {}
+    received_at = str(record.get("received_at") or record.get("timestamp") or "")
+    return (
+        str(record.get("feedback_id") or fallback_id),
+        received_at[:10],
+        received_at,
+        str(record.get("feedback_type") or ""),
+        str(metadata.get("message_type") or ""),
+        str(original.get("angle") or ""),
+        str(metadata.get("manager_name") or ""),
+        str(original.get("subject") or ""),
+        record.get("improved_version") or None
+    )
+
+
+def _insert(conn: sqlite3.Connection, rows: Iterable[tuple]) -> None:
+    conn.executemany(
+        "INSERT OR IGNORE INTO feedback (feedback_id, day, received_at, feedback_type, message_type, angle, sender, "
+        "original_subject, improved_version) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        rows
+    )
+
+
+def _update_rollup(conn: sqlite3.Connection) -> None:
+    """Fold feedback rows added since the last rollup into the per-day counts"""
+    last_id = conn.execute("SELECT last_id FROM feedback_rollup_state").fetchone()
+    last_id = last_id[0] if last_id else 0
+    max_id = conn.execute("SELECT MAX(id) FROM feedback").fetchone()[0] or 0
+    if max_id <= last_id:
+        return
+    conn.execute(
+        "INSERT INTO feedback_rollup (day, feedback_type, message_type, angle, sender, count, improvements) "
+        "SELECT day, feedback_type, message_type, angle, sender, COUNT(*), COUNT(improved_version) "
+        "FROM feedback WHERE id > ? AND id <= ? GROUP BY day, feedback_type, message_type, angle, sender "
+        "ON CONFLICT (day, feedback_type, message_type, angle, sender) DO UPDATE SET "
+        "count = count + excluded.count, improvements = improvements + excluded.improvements",
+        (last_id, max_id)
+    )
+    conn.execute("INSERT OR REPLACE INTO feedback_rollup_state (id, last_id) VALUES (0, ?)", (max_id,))
+
+
+def ingest_feedback(feedback_dir: Optional[str] = None) -> int:
+    """
+    Copy records added to the feedback log since the last run into the store
+
+    Files whose size and modification time are unchanged are skipped; a file
+    that grew (the open segment) is read past the records already ingested.
+
+    Returns:
+        Number of new records
+    """
+    conn = _connect()
+    known = {path: (size, mtime, records) for path, size, mtime, records in conn.execute("SELECT * FROM feedback_sources")}
+    added = 0
+    for path in feedback_files(feedback_dir):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue
+        name = os.path.basename(path)
+        size, mtime, done = known.get(name, (None, None, 0))
+        if (size, mtime) == (stat.st_size, stat.st_mtime):
+            continue
+
+        rows = []
+        count = 0
+        for count, record in enumerate(read_feedback_file(path), 1):
+            if count > done:
+                rows.append(_row(record, f"{name}:{count}"))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            before = conn.total_changes
+            _insert(conn, rows)
+            added += conn.total_changes - before
+            conn.execute(
+                "INSERT OR REPLACE INTO feedback_sources (path, size, mtime, records) VALUES (?, ?, ?, ?)",
+                (name, stat.st_size, stat.st_mtime, max(count, done))
+            )
+            _update_rollup(conn)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    return added
+
+
+def parse_since(value: Optional[str]) -> Optional[str]:
+    """
+    First day (YYYY-MM-DD) a --since value covers
+
+    Args:
+        value: "YYYY-MM-DD", "Nd" (the last N days, including today) or None
+
+    Raises:
+        ValueError: For anything else
+    """
+    if not value:
+        return None
+    match = _SINCE_RE.match(value)
+    if match:
+        # Days are UTC, like the received_at timestamps
+        return (datetime.now(timezone.utc).date() - timedelta(days=int(match.group(1)) - 1)).isoformat()
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValueError(f"Invalid --since value: {value} (expected YYYY-MM-DD or Nd, e.g. 7d)")
+
+
+def feedback_summary(since: Optional[str] = None, group_by: Iterable[str] = ()) -> list[dict]:
+    """
+    Feedback counts, optionally from a day onward and split into groups
+
+    Args:
+        since: First day to include (YYYY-MM-DD)
+        group_by: Columns from GROUP_BY_COLUMNS
+
+    Returns:
+        One dict per group, largest first:
+        {<group columns>..., "count": ..., "positive": ..., "negative": ..., "improvements": ...}
+
+    Raises:
+        ValueError: For a column not in GROUP_BY_COLUMNS
+    """
+    group_by = list(group_by)
+    unknown = [column for column in group_by if column not in GROUP_BY_COLUMNS]
+    if unknown:
+        raise ValueError(f"Can't group by {', '.join(unknown)} (expected {', '.join(GROUP_BY_COLUMNS)})")
+
+    select = "".join(f"{column}, " for column in group_by)
+    query = (
+        f"SELECT {select}SUM(count), "
+        "SUM(CASE WHEN feedback_type = 'positive' THEN count ELSE 0 END), "
+        "SUM(CASE WHEN feedback_type = 'negative' THEN count ELSE 0 END), "
+        "SUM(improvements) FROM feedback_rollup"
+    )
+    params = []
+    if since:
+        query += " WHERE day >= ?"
+        params.append(since)
+    if group_by:
+        query += f" GROUP BY {', '.join(group_by)} ORDER BY SUM(count) DESC, {', '.join(group_by)}"
+
+    summary = []
+    for row in _connect().execute(query, params):
+        counts = row[len(group_by):]
+        if counts[0] is None:
+            continue
+        summary.append({
+            **dict(zip(group_by, row)),
+            "count": counts[0],
+            "positive": counts[1],
+            "negative": counts[2],
+            "improvements": counts[3]
+        })
+    return summary
+
+
+def improvement_samples(since: Optional[str] = None, limit: int = 3) -> list[dict]:
+    """
+    The earliest feedback records with an improved version
+
+    Returns:
+        [{"feedback_type": ..., "original_subject": ..., "improved_version": ...}, ...]
+    """
+    query = "SELECT feedback_type, original_subject, improved_version FROM feedback WHERE improved_version IS NOT NULL"
+    params: list = []
+    if since:
+        query += " AND day >= ?"
+        params.append(since)
+    query += " ORDER BY id LIMIT ?"
+    params.append(limit)
+    return [
+        {"feedback_type": row[0], "original_subject": row[1], "improved_version": row[2]}
+        for row in _connect().execute(query, params)
+    ]
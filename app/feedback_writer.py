@@ -0,0 +1,249 @@
+"""
+Append-only feedback log, written by a background thread
+
+Submissions are queued and appended by one writer thread per process to
+gzip-compressed JSONL segments (feedback/feedback-<started>-<pid>-<n>.jsonl.gz),
+so the event loop never touches the disk and concurrent submissions can't
+overwrite each other. The writer takes everything queued since its last write,
+appends it, then flushes and fsyncs once for the whole batch (group commit);
+each submitter is acknowledged only after its record is on disk.
+
+A segment is closed and a new one started once it holds FEEDBACK_SEGMENT_MAX_BYTES
+of uncompressed JSON or is FEEDBACK_SEGMENT_MAX_AGE seconds old. The open segment
+is sync-flushed after every batch, so read_feedback() can read it (and a segment
+left without a gzip trailer by a crash) up to the last acknowledged record.
+"""
+import asyncio
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+
+FEEDBACK_DIR = os.getenv("FEEDBACK_DIR", os.path.join(os.path.dirname(__file__), "..", "feedback"))
+FEEDBACK_SEGMENT_MAX_BYTES = int(os.getenv("FEEDBACK_SEGMENT_MAX_BYTES", str(16 * 1024 * 1024)))
+FEEDBACK_SEGMENT_MAX_AGE = float(os.getenv("FEEDBACK_SEGMENT_MAX_AGE", "3600"))
+FEEDBACK_QUEUE_SIZE = int(os.getenv("FEEDBACK_QUEUE_SIZE", "10000"))
+FEEDBACK_BATCH_SIZE = 1000  # Most records appended per fsync
+
+_STOP = object()
+
+
+class FeedbackQueueFull(Exception):
+    """Raised when the writer has fallen FEEDBACK_QUEUE_SIZE records behind"""
+
+
+class FeedbackWriter:
+    """
+    Background writer for one feedback directory
+
+    Args:
+        feedback_dir: Directory for the segments (created on first write)
+        segment_max_bytes: Uncompressed bytes per segment before rotating
+        segment_max_age: Seconds before an open segment is rotated
+        queue_size: Most records waiting to be written
+    """
+
+    def __init__(
+        self,
+        feedback_dir: str = FEEDBACK_DIR,
+        segment_max_bytes: int = FEEDBACK_SEGMENT_MAX_BYTES,
+        segment_max_age: float = FEEDBACK_SEGMENT_MAX_AGE,
+        queue_size: int = FEEDBACK_QUEUE_SIZE
+    ):
+        self.feedback_dir = feedback_dir
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_age = segment_max_age
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._raw = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        self._segment_bytes = 0
+        self._segment_opened = 0.0
+        self._segment_seq = 0
+        self._stats = {"written": 0, "batches": 0, "segments": 0, "errors": 0}
+
+    async def submit(self, record: dict) -> str:
+        """
+        Queue a feedback record and wait until it is on disk
+
+        Adds a "feedback_id" and a "received_at" UTC timestamp to the record.
+
+        Returns:
+            The record's feedback_id
+
+        Raises:
+            FeedbackQueueFull: If the writer is too far behind to accept the record
+            OSError: If the record couldn't be written
+        """
+        record = dict(record, feedback_id=uuid.uuid4().hex, received_at=datetime.now(timezone.utc).isoformat())
+        loop = asyncio.get_running_loop()
+        written = loop.create_future()
+        # Under the lock so a record can't be queued behind close()'s stop marker
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="feedback-writer", daemon=True)
+                self._thread.start()
+            try:
+                self._queue.put_nowait((record, loop, written))
+            except queue.Full:
+                raise FeedbackQueueFull(f"Feedback writer is {self._queue.maxsize} records behind")
+        await written
+        return record["feedback_id"]
+
+    def close(self) -> None:
+        """Write everything queued, close the open segment and stop the writer thread"""
+        with self._lock:
+            if self._thread is not None:
+                self._queue.put(_STOP)
+                self._thread.join()
+                self._thread = None
+
+    def stats(self) -> dict:
+        """Records, batches and segments written by this process"""
+        return {**self._stats, "queued": self._queue.qsize()}
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self._queue.get(timeout=min(self.segment_max_age, 60.0))
+            except queue.Empty:
+                if self._gzip is not None and time.time() - self._segment_opened >= self.segment_max_age:
+                    self._close_segment()
+                continue
+
+            # Take whatever else queued up while the previous batch was being written
+            batch = [item]
+            while len(batch) < FEEDBACK_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(entry is _STOP for entry in batch)
+            entries = [entry for entry in batch if entry is not _STOP]
+
+            if entries:
+                try:
+                    self._write_batch([record for record, _, _ in entries])
+                    error = None
+                except Exception as e:
+                    print(f"Feedback write failed: {e}")
+                    self._stats["errors"] += 1
+                    self._close_segment(quiet=True)
+                    error = e
+                for _, loop, written in entries:
+                    try:
+                        loop.call_soon_threadsafe(_resolve, written, error)
+                    except RuntimeError:
+                        pass  # Submitter's event loop already closed
+
+            if stop:
+                self._close_segment()
+                return
+
+    def _write_batch(self, records: list[dict]) -> None:
+        """Append records to the open segment and make them durable with one fsync"""
+        if self._gzip is not None and (
+            self._segment_bytes >= self.segment_max_bytes
+            or time.time() - self._segment_opened >= self.segment_max_age
+        ):
+            self._close_segment()
+        if self._gzip is None:
+            self._open_segment()
+
+        data = "".join(json.dumps(record) + "\n" for record in records).encode("utf-8")
+        self._gzip.write(data)
+        self._gzip.flush(zlib.Z_SYNC_FLUSH)
+        os.fsync(self._raw.fileno())
+        self._segment_bytes += len(data)
+        self._stats["written"] += len(records)
+        self._stats["batches"] += 1
+
+    def _open_segment(self) -> None:
+        os.makedirs(self.feedback_dir, exist_ok=True)
+        self._segment_seq += 1
+        name = f"feedback-{datetime.now().strftime('%Y%m%d_%H%M%S')}-{os.getpid()}-{self._segment_seq:06d}.jsonl.gz"
+        self._raw = open(os.path.join(self.feedback_dir, name), "ab")
+        self._gzip = gzip.GzipFile(fileobj=self._raw, mode="ab")
+        self._segment_bytes = 0
+        self._segment_opened = time.time()
+        self._stats["segments"] += 1
+
+    def _close_segment(self, quiet: bool = False) -> None:
+        """Finish the open segment's gzip stream and close it"""
+        if self._gzip is None:
+            return
+        try:
+            self._gzip.close()
+            self._raw.flush()
+            os.fsync(self._raw.fileno())
+        except Exception as e:
+            if not quiet:
+                print(f"Feedback segment close failed: {e}")
+        finally:
+            self._raw.close()
+            self._gzip = self._raw = None
+
+
+def _resolve(written: asyncio.Future, error: Optional[Exception]) -> None:
+    if written.done():
+        return
+    if error is None:
+        written.set_result(None)
+    else:
+        written.set_exception(error)
+
+
+def feedback_files(feedback_dir: Optional[str] = None) -> list[str]:
+    """Legacy feedback_*.json files, then the JSONL segments, oldest first"""
+    feedback_dir = feedback_dir or FEEDBACK_DIR
+    return (
+        sorted(glob.glob(os.path.join(feedback_dir, "feedback_*.json")))
+        + sorted(glob.glob(os.path.join(feedback_dir, "feedback-*.jsonl.gz")))
+    )
+
+
+def read_feedback_file(path: str) -> Iterator[dict]:
+    """
+    Records in a legacy feedback_*.json file or a JSONL segment
+
+    A segment is read up to a missing gzip trailer or a torn last line, so the
+    open segment and one cut short by a crash are readable. An unreadable
+    legacy file is reported and skipped.
+    """
+    if path.endswith(".json"):
+        try:
+            with open(path, encoding="utf-8") as f:
+                record = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading {path}: {e}")
+            return
+        yield record
+        return
+
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            return
+
+
+def read_feedback(feedback_dir: Optional[str] = None) -> Iterator[dict]:
+    """Every feedback record in a directory (see feedback_files and read_feedback_file)"""
+    for path in feedback_files(feedback_dir):
+        yield from read_feedback_file(path)
+
+
+feedback_writer = FeedbackWriter()
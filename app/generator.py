@@ -1,8 +1,132 @@
 """
 Core generation logic for executive outreach emails
 """
-from app.prompts_v2 import build_prompt
-from app.model_client import generate_with_model
+import os
+import time
+import asyncio
+import hashlib
+from typing import AsyncIterator, Optional
+
+from app.prompts_v2 import build_prompt, build_user_prompt, STRATEGIC_ANGLES
+from app.model_client import generate_with_model, stream_anthropic, parse_json_response, message_params, TemplateStreamParser
+from app.metrics import timed, TIME_TO_FIRST_TEMPLATE
+from app.admission import AdmissionRejected
+from app.resilience import DeadlineExceeded
+from app.result_cache import get_result_cache, result_cache_key, get_cached_result_async, cache_result_async, cache_mode, ResultCacheMiss
+
+
+# Parallel mode: one smaller request per strategic angle instead of one long completion
+PARALLEL_ANGLES = os.getenv("PARALLEL_ANGLES", "false").lower() == "true"
+ANGLE_CONCURRENCY = int(os.getenv("ANGLE_CONCURRENCY", "5"))
+ANGLE_MAX_TOKENS = int(os.getenv("ANGLE_MAX_TOKENS", "1000"))
+
+# Anthropic keeps a cached prompt prefix for 5 minutes after its last use; a
+# prefix not used by a parallel generation within this long is treated as cold
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "300"))
+
+# Stable system prefix hash -> when a per-angle request last completed with it
+_warm_prefixes: dict[str, float] = {}
+
+
+def _validate_template(i: int, template: dict) -> None:
+    """Raise ValueError if a template is missing a required field"""
+    if "subject" not in template:
+        raise ValueError(f"Template {i} missing 'subject' field")
+    if "body" not in template:
+        raise ValueError(f"Template {i} missing 'body' field")
+    if "angle" not in template:
+        raise ValueError(f"Template {i} missing 'angle' field")
+
+
+def _sum_usage(usages: list[dict]) -> dict:
+    """Add up token usage from one or more model responses"""
+    total = {
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 0
+    }
+    for usage in usages:
+        for key in total:
+            total[key] += usage.get(key, 0)
+    return total
+
+
+def _build_metadata(message_type: str, prospect_name: str, prospect_company: str, manager_name: str) -> dict:
+    """Metadata attached to every generation result"""
+    return {
+        "message_type": message_type,
+        "prospect_name": prospect_name,
+        "prospect_company": prospect_company,
+        "manager_name": manager_name,
+        "model_provider": "anthropic"
+    }
+
+
+def _result_cache_key(system_prompt: list[dict], user_prompt: str, parallel: bool) -> Optional[str]:
+    """Result cache key for a request, or None when result caching is off"""
+    if get_result_cache() is None:
+        return None
+    if parallel:
+        return result_cache_key(message_params(system_prompt, user_prompt, max_tokens=ANGLE_MAX_TOKENS), "parallel")
+    return result_cache_key(message_params(system_prompt, user_prompt), "single")
+
+
+async def _lookup_cached(cache_key: Optional[str], mode: str) -> Optional[tuple[dict, float]]:
+    """
+    Cached result for a request, honoring its cache mode
+    
+    Raises:
+        ResultCacheMiss: For mode "only" when nothing is cached
+    """
+    cached = await get_cached_result_async(cache_key) if cache_key and mode != "bypass" else None
+    if cached is None and mode == "only":
+        raise ResultCacheMiss("No cached result for these inputs")
+    return cached
+
+
+def _cached_metadata(metadata: dict, cached_at: float) -> dict:
+    """Mark metadata as served from the result cache (no tokens were used)"""
+    metadata["usage"] = _sum_usage([])
+    metadata["from_cache"] = True
+    metadata["cache_age_seconds"] = round(time.time() - cached_at, 1)
+    return metadata
+
+
+def templates_result(
+    response: dict,
+    message_type: str,
+    prospect_name: str,
+    prospect_company: str,
+    manager_name: str
+) -> dict:
+    """
+    Validate a parsed single-request model response and attach metadata
+    
+    Args:
+        response: Parsed model JSON, with the token usage under "usage"
+    
+    Returns:
+        {"templates": [...], "metadata": {...}} as returned by generate_outreach_emails
+    
+    Raises:
+        ValueError: If the response has no templates array or a template is missing a field
+    """
+    usage = response.pop("usage", {})
+    
+    # Validate response structure
+    with timed("validate"):
+        if "templates" not in response or not isinstance(response["templates"], list):
+            raise ValueError("Model response missing 'templates' array")
+        
+        for i, template in enumerate(response["templates"]):
+            _validate_template(i, template)
+    
+    # Add metadata
+    response["metadata"] = _build_metadata(message_type, prospect_name, prospect_company, manager_name)
+    response["metadata"]["usage"] = _sum_usage([usage])
+    
+    return response
 
 
 async def generate_outreach_emails(
@@ -13,7 +137,9 @@ async def generate_outreach_emails(
     unique_fact: str,
     business_initiative: str,
     manager_name: str = "[Manager's Name]",
-    meeting_purpose: str = ""
+    meeting_purpose: str = "",
+    parallel: Optional[bool] = None,
+    cache: Optional[str] = None
 ) -> dict:
     """
     Generate 5 distinct executive outreach emails using mega-prompt v14,
@@ -27,6 +153,9 @@ async def generate_outreach_emails(
         unique_fact: Unique fact about prospect or company (award, initiative, etc.)
         business_initiative: Business initiative or challenge
         manager_name: Name of the email sender (executive)
+        parallel: Generate each angle as its own concurrent request
+            (defaults to the PARALLEL_ANGLES setting)
+        cache: Result cache mode: "prefer" (default), "bypass" or "only" (see app.result_cache)
     
     Returns:
         {
@@ -43,10 +172,17 @@ async def generate_outreach_emails(
                 "prospect_name": "...",
                 "prospect_company": "...",
                 "manager_name": "...",
-                "model_provider": "anthropic"
+                "model_provider": "anthropic",
+                "from_cache": false
             }
         }
+    
+    Raises:
+        ValueError: For an unknown cache mode or an invalid model response
+        ResultCacheMiss: For cache="only" when nothing is cached
     """
+    mode = cache_mode(cache)
+    
     # Build prompts from mega-prompt template
     system_prompt, user_prompt = build_prompt(
         message_type=message_type,
@@ -59,31 +195,258 @@ async def generate_outreach_emails(
         meeting_purpose=meeting_purpose
     )
     
+    if parallel is None:
+        parallel = PARALLEL_ANGLES
+    
+    cache_key = _result_cache_key(system_prompt, user_prompt, parallel)
+    cached = await _lookup_cached(cache_key, mode)
+    if cached is not None:
+        result, cached_at = cached
+        result["metadata"] = _build_metadata(message_type, prospect_name, prospect_company, manager_name)
+        if parallel:
+            result["metadata"]["generation_mode"] = "parallel"
+        _cached_metadata(result["metadata"], cached_at)
+        return result
+    
+    if parallel:
+        user_prompt_args = dict(
+            message_type=message_type,
+            prospect_name=prospect_name,
+            prospect_title=prospect_title,
+            prospect_company=prospect_company,
+            unique_fact=unique_fact,
+            business_initiative=business_initiative,
+            meeting_purpose=meeting_purpose
+        )
+        templates, failed_angles, usages = await _generate_angles_parallel(system_prompt, user_prompt_args)
+        result = {"templates": templates}
+        result["metadata"] = _build_metadata(message_type, prospect_name, prospect_company, manager_name)
+        result["metadata"]["generation_mode"] = "parallel"
+        result["metadata"]["usage"] = _sum_usage(usages)
+        result["metadata"]["from_cache"] = False
+        if failed_angles:
+            result["metadata"]["failed_angles"] = failed_angles
+        elif cache_key:
+            await cache_result_async(cache_key, {"templates": templates})
+        return result
+    
     # Generate with Anthropic
     result = await generate_with_model(
         system_prompt=system_prompt,
         user_prompt=user_prompt
     )
     
-    # Validate response structure
-    if "templates" not in result or not isinstance(result["templates"], list):
-        raise ValueError("Model response missing 'templates' array")
+    result = templates_result(result, message_type, prospect_name, prospect_company, manager_name)
+    result["metadata"]["from_cache"] = False
+    if cache_key and result["templates"]:
+        await cache_result_async(cache_key, {"templates": result["templates"]})
+    return result
+
+
+async def _generate_angle(
+    angle: str,
+    system_prompt: list[dict],
+    user_prompt: str,
+    semaphore: asyncio.Semaphore,
+    first_chunk: Optional[asyncio.Event] = None
+) -> tuple[dict, dict]:
+    """
+    Generate and validate the template for a single strategic angle
     
-    for i, template in enumerate(result["templates"]):
-        if "subject" not in template:
-            raise ValueError(f"Template {i} missing 'subject' field")
-        if "body" not in template:
-            raise ValueError(f"Template {i} missing 'body' field")
-        if "angle" not in template:
-            raise ValueError(f"Template {i} missing 'angle' field")
+    Args:
+        first_chunk: If given, the angle is streamed and the event set once
+            its first text arrives (the prompt prefix has been cached by then)
     
-    # Add metadata
-    result["metadata"] = {
-        "message_type": message_type,
-        "prospect_name": prospect_name,
-        "prospect_company": prospect_company,
-        "manager_name": manager_name,
-        "model_provider": "anthropic"
-    }
+    Returns:
+        (template, token usage)
+    """
+    async with semaphore:
+        if first_chunk is None:
+            template = await generate_with_model(
+                system_prompt=system_prompt,
+                user_prompt=user_prompt,
+                max_tokens=ANGLE_MAX_TOKENS
+            )
+            usage = template.pop("usage", {})
+        else:
+            usage = {}
+            chunks = []
+            async for chunk in stream_anthropic(system_prompt, user_prompt, usage=usage, max_tokens=ANGLE_MAX_TOKENS):
+                first_chunk.set()
+                chunks.append(chunk)
+            template = parse_json_response("".join(chunks))
     
-    return result
+    # Tolerate the model wrapping its answer in the multi-template structure
+    if isinstance(template.get("templates"), list) and template["templates"]:
+        template = template["templates"][0]
+    template.setdefault("angle", angle)
+    _validate_template(STRATEGIC_ANGLES.index(angle), template)
+    return template, usage
+
+
+def _stable_prefix_key(system_prompt: list[dict]) -> Optional[str]:
+    """Hash of the prompt-cached part of the system prompt, or None if it has none"""
+    stable = "".join(block["text"] for block in system_prompt if block.get("stable"))
+    return hashlib.sha256(stable.encode()).hexdigest() if stable else None
+
+
+async def _generate_angles_parallel(
+    system_prompt: list[dict],
+    user_prompt_args: dict
+) -> tuple[list[dict], list[dict], list[dict]]:
+    """
+    Generate one template per strategic angle concurrently, sharing the
+    (prompt-cached) system prompt
+    
+    While the system prompt's cached prefix is cold, the first angle is
+    streamed and the other four start once its first text arrives, when the
+    prefix has been written to the cache and they can read it.
+    
+    Returns:
+        (templates in angle order,
+         [{"angle": ..., "error": ...}] for angles that failed,
+         token usage of each successful request)
+    
+    Raises:
+        ValueError: If every angle failed
+    """
+    semaphore = asyncio.Semaphore(ANGLE_CONCURRENCY)
+    
+    def generate(angle: str, first_chunk: Optional[asyncio.Event] = None):
+        return _generate_angle(
+            angle, system_prompt, build_user_prompt(angle=angle, **user_prompt_args), semaphore, first_chunk
+        )
+    
+    # Requests sent together against a cold prompt cache would each miss it and pay
+    # for a cache write, so the first angle goes ahead and the others follow as
+    # soon as its first byte shows the prefix is cached (or it fails)
+    prefix = _stable_prefix_key(system_prompt)
+    if prefix and time.monotonic() - _warm_prefixes.get(prefix, float("-inf")) > PROMPT_CACHE_TTL_SECONDS:
+        first_chunk = asyncio.Event()
+        first = asyncio.ensure_future(generate(STRATEGIC_ANGLES[0], first_chunk))
+        warmed = asyncio.ensure_future(first_chunk.wait())
+        try:
+            await asyncio.wait({first, warmed}, return_when=asyncio.FIRST_COMPLETED)
+            if first_chunk.is_set():
+                _warm_prefixes[prefix] = time.monotonic()  # Later requests needn't wait either
+            rest = await asyncio.gather(*(generate(angle) for angle in STRATEGIC_ANGLES[1:]), return_exceptions=True)
+            results = [*await asyncio.gather(first, return_exceptions=True), *rest]
+        finally:
+            warmed.cancel()
+            first.cancel()
+    else:
+        results = await asyncio.gather(*(generate(angle) for angle in STRATEGIC_ANGLES), return_exceptions=True)
+    if prefix and not all(isinstance(result, BaseException) for result in results):
+        _warm_prefixes[prefix] = time.monotonic()
+    
+    templates = []
+    failed_angles = []
+    usages = []
+    for angle, result in zip(STRATEGIC_ANGLES, results):
+        if isinstance(result, BaseException):
+            failed_angles.append({"angle": angle, "error": str(result)})
+        else:
+            templates.append(result[0])
+            usages.append(result[1])
+    
+    if not templates:
+        rejected = [result for result in results if isinstance(result, (AdmissionRejected, DeadlineExceeded))]
+        if rejected:
+            raise rejected[0]
+        raise ValueError(f"All {len(STRATEGIC_ANGLES)} angle generations failed: {failed_angles[0]['error']}")
+    
+    return templates, failed_angles, usages
+
+
+async def stream_outreach_emails(
+    message_type: str,
+    prospect_name: str,
+    prospect_title: str,
+    prospect_company: str,
+    unique_fact: str,
+    business_initiative: str,
+    manager_name: str = "[Manager's Name]",
+    meeting_purpose: str = "",
+    cache: Optional[str] = None
+) -> AsyncIterator[dict]:
+    """
+    Stream the 5 outreach emails, yielding each template as soon as the model
+    finishes writing it.
+    
+    Takes the same arguments as generate_outreach_emails (always a single
+    request; a result cached by either function is served by both).
+    
+    Yields:
+        {"event": "template", "index": 0, "template": {"angle": ..., "subject": ..., "body": ...}}
+        ...
+        {"event": "done", "metadata": {..., "time_to_first_template_ms": ..., "total_ms": ...}}
+    """
+    started = time.perf_counter()
+    mode = cache_mode(cache)
+    
+    system_prompt, user_prompt = build_prompt(
+        message_type=message_type,
+        prospect_name=prospect_name,
+        prospect_title=prospect_title,
+        prospect_company=prospect_company,
+        unique_fact=unique_fact,
+        business_initiative=business_initiative,
+        manager_name=manager_name,
+        meeting_purpose=meeting_purpose
+    )
+    
+    cache_key = _result_cache_key(system_prompt, user_prompt, parallel=False)
+    cached = await _lookup_cached(cache_key, mode)
+    if cached is not None:
+        result, cached_at = cached
+        for index, template in enumerate(result["templates"]):
+            yield {"event": "template", "index": index, "template": template}
+        metadata = _cached_metadata(
+            _build_metadata(message_type, prospect_name, prospect_company, manager_name), cached_at
+        )
+        metadata["template_count"] = len(result["templates"])
+        metadata["time_to_first_template_ms"] = metadata["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        TIME_TO_FIRST_TEMPLATE.observe(metadata["time_to_first_template_ms"] / 1000, "cache")
+        yield {"event": "done", "metadata": metadata}
+        return
+    
+    parser = TemplateStreamParser()
+    templates = []
+    usage: dict = {}
+    count = 0
+    first_template_ms = None
+    
+    async for chunk in stream_anthropic(system_prompt, user_prompt, usage=usage):
+        for template in parser.feed(chunk):
+            _validate_template(count, template)
+            templates.append(template)
+            if first_template_ms is None:
+                first_template_ms = (time.perf_counter() - started) * 1000
+                TIME_TO_FIRST_TEMPLATE.observe(first_template_ms / 1000, "model")
+            yield {"event": "template", "index": count, "template": template}
+            count += 1
+    
+    # Fall back to parsing the whole response if nothing was streamed
+    # (e.g. the model ignored the expected structure)
+    if count == 0:
+        result = parse_json_response(parser.text)
+        if "templates" not in result or not isinstance(result["templates"], list):
+            raise ValueError("Model response missing 'templates' array")
+        for template in result["templates"]:
+            _validate_template(count, template)
+            templates.append(template)
+            if first_template_ms is None:
+                first_template_ms = (time.perf_counter() - started) * 1000
+                TIME_TO_FIRST_TEMPLATE.observe(first_template_ms / 1000, "model")
+            yield {"event": "template", "index": count, "template": template}
+            count += 1
+    
+    metadata = _build_metadata(message_type, prospect_name, prospect_company, manager_name)
+    metadata["template_count"] = count
+    metadata["usage"] = _sum_usage([usage])
+    metadata["from_cache"] = False
+    metadata["time_to_first_template_ms"] = round(first_template_ms, 1) if first_template_ms is not None else None
+    metadata["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    if cache_key and templates:
+        await cache_result_async(cache_key, {"templates": templates})
+    yield {"event": "done", "metadata": metadata}
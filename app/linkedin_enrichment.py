@@ -2,8 +2,97 @@
 LinkedIn profile enrichment using Perplexity API
 """
 import os
+import asyncio
+import weakref
+import httpx
 import openai
-from app.enrichment_cache import get_cached_enrichment, cache_enrichment
+from app.enrichment_cache import (
+    get_cached_enrichment_async,
+    cache_enrichment_async,
+    get_negative_enrichment,
+    cache_negative_enrichment,
+    _get_cache_key
+)
+from app.metrics import timed, UPSTREAM_REQUESTS
+from app.resilience import CircuitBreaker
+
+
+PERPLEXITY_BASE_URL = os.getenv("PERPLEXITY_BASE_URL", "https://api.perplexity.ai")
+PERPLEXITY_TIMEOUT = float(os.getenv("PERPLEXITY_TIMEOUT", "60"))
+PERPLEXITY_MAX_RETRIES = int(os.getenv("PERPLEXITY_MAX_RETRIES", "2"))
+
+# Connection pool for the shared Perplexity client, sized separately from Anthropic's
+PERPLEXITY_MAX_CONNECTIONS = int(os.getenv("PERPLEXITY_MAX_CONNECTIONS", "50"))
+PERPLEXITY_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("PERPLEXITY_MAX_KEEPALIVE_CONNECTIONS", "10"))
+PERPLEXITY_KEEPALIVE_EXPIRY = float(os.getenv("PERPLEXITY_KEEPALIVE_EXPIRY", "30"))
+
+# Results below this confidence are only negatively cached (short TTL), so they get retried
+MIN_CACHE_CONFIDENCE = int(os.getenv("ENRICHMENT_MIN_CACHE_CONFIDENCE", "40"))
+
+# Errors that mean Perplexity itself is unhealthy (as opposed to e.g. an unparseable answer)
+_UPSTREAM_ERRORS = (openai.APIConnectionError, openai.InternalServerError, openai.RateLimitError)
+# Errors that mean our request is wrong (bad key, unknown model, bad parameters): every
+# lookup would fail the same way until the config is fixed, whatever the profile
+_CONFIG_ERRORS = (
+    openai.AuthenticationError,
+    openai.PermissionDeniedError,
+    openai.BadRequestError,
+    openai.NotFoundError,
+    openai.UnprocessableEntityError
+)
+
+perplexity_breaker = CircuitBreaker(
+    "perplexity",
+    failure_threshold=int(os.getenv("PERPLEXITY_BREAKER_THRESHOLD", "5")),
+    reset_timeout=float(os.getenv("PERPLEXITY_BREAKER_RESET_SECONDS", "30"))
+)
+
+# Shared Perplexity client per event loop, as for the Anthropic client in model_client
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, openai.AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+# Upstream lookups in progress, keyed like the enrichment cache, so concurrent
+# requests for the same profile await one Perplexity call
+_inflight: dict[str, asyncio.Future] = {}
+
+
+def get_perplexity_client(api_key: str) -> openai.AsyncOpenAI:
+    """Get the shared Perplexity client for the running event loop, creating it on first use"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = openai.AsyncOpenAI(
+            api_key=api_key,
+            base_url=PERPLEXITY_BASE_URL,
+            max_retries=PERPLEXITY_MAX_RETRIES,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=PERPLEXITY_MAX_CONNECTIONS,
+                    max_keepalive_connections=PERPLEXITY_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=PERPLEXITY_KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(PERPLEXITY_TIMEOUT, connect=5.0)
+            )
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_perplexity_client() -> None:
+    """Close the shared Perplexity client for the running event loop, if one was created"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def _fallback_result(prospect_name: str, prospect_title: str, prospect_company: str, reason: str) -> dict:
+    """Generic enrichment data returned when a profile couldn't be researched"""
+    return {
+        "unique_fact": f"{prospect_name} is an experienced {prospect_title or 'professional'} at {prospect_company or 'their company'}",
+        "business_initiative": "Driving digital transformation and operational excellence",
+        "linkedin_insight": f"Could not automatically enrich profile: {reason}",
+        "confidence": 0,
+        "needs_verification": True
+    }
 
 
 def calculate_confidence(result: dict, prospect_name: str, prospect_company: str) -> int:
@@ -103,19 +192,54 @@ async def enrich_linkedin_profile(
         }
     """
     # Check cache first
-    cached_result = get_cached_enrichment(linkedin_url, prospect_name)
+    cached_result = await get_cached_enrichment_async(linkedin_url, prospect_name)
     if cached_result:
         cached_result['from_cache'] = True
         return cached_result
     
+    # Recently failed or low-confidence lookups aren't retried until their short TTL lapses
+    negative_result = get_negative_enrichment(linkedin_url, prospect_name)
+    if negative_result:
+        negative_result['from_cache'] = True
+        return negative_result
+    
     api_key = os.getenv("PERPLEXITY_API_KEY")
     if not api_key:
         raise ValueError("PERPLEXITY_API_KEY not configured. Add it to your .env file.")
     
-    client = openai.AsyncOpenAI(
-        api_key=api_key,
-        base_url="https://api.perplexity.ai"
-    )
+    # Join an in-flight lookup for the same profile, or start one
+    cache_key = _get_cache_key(linkedin_url, prospect_name)
+    inflight = _inflight.get(cache_key)
+    if inflight is None:
+        inflight = asyncio.ensure_future(
+            _fetch_enrichment(api_key, linkedin_url, prospect_name, prospect_title, prospect_company)
+        )
+        _inflight[cache_key] = inflight
+        
+        def _forget(future: asyncio.Future) -> None:
+            if _inflight.get(cache_key) is future:
+                del _inflight[cache_key]
+        
+        inflight.add_done_callback(_forget)
+    
+    # Shielded so one caller disconnecting doesn't cancel the lookup for the others
+    result = await asyncio.shield(inflight)
+    return dict(result)
+
+
+async def _fetch_enrichment(
+    api_key: str,
+    linkedin_url: str,
+    prospect_name: str,
+    prospect_title: str,
+    prospect_company: str
+) -> dict:
+    """Query Perplexity for a profile, cache the result and return it (or fallback data on failure)"""
+    # Fail fast while Perplexity is unhealthy; not negatively cached since it says nothing about this profile
+    if not perplexity_breaker.allow():
+        return _fallback_result(prospect_name, prospect_title, prospect_company, "Perplexity is temporarily unavailable")
+    
+    client = get_perplexity_client(api_key)
     
     # Build search query
     search_context = f"{prospect_name}"
@@ -158,16 +282,41 @@ Return ONLY a JSON object with these fields:
 Be specific and use recent information. If you can't find something specific about {prospect_name}, say so rather than returning information about a different person."""
     
     try:
-        response = await client.chat.completions.create(
-            model="sonar-pro",
-            messages=[
-                {"role": "system", "content": "You are a research assistant that extracts key insights from LinkedIn profiles. You MUST only return information about the specific person at the LinkedIn URL provided. Always return valid JSON."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.1,  # Lower temperature for more focused, accurate results
-            max_tokens=1000
-        )
-        
+        with timed("perplexity_request"):
+            response = await client.chat.completions.create(
+                model="sonar-pro",
+                messages=[
+                    {"role": "system", "content": "You are a research assistant that extracts key insights from LinkedIn profiles. You MUST only return information about the specific person at the LinkedIn URL provided. Always return valid JSON."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.1,  # Lower temperature for more focused, accurate results
+                max_tokens=1000
+            )
+    except _UPSTREAM_ERRORS as e:
+        UPSTREAM_REQUESTS.inc("perplexity", "error")
+        perplexity_breaker.record_failure()
+        result = _fallback_result(prospect_name, prospect_title, prospect_company, str(e))
+        cache_negative_enrichment(linkedin_url, prospect_name, result)
+        return result
+    except _CONFIG_ERRORS as e:
+        # Counts against the breaker so a bad key stops hammering Perplexity, but isn't
+        # negatively cached: it says nothing about this profile
+        UPSTREAM_REQUESTS.inc("perplexity", "error")
+        perplexity_breaker.record_failure()
+        print(f"Perplexity rejected the request ({getattr(e, 'status_code', '')}); check PERPLEXITY_API_KEY and settings: {e}")
+        return _fallback_result(prospect_name, prospect_title, prospect_company, str(e))
+    except Exception as e:
+        # Neither a verdict on the profile nor on Perplexity's health
+        UPSTREAM_REQUESTS.inc("perplexity", "error")
+        perplexity_breaker.release()
+        return _fallback_result(prospect_name, prospect_title, prospect_company, str(e))
+    except BaseException:
+        perplexity_breaker.release()
+        raise
+    UPSTREAM_REQUESTS.inc("perplexity", "ok")
+    perplexity_breaker.record_success()
+    
+    try:
         content = response.choices[0].message.content
         
         # Parse JSON response
@@ -198,17 +347,16 @@ Be specific and use recent information. If you can't find something specific abo
         result["confidence"] = confidence
         result["needs_verification"] = confidence < 70
         
-        # Cache the result
-        cache_enrichment(linkedin_url, prospect_name, result)
+        # Cache the result (low-confidence results only briefly)
+        if confidence >= MIN_CACHE_CONFIDENCE:
+            await cache_enrichment_async(linkedin_url, prospect_name, result)
+        else:
+            cache_negative_enrichment(linkedin_url, prospect_name, result)
         
         return result
         
     except Exception as e:
         # Return fallback data if enrichment fails
-        return {
-            "unique_fact": f"{prospect_name} is an experienced {prospect_title or 'professional'} at {prospect_company or 'their company'}",
-            "business_initiative": "Driving digital transformation and operational excellence",
-            "linkedin_insight": f"Could not automatically enrich profile: {str(e)}",
-            "confidence": 0,
-            "needs_verification": True
-        }
+        result = _fallback_result(prospect_name, prospect_title, prospect_company, str(e))
+        cache_negative_enrichment(linkedin_url, prospect_name, result)
+        return result
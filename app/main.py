@@ -1,35 +1,107 @@
 """
 FastAPI backend for Executive Note Generator
 """
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 from pydantic import BaseModel, Field
 from typing import Optional
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import math
 import os
 from dotenv import load_dotenv
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
+from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 # Load environment variables from .env file
 load_dotenv()
 
-from app.generator import generate_outreach_emails
-from app.linkedin_enrichment import enrich_linkedin_profile
+from app.generator import generate_outreach_emails, stream_outreach_emails
+from app.model_client import get_anthropic_client, close_anthropic_client, anthropic_retry
+from app.resilience import deadline, DeadlineExceeded
+from app.prompts_v2 import warm_prompt_cache
+from app.account_knowledge import list_known_accounts, stop_account_watcher
+from app.enrichment_cache import run_expiry_sweeper, get_cache_stats
+from app.result_cache import get_result_cache, get_result_cache_stats, ResultCacheMiss
+from app.feedback_writer import feedback_writer, FeedbackQueueFull
+from app.event_loop import run_io, io_stats, shutdown_io, LoopWatchdog, LOOP_BLOCK_WARN_MS
+from app.metrics import MetricsMiddleware, RATE_LIMIT_REJECTIONS, register_collector, render_metrics
+from app.rate_limit import create_limiter, rate_limit_key
+from app.admission import admission, AdmissionRejected, TenantMiddleware
+from app.linkedin_enrichment import enrich_linkedin_profile, close_perplexity_client, perplexity_breaker
+from app.batch import (
+    parse_batch_rows,
+    run_batch,
+    batch_checkpoint_path,
+    expire_checkpoints,
+    remove_checkpoint,
+    token_bucket as batch_token_bucket,
+    BATCH_CONCURRENCY,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_MAX_ROWS
+)
 
 # Rate limit configuration (configurable via environment variables)
 GENERATE_RATE_LIMIT = os.getenv("GENERATE_RATE_LIMIT", "10/minute")
 ENRICH_RATE_LIMIT = os.getenv("ENRICH_RATE_LIMIT", "20/minute")
 FEEDBACK_RATE_LIMIT = os.getenv("FEEDBACK_RATE_LIMIT", "30/minute")
+BATCH_RATE_LIMIT = os.getenv("BATCH_RATE_LIMIT", "5/minute")
+
+# Longest a generation request may take, model retries included (0: no limit);
+# a client can ask for less with an X-Request-Timeout header (seconds)
+REQUEST_TIMEOUT = float(os.getenv("REQUEST_TIMEOUT", "120"))
+
+
+def request_timeout(request: Request) -> Optional[float]:
+    """Seconds the request may take: its X-Request-Timeout, at most REQUEST_TIMEOUT"""
+    try:
+        requested = float(request.headers.get("x-request-timeout", "0"))
+    except ValueError:
+        requested = 0
+    if requested > 0:
+        return min(requested, REQUEST_TIMEOUT) if REQUEST_TIMEOUT > 0 else requested
+    return REQUEST_TIMEOUT or None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared clients and background tasks at startup and close them at shutdown"""
+    warm_prompt_cache()
+    list_known_accounts()  # Parse accounts/ and start watching it for changes
+    get_result_cache()  # Fail fast on a misconfigured RESULT_CACHE_BACKEND
+    if os.getenv("ANTHROPIC_API_KEY"):
+        get_anthropic_client()
+    sweeper = asyncio.create_task(run_expiry_sweeper())
+    watchdog = asyncio.create_task(LoopWatchdog(LOOP_BLOCK_WARN_MS).run()) if LOOP_BLOCK_WARN_MS > 0 else None
+    yield
+    sweeper.cancel()
+    if watchdog:
+        watchdog.cancel()
+    await close_anthropic_client()
+    await close_perplexity_client()
+    stop_account_watcher()
+    await asyncio.to_thread(feedback_writer.close)  # Write out queued feedback
+    await asyncio.to_thread(shutdown_io)  # Finish pending cache and checkpoint writes
 
-app = FastAPI(title="Executive Note Generator", version="1.0.0")
+
+app = FastAPI(title="Executive Note Generator", version="1.0.0", lifespan=lifespan)
 
 # Rate limiter
-limiter = Limiter(key_func=get_remote_address)
+limiter = create_limiter()
 app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
+
+
+def rate_limit_exceeded(request: Request, exc: RateLimitExceeded):
+    """Count the rejection, then answer with slowapi's 429"""
+    route = request.scope.get("route")
+    RATE_LIMIT_REJECTIONS.inc(getattr(route, "path", "other"))
+    return _rate_limit_exceeded_handler(request, exc)
+
+
+app.add_exception_handler(RateLimitExceeded, rate_limit_exceeded)
 
 # CORS middleware
 app.add_middleware(
@@ -40,6 +112,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Charge each request's model calls to the same caller its rate limits are keyed on
+app.add_middleware(TenantMiddleware, key_func=rate_limit_key)
+
+# Request latency by route, outermost so it also sees 429s and CORS preflights
+app.add_middleware(MetricsMiddleware)
+
 # Serve static files
 static_path = os.path.join(os.path.dirname(__file__), "..", "static")
 if os.path.exists(static_path):
@@ -57,6 +135,8 @@ class GenerateRequest(BaseModel):
     manager_name: str = Field(default="[Manager's Name]", max_length=100, description="Name of email sender")
     meeting_purpose: str = Field(default="", max_length=500, description="Purpose of in-person meeting (for in_person_ask type)")
     linkedin_url: Optional[str] = Field(default=None, description="LinkedIn profile URL for auto-enrichment")
+    parallel: Optional[bool] = Field(default=None, description="Generate each angle as a separate concurrent model call (defaults to PARALLEL_ANGLES)")
+    cache: Optional[str] = Field(default=None, pattern="^(prefer|bypass|only)$", description="Result cache mode: prefer (default), bypass or only")
 
 
 class EmailTemplate(BaseModel):
@@ -96,6 +176,86 @@ async def health():
     return {"status": "healthy", "service": "executive-note-gen"}
 
 
+def _stats_snapshot() -> dict:
+    """Everything /api/stats reports"""
+    return {
+        "enrichment_cache": get_cache_stats(),
+        "result_cache": get_result_cache_stats(),
+        "circuit_breakers": {"perplexity": perplexity_breaker.snapshot()},
+        "token_buckets": {"batch": batch_token_bucket.snapshot()},
+        "admission": admission.snapshot(),
+        "retries": {"anthropic": anthropic_retry.snapshot()},
+        "feedback_writer": feedback_writer.stats(),
+        "io": io_stats()
+    }
+
+
+@app.get("/api/stats")
+async def stats():
+    """Cache, upstream circuit breaker and retry, token budget and I/O pool statistics for this worker"""
+    # Sizing a SQLite or Redis result cache is blocking I/O
+    return await run_io(_stats_snapshot)
+
+
+def _stats_metrics() -> list[tuple]:
+    """The /api/stats counters and gauges as metric families, read at scrape time"""
+    enrichment = get_cache_stats()
+    result_cache = get_result_cache_stats()
+    breaker = perplexity_breaker.snapshot()
+    bucket = batch_token_bucket.snapshot()
+    admitted = admission.snapshot()
+    retry = anthropic_retry.snapshot()
+    writer = feedback_writer.stats()
+    io = io_stats()
+    return [
+        ("executive_notes_enrichment_cache_lookups_total", "counter", "Enrichment LRU lookups by result",
+         [({"result": "hit"}, enrichment["hits"]), ({"result": "miss"}, enrichment["misses"])]),
+        ("executive_notes_enrichment_cache_hit_ratio", "gauge", "Enrichment LRU hits / lookups since start",
+         [({}, enrichment["hit_ratio"])]),
+        ("executive_notes_enrichment_cache_entries", "gauge", "Profiles in the enrichment LRU and negative cache",
+         [({"cache": "lru"}, enrichment["size"]), ({"cache": "negative"}, enrichment["negative"]["size"])]),
+        ("executive_notes_enrichment_negative_cache_hits_total", "counter", "Lookups answered by the negative cache",
+         [({}, enrichment["negative"]["hits"])]),
+        ("executive_notes_result_cache_lookups_total", "counter", "Result cache lookups by result",
+         [({"result": "hit"}, result_cache["hits"]), ({"result": "miss"}, result_cache["misses"])]),
+        ("executive_notes_result_cache_hit_ratio", "gauge", "Result cache hits / lookups since start",
+         [({}, result_cache["hit_ratio"])]),
+        ("executive_notes_circuit_breaker_open", "gauge", "1 while the circuit breaker rejects calls",
+         [({"upstream": "perplexity"}, int(breaker["state"] == "open"))]),
+        ("executive_notes_circuit_breaker_rejections_total", "counter", "Calls failed fast by an open circuit breaker",
+         [({"upstream": "perplexity"}, breaker["rejections"])]),
+        ("executive_notes_token_bucket_available", "gauge", "Tokens currently available in the budget",
+         [({"bucket": "batch"}, bucket["available"]), ({"bucket": "admission"}, admitted["available"])]),
+        ("executive_notes_token_bucket_wait_seconds_total", "counter", "Time spent waiting for token budget",
+         [({"bucket": "batch"}, bucket["wait_seconds"]), ({"bucket": "admission"}, admitted["wait_seconds"])]),
+        ("executive_notes_admission_queued", "gauge", "Model calls waiting for token budget",
+         [({}, admitted["queued"])]),
+        ("executive_notes_admission_rejected_total", "counter", "Model calls that waited too long or found the queue full",
+         [({}, admitted["rejected"])]),
+        ("executive_notes_upstream_retries_total", "counter", "Upstream attempts repeated after a retryable failure",
+         [({"upstream": "anthropic"}, retry["retries"])]),
+        ("executive_notes_upstream_timeouts_total", "counter", "Upstream attempts cut off, by which timeout",
+         [({"upstream": "anthropic", "timeout": "attempt"}, retry["timeouts"]),
+          ({"upstream": "anthropic", "timeout": "deadline"}, retry["deadline_exceeded"])]),
+        ("executive_notes_upstream_hedges_total", "counter", "Hedged upstream requests, and those that answered first",
+         [({"upstream": "anthropic", "result": "sent"}, retry["hedges"]),
+          ({"upstream": "anthropic", "result": "won"}, retry["hedge_wins"])]),
+        ("executive_notes_feedback_queued", "gauge", "Feedback records waiting for the writer thread",
+         [({}, writer["queued"])]),
+        ("executive_notes_io_pending", "gauge", "Blocking calls waiting for or running on I/O threads",
+         [({}, io["pending"])])
+    ]
+
+
+register_collector(_stats_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics for this worker"""
+    return PlainTextResponse(await run_io(render_metrics), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @app.post("/api/generate", response_model=GenerateResponse)
 @limiter.limit(GENERATE_RATE_LIMIT)
 async def generate(request: Request, body: GenerateRequest):
@@ -103,23 +263,110 @@ async def generate(request: Request, body: GenerateRequest):
     Generate 5 optimized executive outreach email templates
     """
     try:
-        result = await generate_outreach_emails(
-            message_type=body.message_type,
-            prospect_name=body.prospect_name,
-            prospect_title=body.prospect_title,
-            prospect_company=body.prospect_company,
-            unique_fact=body.unique_fact,
-            business_initiative=body.business_initiative,
-            manager_name=body.manager_name,
-            meeting_purpose=body.meeting_purpose
-        )
+        with deadline(request_timeout(request)):
+            result = await generate_outreach_emails(
+                message_type=body.message_type,
+                prospect_name=body.prospect_name,
+                prospect_title=body.prospect_title,
+                prospect_company=body.prospect_company,
+                unique_fact=body.unique_fact,
+                business_initiative=body.business_initiative,
+                manager_name=body.manager_name,
+                meeting_purpose=body.meeting_purpose,
+                parallel=body.parallel,
+                cache=body.cache
+            )
         return result
+    except ResultCacheMiss as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+    except DeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Generation failed: {str(e)}")
 
 
+@app.post("/api/generate/stream")
+@limiter.limit(GENERATE_RATE_LIMIT)
+async def generate_stream(request: Request, body: GenerateRequest):
+    """
+    Stream the 5 email templates as newline-delimited JSON, one event per
+    template as soon as it is parsed, followed by a final "done" event with metadata
+    """
+    timeout = request_timeout(request)
+
+    async def events():
+        try:
+            with deadline(timeout):
+                async for event in stream_outreach_emails(
+                    message_type=body.message_type,
+                    prospect_name=body.prospect_name,
+                    prospect_title=body.prospect_title,
+                    prospect_company=body.prospect_company,
+                    unique_fact=body.unique_fact,
+                    business_initiative=body.business_initiative,
+                    manager_name=body.manager_name,
+                    meeting_purpose=body.meeting_purpose,
+                    cache=body.cache
+                ):
+                    yield json.dumps(event) + "\n"
+        except ResultCacheMiss as e:
+            yield json.dumps({"event": "error", "detail": str(e)}) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": f"Generation failed: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
+@app.post("/api/generate/batch")
+@limiter.limit(BATCH_RATE_LIMIT)
+async def generate_batch(
+    request: Request,
+    input_format: Optional[str] = Query(default=None, alias="format", description="csv or jsonl (defaults from Content-Type)"),
+    batch_id: Optional[str] = Query(default=None, description="Checkpoint id; re-posting the same rows with it resumes the batch"),
+    concurrency: Optional[int] = Query(default=None, ge=1, description="Prospects generated at once")
+):
+    """
+    Generate templates for a list of prospects (CSV with a header row or JSONL body,
+    one prospect per row), streaming one NDJSON result per prospect as it completes,
+    followed by a final "done" event with counts and token usage
+    """
+    try:
+        data = (await request.body()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=400, detail="Batch body must be UTF-8")
+    if input_format is None:
+        input_format = "csv" if "csv" in request.headers.get("content-type", "") else "jsonl"
+    
+    try:
+        rows = parse_batch_rows(data, input_format.lower())
+        checkpoint_path = batch_checkpoint_path(batch_id, rate_limit_key(request)) if batch_id else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not rows:
+        raise HTTPException(status_code=400, detail="Batch has no rows")
+    if len(rows) > BATCH_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Batch has {len(rows)} rows (limit {BATCH_MAX_ROWS})")
+    
+    if checkpoint_path:
+        await run_io(expire_checkpoints, store="batch_checkpoints")
+    
+    async def events():
+        try:
+            async for event in run_batch(rows, checkpoint_path, min(concurrency or BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY)):
+                # Nothing left to resume once every row has succeeded
+                if event["event"] == "done" and checkpoint_path and not event["failed"]:
+                    await run_io(remove_checkpoint, checkpoint_path, store="batch_checkpoints")
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            yield json.dumps({"event": "error", "detail": f"Batch failed: {str(e)}"}) + "\n"
+    
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+
 @app.post("/api/enrich")
 @limiter.limit(ENRICH_RATE_LIMIT)
 async def enrich_profile(request: Request, linkedin_url: str, prospect_name: str, prospect_title: str = "", prospect_company: str = ""):
@@ -200,25 +447,15 @@ async def summarize_bio(request: Request, body: dict):
 async def submit_feedback(request: Request, body: FeedbackRequest):
     """
     Save user feedback for improving future outputs
-    """
-    import json
-    from datetime import datetime
     
+    The record is appended to the feedback log by a background writer; the
+    response is sent once it is on disk.
+    """
     try:
-        # Create feedback directory if it doesn't exist
-        feedback_dir = os.path.join(os.path.dirname(__file__), "..", "feedback")
-        os.makedirs(feedback_dir, exist_ok=True)
-        
-        # Create feedback file path with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        feedback_file = os.path.join(feedback_dir, f"feedback_{timestamp}.json")
-        
-        # Save feedback to file
-        feedback_data = body.model_dump()
-        with open(feedback_file, 'w') as f:
-            json.dump(feedback_data, f, indent=2)
-        
-        return {"status": "success", "message": "Feedback saved successfully"}
+        feedback_id = await feedback_writer.submit(body.model_dump())
+        return {"status": "success", "message": "Feedback saved successfully", "feedback_id": feedback_id}
+    except FeedbackQueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Failed to save feedback: {str(e)}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to save feedback: {str(e)}")
 
@@ -0,0 +1,233 @@
+"""
+In-process metrics in the Prometheus text exposition format
+
+Counters and histograms are plain dicts keyed by label values, updated under
+a lock, so recording costs about a microsecond; gauges for state that already
+lives elsewhere (cache, circuit breaker and token bucket statistics) are read
+from registered collectors only when /metrics is scraped. Metrics are per
+worker process, like /api/stats: scrape each worker, or aggregate in
+Prometheus.
+
+Set METRICS_ENABLED=false to turn recording into a no-op.
+"""
+import bisect
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; spans in-process stages (sub-millisecond) through model calls (tens of seconds)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Monotonic counter with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount: float = 1) -> None:
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def value(self, *labelvalues) -> float:
+        return self._values.get(labelvalues, 0)
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labelvalues, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with optional labels"""
+
+    def __init__(self, name: str, help_text: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        # labelvalues -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labelvalues) -> None:
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, *labelvalues) -> int:
+        series = self._series.get(labelvalues)
+        return series[2] if series else 0
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((labelvalues, (list(s[0]), s[1], s[2])) for labelvalues, s in self._series.items())
+        for labelvalues, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+STAGE_LATENCY = Histogram(
+    "executive_notes_stage_duration_seconds",
+    "Time spent in each stage of a generation or enrichment request (stages nest: build_prompt includes account_lookup)",
+    ("stage",)
+)
+HTTP_LATENCY = Histogram(
+    "executive_notes_http_request_duration_seconds",
+    "HTTP request duration until the response starts, by route and status",
+    ("method", "route", "status")
+)
+UPSTREAM_TOKENS = Counter(
+    "executive_notes_upstream_tokens_total",
+    "Tokens reported by Anthropic responses (input, output, cache_read, cache_creation)",
+    ("model", "type")
+)
+UPSTREAM_REQUESTS = Counter(
+    "executive_notes_upstream_requests_total",
+    "Upstream API calls by outcome",
+    ("upstream", "outcome")
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    "executive_notes_rate_limit_rejections_total",
+    "Requests rejected with 429 by the per-client rate limiter",
+    ("route",)
+)
+TIME_TO_FIRST_TEMPLATE = Histogram(
+    "executive_notes_time_to_first_template_seconds",
+    "Time from a streamed generation request to its first template, by where it came from (model or cache)",
+    ("source",)
+)
+LOOP_BLOCKS = Counter(
+    "executive_notes_event_loop_blocks_total",
+    "Event loop stalls longer than LOOP_BLOCK_WARN_MS (only counted while the watchdog is on)"
+)
+
+_METRICS = [
+    STAGE_LATENCY, HTTP_LATENCY, TIME_TO_FIRST_TEMPLATE, UPSTREAM_TOKENS, UPSTREAM_REQUESTS, RATE_LIMIT_REJECTIONS, LOOP_BLOCKS
+]
+
+# Callbacks returning [(name, type, help, [(labels dict, value), ...]), ...] at scrape time
+_collectors: list[Callable[[], list[tuple]]] = []
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    """Record how long the block takes as a stage latency (also when it raises)"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage)
+
+
+def record_usage(model: str, usage: dict) -> None:
+    """Count the token usage from one Anthropic response (see model_client.usage_to_dict)"""
+    if not METRICS_ENABLED:
+        return
+    for key, kind in (
+        ("input_tokens", "input"),
+        ("output_tokens", "output"),
+        ("cache_read_input_tokens", "cache_read"),
+        ("cache_creation_input_tokens", "cache_creation")
+    ):
+        if usage.get(key):
+            UPSTREAM_TOKENS.inc(model, kind, amount=usage[key])
+
+
+def register_collector(collector: Callable[[], list[tuple]]) -> None:
+    """Add a callback that reports gauges or counters kept elsewhere, read on every scrape"""
+    _collectors.append(collector)
+
+
+def render_metrics() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            print(f"Metrics collector failed: {e}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request latency by route template (static files and unknown paths share the "other" label)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                route = scope.get("route")
+                HTTP_LATENCY.observe(
+                    time.perf_counter() - started, scope["method"], getattr(route, "path", "other"), str(status[0])
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_status)
@@ -4,34 +4,341 @@ Model client for Anthropic API
 import os
 import json
 import re
-from typing import Optional
+import asyncio
+import itertools
+import weakref
+from typing import AsyncIterator, Optional, Union
 
+from app.metrics import timed, record_usage, UPSTREAM_REQUESTS
+from app.admission import admission, upstream_retry_after, UPSTREAM_RATE_LIMIT_STATUSES
+from app.resilience import RetryPolicy
 
-async def call_anthropic(system_prompt: str, user_prompt: str, model: str = "claude-sonnet-4-20250514") -> dict:
-    """Call Anthropic API"""
+DEFAULT_MODEL = "claude-sonnet-4-20250514"
+
+# Connection pool configuration for the shared Anthropic client
+ANTHROPIC_MAX_CONNECTIONS = int(os.getenv("ANTHROPIC_MAX_CONNECTIONS", "100"))
+ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS", "20"))
+ANTHROPIC_KEEPALIVE_EXPIRY = float(os.getenv("ANTHROPIC_KEEPALIVE_EXPIRY", "30"))
+ANTHROPIC_CONNECT_TIMEOUT = float(os.getenv("ANTHROPIC_CONNECT_TIMEOUT", "5"))
+ANTHROPIC_TIMEOUT = float(os.getenv("ANTHROPIC_TIMEOUT", "120"))
+
+# Retries, per-attempt timeout and hedging for model calls (see RetryPolicy)
+ANTHROPIC_MAX_RETRIES = int(os.getenv("ANTHROPIC_MAX_RETRIES", "2"))
+ANTHROPIC_ATTEMPT_TIMEOUT = float(os.getenv("ANTHROPIC_ATTEMPT_TIMEOUT", "90"))
+ANTHROPIC_BACKOFF_BASE = float(os.getenv("ANTHROPIC_BACKOFF_BASE", "0.5"))
+ANTHROPIC_BACKOFF_MAX = float(os.getenv("ANTHROPIC_BACKOFF_MAX", "8"))
+ANTHROPIC_HEDGE = os.getenv("ANTHROPIC_HEDGE", "false").lower() == "true"
+ANTHROPIC_HEDGE_MIN_DELAY = float(os.getenv("ANTHROPIC_HEDGE_MIN_DELAY", "2"))
+RETRYABLE_STATUSES = (408, 409, 429, 500, 502, 503, 504, 529)
+
+# Process-wide client registry. httpx connection pools are bound to the event
+# loop they were opened on, so there is one client per running loop.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, object]" = weakref.WeakKeyDictionary()
+
+
+def create_anthropic_client(api_key: Optional[str] = None, base_url: Optional[str] = None):
+    """
+    Create an AsyncAnthropic client with the configured pool limits and timeouts
+    
+    Args:
+        api_key: API key (defaults to ANTHROPIC_API_KEY)
+        base_url: Optional API base URL override (defaults to ANTHROPIC_BASE_URL or the public API)
+    
+    Returns:
+        anthropic.AsyncAnthropic instance
+    """
     try:
         import anthropic
+        import httpx
     except ImportError:
         raise ImportError("anthropic package not installed. Run: pip install anthropic")
     
-    api_key = os.getenv("ANTHROPIC_API_KEY")
+    api_key = api_key or os.getenv("ANTHROPIC_API_KEY")
     if not api_key:
         raise ValueError("ANTHROPIC_API_KEY environment variable not set")
     
-    client = anthropic.AsyncAnthropic(api_key=api_key)
+    http_client = anthropic.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=ANTHROPIC_MAX_CONNECTIONS,
+            max_keepalive_connections=ANTHROPIC_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=ANTHROPIC_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(ANTHROPIC_TIMEOUT, connect=ANTHROPIC_CONNECT_TIMEOUT)
+    )
+    # Retries are up to anthropic_retry, not the SDK, so they aren't multiplied
+    return anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed Anthropic request is worth repeating: overload, server errors, timeouts, dropped connections"""
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        # With token budgets on, upstream rate limits are waited out by admission
+        # instead; retrying them here too would multiply the attempts per call
+        if status in UPSTREAM_RATE_LIMIT_STATUSES and admission.enabled:
+            return False
+        return status in RETRYABLE_STATUSES
+    try:
+        import anthropic
+    except ImportError:
+        return False
+    return isinstance(error, anthropic.APIConnectionError)
+
+
+anthropic_retry = RetryPolicy(
+    "anthropic",
+    is_retryable,
+    max_retries=ANTHROPIC_MAX_RETRIES,
+    attempt_timeout=ANTHROPIC_ATTEMPT_TIMEOUT,
+    backoff_base=ANTHROPIC_BACKOFF_BASE,
+    backoff_max=ANTHROPIC_BACKOFF_MAX,
+    hedge=ANTHROPIC_HEDGE,
+    hedge_min_delay=ANTHROPIC_HEDGE_MIN_DELAY
+)
+
+
+def get_anthropic_client():
+    """
+    Get the shared Anthropic client for the running event loop, creating it on first use
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = create_anthropic_client()
+        _clients[loop] = client
+    return client
+
+
+async def close_anthropic_client() -> None:
+    """Close the shared Anthropic client for the running event loop, if one was created"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+def _system_param(system_prompt: Union[str, list[dict]]) -> Union[str, list[dict]]:
+    """
+    Convert a system prompt into the API `system` parameter
+    
+    Structured blocks from build_prompt are sent as text blocks, with a
+    cache-control breakpoint on the last stable block so the shared prefix is
+    served from Anthropic's prompt cache.
+    """
+    if isinstance(system_prompt, str):
+        return system_prompt
     
-    response = await client.messages.create(
-        model=model,
-        max_tokens=4000,
-        temperature=0.7,
-        system=system_prompt,
-        messages=[
+    blocks = [{"type": "text", "text": block["text"]} for block in system_prompt]
+    stable = [i for i, block in enumerate(system_prompt) if block.get("stable")]
+    if stable:
+        blocks[stable[-1]]["cache_control"] = {"type": "ephemeral"}
+    return blocks
+
+
+def usage_to_dict(usage) -> dict:
+    """Token counts from an API response usage object, including prompt cache reads/writes"""
+    return {
+        "input_tokens": getattr(usage, "input_tokens", 0) or 0,
+        "output_tokens": getattr(usage, "output_tokens", 0) or 0,
+        "cache_creation_input_tokens": getattr(usage, "cache_creation_input_tokens", 0) or 0,
+        "cache_read_input_tokens": getattr(usage, "cache_read_input_tokens", 0) or 0
+    }
+
+
+def message_params(
+    system_prompt: Union[str, list[dict]],
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4000
+) -> dict:
+    """Messages API parameters for a generation request (also used for Message Batches requests)"""
+    return {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": 0.7,
+        "system": _system_param(system_prompt),
+        "messages": [
             {"role": "user", "content": user_prompt}
         ]
-    )
+    }
+
+
+async def call_anthropic(
+    system_prompt: Union[str, list[dict]],
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    max_tokens: int = 4000
+) -> dict:
+    """
+    Call Anthropic API
+    
+    Transient failures are retried by anthropic_retry within the current
+    request deadline; while token budgets are on, upstream rate limits go
+    back through admission instead.
+    
+    Returns:
+        Parsed JSON response, with the response token usage under "usage"
+    
+    Raises:
+        DeadlineExceeded: If the request deadline passed first
+    """
+    client = get_anthropic_client()
+    params = message_params(system_prompt, user_prompt, model, max_tokens)
+    
+    def admit_hedge() -> bool:
+        # A hedge is a second upstream request: it's charged its estimate, or not sent without budget
+        hedge_ticket = admission.try_admit(system_prompt, user_prompt, max_tokens)
+        if hedge_ticket is None:
+            return False
+        admission.settle(hedge_ticket)
+        return True
+    
+    # Wait for token budget; an upstream rate limit puts the call back in the queue
+    for attempt in itertools.count():
+        ticket = await admission.admit(system_prompt, user_prompt, max_tokens)
+        try:
+            with timed("anthropic_request"):
+                response = await anthropic_retry.call(
+                    lambda: client.messages.create(**params), kind=max_tokens, admit_hedge=admit_hedge
+                )
+        except Exception as e:
+            UPSTREAM_REQUESTS.inc("anthropic", "rate_limited" if upstream_retry_after(e) is not None else "error")
+            if admission.requeue(ticket, e, attempt):
+                continue
+            raise
+        break
+    UPSTREAM_REQUESTS.inc("anthropic", "ok")
+    usage = usage_to_dict(response.usage)
+    admission.settle(ticket, usage)
+    record_usage(model, usage)
     
     content = response.content[0].text
-    return parse_json_response(content)
+    with timed("parse_json"):
+        result = parse_json_response(content)
+    result["usage"] = usage
+    return result
+
+
+async def stream_anthropic(
+    system_prompt: Union[str, list[dict]],
+    user_prompt: str,
+    model: str = DEFAULT_MODEL,
+    usage: Optional[dict] = None,
+    max_tokens: int = 4000
+) -> AsyncIterator[str]:
+    """
+    Call Anthropic API with streaming, yielding text deltas as they arrive
+    
+    Args:
+        usage: Optional dict updated with the response token usage once the stream completes
+        max_tokens: Maximum output tokens
+    """
+    client = get_anthropic_client()
+    params = message_params(system_prompt, user_prompt, model, max_tokens)
+    
+    final = {}
+    
+    async def open_stream():
+        async with client.messages.stream(**params) as stream:
+            async for text in stream.text_stream:
+                yield text
+            final["message"] = await stream.get_final_message()
+    
+    for attempt in itertools.count():
+        ticket = await admission.admit(system_prompt, user_prompt, params["max_tokens"])
+        streamed = False
+        try:
+            with timed("anthropic_stream"):
+                async for text in anthropic_retry.iterate(open_stream):
+                    streamed = True
+                    yield text
+        except Exception as e:
+            UPSTREAM_REQUESTS.inc("anthropic", "rate_limited" if upstream_retry_after(e) is not None else "error")
+            # Only a stream that hasn't sent anything yet can be retried
+            if not streamed and admission.requeue(ticket, e, attempt):
+                continue
+            raise
+        break
+    UPSTREAM_REQUESTS.inc("anthropic", "ok")
+    final_usage = usage_to_dict(final["message"].usage)
+    admission.settle(ticket, final_usage)
+    record_usage(model, final_usage)
+    if usage is not None:
+        usage.update(final_usage)
+
+
+class TemplateStreamParser:
+    """
+    Incremental parser for a streamed {"templates": [...]} JSON response
+    
+    Feed it text chunks as they arrive; each call returns the template objects
+    whose closing brace was seen in that chunk. Braces inside strings and
+    markdown code fences around the JSON are ignored.
+    """
+    
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._stack: list[str] = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = -1
+        self._last_key = None
+        self._array_depth = -1
+        self._object_start = -1
+    
+    def feed(self, chunk: str) -> list[dict]:
+        """
+        Consume a chunk of model output
+        
+        Returns:
+            List of template dicts completed by this chunk (possibly empty)
+        """
+        self._buffer += chunk
+        completed = []
+        buf = self._buffer
+        
+        for i in range(self._pos, len(buf)):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_key = json.loads(buf[self._string_start:i + 1])
+                continue
+            
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == "{":
+                self._stack.append("{")
+                if len(self._stack) == self._array_depth + 1:
+                    self._object_start = i
+            elif ch == "[":
+                self._stack.append("[")
+                if len(self._stack) == 2 and self._last_key == "templates":
+                    self._array_depth = 2
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                depth = len(self._stack)
+                self._stack.pop()
+                if ch == "}" and depth == self._array_depth + 1 and self._object_start >= 0:
+                    completed.append(json.loads(buf[self._object_start:i + 1]))
+                    self._object_start = -1
+                elif ch == "]" and depth == self._array_depth:
+                    self._array_depth = -1
+        
+        self._pos = len(buf)
+        return completed
+    
+    @property
+    def text(self) -> str:
+        """Full text received so far"""
+        return self._buffer
 
 
 def parse_json_response(content: str) -> dict:
@@ -56,21 +363,23 @@ def parse_json_response(content: str) -> dict:
 
 
 async def generate_with_model(
-    system_prompt: str,
+    system_prompt: Union[str, list[dict]],
     user_prompt: str,
     provider: str = "anthropic",
-    model: Optional[str] = None
+    model: Optional[str] = None,
+    max_tokens: int = 4000
 ) -> dict:
     """
     Generate content using Anthropic
     
     Args:
-        system_prompt: System prompt
+        system_prompt: System prompt string or structured blocks from build_prompt
         user_prompt: User prompt
         provider: Ignored (kept for backward compatibility)
         model: Optional model override
+        max_tokens: Maximum output tokens
     
     Returns:
-        Parsed JSON response
+        Parsed JSON response, with the response token usage under "usage"
     """
-    return await call_anthropic(system_prompt, user_prompt, model or "claude-sonnet-4-20250514")
+    return await call_anthropic(system_prompt, user_prompt, model or DEFAULT_MODEL, max_tokens)
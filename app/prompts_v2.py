@@ -317,6 +317,15 @@ Each email should:
 - Write like you're emailing a colleague, not pitching a prospect
 """
 
+# The 5 strategic angles, in output order
+STRATEGIC_ANGLES = [
+    "Strategy & Digital Leadership",
+    "Technology Modernization",
+    "Financial Efficiency",
+    "Customer Value & Growth",
+    "Competitive Advantage"
+]
+
 USER_PROMPT_TEMPLATE = """Generate 5 distinct executive outreach emails, one for each strategic angle, for the following prospect:
 
 **Prospect Information:**
@@ -373,10 +382,101 @@ Return ONLY valid JSON. Do not include markdown code fences or any other text.
 """
 
 
-from app.sender_profiles import get_sender_context
+# Used in parallel mode, where each angle is its own request sharing the system prompt above
+ANGLE_USER_PROMPT_TEMPLATE = """Generate ONE executive outreach email for the "{angle}" strategic angle only, for the following prospect:
+
+**Prospect Information:**
+- Name: {prospect_name}
+- Title: {prospect_title}
+- Company: {prospect_company}
+- Unique Fact: {unique_fact}
+- Business Initiative: {business_initiative}{meeting_purpose_context}
+
+**Output Requirements:**
+Return a valid JSON object with this exact structure:
+{{
+  "angle": "{angle}",
+  "subject": "Subject line here (≤6 words)",
+  "body": "Email body here (80-110 words)"
+}}
+
+Ensure the email:
+- Uses the prospect's first name in greeting
+- Incorporates the unique fact and business initiative naturally
+- Includes Citi/Goldman validation OR uses the most relevant case study
+- Follows the 80-110 word constraint strictly
+- Has a crisp, message-type-appropriate CTA
+- Matches the tone and structure of the provided examples
+- Uses a hook and framing appropriate to the "{angle}" angle
+
+This should be your absolute best work - the strongest possible message for this prospect.
+
+Return ONLY valid JSON. Do not include markdown code fences or any other text.
+"""
+
+
+from functools import lru_cache
+from typing import Optional
+
+from app.sender_profiles import get_sender_context, SENDER_PROFILES
 from app.account_knowledge import format_account_context_for_prompt
+from app.metrics import timed
+
+
+MESSAGE_TYPES = ["cold_outreach", "in_person_ask", "executive_alignment"]
+DEFAULT_MANAGER_NAME = "[Manager's Name]"
+
+_MANAGER_PLACEHOLDER = "\x00MANAGER_NAME\x00"
+
+
+def _compile_system_template(message_type: str) -> list[str]:
+    """
+    Render MEGA_PROMPT_SYSTEM for a message type once, split around the sender
+    name so a sender-specific prompt is just a join
+    """
+    examples, type_instructions = get_message_type_context(message_type)
+    rendered = MEGA_PROMPT_SYSTEM.format(
+        manager_name=_MANAGER_PLACEHOLDER,
+        message_type_instructions=type_instructions,
+        examples=examples
+    )
+    return rendered.split(_MANAGER_PLACEHOLDER)
 
 
+# Examples and instructions interpolated once per message type at import
+_SYSTEM_TEMPLATES = {message_type: _compile_system_template(message_type) for message_type in MESSAGE_TYPES}
+
+
+@lru_cache(maxsize=512)
+def _render_stable_system_prompt(message_type: str, manager_name: str) -> str:
+    """Stable system prompt (mega-prompt, examples, sender profile) for a message type and sender"""
+    return manager_name.join(_SYSTEM_TEMPLATES[message_type]) + get_sender_context(manager_name)
+
+
+def render_stable_system_prompt(message_type: str, manager_name: str = DEFAULT_MANAGER_NAME) -> str:
+    """
+    Get the memoized stable system prompt for a message type and sender
+    
+    Unknown message types fall back to cold outreach, as in get_message_type_context.
+    """
+    if message_type not in _SYSTEM_TEMPLATES:
+        message_type = "cold_outreach"
+    return _render_stable_system_prompt(message_type, manager_name)
+
+
+def warm_prompt_cache() -> None:
+    """Pre-render the stable system prompt for every message type and known sender"""
+    for message_type in MESSAGE_TYPES:
+        for manager_name in [DEFAULT_MANAGER_NAME, *SENDER_PROFILES]:
+            render_stable_system_prompt(message_type, manager_name)
+
+
+def system_prompt_text(system_blocks: list[dict]) -> str:
+    """Join structured system blocks back into a single system prompt string"""
+    return "".join(block["text"] for block in system_blocks)
+
+
+@timed("build_prompt")
 def build_prompt(
     message_type: str,
     prospect_name: str,
@@ -384,12 +484,21 @@ def build_prompt(
     prospect_company: str,
     unique_fact: str,
     business_initiative: str,
-    manager_name: str = "[Manager's Name]",
+    manager_name: str = DEFAULT_MANAGER_NAME,
     meeting_purpose: str = ""
-) -> tuple[str, str]:
+) -> tuple[list[dict], str]:
     """
     Build system and user prompts from mega-prompt template
     
+    The system prompt is returned as structured blocks so the stable prefix
+    (mega-prompt, examples and sender profile, identical for every request with
+    the same message type and sender) can be prompt-cached upstream:
+    
+        [{"type": "text", "text": "...", "stable": True},
+         {"type": "text", "text": "[ACCOUNT KNOWLEDGE]...", "stable": False}]
+    
+    The variable account-knowledge block is only present when the company is known.
+    
     Args:
         message_type: cold_outreach, in_person_ask, or executive_alignment
         prospect_name: Full name
@@ -401,28 +510,55 @@ def build_prompt(
         meeting_purpose: Purpose of in-person meeting (for in_person_ask type)
     
     Returns:
-        (system_prompt, user_prompt)
+        (system_blocks, user_prompt)
     """
-    first_name = prospect_name.split()[0] if prospect_name else "there"
-    
-    # Get message-type-specific context
-    examples, type_instructions = get_message_type_context(message_type)
-    
-    # Get sender profile context
-    sender_context = get_sender_context(manager_name)
+    # Mega-prompt with message-type examples and sender profile, memoized per (message_type, manager_name)
+    stable_prompt = render_stable_system_prompt(message_type, manager_name)
+    system_blocks = [{"type": "text", "text": stable_prompt, "stable": True}]
     
     # Get account knowledge context
-    account_context = format_account_context_for_prompt(prospect_company, prospect_name)
+    with timed("account_lookup"):
+        account_context = format_account_context_for_prompt(prospect_company, prospect_name)
     if account_context:
-        sender_context += f"\n\n[ACCOUNT KNOWLEDGE]\n{account_context}\n\nUse this context to make the email more relevant and personalized. Reference specific people, initiatives, or recent activities when natural."
+        system_blocks.append({
+            "type": "text",
+            "text": f"\n\n[ACCOUNT KNOWLEDGE]\n{account_context}\n\nUse this context to make the email more relevant and personalized. Reference specific people, initiatives, or recent activities when natural.",
+            "stable": False
+        })
     
-    system_prompt = MEGA_PROMPT_SYSTEM.format(
-        manager_name=manager_name,
-        first_name=first_name,
-        message_type_instructions=type_instructions,
-        examples=examples
-    ) + sender_context
+    user_prompt = build_user_prompt(
+        message_type=message_type,
+        prospect_name=prospect_name,
+        prospect_title=prospect_title,
+        prospect_company=prospect_company,
+        unique_fact=unique_fact,
+        business_initiative=business_initiative,
+        meeting_purpose=meeting_purpose
+    )
+    
+    return system_blocks, user_prompt
+
+
+def build_user_prompt(
+    message_type: str,
+    prospect_name: str,
+    prospect_title: str,
+    prospect_company: str,
+    unique_fact: str,
+    business_initiative: str,
+    meeting_purpose: str = "",
+    angle: Optional[str] = None
+) -> str:
+    """
+    Build the user prompt with prospect details
     
+    Args:
+        angle: If set, ask for a single email for this strategic angle
+            instead of all 5 (see STRATEGIC_ANGLES)
+    
+    Returns:
+        user_prompt
+    """
     # Build user prompt with meeting purpose if provided
     user_prompt_data = {
         "prospect_name": prospect_name,
@@ -438,6 +574,6 @@ def build_prompt(
     else:
         user_prompt_data["meeting_purpose_context"] = ""
     
-    user_prompt = USER_PROMPT_TEMPLATE.format(**user_prompt_data)
-    
-    return system_prompt, user_prompt
+    if angle:
+        return ANGLE_USER_PROMPT_TEMPLATE.format(angle=angle, **user_prompt_data)
+    return USER_PROMPT_TEMPLATE.format(**user_prompt_data)
@@ -0,0 +1,269 @@
+"""
+Rate limiting shared across workers, keyed on the caller rather than the socket
+
+RATE_LIMIT_STORAGE selects where the counters live:
+
+    memory  Per process (default); each worker enforces the full limit on its own
+    redis   One set of counters in Redis (RATE_LIMIT_REDIS_URL) for every worker
+            on every node, so a limit means the same thing however many run
+
+Limits use the sliding window counter strategy by default: a hit is weighted
+against the current window's count plus the previous window's count scaled by
+how much of it still overlaps, so a burst straddling a window boundary can't
+get twice the limit through. The Redis counters are updated in a single
+MULTI/EXEC round trip per hit, so concurrent workers never admit more than the
+limit between them. If Redis is unreachable the limiter falls back to
+per-process counters until it answers again, rather than failing requests.
+
+Every request behind the load balancer arrives from the proxy's address, so
+limits are keyed on the authenticated caller, in this order:
+
+    1. The first of RATE_LIMIT_KEY_HEADERS present: headers a gateway in front
+       of the app authenticates or overwrites, e.g. X-User-Id (none by default)
+    2. The API key in RATE_LIMIT_API_KEY_HEADER (X-API-Key), if it is one of
+       RATE_LIMIT_API_KEYS, the keys issued to callers. An unknown key counts
+       as no key, so a fresh random value per request can't buy a fresh limit
+    3. Otherwise the client address the trusted proxies recorded in
+       X-Forwarded-For, else the socket's peer address
+
+Identities are hashed, so raw API keys never reach the counter store. Shared
+(redis) counters with none of these configured key every request on the load
+balancer's address; create_limiter() warns about that at startup.
+"""
+import hashlib
+import os
+import time
+from typing import Optional
+
+from limits.storage import Storage, SlidingWindowCounterSupport
+from limits.storage.base import TimestampedSlidingWindow
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+
+RATE_LIMIT_STORAGE = os.getenv("RATE_LIMIT_STORAGE", "memory").lower()
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "redis://localhost:6379/0")
+RATE_LIMIT_REDIS_TIMEOUT = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.25"))
+RATE_LIMIT_STRATEGY = os.getenv("RATE_LIMIT_STRATEGY", "sliding-window-counter")
+RATE_LIMIT_KEY_HEADERS = [h.strip() for h in os.getenv("RATE_LIMIT_KEY_HEADERS", "").split(",") if h.strip()]
+RATE_LIMIT_API_KEY_HEADER = os.getenv("RATE_LIMIT_API_KEY_HEADER", "X-API-Key")
+RATE_LIMIT_API_KEYS = [k.strip() for k in os.getenv("RATE_LIMIT_API_KEYS", "").split(",") if k.strip()]
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", "0"))
+
+STORAGES = ("memory", "redis")
+
+
+def client_address(request: Request) -> str:
+    """
+    The caller's address, looking through RATE_LIMIT_TRUSTED_PROXIES proxies
+
+    Each proxy appends the address it received the request from to
+    X-Forwarded-For, so the entry written by the outermost trusted proxy is the
+    last one a client can't forge. Anything left of it is client-supplied.
+
+    Args:
+        request: Incoming request
+
+    Returns:
+        IP address string
+    """
+    if RATE_LIMIT_TRUSTED_PROXIES > 0:
+        forwarded = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+        if forwarded:
+            return forwarded[-min(RATE_LIMIT_TRUSTED_PROXIES, len(forwarded))]
+    return get_remote_address(request)
+
+
+def _digest(value: str) -> str:
+    return hashlib.sha256(value.encode()).hexdigest()[:32]
+
+
+def rate_limit_key(request: Request) -> str:
+    """
+    Identify who a request counts against
+
+    Args:
+        request: Incoming request
+
+    Returns:
+        "<header>:<hash>" for the first RATE_LIMIT_KEY_HEADERS header present,
+        else "api-key:<hash>" for an issued API key, else "ip:<client address>"
+    """
+    for header in RATE_LIMIT_KEY_HEADERS:
+        value = request.headers.get(header)
+        if value:
+            return f"{header.lower()}:{_digest(value)}"
+    if RATE_LIMIT_API_KEYS:
+        api_key = request.headers.get(RATE_LIMIT_API_KEY_HEADER)
+        if api_key:
+            digest = _digest(api_key)
+            if digest in {_digest(key) for key in RATE_LIMIT_API_KEYS}:
+                return f"api-key:{digest}"
+    return f"ip:{client_address(request)}"
+
+
+def keys_by_proxy_address(storage: str = RATE_LIMIT_STORAGE) -> bool:
+    """
+    Whether shared limits would key every caller on the load balancer's address
+
+    True when counters are shared (redis) but no caller identity is configured:
+    no gateway headers, no issued API keys and no trusted proxies.
+    """
+    return storage == "redis" and not (RATE_LIMIT_KEY_HEADERS or RATE_LIMIT_API_KEYS or RATE_LIMIT_TRUSTED_PROXIES > 0)
+
+
+class RedisRateLimitStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    limits storage on plain Redis commands, shared by every worker using the server
+
+    limits ships a Redis storage, but it relies on server-side Lua scripts;
+    this one sticks to commands redis-py clients and local stand-ins both
+    support, and does each update in one MULTI/EXEC transaction instead.
+    Supports the fixed-window and sliding-window-counter strategies.
+
+    Built by slowapi from a "shared+redis://" URI (see create_limiter).
+
+    Args:
+        uri: "shared+" followed by the Redis URL
+        client: Redis client (defaults to one for the URL); anything with the
+            redis-py get/set/incrby/decrby/delete/pttl/ping/scan_iter/pipeline
+            methods works, e.g. a local stand-in
+        timeout: Socket timeout in seconds, bounding how long a hung server
+            can hold up a request before the in-memory fallback takes over
+        prefix: Prefix for every key this storage writes
+    """
+
+    STORAGE_SCHEME = ["shared+redis", "shared+rediss"]
+
+    def __init__(
+        self,
+        uri: Optional[str] = None,
+        client=None,
+        timeout: float = RATE_LIMIT_REDIS_TIMEOUT,
+        prefix: str = "rate_limit:",
+        wrap_exceptions: bool = False,
+        **options
+    ):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions)
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("redis package not installed. Run: pip install redis")
+            url = uri.split("+", 1)[1] if uri else RATE_LIMIT_REDIS_URL
+            client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout, **options)
+        self.client = client
+        self.prefix = prefix
+
+    @property
+    def base_exceptions(self):
+        try:
+            import redis
+        except ImportError:
+            return Exception
+        return redis.RedisError
+
+    def incr(self, key: str, expiry: int, amount: int = 1) -> int:
+        key = self.prefix + key
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(key, 0, ex=max(1, int(expiry)), nx=True)  # Start the window's TTL on its first hit
+        pipe.incrby(key, amount)
+        return int(pipe.execute()[1])
+
+    def get(self, key: str) -> int:
+        return int(self.client.get(self.prefix + key) or 0)
+
+    def get_expiry(self, key: str) -> float:
+        return time.time() + max(self.client.pttl(self.prefix + key), 0) / 1000
+
+    def check(self) -> bool:
+        try:
+            return bool(self.client.ping())
+        except Exception:
+            return False
+
+    def reset(self) -> Optional[int]:
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+        return len(keys)
+
+    def clear(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def acquire_sliding_window_entry(self, key: str, limit: int, expiry: int, amount: int = 1) -> bool:
+        if amount > limit:
+            return False
+        now = time.time()
+        previous_key, current_key = (self.prefix + k for k in self.sliding_window_keys(key, expiry, now))
+        pipe = self.client.pipeline(transaction=True)
+        pipe.set(current_key, 0, ex=2 * expiry, nx=True)
+        pipe.incrby(current_key, amount)
+        pipe.get(previous_key)
+        _, current_count, previous_count = pipe.execute()
+        weighted = self._weighted(int(previous_count or 0), int(current_count), expiry, now)
+        if int(weighted) > limit:
+            # The increment is what claimed the slot, so concurrent hits each see a
+            # distinct count and only those past the limit are turned away
+            self.client.decrby(current_key, amount)
+            return False
+        return True
+
+    def get_sliding_window(self, key: str, expiry: int) -> tuple[int, float, int, float]:
+        now = time.time()
+        previous_key, current_key = (self.prefix + k for k in self.sliding_window_keys(key, expiry, now))
+        pipe = self.client.pipeline(transaction=True)
+        pipe.get(previous_key)
+        pipe.get(current_key)
+        previous_count, current_count = (int(count or 0) for count in pipe.execute())
+        previous_ttl = self._previous_ttl(expiry, now) if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def clear_sliding_window(self, key: str, expiry: int) -> None:
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.client.delete(self.prefix + previous_key, self.prefix + current_key)
+
+    @staticmethod
+    def _previous_ttl(expiry: int, now: float) -> float:
+        """Seconds until the previous window stops overlapping the sliding window"""
+        return (1 - (((now - expiry) / expiry) % 1)) * expiry
+
+    def _weighted(self, previous_count: int, current_count: int, expiry: int, now: float) -> float:
+        return previous_count * self._previous_ttl(expiry, now) / expiry + current_count
+
+
+def create_limiter(storage: str = RATE_LIMIT_STORAGE, client=None, strategy: str = RATE_LIMIT_STRATEGY) -> Limiter:
+    """
+    Build the app's limiter
+
+    Args:
+        storage: "memory" or "redis"
+        client: Redis client for the redis storage (defaults to one for RATE_LIMIT_REDIS_URL)
+        strategy: limits strategy name
+
+    Returns:
+        slowapi Limiter keyed on rate_limit_key
+
+    Raises:
+        ValueError: For an unknown storage
+    """
+    if keys_by_proxy_address(storage):
+        print(
+            "WARNING: RATE_LIMIT_STORAGE=redis but no caller identity is configured "
+            "(RATE_LIMIT_API_KEYS, RATE_LIMIT_KEY_HEADERS or RATE_LIMIT_TRUSTED_PROXIES); "
+            "behind a load balancer every caller will share one rate limit"
+        )
+    if storage == "memory":
+        return Limiter(key_func=rate_limit_key, strategy=strategy)
+    if storage == "redis":
+        return Limiter(
+            key_func=rate_limit_key,
+            strategy=strategy,
+            storage_uri=f"shared+{RATE_LIMIT_REDIS_URL}",
+            storage_options={"client": client} if client is not None else {},
+            in_memory_fallback_enabled=True,
+            swallow_errors=True
+        )
+    raise ValueError(f"Unknown RATE_LIMIT_STORAGE: {storage} (expected {', '.join(STORAGES)})")
@@ -0,0 +1,492 @@
+"""
+Resilience helpers for calls to upstream APIs
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Awaitable, Callable, Hashable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Monotonic time by which the current request must be answered (None: no deadline)
+_deadline: ContextVar[Optional[float]] = ContextVar("deadline", default=None)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one upstream
+
+    closed: calls go through. After `failure_threshold` consecutive failures the
+    breaker opens and calls are rejected for `reset_timeout` seconds. It then
+    goes half-open and lets a single probe through: success closes it, failure
+    re-opens it for another `reset_timeout`.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {"successes": 0, "failures": 0, "rejections": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """
+        Whether a call may be attempted now
+
+        Every allowed call must be followed by record_success() or record_failure().
+        """
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._stats["rejections"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            self._state = self.CLOSED
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._stats["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Give up an allowed call without an outcome (e.g. it was cancelled)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def reset(self) -> None:
+        """Force the breaker closed and clear its counters"""
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+            self._stats = {key: 0 for key in self._stats}
+
+    def snapshot(self) -> dict:
+        """Current state and counters, for the stats endpoint"""
+        with self._lock:
+            state = self._current_state()
+            return {
+                "name": self.name,
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "retry_in_seconds": round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 3) if state == self.OPEN else 0.0,
+                **self._stats
+            }
+
+
+class TokenBucket:
+    """
+    Token-per-minute pacer for one upstream
+
+    Callers reserve the estimated token cost of a request before sending it
+    and wait until the bucket has refilled enough to cover it, then settle
+    the reservation with the actual cost once the usage is known. The balance
+    may go negative, so concurrent callers queue behind each other and a
+    request bigger than the bucket still goes through once its debt is repaid.
+    A rate of 0 disables pacing.
+    """
+
+    def __init__(self, name: str, tokens_per_minute: float, burst: float | None = None):
+        self.name = name
+        self.tokens_per_minute = tokens_per_minute
+        self.capacity = burst if burst is not None else tokens_per_minute
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._stats = {"reserved": 0, "settled": 0, "waits": 0, "wait_seconds": 0.0}
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.tokens_per_minute / 60)
+        self._updated = now
+
+    def reserve(self, tokens: float) -> float:
+        """
+        Take `tokens` from the bucket
+
+        Returns:
+            Seconds to wait before sending the request (0 if it may go now)
+        """
+        if self.tokens_per_minute <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            self._stats["reserved"] += tokens
+            if self._tokens >= 0:
+                return 0.0
+            delay = -self._tokens * 60 / self.tokens_per_minute
+            self._stats["waits"] += 1
+            self._stats["wait_seconds"] += delay
+            return delay
+
+    def wait_time(self, tokens: float) -> float:
+        """
+        Seconds until `tokens` (at most a full bucket) are available, without taking them
+
+        Used by callers that decide for themselves who goes next, then take().
+        """
+        if self.tokens_per_minute <= 0:
+            return 0.0
+        with self._lock:
+            self._refill()
+            shortfall = min(tokens, self.capacity) - self._tokens
+            return max(0.0, shortfall * 60 / self.tokens_per_minute)
+
+    def take(self, tokens: float) -> None:
+        """Take `tokens` without pacing, e.g. once wait_time() said they are available"""
+        if self.tokens_per_minute <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            self._stats["reserved"] += tokens
+
+    async def acquire(self, tokens: float) -> None:
+        """Reserve `tokens` and sleep until they are available"""
+        delay = self.reserve(tokens)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def settle(self, reserved: float, actual: float) -> None:
+        """Correct an earlier reservation with the request's actual token cost"""
+        if self.tokens_per_minute <= 0:
+            return
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + reserved - actual)
+            self._stats["settled"] += actual
+
+    def snapshot(self) -> dict:
+        """Current balance and counters, for the stats endpoint"""
+        with self._lock:
+            if self.tokens_per_minute > 0:
+                self._refill()
+            return {
+                "name": self.name,
+                "tokens_per_minute": self.tokens_per_minute,
+                "available": round(self._tokens, 1),
+                **{key: round(value, 3) for key, value in self._stats.items()}
+            }
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request's overall deadline passed before the upstream call finished"""
+
+
+class AttemptTimeout(TimeoutError):
+    """One attempt took longer than its per-attempt timeout (retryable)"""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """
+    Give everything inside `seconds` to finish (None or 0: no limit)
+
+    Nested deadlines only ever shorten the outer one.
+    """
+    current = _deadline.get()
+    if seconds:
+        proposed = time.monotonic() + seconds
+        current = proposed if current is None else min(current, proposed)
+    token = _deadline.set(current)
+    try:
+        yield
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            pass  # Left from another context (a generator closed elsewhere), which never saw it set
+
+
+def time_remaining() -> Optional[float]:
+    """Seconds left before the current deadline, None if there is none"""
+    current = _deadline.get()
+    return None if current is None else current - time.monotonic()
+
+
+def retry_after_header(error: Exception) -> Optional[float]:
+    """The Retry-After seconds on an API error's response, if it has one"""
+    try:
+        return max(0.0, float(error.response.headers["retry-after"]))
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """
+    Per-attempt timeouts, jittered retries and optional hedging for one upstream
+
+    Each attempt gets `attempt_timeout` seconds, or what is left of the
+    current deadline if that is less. Retryable failures (is_retryable, or an
+    attempt timing out) are retried up to `max_retries` times after a full
+    jitter exponential backoff, or the Retry-After the upstream sent, unless
+    the wait would outlast the deadline.
+
+    With hedging on, an attempt still running after the p95 latency of recent
+    successful attempts of the same kind (at least hedge_min_delay) gets a
+    second, identical request; whichever answers first wins and the other is
+    cancelled. Latencies are kept per kind, e.g. per max_tokens, since a full
+    generation and a short one would skew each other's p95. Until
+    hedge_min_samples latencies of a kind have been seen there is no p95 to go
+    by, so no hedging. The hedge is an extra upstream request, so the caller
+    can pass admit_hedge to reserve budget for it; without budget the attempt
+    just carries on alone.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        is_retryable: Callable[[Exception], bool],
+        max_retries: int = 2,
+        attempt_timeout: float = 60.0,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        hedge: bool = False,
+        hedge_min_delay: float = 1.0,
+        hedge_min_samples: int = 20
+    ):
+        self.name = name
+        self.is_retryable = is_retryable
+        self.max_retries = max_retries
+        self.attempt_timeout = attempt_timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        # kind -> recent successful attempt latencies
+        self._latencies: dict[Hashable, deque] = {}
+        self._stats = {
+            "calls": 0, "retries": 0, "timeouts": 0, "deadline_exceeded": 0, "hedges": 0, "hedge_wins": 0, "hedges_skipped": 0
+        }
+
+    def backoff(self, error: Exception, retries: int) -> Optional[float]:
+        """
+        How long to wait before retrying after `error`
+
+        Args:
+            error: What the attempt raised
+            retries: Retries made so far
+
+        Returns:
+            Seconds to sleep, or None if the error should be raised instead
+        """
+        if retries >= self.max_retries:
+            return None
+        if not isinstance(error, AttemptTimeout) and (isinstance(error, DeadlineExceeded) or not self.is_retryable(error)):
+            return None
+        delay = retry_after_header(error)
+        if delay is None:
+            delay = random.uniform(0, self.backoff_base * 2 ** retries)
+        delay = min(delay, self.backoff_max)
+        remaining = time_remaining()
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+    def hedge_delay(self, kind: Hashable = None) -> Optional[float]:
+        """Seconds after which a slow attempt of this kind is hedged, None while hedging is off or unsampled"""
+        latencies = self._latencies.get(kind, ())
+        if not self.hedge or len(latencies) < self.hedge_min_samples:
+            return None
+        latencies = sorted(latencies)
+        return max(self.hedge_min_delay, latencies[int(0.95 * (len(latencies) - 1))])
+
+    def _timeout(self) -> tuple[Optional[float], bool]:
+        """
+        This attempt's timeout, and whether it is the deadline's (rather than the per-attempt limit)
+
+        Raises:
+            DeadlineExceeded: If the deadline has already passed
+        """
+        remaining = time_remaining()
+        if remaining is not None and remaining <= 0:
+            self._stats["deadline_exceeded"] += 1
+            raise DeadlineExceeded(f"{self.name} call not started before the request deadline")
+        if not self.attempt_timeout or (remaining is not None and remaining < self.attempt_timeout):
+            return remaining, True
+        return self.attempt_timeout, False
+
+    def _timeout_error(self, timeout: Optional[float], from_deadline: bool) -> TimeoutError:
+        if from_deadline:
+            self._stats["deadline_exceeded"] += 1
+            return DeadlineExceeded(f"{self.name} call ran past the request deadline")
+        self._stats["timeouts"] += 1
+        return AttemptTimeout(f"{self.name} attempt took longer than {timeout:g}s")
+
+    async def call(
+        self,
+        send: Callable[[], Awaitable[T]],
+        kind: Hashable = None,
+        admit_hedge: Optional[Callable[[], bool]] = None
+    ) -> T:
+        """
+        Call `send()` (a fresh request each time) until it succeeds or fails for good
+
+        Args:
+            send: Makes one request
+            kind: Which latency window the call is timed in and hedged by
+            admit_hedge: Called before sending a hedge; reserves budget for it
+                and returns False if there is none, so no hedge is sent
+
+        Raises:
+            DeadlineExceeded: If the deadline passed first
+            The last attempt's exception otherwise
+        """
+        self._stats["calls"] += 1
+        retries = 0
+        while True:
+            try:
+                return await self._attempt(send, kind, admit_hedge)
+            except Exception as e:
+                delay = self.backoff(e, retries)
+                if delay is None:
+                    raise
+                retries += 1
+                self._stats["retries"] += 1
+                await asyncio.sleep(delay)
+
+    async def _attempt(
+        self,
+        send: Callable[[], Awaitable[T]],
+        kind: Hashable = None,
+        admit_hedge: Optional[Callable[[], bool]] = None
+    ) -> T:
+        timeout, from_deadline = self._timeout()
+        started = time.monotonic()
+        hedge_after = self.hedge_delay(kind)
+        try:
+            if hedge_after is not None and (timeout is None or hedge_after < timeout):
+                result = await self._hedged(send, hedge_after, timeout, admit_hedge)
+            else:
+                async with asyncio.timeout(timeout):
+                    result = await send()
+        except TimeoutError as e:
+            if isinstance(e, (AttemptTimeout, DeadlineExceeded)):
+                raise
+            raise self._timeout_error(timeout, from_deadline) from None
+        self._latencies.setdefault(kind, deque(maxlen=200)).append(time.monotonic() - started)
+        return result
+
+    async def _hedged(
+        self,
+        send: Callable[[], Awaitable[T]],
+        hedge_after: float,
+        timeout: Optional[float],
+        admit_hedge: Optional[Callable[[], bool]] = None
+    ) -> T:
+        """Race a second request against one still running after `hedge_after` seconds"""
+        first = asyncio.ensure_future(send())
+        pending = {first}
+        try:
+            async with asyncio.timeout(timeout):
+                done, _ = await asyncio.wait(pending, timeout=hedge_after)
+                if not done:
+                    if admit_hedge is None or admit_hedge():
+                        self._stats["hedges"] += 1
+                        pending.add(asyncio.ensure_future(send()))
+                    else:
+                        self._stats["hedges_skipped"] += 1
+                error = None
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            if task is not first:
+                                self._stats["hedge_wins"] += 1
+                            return task.result()
+                        error = task.exception()
+                raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def iterate(self, start: Callable[[], AsyncIterator[T]]) -> AsyncIterator[T]:
+        """
+        Stream the items of `start()`, retrying with a fresh stream until the first item arrives
+
+        The per-attempt timeout covers the wait for the first item; after
+        that only the deadline applies, and a failure is raised as is since
+        items have already been passed on.
+        """
+        self._stats["calls"] += 1
+        retries = 0
+        while True:
+            items = start()
+            received = False
+            try:
+                while True:
+                    timeout, from_deadline = self._timeout() if not received else (time_remaining(), True)
+                    try:
+                        async with asyncio.timeout(timeout):
+                            item = await items.__anext__()
+                    except StopAsyncIteration:
+                        return
+                    except TimeoutError as e:
+                        if isinstance(e, (AttemptTimeout, DeadlineExceeded)):
+                            raise
+                        raise self._timeout_error(timeout, from_deadline) from None
+                    received = True
+                    yield item
+            except Exception as e:
+                delay = None if received else self.backoff(e, retries)
+                if delay is None:
+                    raise
+                retries += 1
+                self._stats["retries"] += 1
+                await asyncio.sleep(delay)
+            finally:
+                await items.aclose()
+
+    def snapshot(self) -> dict:
+        """Settings and counters, for the stats endpoint"""
+        hedge_after = {str(kind): self.hedge_delay(kind) for kind in self._latencies}
+        return {
+            "name": self.name,
+            "max_retries": self.max_retries,
+            "attempt_timeout_seconds": self.attempt_timeout,
+            "hedge": self.hedge,
+            "hedge_after_seconds": {kind: round(delay, 3) for kind, delay in hedge_after.items() if delay is not None},
+            **self._stats
+        }
@@ -0,0 +1,362 @@
+"""
+Cache for generation results, keyed on the final prompt
+
+Regenerating for a prospect with identical inputs (a page refresh, a teammate
+working the same account) is served from here instead of paying for another
+model call. The key is a hash of the normalized system and user prompt plus the
+model, temperature, token limit and generation mode, so anything that changes
+the prompt (edited inputs, updated account knowledge, a new prompt version)
+is a miss.
+
+Opt-in: RESULT_CACHE_BACKEND selects the storage (off, memory, sqlite or
+redis). Each request chooses how to use it:
+
+    prefer  Serve a cached result if there is one, else generate and store (default)
+    bypass  Always generate, then store the fresh result (an explicit "regenerate")
+    only    Serve a cached result or fail with ResultCacheMiss, never call the model
+
+A backend failure is logged and treated as a miss, never as a failed generation.
+"""
+import copy
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.event_loop import run_io
+
+
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "off").lower()
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+RESULT_CACHE_DB = os.getenv("RESULT_CACHE_DB", "result_cache.db")
+RESULT_CACHE_REDIS_URL = os.getenv("RESULT_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+CACHE_MODES = ("prefer", "bypass", "only")
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS result_cache (
+    cache_key TEXT PRIMARY KEY,
+    result TEXT NOT NULL,
+    cached_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_result_cache_cached_at ON result_cache (cached_at);
+"""
+
+
+class ResultCacheMiss(LookupError):
+    """Raised for cache="only" when there is no cached result"""
+
+
+class MemoryResultCache:
+    """Per-process LRU cache"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, ttl: float = RESULT_CACHE_TTL, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[tuple[dict, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            cached_at, result = entry
+            if time.time() - cached_at >= self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return result, cached_at
+
+    def put(self, key: str, result: dict) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def size(self) -> int:
+        return len(self._entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteResultCache:
+    """Cache shared by every worker on the host, in a SQLite file (WAL mode); oldest entries are evicted first"""
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str = RESULT_CACHE_DB, ttl: float = RESULT_CACHE_TTL, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # One connection per thread (sqlite3 connections are not shareable across threads)
+        self._local = threading.local()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[tuple[dict, float]]:
+        row = self._connect().execute(
+            "SELECT result, cached_at FROM result_cache WHERE cache_key = ? AND cached_at > ?",
+            (key, time.time() - self.ttl)
+        ).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def put(self, key: str, result: dict) -> None:
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO result_cache (cache_key, result, cached_at) VALUES (?, ?, ?)",
+            (key, json.dumps(result), time.time())
+        )
+        # Drop expired entries and everything beyond the newest max_entries
+        conn.execute(
+            "DELETE FROM result_cache WHERE cached_at <= ? OR cache_key IN "
+            "(SELECT cache_key FROM result_cache ORDER BY cached_at DESC LIMIT -1 OFFSET ?)",
+            (time.time() - self.ttl, self.max_entries)
+        )
+
+    def size(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM result_cache").fetchone()[0]
+
+    def clear(self) -> None:
+        self._connect().execute("DELETE FROM result_cache")
+
+
+class RedisResultCache:
+    """
+    Cache in Redis, shared across hosts. Entries expire through Redis TTLs; a
+    sorted set of keys by store time evicts the oldest beyond max_entries.
+
+    Args:
+        client: Redis client (defaults to one for RESULT_CACHE_REDIS_URL); anything
+            with the redis-py get/set/delete/z* methods works, e.g. a local stand-in
+    """
+
+    name = "redis"
+    blocking = True
+
+    def __init__(
+        self,
+        url: str = RESULT_CACHE_REDIS_URL,
+        ttl: float = RESULT_CACHE_TTL,
+        max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+        client=None,
+        prefix: str = "result_cache:"
+    ):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("redis package not installed. Run: pip install redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.prefix = prefix
+        self._index = prefix + "index"
+
+    def get(self, key: str) -> Optional[tuple[dict, float]]:
+        raw = self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry["result"], entry["cached_at"]
+
+    def put(self, key: str, result: dict) -> None:
+        now = time.time()
+        self.client.set(self.prefix + key, json.dumps({"result": result, "cached_at": now}), ex=max(1, int(self.ttl)))
+        self.client.zadd(self._index, {key: now})
+        self.client.zremrangebyscore(self._index, 0, now - self.ttl)
+        excess = self.client.zcard(self._index) - self.max_entries
+        if excess > 0:
+            oldest = [k.decode() if isinstance(k, bytes) else k for k in self.client.zrange(self._index, 0, excess - 1)]
+            self.client.delete(*(self.prefix + k for k in oldest))
+            self.client.zrem(self._index, *oldest)
+
+    def size(self) -> int:
+        return self.client.zcard(self._index)
+
+    def clear(self) -> None:
+        keys = [k.decode() if isinstance(k, bytes) else k for k in self.client.zrange(self._index, 0, -1)]
+        if keys:
+            self.client.delete(*(self.prefix + k for k in keys))
+        self.client.delete(self._index)
+
+
+BACKENDS = ("memory", "sqlite", "redis")
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+
+def get_result_cache():
+    """
+    Get the configured cache backend, creating it on first use
+
+    Returns:
+        Backend instance, or None when RESULT_CACHE_BACKEND is off
+
+    Raises:
+        ValueError: For an unknown RESULT_CACHE_BACKEND
+    """
+    global _backend
+    if _backend is None and RESULT_CACHE_BACKEND not in ("", "off"):
+        with _backend_lock:
+            if _backend is None:
+                if RESULT_CACHE_BACKEND == "memory":
+                    _backend = MemoryResultCache(RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES)
+                elif RESULT_CACHE_BACKEND == "sqlite":
+                    _backend = SQLiteResultCache(RESULT_CACHE_DB, RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES)
+                elif RESULT_CACHE_BACKEND == "redis":
+                    _backend = RedisResultCache(RESULT_CACHE_REDIS_URL, RESULT_CACHE_TTL, RESULT_CACHE_MAX_ENTRIES)
+                else:
+                    raise ValueError(f"Unknown RESULT_CACHE_BACKEND: {RESULT_CACHE_BACKEND} (expected off, {', '.join(BACKENDS)})")
+    return _backend
+
+
+def set_result_cache(backend) -> None:
+    """Replace the cache backend (None disables caching)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
+
+
+def cache_mode(cache: Optional[str]) -> str:
+    """
+    Validate a request's cache mode
+
+    Raises:
+        ValueError: If it isn't one of CACHE_MODES
+    """
+    if cache is None:
+        return "prefer"
+    if cache not in CACHE_MODES:
+        raise ValueError(f"Unknown cache mode: {cache} (expected {', '.join(CACHE_MODES)})")
+    return cache
+
+
+def _normalize(text: str) -> str:
+    """Collapse whitespace so formatting-only differences share an entry"""
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def result_cache_key(params: dict, mode: str = "single") -> str:
+    """
+    Cache key for a generation request
+
+    Args:
+        params: Messages API parameters from message_params
+        mode: Generation mode ("single" or "parallel"), which shapes the result
+
+    Returns:
+        Hex digest of the normalized prompt, model, temperature, max_tokens and mode
+    """
+    system = params["system"]
+    if not isinstance(system, str):
+        system = "".join(block["text"] for block in system)
+    canonical = {
+        "model": params["model"],
+        "temperature": params.get("temperature"),
+        "max_tokens": params["max_tokens"],
+        "mode": mode,
+        "system": _normalize(system),
+        "messages": [_normalize(message["content"]) for message in params["messages"]]
+    }
+    return hashlib.sha256(json.dumps(canonical, sort_keys=True).encode()).hexdigest()
+
+
+def get_cached_result(key: str) -> Optional[tuple[dict, float]]:
+    """
+    Look up a cached result
+
+    Returns:
+        (copy of the cached result, cached_at timestamp), or None on a miss,
+        when caching is off or if the backend failed
+    """
+    backend = get_result_cache()
+    if backend is None:
+        return None
+    try:
+        entry = backend.get(key)
+    except Exception as e:
+        print(f"Result cache lookup failed ({backend.name}): {e}")
+        _stats["errors"] += 1
+        entry = None
+    if entry is None:
+        _stats["misses"] += 1
+        return None
+    _stats["hits"] += 1
+    result, cached_at = entry
+    return copy.deepcopy(result), cached_at
+
+
+def cache_result(key: str, result: dict) -> None:
+    """Store a generation result (a no-op when caching is off)"""
+    backend = get_result_cache()
+    if backend is None:
+        return
+    try:
+        backend.put(key, copy.deepcopy(result))
+        _stats["stores"] += 1
+    except Exception as e:
+        print(f"Result cache store failed ({backend.name}): {e}")
+        _stats["errors"] += 1
+
+
+async def get_cached_result_async(key: str) -> Optional[tuple[dict, float]]:
+    """get_cached_result, on the I/O thread pool for backends that block (SQLite, Redis)"""
+    backend = get_result_cache()
+    if backend is None or not backend.blocking:
+        return get_cached_result(key)
+    return await run_io(get_cached_result, key)
+
+
+async def cache_result_async(key: str, result: dict) -> None:
+    """cache_result, on the result cache's owner thread for backends that block (SQLite, Redis)"""
+    backend = get_result_cache()
+    if backend is None or not backend.blocking:
+        cache_result(key, result)
+        return
+    await run_io(cache_result, key, result, store="result_cache")
+
+
+def get_result_cache_stats() -> dict:
+    """Hit/miss/store counters for this worker and the backend's current size"""
+    backend = get_result_cache()
+    lookups = _stats["hits"] + _stats["misses"]
+    stats = {
+        **_stats,
+        "backend": backend.name if backend else "off",
+        "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else 0.0
+    }
+    if backend is not None:
+        try:
+            stats.update(size=backend.size(), max_size=backend.max_entries, ttl_seconds=backend.ttl)
+        except Exception as e:
+            stats["size_error"] = str(e)
+    return stats
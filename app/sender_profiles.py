@@ -1,6 +1,7 @@
 """
 Sender profiles with personal facts for more natural connections
 """
+from functools import lru_cache
 
 SENDER_PROFILES = {
     "Jake": {
@@ -58,18 +59,21 @@ def get_sender_context(manager_name: str) -> str:
     # Extract first name
     first_name = manager_name.split()[0] if manager_name else manager_name
     
+    return _render_sender_context(first_name)
+
+
+@lru_cache(maxsize=256)
+def _render_sender_context(first_name: str) -> str:
+    """Render the sender profile block for a first name ("" if unknown)"""
     profile = SENDER_PROFILES.get(first_name, None)
     
     if not profile:
         return ""
     
-    context = f"\n[SENDER PROFILE - {first_name}]\n"
-    context += "Background:\n"
-    for item in profile["background"]:
-        context += f"- {item}\n"
-    context += "\nInterests:\n"
-    for item in profile["interests"]:
-        context += f"- {item}\n"
-    context += "\nUse these personal facts ONLY if they naturally connect to the prospect's unique fact or background. Don't force connections.\n"
+    lines = [f"\n[SENDER PROFILE - {first_name}]", "Background:"]
+    lines.extend(f"- {item}" for item in profile["background"])
+    lines.append("\nInterests:")
+    lines.extend(f"- {item}" for item in profile["interests"])
+    lines.append("\nUse these personal facts ONLY if they naturally connect to the prospect's unique fact or background. Don't force connections.\n")
     
-    return context
+    return "\n".join(lines)
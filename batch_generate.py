@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Generate outreach templates for a whole prospect list
+
+    python batch_generate.py prospects.csv --checkpoint results.jsonl > results.ndjson
+
+The input is CSV with a header row or JSONL, one prospect per row, using the
+/api/generate field names (plus an optional "id"). Results are written to
+stdout as NDJSON as each prospect completes, and progress to stderr.
+Rerunning with the same --checkpoint skips prospects that already succeeded.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Load .env before the app modules read their settings
+load_dotenv()
+
+from app.batch import parse_batch_rows, run_batch, BATCH_CONCURRENCY
+from app.model_client import close_anthropic_client
+from app.resilience import TokenBucket
+
+
+async def run(args: argparse.Namespace) -> int:
+    """Run the batch, returning the process exit code (1 if any prospect failed)"""
+    fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+    with open(args.input, encoding='utf-8-sig') as f:
+        rows = parse_batch_rows(f.read(), fmt)
+    bucket = TokenBucket("batch_cli", args.tokens_per_minute) if args.tokens_per_minute is not None else None
+
+    summary = {}
+    finished = 0
+    try:
+        async for event in run_batch(rows, args.checkpoint, args.concurrency, bucket):
+            print(json.dumps(event), flush=True)
+            if event["event"] == "result":
+                finished += 1
+                detail = " (resumed)" if event.get("resumed") else f": {event['error']}" if event["status"] == "error" else ""
+                print(f"[{finished}/{len(rows)}] {event['id']} {event['status']}{detail}", file=sys.stderr)
+            else:
+                summary = event
+    finally:
+        await close_anthropic_client()
+
+    print(
+        f"Done in {summary['elapsed_ms'] / 1000:.1f}s: {summary['succeeded']} succeeded, "
+        f"{summary['failed']} failed, {summary['resumed']} resumed",
+        file=sys.stderr
+    )
+    return 1 if summary["failed"] else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="CSV or JSONL prospect list")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (defaults from the file extension)")
+    parser.add_argument("--checkpoint", help="JSONL file to record results in and resume from")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Prospects generated at once")
+    parser.add_argument("--tokens-per-minute", type=int, help="Token budget to pace requests to (0 disables pacing)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        parser.error(f"{args.input} not found")
+    try:
+        sys.exit(asyncio.run(run(args)))
+    except ValueError as e:
+        parser.error(str(e))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: first account lookup after process start, with and without the persisted snapshot
+
+Each measurement runs in a fresh Python process, as a newly booted uvicorn
+worker would, and times the first format_account_context_for_prompt call.
+
+    python -m benchmarks.bench_account_cold_start --accounts 2000
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.bench_account_parser import _account_markdown
+
+FIRST_REQUEST = """
+import json, sys, time
+from app import account_knowledge
+account_knowledge.ACCOUNTS_DIR = sys.argv[1]
+start = time.perf_counter()
+context = account_knowledge.format_account_context_for_prompt("Company 7", "Contact 3")
+elapsed = (time.perf_counter() - start) * 1000
+assert "Company 7" in context
+print(json.dumps({"ms": elapsed}))
+"""
+
+
+def _first_request_ms(accounts_dir: str, snapshot_file: str) -> float:
+    env = dict(os.environ, ACCOUNT_WATCH_MODE="off", ACCOUNT_SNAPSHOT_FILE=snapshot_file)
+    out = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST, accounts_dir],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])["ms"]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=2000)
+    parser.add_argument("--contacts", type=int, default=20, help="Contact notes per account file")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for i in range(args.accounts):
+            with open(os.path.join(tmp, f"Company{i}.md"), 'w', encoding='utf-8') as f:
+                f.write(_account_markdown(i, args.contacts))
+        snapshot_path = os.path.join(tmp, ".account_snapshot.pickle")
+        print(f"{args.accounts:,} account files, {args.contacts} contact notes each")
+
+        no_snapshot = [_first_request_ms(tmp, "") for _ in range(args.runs)]
+
+        building = []
+        for _ in range(args.runs):
+            if os.path.exists(snapshot_path):
+                os.remove(snapshot_path)
+            building.append(_first_request_ms(tmp, ".account_snapshot.pickle"))
+
+        warm = [_first_request_ms(tmp, ".account_snapshot.pickle") for _ in range(args.runs)]
+        snapshot_kb = os.path.getsize(snapshot_path) / 1024
+
+        # One file edited: only it is reparsed
+        shutil.copy(os.path.join(tmp, "Company1.md"), os.path.join(tmp, "Company0.md"))
+        one_changed = _first_request_ms(tmp, ".account_snapshot.pickle")
+
+        for label, samples in [
+            ("parse all (no snapshot)", no_snapshot),
+            ("parse all + write snapshot", building),
+            ("load snapshot", warm)
+        ]:
+            print(f"  {label:<28} median={statistics.median(samples):8.1f}ms min={min(samples):8.1f}ms")
+        print(f"  {'load snapshot, 1 file edited':<28} {one_changed:15.1f}ms")
+        print(f"  snapshot size: {snapshot_kb:,.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark: account-knowledge company resolution with thousands of account files
+
+Compares the indexed resolver against the legacy linear partial-match scan,
+and reports end-to-end get_account_context / format_account_context_for_prompt
+and contact lookup latency against the loaded snapshot.
+
+    python -m benchmarks.bench_account_lookup --accounts 5000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app import account_knowledge
+from app.account_knowledge import (
+    get_account_context,
+    get_contact_context,
+    find_contact_candidates,
+    format_account_context_for_prompt,
+    _get_accounts,
+    _get_account_index,
+    _resolve_account_key
+)
+
+WORDS = [
+    "Acme", "Global", "Northern", "Pacific", "United", "Summit", "Pioneer", "Atlas", "Harbor", "Apex",
+    "Crescent", "Sterling", "Evergreen", "Liberty", "Keystone", "Meridian", "Orion", "Vertex", "Beacon", "Cobalt"
+]
+SUFFIXES = ["", " Inc", " Corp", " Group", " Holdings"]
+
+
+def _company_name(i: int) -> str:
+    rng = random.Random(i)
+    return f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i:05d}"
+
+
+def _write_accounts(accounts_dir: str, n: int) -> None:
+    for i in range(n):
+        name = _company_name(i)
+        with open(os.path.join(accounts_dir, f"account_{i:05d}.md"), 'w', encoding='utf-8') as f:
+            f.write(
+                f"# {name}\n\n## Overview\n- **Industry:** Retail\n- **Status:** Active\n- **Aliases:** {name} Bank\n\n"
+                f"## Situation\n- **Focus:** Focus {i}\n- **Recent Activity:** Activity {i}\n\n"
+                f"## Key Initiatives\n- Initiative {i}\n\n"
+                f"## Contact Notes\n### Pat {i}\n- **Title:** CTO\n- **Notes:** Note {i}\n"
+            )
+
+
+def _legacy_lookup(accounts: dict, company_name: str):
+    """The pre-index resolution: exact key, then substring match in both directions"""
+    company_key = company_name.upper().strip()
+    if company_key in accounts:
+        return accounts[company_key]
+    for key in accounts:
+        if company_key in key or key in company_key:
+            return accounts[key]
+    return None
+
+
+def _queries(n: int, count: int) -> list[str]:
+    """Mix of exact, suffixed, prefix and unknown names, as seen from user input"""
+    rng = random.Random(0)
+    queries = []
+    for _ in range(count):
+        name = _company_name(rng.randrange(n))
+        kind = rng.randrange(4)
+        if kind == 0:
+            queries.append(name)
+        elif kind == 1:
+            queries.append(name.lower() + rng.choice(SUFFIXES))
+        elif kind == 2:
+            queries.append(f"The {name} Company")
+        else:
+            queries.append(f"Unknown Prospect {rng.randrange(10**6)}")
+    return queries
+
+
+def _timed(fn, queries: list[str]) -> list[float]:
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _report(label: str, latencies: list[float]) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"  {label:<24} mean={statistics.mean(latencies):9.4f}ms p95={p95:9.4f}ms (n={len(latencies)})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _write_accounts(tmp, args.accounts)
+        account_knowledge.ACCOUNTS_DIR = tmp
+
+        start = time.perf_counter()
+        accounts = _get_accounts()
+        index = _get_account_index()
+        print(f"{len(accounts):,} accounts loaded and indexed in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+        queries = _queries(args.accounts, args.queries)
+        legacy_found = sum(_legacy_lookup(accounts, q) is not None for q in queries)
+        indexed_found = sum(_resolve_account_key(dict(index, resolved={}), q) is not None for q in queries)
+        print(f"  resolved: legacy={legacy_found} indexed={indexed_found} of {len(queries)}")
+
+        _report("legacy scan", _timed(lambda q: _legacy_lookup(accounts, q), queries))
+        _report("index (cold memo)", _timed(lambda q: _resolve_account_key(dict(index, resolved={}), q), queries))
+        _report("index (warm memo)", _timed(lambda q: _resolve_account_key(index, q), queries))
+        _report("get_account_context", _timed(get_account_context, queries[:200]))
+        _report("format_for_prompt", _timed(lambda q: format_account_context_for_prompt(q, "Pat 1"), queries[:200]))
+
+        rng = random.Random(1)
+        contacts = [(f"Pat {i}", _company_name(i)) for i in (rng.randrange(args.accounts) for _ in range(200))]
+        found = sum(get_contact_context(*contact) is not None for contact in contacts)
+        print(f"  contacts found: {found} of {len(contacts)}")
+        _report("get_contact_context", _timed(lambda c: get_contact_context(*c), contacts))
+        _report("find_contact_candidates", _timed(lambda c: find_contact_candidates(c[0]), contacts))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: account markdown parse throughput (files/sec)
+
+Parses a generated corpus of large account files (hundreds of contact notes
+each) with the compiled parser and the legacy regex parser, and checks
+they produce identical output.
+
+    python -m benchmarks.bench_account_parser --files 200 --contacts 300
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.account_knowledge import _parse_account_markdown
+from benchmarks.legacy_account_parser import parse_account_markdown as legacy_parse_account_markdown
+
+WORDS = "platform data cloud migration analytics supply chain pricing loyalty automation forecasting".split()
+
+
+def _sentence(rng: random.Random, n: int = 12) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize()
+
+
+def _account_markdown(i: int, contacts: int) -> str:
+    rng = random.Random(i)
+    bullets = lambda n: "\n".join(f"- {_sentence(rng)}" for _ in range(n))
+    parts = [
+        f"# Company {i}\n",
+        f"## Overview\n- **Industry:** Retail\n- **Status:** {_sentence(rng, 6)}\n- **Aliases:** Company {i} Inc, C{i}\n",
+        f"## Situation\n- **Focus:** {_sentence(rng)}\n- **Recent Activity:** {_sentence(rng)}\n\n### Challenges\n{bullets(8)}\n",
+        f"## Key Initiatives\n{bullets(10)}\n",
+        f"## Positioning\n- **Focus:** {_sentence(rng)}\n- **Competitive:** {_sentence(rng, 4)}\n\n### Differentiators\n{bullets(6)}\n",
+        "## Team Contacts\n" + "\n".join(f"- **Team {t}:** " + ", ".join(f"Person {t}{k}" for k in range(5)) for t in range(10)) + "\n",
+        "## Research Intelligence\n\n### AI Maturity\nDeveloping\n\n" + bullets(20) + "\n",
+        "## Contact Notes\n" + "\n".join(
+            f"### Contact {c}\n- **Title:** {rng.choice(['CTO', 'CIO', 'VP Engineering', 'CDO'])}\n"
+            f"- **Notes:** {_sentence(rng, 20)}\n- **Last Contact:** 2026-0{rng.randrange(1, 10)}-1{rng.randrange(10)}\n"
+            for c in range(contacts)
+        )
+    ]
+    return "\n".join(parts)
+
+
+def _throughput(parse, paths: list[str], rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for path in paths:
+            parse(path)
+    return rounds * len(paths) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--contacts", type=int, default=300, help="Contact notes per file")
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(args.files):
+            path = os.path.join(tmp, f"Company{i}.md")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(_account_markdown(i, args.contacts))
+            paths.append(path)
+        size_kb = sum(os.path.getsize(p) for p in paths) / len(paths) / 1024
+        print(f"{args.files} files, {args.contacts} contact notes each (avg {size_kb:.0f} KB)")
+
+        mismatches = [p for p in paths if _parse_account_markdown(p) != legacy_parse_account_markdown(p)]
+        print(f"  identical output: {len(paths) - len(mismatches)}/{len(paths)}")
+
+        legacy = _throughput(legacy_parse_account_markdown, paths, args.rounds)
+        compiled = _throughput(_parse_account_markdown, paths, args.rounds)
+        print(f"  legacy regex parser   {legacy:9.1f} files/sec")
+        print(f"  compiled parser       {compiled:9.1f} files/sec ({compiled / legacy:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
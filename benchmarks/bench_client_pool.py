@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark: per-call AsyncAnthropic clients vs the shared pooled client
+
+Runs against a local stub server so it measures client construction and
+connection setup, not model latency.
+
+    python -m benchmarks.bench_client_pool --requests 200 --concurrency 10
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks.stub_server import StubServer
+from app.model_client import create_anthropic_client
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def _one_call(client) -> None:
+    await client.messages.create(
+        model="stub-model",
+        max_tokens=16,
+        messages=[{"role": "user", "content": "ping"}]
+    )
+
+
+async def _run(mode: str, base_url: str, total: int, concurrency: int) -> list[float]:
+    semaphore = asyncio.Semaphore(concurrency)
+    pooled = create_anthropic_client(api_key="bench", base_url=base_url) if mode == "pooled" else None
+    latencies: list[float] = []
+
+    async def worker():
+        async with semaphore:
+            start = time.perf_counter()
+            if pooled is not None:
+                await _one_call(pooled)
+            else:
+                client = create_anthropic_client(api_key="bench", base_url=base_url)
+                try:
+                    await _one_call(client)
+                finally:
+                    await client.close()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(total)))
+    if pooled is not None:
+        await pooled.close()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Stub server latency per request")
+    args = parser.parse_args()
+
+    with StubServer(latency=args.latency_ms / 1000) as server:
+        for mode in ("per-call", "pooled"):
+            connections_before = server.connections
+            started = time.perf_counter()
+            latencies = asyncio.run(_run(mode, server.base_url, args.requests, args.concurrency))
+            elapsed = time.perf_counter() - started
+            print(
+                f"{mode:>8}: mean={statistics.mean(latencies):7.2f}ms "
+                f"p50={_percentile(latencies, 50):7.2f}ms "
+                f"p95={_percentile(latencies, 95):7.2f}ms "
+                f"p99={_percentile(latencies, 99):7.2f}ms "
+                f"rps={args.requests / elapsed:7.1f} "
+                f"connections={server.connections - connections_before}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Benchmark: enrichment cache lookup/store latency as the cache grows
+
+Compares the SQLite store against the legacy approach of loading and
+rewriting a single JSON file on every operation.
+
+    python -m benchmarks.bench_enrichment_cache --sizes 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from app import enrichment_cache
+from app.enrichment_cache import cache_enrichment, get_cached_enrichment, _connect, _get_cache_key
+
+RESULT = {
+    "unique_fact": "Led a 40-person platform team through a core banking migration",
+    "business_initiative": "Consolidating legacy payment systems",
+    "linkedin_insight": "Engineering leader focused on modernization",
+    "confidence": 90,
+    "needs_verification": False
+}
+
+
+def _populate_sqlite(n: int) -> None:
+    now = time.time()
+    conn = _connect()
+    conn.execute("BEGIN")
+    conn.executemany(
+        "INSERT INTO enrichment_cache (cache_key, linkedin_url, prospect_name, result, cached_at) VALUES (?, ?, ?, ?, ?)",
+        (
+            (_get_cache_key(f"https://linkedin.com/in/p{i}", f"Person {i}"), f"https://linkedin.com/in/p{i}", f"Person {i}", json.dumps(RESULT), now)
+            for i in range(n)
+        )
+    )
+    conn.execute("COMMIT")
+
+
+def _legacy_get(path: str, key: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    return cache.get(key)
+
+
+def _legacy_put(path: str, key: str, entry: dict) -> None:
+    with open(path, 'r', encoding='utf-8') as f:
+        cache = json.load(f)
+    cache[key] = entry
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2)
+
+
+def _timed(fn, samples: int) -> list[float]:
+    latencies = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        fn()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def _report(label: str, latencies: list[float]) -> None:
+    ordered = sorted(latencies)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    print(f"  {label:<14} mean={statistics.mean(latencies):9.3f}ms p95={p95:9.3f}ms (n={len(latencies)})")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--samples", type=int, default=2000)
+    parser.add_argument("--legacy-samples", type=int, default=5, help="Samples for the (slow) JSON baseline; 0 to skip")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            enrichment_cache.CACHE_DB = os.path.join(tmp, "cache.db")
+            enrichment_cache.CACHE_FILE = os.path.join(tmp, "legacy.json")
+            _populate_sqlite(n)
+            print(f"{n:,} entries")
+
+            def sqlite_get():
+                i = random.randrange(n)
+                assert get_cached_enrichment(f"https://linkedin.com/in/p{i}", f"Person {i}") is not None
+
+            _report("sqlite get", _timed(sqlite_get, args.samples))
+            _report("sqlite put", _timed(
+                lambda: cache_enrichment(f"https://linkedin.com/in/new{random.randrange(n)}", "New Person", RESULT),
+                args.samples
+            ))
+
+            if args.legacy_samples:
+                legacy_path = os.path.join(tmp, "bench.json")
+                entry = {"linkedin_url": "", "prospect_name": "", "result": RESULT, "cached_at": "2026-01-01T00:00:00"}
+                with open(legacy_path, 'w', encoding='utf-8') as f:
+                    json.dump({_get_cache_key(f"u{i}", "n"): entry for i in range(n)}, f, indent=2)
+                _report("json get", _timed(lambda: _legacy_get(legacy_path, _get_cache_key("u1", "n")), args.legacy_samples))
+                _report("json put", _timed(lambda: _legacy_put(legacy_path, _get_cache_key("new", "n"), entry), args.legacy_samples))
+
+
+if __name__ == "__main__":
+    main()
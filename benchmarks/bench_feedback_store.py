@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: feedback analysis over a large feedback log
+
+Writes N records as gzip JSONL segments, then times the first ingest into
+the feedback store, an incremental ingest after more feedback arrives, and
+--since/--group-by summaries. The legacy baseline parses every record on
+each run, as analyze_feedback.py used to.
+
+    python -m benchmarks.bench_feedback_store --records 1000000
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from app import feedback_store
+from app.feedback_store import ingest_feedback, feedback_summary, improvement_samples
+from app.feedback_writer import read_feedback
+from app.prompts_v2 import STRATEGIC_ANGLES
+
+SEGMENT_RECORDS = 50_000
+MESSAGE_TYPES = ["cold_outreach", "in_person_ask", "executive_alignment"]
+SENDERS = [f"Sender {i}" for i in range(20)]
+
+
+def _records(start: int, n: int, days: int):
+    rng = random.Random(start)
+    first_day = date.today() - timedelta(days=days - 1)
+    for i in range(start, start + n):
+        day = first_day + timedelta(days=rng.randrange(days))
+        yield {
+            "feedback_id": f"bench{i}",
+            "feedback_type": "positive" if rng.random() < 0.7 else "negative",
+            "original_output": {"angle": rng.choice(STRATEGIC_ANGLES), "subject": f"Subject {i}", "body": "Hi there, ..."},
+            "improved_version": f"Improved email {i}" if rng.random() < 0.1 else None,
+            "metadata": {"message_type": rng.choice(MESSAGE_TYPES), "manager_name": rng.choice(SENDERS)},
+            "timestamp": f"{day.isoformat()}T12:00:00Z",
+            "received_at": f"{day.isoformat()}T12:00:01+00:00"
+        }
+
+
+def _write_segments(feedback_dir: str, start: int, n: int, days: int) -> None:
+    for offset in range(0, n, SEGMENT_RECORDS):
+        path = os.path.join(feedback_dir, f"feedback-bench-{start + offset:09d}.jsonl.gz")
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            for record in _records(start + offset, min(SEGMENT_RECORDS, n - offset), days):
+                f.write(json.dumps(record) + "\n")
+
+
+def _timed(label: str, fn):
+    start = time.perf_counter()
+    result = fn()
+    print(f"  {label:<34} {(time.perf_counter() - start) * 1000:10.1f}ms")
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--new-records", type=int, default=1000, help="Feedback arriving between runs")
+    parser.add_argument("--legacy", action="store_true", help="Also time a full parse of every record (slow)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        feedback_store.FEEDBACK_STORE_DB = os.path.join(tmp, "feedback.db")
+        print(f"Writing {args.records:,} records over {args.days} days...")
+        _write_segments(tmp, 0, args.records, args.days)
+
+        if args.legacy:
+            _timed("legacy: parse every record", lambda: sum(1 for _ in read_feedback(tmp)))
+        _timed("first ingest", lambda: ingest_feedback(tmp))
+        _timed("rerun, nothing new", lambda: ingest_feedback(tmp))
+        _write_segments(tmp, args.records, args.new_records, 1)
+        _timed(f"rerun, {args.new_records:,} new", lambda: ingest_feedback(tmp))
+
+        since = (date.today() - timedelta(days=29)).isoformat()
+        _timed("overview", lambda: feedback_summary())
+        _timed("--group-by feedback_type", lambda: feedback_summary(None, ["feedback_type"]))
+        _timed("--since 30d --group-by angle", lambda: feedback_summary(since, ["angle"]))
+        _timed("--since 30d --group-by sender,day", lambda: feedback_summary(since, ["sender", "day"]))
+        _timed("--group-by angle,message_type,sender", lambda: feedback_summary(None, ["angle", "message_type", "sender"]))
+        _timed("--since 30d improvement samples", lambda: improvement_samples(since))
+
+
+if __name__ == "__main__":
+    main()
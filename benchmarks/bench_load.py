@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Benchmark: load test of the HTTP API against stub Anthropic and Perplexity servers
+
+Boots the FastAPI app under uvicorn (in a background thread, on its own event
+loop) with the upstream APIs pointed at a local stub server, then drives each
+endpoint in turn at a fixed request rate. Requests are sent open-loop: each is
+started on schedule whether or not earlier ones have finished, and latency is
+measured from its scheduled start, so a stalled server shows up as latency
+rather than as a quietly lower request rate.
+
+For each endpoint it reports p50/p95/p99 latency, throughput, errors and the
+app's event-loop lag (how late a 10ms timer on the server loop fires), and
+writes everything to a JSON file named after the current commit. Pass
+--compare with an earlier results file to flag regressions:
+
+    python -m benchmarks.bench_load --rps 50 --duration 10
+    python -m benchmarks.bench_load --latency 0.5 --stream-tps 80 --endpoints generate_stream
+    python -m benchmarks.bench_load --compare benchmarks/results/bench_load-1a2b3c4.json
+
+The client and server share one process (and the GIL), so absolute numbers
+are pessimistic; compare runs made on the same machine with the same settings.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+
+from benchmarks.stub_server import StubServer
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+LAG_PROBE_INTERVAL = 0.01
+
+PROSPECT = {
+    "message_type": "cold_outreach",
+    "prospect_name": "Sarah Chen",
+    "prospect_title": "CTO",
+    "prospect_company": "Acme Corp",
+    "unique_fact": "Led cloud migration",
+    "business_initiative": "Modernization"
+}
+
+
+def _generate_request(i: int, profiles: int) -> dict:
+    # cache="bypass" so every request reaches the model even with a result cache configured
+    return {"json": dict(PROSPECT, unique_fact=f"Led cloud migration #{i}", cache="bypass")}
+
+
+def _enrich_request(i: int, profiles: int) -> dict:
+    return {"params": {
+        "linkedin_url": f"https://www.linkedin.com/in/load-test-{i % profiles}",
+        "prospect_name": f"Load Test {i % profiles}",
+        "prospect_company": "Acme Corp"
+    }}
+
+
+def _summarize_bio_request(i: int, profiles: int) -> dict:
+    return {"json": {
+        "linkedinUrl": f"https://www.linkedin.com/in/bio-test-{i % profiles}",
+        "prospectName": f"Bio Test {i % profiles}",
+        "prospectCompany": "Acme Corp"
+    }}
+
+
+# name -> (path, request kwargs for the i-th request, upstream path it calls)
+ENDPOINTS = {
+    "generate": ("/api/generate", _generate_request, "/v1/messages"),
+    "generate_stream": ("/api/generate/stream", _generate_request, "/v1/messages"),
+    "enrich": ("/api/enrich", _enrich_request, "/chat/completions"),
+    "summarize_bio": ("/api/summarize-bio", _summarize_bio_request, "/chat/completions")
+}
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _summary(samples: list[float], percentiles: tuple = (50, 95, 99)) -> dict:
+    if not samples:
+        return {}
+    summary = {f"p{pct}": round(_percentile(samples, pct), 3) for pct in percentiles}
+    summary["max"] = round(max(samples), 3)
+    summary["mean"] = round(statistics.mean(samples), 3)
+    return summary
+
+
+def _git_revision() -> dict:
+    """Current commit, and whether the working tree has uncommitted changes"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": False}
+    return {"commit": commit, "dirty": dirty}
+
+
+class AppServer:
+    """
+    The FastAPI app under uvicorn in a background thread, sampling its event-loop lag
+
+    Attributes:
+        base_url: URL the app is listening on
+        lag_samples: (perf_counter time, lag in ms) for each probe tick
+    """
+
+    def __init__(self, app):
+        import uvicorn
+
+        self._sock = socket.socket()
+        self._sock.bind(("127.0.0.1", 0))
+        host, port = self._sock.getsockname()
+        self.base_url = f"http://{host}:{port}"
+        self.lag_samples: list[tuple[float, float]] = []
+        self._server = uvicorn.Server(uvicorn.Config(app, log_level="warning", access_log=False, lifespan="on", ws="none"))
+        self._thread = threading.Thread(target=lambda: asyncio.run(self._serve()), daemon=True)
+
+    async def _probe_lag(self) -> None:
+        while True:
+            expected = time.perf_counter() + LAG_PROBE_INTERVAL
+            await asyncio.sleep(LAG_PROBE_INTERVAL)
+            now = time.perf_counter()
+            self.lag_samples.append((now, max(0.0, now - expected) * 1000))
+
+    async def _serve(self) -> None:
+        probe = asyncio.create_task(self._probe_lag())
+        try:
+            await self._server.serve(sockets=[self._sock])
+        finally:
+            probe.cancel()
+
+    def lag_between(self, start: float, end: float) -> list[float]:
+        return [lag for at, lag in list(self.lag_samples) if start <= at <= end]
+
+    def __enter__(self) -> "AppServer":
+        self._thread.start()
+        deadline = time.monotonic() + 30
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("App server failed to start")
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=30)
+        self._sock.close()
+
+
+@contextlib.contextmanager
+def _app_settings(settings: dict):
+    """Point the app at the stub upstreams for the duration of the block, yielding the FastAPI app"""
+    previous_env = {key: os.environ.get(key) for key in settings}
+    os.environ.update(settings)
+
+    # Imported late so the settings above are read; patched too in case they were imported already
+    from app import enrichment_cache, linkedin_enrichment
+    from app.main import app
+    previous = (enrichment_cache.CACHE_DB, linkedin_enrichment.PERPLEXITY_BASE_URL)
+    enrichment_cache.CACHE_DB = settings["ENRICHMENT_CACHE_DB"]
+    linkedin_enrichment.PERPLEXITY_BASE_URL = settings["PERPLEXITY_BASE_URL"]
+    try:
+        yield app
+    finally:
+        enrichment_cache.CACHE_DB, linkedin_enrichment.PERPLEXITY_BASE_URL = previous
+        for key, value in previous_env.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+async def _send(client: httpx.AsyncClient, path: str, request: dict, scheduled: float) -> tuple[float, str]:
+    """Send one request; returns (ms since its scheduled start, status code or exception name)"""
+    try:
+        async with client.stream("POST", path, **request) as response:
+            await response.aread()
+            status = str(response.status_code)
+    except httpx.HTTPError as e:
+        status = type(e).__name__
+    return (time.perf_counter() - scheduled) * 1000, status
+
+
+async def _drive(base_url: str, name: str, rps: float, duration: float, profiles: int, warmup: int) -> dict:
+    path, make_request, _ = ENDPOINTS[name]
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120.0) as client:
+        for i in range(warmup):
+            await _send(client, path, make_request(-1 - i, profiles), time.perf_counter())
+
+        total = max(1, int(rps * duration))
+        started = time.perf_counter()
+        tasks = []
+        for i in range(total):
+            scheduled = started + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(_send(client, path, make_request(i, profiles), scheduled)))
+        results = await asyncio.gather(*tasks)
+        finished = time.perf_counter()
+
+    latencies = [latency for latency, status in results if status == "200"]
+    errors: dict[str, int] = {}
+    for _, status in results:
+        if status != "200":
+            errors[status] = errors.get(status, 0) + 1
+    return {
+        "path": path,
+        "target_rps": rps,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": errors,
+        "elapsed_seconds": round(finished - started, 3),
+        "throughput_rps": round(len(latencies) / (finished - started), 2),
+        "latency_ms": _summary(latencies),
+        "started": started,
+        "finished": finished
+    }
+
+
+def run_load_test(
+    endpoints: list[str],
+    rps: float = 20.0,
+    duration: float = 5.0,
+    latency: float = 0.0,
+    stream_tps: float = 0.0,
+    profiles: int = 0,
+    warmup: int = 3
+) -> dict:
+    """
+    Run the load test and return the results
+
+    Args:
+        endpoints: Names from ENDPOINTS, driven one after another
+        rps: Requests per second sent to each endpoint
+        duration: Seconds of load per endpoint
+        latency: Seconds the stub upstreams wait before answering
+        stream_tps: Streamed output tokens per second (0 streams as fast as possible)
+        profiles: Distinct LinkedIn profiles to cycle through for enrichment
+            (0: a new profile per request, so every lookup misses the cache)
+        warmup: Requests sent to each endpoint before measuring
+
+    Returns:
+        {"run": {...}, "config": {...}, "endpoints": {name: {...}}}
+    """
+    unknown = [name for name in endpoints if name not in ENDPOINTS]
+    if unknown:
+        raise ValueError(f"Unknown endpoints: {', '.join(unknown)} (expected {', '.join(ENDPOINTS)})")
+    profiles = profiles or max(1, int(rps * duration)) + warmup
+
+    with StubServer(latency=latency) as stub, tempfile.TemporaryDirectory() as tmp:
+        # ~4 characters per token
+        stub.chunk_delay = stub.chunk_size / 4 / stream_tps if stream_tps else 0.0
+        settings = {
+            "ANTHROPIC_API_KEY": "load-test",
+            "ANTHROPIC_BASE_URL": stub.base_url,
+            "PERPLEXITY_API_KEY": "load-test",
+            "PERPLEXITY_BASE_URL": stub.base_url,
+            "ENRICHMENT_CACHE_DB": os.path.join(tmp, "enrichment_cache.db"),
+            "FEEDBACK_DIR": os.path.join(tmp, "feedback"),
+            **{f"{kind}_RATE_LIMIT": "1000000/minute" for kind in ("GENERATE", "ENRICH", "FEEDBACK", "BATCH")}
+        }
+        results = {}
+        # The app prints per request (e.g. summarize-bio bodies); keep that out of the report
+        with _app_settings(settings) as app, AppServer(app) as server, \
+                open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for name in endpoints:
+                print(f"Driving {name} at {rps:g} rps for {duration:g}s...", file=sys.stderr)
+                upstream = ENDPOINTS[name][2]
+                upstream_before = stub.requests[upstream]
+                result = asyncio.run(_drive(server.base_url, name, rps, duration, profiles, warmup))
+                result["loop_lag_ms"] = _summary(server.lag_between(result.pop("started"), result.pop("finished")), (50, 99))
+                result["upstream_requests"] = stub.requests[upstream] - upstream_before
+                results[name] = result
+
+    return {
+        "run": {
+            **_git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform()
+        },
+        "config": {
+            "rps": rps,
+            "duration": duration,
+            "upstream_latency": latency,
+            "stream_tps": stream_tps,
+            "profiles": profiles,
+            "warmup": warmup
+        },
+        "endpoints": results
+    }
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> list[str]:
+    """
+    Regressions of the current run against a baseline
+
+    A regression is a p95 or p99 latency more than `threshold` percent higher,
+    or a throughput more than `threshold` percent lower.
+
+    Returns:
+        Description of each regression, empty if there are none
+    """
+    regressions = []
+    for name, result in current["endpoints"].items():
+        base = baseline.get("endpoints", {}).get(name)
+        if not base or not base.get("latency_ms") or not result.get("latency_ms"):
+            continue
+        for pct in ("p95", "p99"):
+            before, after = base["latency_ms"][pct], result["latency_ms"][pct]
+            if before > 0 and (after - before) / before * 100 > threshold:
+                regressions.append(f"{name} {pct} latency {before:.1f}ms -> {after:.1f}ms (+{(after - before) / before * 100:.0f}%)")
+        before, after = base["throughput_rps"], result["throughput_rps"]
+        if before > 0 and (before - after) / before * 100 > threshold:
+            regressions.append(f"{name} throughput {before:.1f} -> {after:.1f} rps (-{(before - after) / before * 100:.0f}%)")
+    return regressions
+
+
+def _print_report(results: dict, baseline: dict | None) -> None:
+    run = results["run"]
+    print(f"Commit {run['commit']}{' (dirty)' if run['dirty'] else ''}, {results['config']}")
+    print(f"{'endpoint':<16} {'ok/sent':>10} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'lag p99':>9} {'lag max':>9}")
+    for name, result in results["endpoints"].items():
+        latency, lag = result["latency_ms"], result["loop_lag_ms"]
+        print(
+            f"{name:<16} {result['ok']:>4}/{result['requests']:<5} {result['throughput_rps']:>8.1f} "
+            + " ".join(f"{latency.get(key, 0):>7.1f}ms" for key in ("p50", "p95", "p99", "max"))
+            + " " + " ".join(f"{lag.get(key, 0):>7.1f}ms" for key in ("p99", "max"))
+            + (f"  errors: {result['errors']}" if result["errors"] else "")
+        )
+        base = (baseline or {}).get("endpoints", {}).get(name)
+        if base and base.get("latency_ms") and latency:
+            print(
+                f"{'  vs baseline':<16} {'':>10} {result['throughput_rps'] - base['throughput_rps']:>+8.1f} "
+                + " ".join(f"{latency[key] - base['latency_ms'][key]:>+7.1f}ms" for key in ("p50", "p95", "p99", "max"))
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help=f"Comma-separated: {', '.join(ENDPOINTS)}")
+    parser.add_argument("--rps", type=float, default=20.0, help="Requests per second per endpoint")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per endpoint")
+    parser.add_argument("--latency", type=float, default=0.0, help="Stub upstream response delay in seconds")
+    parser.add_argument("--stream-tps", type=float, default=0.0, help="Stub streaming speed in output tokens/second (0: unthrottled)")
+    parser.add_argument("--profiles", type=int, default=0, help="Distinct profiles for enrichment (0: all cache misses)")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured requests per endpoint")
+    parser.add_argument("--output", help=f"Results file (default: {os.path.relpath(RESULTS_DIR)}/bench_load-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Percent change counted as a regression with --compare")
+    args = parser.parse_args()
+
+    try:
+        results = run_load_test(
+            [name.strip() for name in args.endpoints.split(",") if name.strip()],
+            rps=args.rps,
+            duration=args.duration,
+            latency=args.latency,
+            stream_tps=args.stream_tps,
+            profiles=args.profiles,
+            warmup=args.warmup
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    _print_report(results, baseline)
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        run = results["run"]
+        output = os.path.join(RESULTS_DIR, f"bench_load-{run['commit']}{'-dirty' if run['dirty'] else ''}.json")
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if baseline is not None:
+        if baseline.get("config") != results["config"]:
+            print(f"Warning: baseline was run with different settings: {baseline.get('config')}")
+        regressions = compare_results(baseline, results, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of the metrics instrumentation
+
+Times the recording primitives on their own (with metrics on and off), a
+/metrics render, and full generate_outreach_emails calls against the local
+stub server with METRICS_ENABLED on vs off, so the overhead is shown next to
+a request that does no model work.
+
+    python -m benchmarks.bench_metrics --requests 500
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+
+from benchmarks.stub_server import StubServer
+from app import metrics
+from app.metrics import Counter, Histogram, timed, render_metrics
+from app.generator import generate_outreach_emails
+from app.model_client import close_anthropic_client
+
+PROSPECT = {
+    "message_type": "cold_outreach",
+    "prospect_name": "Sarah Chen",
+    "prospect_title": "CTO",
+    "prospect_company": "Acme Corp",
+    "unique_fact": "Led cloud migration",
+    "business_initiative": "Modernization"
+}
+
+
+def _ns_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter_ns() - start) / iterations
+
+
+def _timed_block() -> None:
+    with timed("bench"):
+        pass
+
+
+def _primitives(iterations: int) -> None:
+    counter = Counter("bench_total", "Benchmark counter", ("model", "type"))
+    histogram = Histogram("bench_seconds", "Benchmark histogram", ("stage",))
+    cases = [
+        ("Counter.inc", lambda: counter.inc("model", "input", amount=100)),
+        ("Histogram.observe", lambda: histogram.observe(0.042, "stage")),
+        ("with timed(stage)", _timed_block)
+    ]
+    print(f"{'primitive':<20} {'enabled':>12} {'disabled':>12}")
+    for label, fn in cases:
+        metrics.METRICS_ENABLED = True
+        enabled = _ns_per_call(fn, iterations)
+        metrics.METRICS_ENABLED = False
+        disabled = _ns_per_call(fn, iterations)
+        print(f"{label:<20} {enabled:>10.0f}ns {disabled:>10.0f}ns")
+    metrics.METRICS_ENABLED = True
+
+
+async def _generate_run(total: int) -> list[float]:
+    latencies = []
+    for _ in range(total):
+        start = time.perf_counter()
+        await generate_outreach_emails(**PROSPECT, parallel=False)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+async def _end_to_end(total: int, rounds: int) -> None:
+    # Alternate on/off rounds so drift in the stub or machine affects both equally
+    results = {True: [], False: []}
+    for _ in range(rounds):
+        for enabled in (True, False):
+            metrics.METRICS_ENABLED = enabled
+            results[enabled].extend(await _generate_run(total // rounds))
+    metrics.METRICS_ENABLED = True
+    await close_anthropic_client()
+
+    print(f"\ngenerate_outreach_emails against the stub ({len(results[True])} requests each)")
+    for enabled in (True, False):
+        samples = results[enabled]
+        print(f"  metrics {'on ' if enabled else 'off'}: mean {statistics.mean(samples):.3f}ms, "
+              f"p50 {statistics.median(samples):.3f}ms")
+    delta_us = (statistics.median(results[True]) - statistics.median(results[False])) * 1000
+    print(f"  p50 overhead: {delta_us:.1f}µs per request")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200_000, help="Calls per recording primitive")
+    parser.add_argument("--requests", type=int, default=500, help="Generations per mode")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    _primitives(args.iterations)
+
+    with StubServer() as server:
+        os.environ["ANTHROPIC_API_KEY"] = "bench"
+        os.environ["ANTHROPIC_BASE_URL"] = server.base_url
+        asyncio.run(_end_to_end(args.requests, args.rounds))
+
+    start = time.perf_counter()
+    text = render_metrics()
+    print(f"\nrender /metrics: {(time.perf_counter() - start) * 1000:.2f}ms ({len(text.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Benchmark: stable system prompt assembly with and without precompiled templates
+
+Compares formatting the mega-prompt on every call against the precompiled,
+memoized render_stable_system_prompt, and reports a full build_prompt for scale.
+
+    python -m benchmarks.bench_prompts --duration 1
+"""
+import argparse
+import time
+
+from app.sender_profiles import get_sender_context
+from app.prompts_v2 import build_prompt, get_message_type_context, render_stable_system_prompt, MEGA_PROMPT_SYSTEM
+
+
+def _prompts_per_second(build, duration: float) -> float:
+    count = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < duration:
+        build()
+        count += 1
+    return count / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--message-type", default="executive_alignment")
+    parser.add_argument("--manager", default="Sandeep")
+    parser.add_argument("--duration", type=float, default=1.0, help="Seconds to run each variant")
+    args = parser.parse_args()
+
+    examples, type_instructions = get_message_type_context(args.message_type)
+
+    def format_every_time():
+        return MEGA_PROMPT_SYSTEM.format(
+            manager_name=args.manager,
+            message_type_instructions=type_instructions,
+            examples=examples
+        ) + get_sender_context(args.manager)
+
+    def precompiled():
+        return render_stable_system_prompt(args.message_type, args.manager)
+
+    def full_build():
+        return build_prompt(
+            message_type=args.message_type,
+            prospect_name="Test Person",
+            prospect_title="CTO",
+            prospect_company="Kroger",
+            unique_fact="Test fact",
+            business_initiative="Test initiative",
+            manager_name=args.manager
+        )
+
+    for label, build in [("formatted", format_every_time), ("precompiled", precompiled), ("full build_prompt", full_build)]:
+        print(f"  {label:<18} {_prompts_per_second(build, args.duration):12,.0f} prompts/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Reference regex-based account markdown parser
+
+This is the multi-pass implementation that app.account_knowledge used before
+its compiled parser. It is kept as the oracle the new parser is checked
+against (tests/test_account_knowledge.py) and as the benchmark baseline.
+"""
+import os
+import re
+
+
+def parse_account_markdown(file_path: str) -> dict:
+    """
+    Parse an account markdown file into the dict structure expected by the rest of the app.
+    """
+    with open(file_path, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # Extract company name from H1
+    h1_match = re.search(r'^# (.+)', content, re.MULTILINE)
+    company_name = h1_match.group(1).strip() if h1_match else os.path.splitext(os.path.basename(file_path))[0]
+
+    # Split into ## sections
+    sections: dict[str, str] = {}
+    parts = re.split(r'^## ', content, flags=re.MULTILINE)
+    for part in parts[1:]:  # skip preamble before first ##
+        lines = part.split('\n', 1)
+        header = lines[0].strip()
+        body = lines[1] if len(lines) > 1 else ''
+        sections[header.lower()] = body
+
+    # --- Overview ---
+    industry = ''
+    status = ''
+    aliases: list[str] = []
+    if 'overview' in sections:
+        overview = sections['overview']
+        m = re.search(r'\*\*Industry:\*\*\s*(.+)', overview)
+        if m:
+            industry = m.group(1).strip()
+        m = re.search(r'\*\*Status:\*\*\s*(.+)', overview)
+        if m:
+            status = m.group(1).strip()
+        m = re.search(r'\*\*Aliases:\*\*[ \t]*(.+)', overview)
+        if m:
+            aliases = [a.strip() for a in m.group(1).split(',') if a.strip()]
+
+    # --- Situation ---
+    situation: dict = {"focus": "", "challenges": [], "recent_activity": ""}
+    if 'situation' in sections:
+        sit_text = sections['situation']
+        m = re.search(r'\*\*Focus:\*\*\s*(.+)', sit_text)
+        if m:
+            situation['focus'] = m.group(1).strip()
+        m = re.search(r'\*\*Recent Activity:\*\*\s*(.+)', sit_text)
+        if m:
+            situation['recent_activity'] = m.group(1).strip()
+        # Challenges are bullet points under ### Challenges
+        challenges_match = re.search(r'### Challenges\s*\n((?:- .+\n?)+)', sit_text)
+        if challenges_match:
+            situation['challenges'] = [
+                line.removeprefix('- ').strip()
+                for line in challenges_match.group(1).strip().split('\n')
+                if line.strip().startswith('-')
+            ]
+
+    # --- Key Initiatives ---
+    key_initiatives: list[str] = []
+    if 'key initiatives' in sections:
+        for line in sections['key initiatives'].strip().split('\n'):
+            line = line.strip()
+            if line.startswith('-'):
+                key_initiatives.append(line.removeprefix('- ').strip())
+
+    # --- Positioning ---
+    positioning: dict = {"focus": "", "differentiators": [], "competitive": ""}
+    if 'positioning' in sections:
+        pos_text = sections['positioning']
+        m = re.search(r'\*\*Focus:\*\*\s*(.+)', pos_text)
+        if m:
+            positioning['focus'] = m.group(1).strip()
+        m = re.search(r'\*\*Competitive:\*\*\s*(.+)', pos_text)
+        if m:
+            positioning['competitive'] = m.group(1).strip()
+        diff_match = re.search(r'### Differentiators\s*\n((?:- .+\n?)+)', pos_text)
+        if diff_match:
+            positioning['differentiators'] = [
+                line.removeprefix('- ').strip()
+                for line in diff_match.group(1).strip().split('\n')
+                if line.strip().startswith('-')
+            ]
+
+    # --- Team Contacts ---
+    team_contacts: dict[str, list[str]] = {}
+    if 'team contacts' in sections:
+        for m in re.finditer(r'\*\*(.+?):\*\*\s*(.+)', sections['team contacts']):
+            team_key = m.group(1).strip().lower().replace(' ', '_')
+            contacts = [c.strip() for c in m.group(2).split(',')]
+            team_contacts[team_key] = contacts
+
+    # --- Contact Notes ---
+    contact_notes: dict[str, dict] = {}
+    if 'contact notes' in sections:
+        cn_text = sections['contact notes']
+        # Split by ### sub-headers
+        contact_parts = re.split(r'^### ', cn_text, flags=re.MULTILINE)
+        for cp in contact_parts[1:]:  # skip preamble
+            cp_lines = cp.split('\n', 1)
+            contact_name = cp_lines[0].strip()
+            contact_body = cp_lines[1] if len(cp_lines) > 1 else ''
+            entry: dict[str, str] = {}
+            for field_match in re.finditer(r'\*\*(.+?):\*\*\s*(.+)', contact_body):
+                field_key = field_match.group(1).strip().lower().replace(' ', '_')
+                entry[field_key] = field_match.group(2).strip()
+            if entry:
+                contact_notes[contact_name] = entry
+
+    return {
+        "company_name": company_name,
+        "aliases": aliases,
+        "industry": industry,
+        "status": status,
+        "situation": situation,
+        "team_contacts": team_contacts,
+        "key_initiatives": key_initiatives,
+        "positioning": positioning,
+        "contact_notes": contact_notes
+    }
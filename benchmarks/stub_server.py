@@ -0,0 +1,346 @@
+"""
+Local stub HTTP server impersonating the upstream Anthropic and Perplexity APIs
+
+Supports plain and streamed (server-sent events) Anthropic Messages API
+responses, the Message Batches API (create, retrieve and JSONL results), and
+Perplexity's OpenAI-compatible /chat/completions.
+
+Used by benchmarks and tests to exercise the real client code paths without
+network access. Point a client at `server.base_url`.
+"""
+import itertools
+import json
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+ANGLES = [
+    "Strategy & Digital Leadership",
+    "Technology Modernization",
+    "Financial Efficiency",
+    "Customer Value & Growth",
+    "Competitive Advantage"
+]
+
+DEFAULT_ENRICHMENT = {
+    "unique_fact": "Stub Person led a platform migration that was named a finalist for an industry award",
+    "business_initiative": "Modernizing legacy systems at Stub Corp",
+    "linkedin_insight": "Engineering leader at Stub Corp"
+}
+
+DEFAULT_TEMPLATES = {
+    "templates": [
+        {
+            "angle": angle,
+            "subject": f"Stub Subject {i + 1}",
+            "body": f"Hi there,\n\nStub body for {angle}.\n\nBest,\nStub"
+        }
+        for i, angle in enumerate(ANGLES)
+    ]
+}
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response (a timed-out or hedged attempt) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        with self.server.stub.lock:
+            self.server.stub.connections += 1
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark and test output clean
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def _send_json(self, payload: dict, status: int = 200, headers: dict | None = None) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, events) -> None:
+        """Send server-sent events using chunked transfer encoding"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event_type, payload, delay in events:
+            if delay:
+                time.sleep(delay)
+            data = f"event: {event_type}\ndata: {json.dumps(payload)}\n\n".encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_jsonl(self, lines: list[dict]) -> None:
+        data = "".join(json.dumps(line) + "\n" for line in lines).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/binary")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        stub = self.server.stub
+        with stub.lock:
+            stub.requests[self.path] += 1
+        if stub.error_status:
+            self._send_json({"error": {"type": "api_error", "message": "stub failure"}}, status=stub.error_status)
+            return
+
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        batch_id = parts[4] if len(parts) > 4 and parts[1:4] == ["v1", "messages", "batches"] else None
+        with stub.lock:
+            batch = stub.batches.get(batch_id)
+        if batch is None:
+            self._send_json({"error": {"type": "not_found_error", "message": self.path}}, status=404)
+        elif len(parts) == 5:
+            self._send_json(stub.batch_payload(batch))
+        elif parts[5:] == ["results"] and stub.batch_ended(batch):
+            self._send_jsonl(stub.batch_results(batch))
+        else:
+            self._send_json({"error": {"type": "not_found_error", "message": self.path}}, status=404)
+
+    def do_POST(self):
+        stub = self.server.stub
+        body = self._read_json()
+        with stub.lock:
+            stub.requests[self.path] += 1
+            stub.bodies.append((self.path, body))
+            fault = stub.faults.pop(0) if stub.faults and self.path.endswith("/v1/messages") else None
+        if stub.latency:
+            time.sleep(stub.latency)
+        if isinstance(fault, float):
+            time.sleep(fault)
+            fault = None
+
+        if stub.error_status:
+            self._send_json({"error": {"type": "api_error", "message": "stub failure"}}, status=stub.error_status)
+        elif fault is not None:
+            error_type = {429: "rate_limit_error", 529: "overloaded_error"}.get(fault, "api_error")
+            self._send_json(
+                {"type": "error", "error": {"type": error_type, "message": f"stub fault {fault}"}},
+                status=fault,
+                headers={"retry-after": f"{stub.retry_after:g}"} if fault == 429 else None
+            )
+        elif self.path.endswith("/v1/messages/batches"):
+            self._send_json(stub.batch_payload(stub.create_batch(body)))
+        elif self.path.endswith("/v1/messages") and body.get("stream"):
+            self._send_stream(stub.stream_events(body))
+        elif self.path.endswith("/v1/messages"):
+            self._send_json(stub.message_payload(body))
+        elif self.path.endswith("/chat/completions"):
+            self._send_json(stub.chat_completion_payload(body))
+        else:
+            self._send_json({"error": {"type": "not_found_error", "message": self.path}}, status=404)
+
+
+class StubServer:
+    """
+    Threaded local HTTP server with configurable latency
+
+    Attributes:
+        latency: Seconds to sleep before answering each request
+        response_text: Assistant text returned by /v1/messages
+        enrichment_text: Assistant text returned by /chat/completions
+        chunk_size: Characters per text delta when streaming
+        chunk_delay: Seconds between text deltas when streaming
+        error_status: If set, every request fails with this HTTP status
+        faults: Faults for upcoming /v1/messages requests, one per request in
+            order: an int is an HTTP status to fail with, a float is seconds to
+            stall before answering normally
+        retry_after: Retry-After seconds sent with 429 faults
+        batch_processing_time: Seconds a Message Batch stays in progress
+        batch_errored_ids: custom_ids whose batch result is "errored"
+        batches: Message Batches created, by id
+        requests: Counter of requests per path
+        connections: Number of TCP connections accepted
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        response_text: str | None = None,
+        chunk_size: int = 16,
+        chunk_delay: float = 0.0,
+        enrichment_text: str | None = None
+    ):
+        self.latency = latency
+        self.response_text = response_text if response_text is not None else json.dumps(DEFAULT_TEMPLATES)
+        self.enrichment_text = enrichment_text if enrichment_text is not None else json.dumps(DEFAULT_ENRICHMENT)
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.error_status: int | None = None
+        self.faults: list[int | float] = []
+        self.retry_after = 0.05
+        self.batch_processing_time = 0.0
+        self.batch_errored_ids: set[str] = set()
+        self.batches: dict[str, dict] = {}
+        self._batch_ids = itertools.count(1)
+        self.requests: Counter = Counter()
+        self.bodies: list[tuple[str, dict]] = []
+        self.cached_prefixes: set[str] = set()
+        self.connections = 0
+        self.lock = threading.Lock()
+        self._httpd: _StubHTTPServer | None = None
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _usage(self, body: dict) -> dict:
+        """Token usage for a request, simulating prompt caching of cache_control prefixes"""
+        usage = {"input_tokens": len(json.dumps(body)) // 4, "output_tokens": len(self.response_text) // 4}
+        system = body.get("system")
+        if isinstance(system, list):
+            marked = [i for i, block in enumerate(system) if block.get("cache_control")]
+            if marked:
+                prefix = json.dumps(system[:marked[-1] + 1])
+                prefix_tokens = len(prefix) // 4
+                with self.lock:
+                    cached = prefix in self.cached_prefixes
+                    self.cached_prefixes.add(prefix)
+                usage["input_tokens"] -= prefix_tokens
+                usage["cache_read_input_tokens" if cached else "cache_creation_input_tokens"] = prefix_tokens
+        return usage
+
+    def message_payload(self, body: dict) -> dict:
+        """Build an Anthropic Messages API response for a request body"""
+        return {
+            "id": "msg_stub",
+            "type": "message",
+            "role": "assistant",
+            "model": body.get("model", "stub-model"),
+            "content": [{"type": "text", "text": self.response_text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": self._usage(body)
+        }
+
+    def chat_completion_payload(self, body: dict) -> dict:
+        """Build an OpenAI-compatible chat completion response (Perplexity)"""
+        return {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "sonar-pro"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": self.enrichment_text}
+            }],
+            "usage": {"prompt_tokens": len(json.dumps(body)) // 4, "completion_tokens": len(self.enrichment_text) // 4, "total_tokens": 0}
+        }
+
+    def stream_events(self, body: dict):
+        """Yield (event_type, payload, delay) tuples for a streamed Messages API response"""
+        message = self.message_payload(body)
+        usage = message.pop("usage")
+        message["content"] = []
+        message["stop_reason"] = None
+        message["usage"] = dict(usage, output_tokens=0)
+        yield "message_start", {"type": "message_start", "message": message}, 0
+        yield "content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}}, 0
+        text = self.response_text
+        for i in range(0, len(text), self.chunk_size):
+            delta = {"type": "text_delta", "text": text[i:i + self.chunk_size]}
+            yield "content_block_delta", {"type": "content_block_delta", "index": 0, "delta": delta}, self.chunk_delay
+        yield "content_block_stop", {"type": "content_block_stop", "index": 0}, 0
+        yield "message_delta", {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+            "usage": {"output_tokens": usage["output_tokens"]}
+        }, 0
+        yield "message_stop", {"type": "message_stop"}, 0
+
+    def create_batch(self, body: dict) -> dict:
+        """Record a Message Batches submission"""
+        with self.lock:
+            batch = {
+                "id": f"msgbatch_stub_{next(self._batch_ids)}",
+                "created_at": datetime.now(timezone.utc),
+                "requests": body.get("requests", [])
+            }
+            self.batches[batch["id"]] = batch
+        return batch
+
+    def batch_ended(self, batch: dict) -> bool:
+        return datetime.now(timezone.utc) >= batch["created_at"] + timedelta(seconds=self.batch_processing_time)
+
+    def batch_payload(self, batch: dict) -> dict:
+        """Build a Message Batches API batch object"""
+        ended = self.batch_ended(batch)
+        total = len(batch["requests"])
+        errored = sum(request["custom_id"] in self.batch_errored_ids for request in batch["requests"]) if ended else 0
+        created_at = batch["created_at"]
+        return {
+            "id": batch["id"],
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": {
+                "processing": 0 if ended else total,
+                "succeeded": total - errored if ended else 0,
+                "errored": errored,
+                "canceled": 0,
+                "expired": 0
+            },
+            "created_at": created_at.isoformat(),
+            "expires_at": (created_at + timedelta(days=1)).isoformat(),
+            "ended_at": (created_at + timedelta(seconds=self.batch_processing_time)).isoformat() if ended else None,
+            "archived_at": None,
+            "cancel_initiated_at": None,
+            "results_url": f"{self.base_url}/v1/messages/batches/{batch['id']}/results" if ended else None
+        }
+
+    def batch_results(self, batch: dict) -> list[dict]:
+        """One result line per request in a finished batch, in reverse order (order isn't guaranteed)"""
+        results = []
+        for request in reversed(batch["requests"]):
+            if request["custom_id"] in self.batch_errored_ids:
+                result = {"type": "errored", "error": {"type": "error", "error": {"type": "invalid_request_error", "message": "stub batch error"}}}
+            else:
+                result = {"type": "succeeded", "message": self.message_payload(request["params"])}
+            results.append({"custom_id": request["custom_id"], "result": result})
+        return results
+
+    def start(self) -> "StubServer":
+        self._httpd = _StubHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self._httpd.stub = self
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
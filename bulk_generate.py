@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Generate outreach templates for a prospect list through the Message Batches API
+
+Half the cost of interactive generation, with results within 24 hours, for
+overnight campaign runs:
+
+    python bulk_generate.py prospects.csv --job nightly-1017 --output results.jsonl
+
+Job state is kept in BULK_JOBS_DB, so after a restart the same command (the
+input file may be omitted) resumes polling instead of resubmitting. Results
+are written as JSONL in input order, in the same shape as batch_generate.py.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+# Load .env before the app modules read their settings
+load_dotenv()
+
+from app.batch import parse_batch_rows
+from app.bulk import create_job, job_status, requeue_failed, run_job, iter_results
+from app.model_client import close_anthropic_client
+
+
+def _progress(status: dict) -> None:
+    rows = ", ".join(f"{count} {state}" for state, count in sorted(status["rows"].items()))
+    print(f"[{status['job_id']}] rows: {rows}", file=sys.stderr)
+
+
+async def run(args: argparse.Namespace) -> dict:
+    try:
+        return await run_job(args.job, args.poll_interval, on_poll=_progress)
+    finally:
+        await close_anthropic_client()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", nargs="?", help="CSV or JSONL prospect list (only needed to create the job)")
+    parser.add_argument("--job", required=True, help="Job id to create or resume")
+    parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (defaults from the file extension)")
+    parser.add_argument("--model", help="Model override")
+    parser.add_argument("--output", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("--poll-interval", type=float, help="Seconds between status polls (default: BULK_POLL_INTERVAL)")
+    parser.add_argument("--retry-failed", action="store_true", help="Resubmit rows that errored, expired or were canceled")
+    parser.add_argument("--status", action="store_true", help="Print the job status and exit")
+    args = parser.parse_args()
+
+    status = job_status(args.job)
+    if args.status:
+        if status is None:
+            parser.error(f"Unknown job: {args.job}")
+        print(json.dumps(status, indent=2))
+        return
+
+    if status is None:
+        if not args.input:
+            parser.error(f"Unknown job {args.job}: pass the prospect list to create it")
+        if not os.path.exists(args.input):
+            parser.error(f"{args.input} not found")
+        fmt = args.format or ("csv" if args.input.lower().endswith(".csv") else "jsonl")
+        try:
+            with open(args.input, encoding='utf-8-sig') as f:
+                rows = parse_batch_rows(f.read(), fmt)
+        except ValueError as e:
+            parser.error(str(e))
+        create_job(rows, args.job, args.model)
+        print(f"Created job {args.job} with {len(rows)} rows", file=sys.stderr)
+    else:
+        print(f"Resuming job {args.job}", file=sys.stderr)
+    if args.retry_failed:
+        print(f"Requeued {requeue_failed(args.job)} failed rows", file=sys.stderr)
+
+    final = asyncio.run(run(args))
+
+    out = open(args.output, 'w', encoding='utf-8') if args.output else sys.stdout
+    try:
+        for result in iter_results(args.job):
+            out.write(json.dumps(result) + "\n")
+    finally:
+        if args.output:
+            out.close()
+    failed = sum(count for state, count in final["rows"].items() if state != "succeeded")
+    print(f"Job {args.job} ended: {final['rows'].get('succeeded', 0)} succeeded, {failed} failed", file=sys.stderr)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,7 @@
 """
 Test script to demonstrate account knowledge integration
 """
-from app.prompts_v2 import build_prompt
+from app.prompts_v2 import build_prompt, system_prompt_text
 from app.account_knowledge import get_account_context, format_account_context_for_prompt
 
 print("=" * 80)
@@ -29,7 +29,7 @@ print(lakshmi_context)
 # Test 3: Build prompt with account knowledge
 print("\n3. Prompt with Account Knowledge (Lakshmi at BMO):")
 print("-" * 80)
-system_prompt, user_prompt = build_prompt(
+system_blocks, user_prompt = build_prompt(
     message_type="executive_alignment",
     prospect_name="Lakshmi",
     prospect_title="SVP Engineering",
@@ -39,6 +39,8 @@ system_prompt, user_prompt = build_prompt(
     manager_name="Sandeep"
 )
 
+system_prompt = system_prompt_text(system_blocks)
+
 # Show account knowledge section
 if "[ACCOUNT KNOWLEDGE]" in system_prompt:
     start = system_prompt.find("[ACCOUNT KNOWLEDGE]")
@@ -52,7 +54,7 @@ else:
 # Test 4: Build prompt without account knowledge (unknown company)
 print("\n4. Prompt without Account Knowledge (Unknown Company):")
 print("-" * 80)
-system_prompt2, _ = build_prompt(
+system_blocks2, _ = build_prompt(
     message_type="cold_outreach",
     prospect_name="John Doe",
     prospect_title="CTO",
@@ -62,7 +64,7 @@ system_prompt2, _ = build_prompt(
     manager_name="Jake"
 )
 
-if "[ACCOUNT KNOWLEDGE]" in system_prompt2:
+if "[ACCOUNT KNOWLEDGE]" in system_prompt_text(system_blocks2):
     print("❌ Should not have account knowledge for unknown company!")
 else:
     print("✅ No account knowledge injected (as expected)")
@@ -0,0 +1,456 @@
+"""
+Test account knowledge parsing and company-name resolution
+"""
+import glob
+import json
+import os
+import random
+import time
+from pathlib import Path
+import pytest
+from benchmarks.legacy_account_parser import parse_account_markdown as legacy_parse_account_markdown
+from app import account_knowledge
+from app.account_knowledge import (
+    get_account_context,
+    get_contact_context,
+    find_contact_candidates,
+    format_account_context_for_prompt,
+    list_known_accounts,
+    rescan_accounts,
+    _normalize_company,
+    _parse_account_markdown
+)
+
+REPO_ACCOUNT_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), '..', 'accounts', '*.md')))
+
+# Lines (including malformed ones) that random account files are assembled from
+FUZZ_LINES = [
+    "# Acme", "# ", "#  ", "## Overview", "## Situation", "## Positioning", "## Key Initiatives", "## Team Contacts",
+    "## Contact Notes", "## ", "### Challenges", "### Challenges  ", "#### Challenges", "### Differentiators", "### Jane Doe",
+    "### ", "- item", "- ", "-   ", "-x", "  - indented", "---", "- **Industry:** Retail", "**Industry:**", "**Industry:**   ",
+    "**Status:** Active **Industry:** X", "**Focus:** f", "**Focus:**", "**Recent Activity:** r", "**Competitive:** c",
+    "**Aliases:** A, B", "**Aliases:**", "**Aliases:**  ", "**Architecture:** Bob, Alice", "**Data Team:**", "**a:**:** x",
+    "***Title:** T", "**Notes:** n", "**:** x", "** x:** y", "**Title:** CTO **Notes:** x", "", " ", "\t", "text"
+]
+
+
+def _write_account(accounts_dir, filename: str, company_name: str, extra_overview: str = "", contacts: str = "") -> None:
+    (accounts_dir / filename).write_text(
+        f"# {company_name}\n\n"
+        f"## Overview\n- **Industry:** Retail\n- **Status:** Active\n{extra_overview}\n"
+        f"## Situation\n- **Focus:** Focus for {company_name}\n- **Recent Activity:** Activity\n\n"
+        f"## Key Initiatives\n- Initiative for {company_name}\n\n"
+        f"## Contact Notes\n{contacts}",
+        encoding="utf-8"
+    )
+
+
+@pytest.fixture
+def accounts_dir(tmp_path, tmp_path_factory, monkeypatch):
+    """Point account knowledge at a temporary accounts/ directory, with its snapshot in a separate cache directory"""
+    monkeypatch.setattr(account_knowledge, "ACCOUNTS_DIR", str(tmp_path))
+    snapshot_file = tmp_path_factory.mktemp("cache") / "account_snapshot.json"
+    monkeypatch.setattr(account_knowledge, "ACCOUNT_SNAPSHOT_FILE", str(snapshot_file))
+    monkeypatch.setattr(account_knowledge, "ACCOUNT_WATCH_MODE", "off")
+    monkeypatch.setattr(account_knowledge, "_snapshot", None)
+    _write_account(tmp_path, "Kroger.md", "Kroger")
+    _write_account(tmp_path, "Colgate-Palmolive.md", "Colgate-Palmolive")
+    _write_account(tmp_path, "Macys.md", "Macy's")
+    _write_account(
+        tmp_path, "BMO.md", "BMO",
+        extra_overview="- **Aliases:** Bank of Montreal, BMO Financial Group\n",
+        contacts="### Lakshmi\n- **Title:** SVP Engineering\n- **Notes:** Met at summit\n"
+    )
+    (tmp_path / "TEMPLATE.md").write_text("# [Company Name]\n", encoding="utf-8")
+    yield tmp_path
+    account_knowledge.stop_account_watcher()
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    """Record the paths of account files as they are parsed"""
+    calls = []
+    parse = account_knowledge._parse_account_markdown
+    monkeypatch.setattr(
+        account_knowledge, "_parse_account_markdown",
+        lambda path, content=None: calls.append(os.path.basename(path)) or parse(path, content)
+    )
+    return calls
+
+
+def _wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_normalize_company():
+    """Test punctuation, leading 'The' and legal suffixes are normalized away"""
+    assert _normalize_company("The Kroger Co.") == "KROGER"
+    assert _normalize_company("Macy's, Inc.") == "MACYS"
+    assert _normalize_company("Colgate-Palmolive Company") == "COLGATE PALMOLIVE"
+    # A bare suffix word is still a name
+    assert _normalize_company("Group") == "GROUP"
+    assert _normalize_company("Nestlé SA") == _normalize_company("NESTLÉ") == _normalize_company("Nestle") == "NESTLE"
+
+
+@pytest.mark.parametrize("query,expected", [
+    ("Kroger", "Kroger"),
+    ("kroger", "Kroger"),
+    ("The Kroger Co.", "Kroger"),
+    ("Macys Inc", "Macy's"),
+    ("ColgatePalmolive", "Colgate-Palmolive"),
+    ("Colgate", "Colgate-Palmolive"),
+    ("Colgate Palm", "Colgate-Palmolive"),
+    ("Macy", "Macy's"),
+    ("Bank of Montreal", "BMO"),
+    ("BMO Financial", "BMO"),
+    ("BMO Capital Markets", "BMO")
+])
+def test_get_account_context_resolves_variants(accounts_dir, query, expected):
+    """Test exact, alias, suffix-stripped, contained and prefix names all resolve"""
+    assert get_account_context(query)["company_name"] == expected
+
+
+@pytest.mark.parametrize("query", ["Nestle", "NESTLÉ", "Nestlé S.A.", "nestlé"])
+def test_get_account_context_folds_accents(accounts_dir, query):
+    """Test accented and unaccented spellings resolve to the same account"""
+    _write_account(accounts_dir, "Nestle.md", "Nestlé")
+    account_knowledge.rescan_accounts()
+    assert get_account_context(query)["company_name"] == "Nestlé"
+
+
+@pytest.mark.parametrize("query", ["Unknown Corp", "Ko", "", "Montrealer Bank", "Palmolive", "Colg"])
+def test_get_account_context_unknown(accounts_dir, query):
+    """Test unrelated or too-short names don't resolve"""
+    assert get_account_context(query) is None
+
+
+@pytest.mark.parametrize("query", ["Bell", "Hut", "Pizza", "Taco", "Kim", "Clark"])
+def test_common_words_dont_resolve_by_prefix(accounts_dir, query):
+    """Test a word that merely starts or ends an account's name or alias isn't taken as that account"""
+    _write_account(accounts_dir, "YumBrands.md", "Yum! Brands", extra_overview="- **Aliases:** Yum Brands, KFC, Taco Bell, Pizza Hut\n")
+    _write_account(accounts_dir, "Kimberly-Clark.md", "Kimberly-Clark")
+    account_knowledge.rescan_accounts()
+
+    assert get_account_context(query) is None
+    assert get_account_context("Pizza Hut")["company_name"] == "Yum! Brands"
+    assert get_account_context("Kimberly")["company_name"] == "Kimberly-Clark"
+
+
+def test_ambiguous_prefix_doesnt_resolve(accounts_dir):
+    """Test a prefix shared by two accounts' names resolves to neither"""
+    _write_account(accounts_dir, "Kroger-Health.md", "Krogerhealth Labs")
+    account_knowledge.rescan_accounts()
+
+    assert get_account_context("Kroge") is None
+    assert get_account_context("Krogerhealth")["company_name"] == "Krogerhealth Labs"
+
+
+def test_aliases_parsed(accounts_dir):
+    """Test the Aliases overview field is parsed into a list"""
+    assert get_account_context("BMO")["aliases"] == ["Bank of Montreal", "BMO Financial Group"]
+    assert get_account_context("Kroger")["aliases"] == []
+    assert sorted(list_known_accounts()) == ["BMO", "COLGATE-PALMOLIVE", "KROGER", "MACY'S"]
+
+
+def test_format_context_resolves_account_once(accounts_dir, monkeypatch):
+    """Test formatting the prompt context resolves the company a single time"""
+    calls = []
+    resolve = account_knowledge._resolve_account_key
+    monkeypatch.setattr(account_knowledge, "_resolve_account_key", lambda index, name: calls.append(name) or resolve(index, name))
+
+    context = format_account_context_for_prompt("Bank of Montreal", "Lakshmi Rao")
+
+    assert calls == ["Bank of Montreal"]
+    assert "Focus for BMO" in context
+    assert "- Title: SVP Engineering" in context
+    assert get_contact_context("Lakshmi", "BMO")["notes"] == "Met at summit"
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("Lakshmi", ("LAKSHMI", "LAKSHMI")),
+    ("Sarah  Chen", ("SARAH CHEN", "SARAH")),
+    ("Dr. Robert J. Smith Jr.", ("ROBERT SMITH", "ROBERT")),
+    ("bob smith", ("ROBERT SMITH", "ROBERT")),
+    ("José-Luis Pérez", ("JOSE PEREZ", "JOSE")),
+    ("Seán O’Brien", ("SEAN OBRIEN", "SEAN")),
+    ("Dr.", ("DR", "DR")),
+    (" - ", ("", ""))
+])
+def test_person_name_keys(name, expected):
+    assert account_knowledge._person_name_keys(name) == expected
+
+
+@pytest.fixture
+def contacts_dir(accounts_dir):
+    """Accounts with contacts sharing first names, within and across accounts"""
+    contact = lambda name, title: f"### {name}\n- **Title:** {title}\n- **Notes:** Notes on {name}\n\n"
+    _write_account(
+        accounts_dir, "Kroger.md", "Kroger",
+        contacts=contact("Sarah Chen", "CIO") + contact("Sarah Lee", "CTO") + contact("Robert Smith", "VP Data")
+        + contact("José Pérez", "CDO")
+    )
+    _write_account(accounts_dir, "Macys.md", "Macy's", contacts=contact("Sarah Chen", "Director"))
+    rescan_accounts()
+    return accounts_dir
+
+
+@pytest.mark.parametrize("prospect, expected_title", [
+    ("Sarah Lee", "CTO"),
+    ("sarah chen", "CIO"),
+    ("Sarah", None),  # Two Sarahs at Kroger
+    ("Sarah Kim", None),
+    ("Bob Smith", "VP Data"),
+    ("Robert A. Smith", "VP Data"),
+    ("Jose Perez", "CDO"),
+    ("Lakshmi", None),  # At BMO
+    ("", None)
+])
+def test_get_contact_context(contacts_dir, prospect, expected_title):
+    contact = get_contact_context(prospect, "Kroger Co")
+    assert (contact["title"] if contact else None) == expected_title
+
+
+def test_get_contact_context_first_name_heading(contacts_dir):
+    """Test a contact listed by first name only matches the prospect's full name"""
+    assert get_contact_context("Lakshmi Rao", "BMO")["title"] == "SVP Engineering"
+    assert get_contact_context("Lakshmi", "Unknown Co") is None
+
+
+def test_find_contact_candidates_ranked(contacts_dir):
+    """Test candidates from the given company rank first, full name matches ahead of first-name ones"""
+    ranked = lambda *args: [(c["company_name"], c["contact_name"], c["match"]) for c in find_contact_candidates(*args)]
+
+    assert ranked("Sarah Chen", "Macys") == [("Macy's", "Sarah Chen", "full_name"), ("Kroger", "Sarah Chen", "full_name")]
+    assert ranked("Sarah", "Kroger") == [
+        ("Kroger", "Sarah Chen", "first_name"), ("Kroger", "Sarah Lee", "first_name"), ("Macy's", "Sarah Chen", "first_name")
+    ]
+    assert ranked("Lakshmi Rao") == [("BMO", "Lakshmi", "first_name")]
+    assert find_contact_candidates("Sarah Lee")[0]["contact"]["title"] == "CTO"
+    assert ranked("Nobody Here") == []
+
+
+def test_contact_lookups_use_the_index(contacts_dir, monkeypatch):
+    """Test contact lookups don't scan every account's contact notes"""
+    loaded = []
+    monkeypatch.setattr(
+        account_knowledge._AccountsView, "__iter__", lambda self: pytest.fail("accounts scanned")
+    )
+    monkeypatch.setattr(
+        account_knowledge._AccountsView, "__getitem__", lambda self, key: loaded.append(key) or self._parsed[key].account
+    )
+
+    assert get_contact_context("Bob Smith", "Kroger")["title"] == "VP Data"
+    assert find_contact_candidates("Lakshmi")[0]["company_name"] == "BMO"
+    assert set(loaded) == {"KROGER", "BMO"}
+
+
+def test_index_rebuilt_when_accounts_change(accounts_dir):
+    """Test a new account file (and alias) is picked up by the index"""
+    assert get_account_context("Sysco") is None
+
+    _write_account(accounts_dir, "Sysco.md", "Sysco", extra_overview="- **Aliases:** Sysco Foods\n")
+    assert rescan_accounts() == [str(accounts_dir / "Sysco.md")]
+
+    assert get_account_context("Sysco Foods")["company_name"] == "Sysco"
+
+
+def test_lookups_make_no_filesystem_calls(accounts_dir, monkeypatch):
+    """Test lookups read the in-memory snapshot once it is loaded"""
+    list_known_accounts()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("filesystem access on the request path")
+
+    for name in ["stat", "scandir", "listdir"]:
+        monkeypatch.setattr(os, name, fail)
+    monkeypatch.setattr(os.path, "getmtime", fail)
+    monkeypatch.setattr(os.path, "isdir", fail)
+
+    assert "Focus for BMO" in format_account_context_for_prompt("BMO", "Lakshmi")
+
+
+def test_rescan_reparses_only_the_edited_file(accounts_dir, parse_calls):
+    """Test editing one account reparses just that file and removals drop the account"""
+    list_known_accounts()
+    assert sorted(parse_calls) == ["BMO.md", "Colgate-Palmolive.md", "Kroger.md", "Macys.md"]
+    before = account_knowledge._snapshot
+    parse_calls.clear()
+
+    assert rescan_accounts() == []
+    assert account_knowledge._snapshot is before
+
+    _write_account(accounts_dir, "Kroger.md", "Kroger", extra_overview="- **Aliases:** Ralphs\n")
+    rescan_accounts()
+    assert parse_calls == ["Kroger.md"]
+    assert get_account_context("Ralphs")["company_name"] == "Kroger"
+    # Unchanged accounts are shared with the previous snapshot, which is left intact
+    assert get_account_context("BMO") is before["accounts"]["BMO"]
+    assert "RALPHS" not in before["names"]
+
+    os.remove(accounts_dir / "Macys.md")
+    rescan_accounts()
+    assert get_account_context("Macys") is None
+    assert parse_calls == ["Kroger.md"]
+
+
+@pytest.mark.parametrize("mode", ["poll", "inotify"])
+def test_watcher_reparses_only_the_edited_file(accounts_dir, parse_calls, monkeypatch, mode):
+    """Test the background watcher picks up an edit and reparses only that file"""
+    if mode == "inotify":
+        pytest.importorskip("watchfiles")
+    monkeypatch.setattr(account_knowledge, "ACCOUNT_WATCH_MODE", mode)
+    monkeypatch.setattr(account_knowledge, "ACCOUNT_POLL_INTERVAL", 0.05)
+    list_known_accounts()
+    assert account_knowledge._watcher.is_alive()
+    parse_calls.clear()
+    time.sleep(0.2)  # Let the watcher start
+
+    _write_account(accounts_dir, "Colgate-Palmolive.md", "Colgate-Palmolive", extra_overview="- **Aliases:** Hill's Pet\n")
+
+    assert _wait_for(lambda: get_account_context("Hills Pet") is not None)
+    assert parse_calls == ["Colgate-Palmolive.md"]
+
+
+def _restart(monkeypatch) -> None:
+    """Drop the in-memory snapshot, as in a freshly started worker"""
+    monkeypatch.setattr(account_knowledge, "_snapshot", None)
+    monkeypatch.setattr(account_knowledge, "_file_accounts", {})
+
+
+def test_persisted_snapshot_skips_parsing_on_restart(accounts_dir, parse_calls, monkeypatch):
+    """Test a restart loads unchanged accounts from the persisted snapshot"""
+    before = dict(account_knowledge._get_accounts())
+    assert len(parse_calls) == 4
+    assert os.path.exists(account_knowledge.ACCOUNT_SNAPSHOT_FILE)
+    parse_calls.clear()
+
+    _restart(monkeypatch)
+    assert dict(account_knowledge._get_accounts()) == before
+    assert parse_calls == []
+
+
+def test_persisted_snapshot_loads_lazily(accounts_dir, monkeypatch):
+    """Test a restart reuses the persisted index and decodes only the accounts looked up"""
+    list_known_accounts()
+    _restart(monkeypatch)
+    monkeypatch.setattr(account_knowledge, "_build_account_index", lambda names_by_key: pytest.fail("index rebuilt"))
+
+    assert get_account_context("Bank of Montreal")["company_name"] == "BMO"
+    loaded = [
+        parsed.company_name for _, _, parsed in account_knowledge._file_accounts.values()
+        if parsed is not None and parsed._account is not None
+    ]
+    assert loaded == ["BMO"]
+
+
+def test_persisted_snapshot_invalidated_per_file_by_content(accounts_dir, parse_calls, monkeypatch):
+    """Test only files whose content changed are reparsed after a restart"""
+    list_known_accounts()
+    parse_calls.clear()
+
+    _write_account(accounts_dir, "Kroger.md", "Kroger", extra_overview="- **Aliases:** Ralphs\n")
+    os.utime(accounts_dir / "BMO.md", ns=(0, 0))  # Touched, content unchanged
+    os.remove(accounts_dir / "Macys.md")
+    _restart(monkeypatch)
+
+    assert get_account_context("Ralphs")["company_name"] == "Kroger"
+    assert get_account_context("Macys") is None
+    assert parse_calls == ["Kroger.md"]
+
+    # The rewritten snapshot reflects the change
+    parse_calls.clear()
+    _restart(monkeypatch)
+    assert get_account_context("Ralphs")["company_name"] == "Kroger"
+    assert parse_calls == []
+
+
+def test_touched_file_is_not_reparsed_by_rescan(accounts_dir, parse_calls):
+    """Test a modification time change alone doesn't trigger a reparse"""
+    list_known_accounts()
+    parse_calls.clear()
+    before = account_knowledge._snapshot
+
+    os.utime(accounts_dir / "BMO.md", ns=(0, 0))
+
+    assert rescan_accounts() == []
+    assert parse_calls == []
+    assert account_knowledge._snapshot is before
+
+
+@pytest.mark.parametrize("contents", [b"not json", b"\x80\x04K\x01.", None])
+def test_unusable_persisted_snapshot_is_rebuilt(accounts_dir, parse_calls, monkeypatch, contents):
+    """Test a corrupt or outdated snapshot file is ignored and replaced"""
+    snapshot_file = Path(account_knowledge.ACCOUNT_SNAPSHOT_FILE)
+    if contents is None:
+        list_known_accounts()
+        _restart(monkeypatch)
+        monkeypatch.setattr(account_knowledge, "SNAPSHOT_VERSION", account_knowledge.SNAPSHOT_VERSION + 1)
+    else:
+        snapshot_file.write_bytes(contents)
+    parse_calls.clear()
+
+    assert get_account_context("BMO")["company_name"] == "BMO"
+    assert len(parse_calls) == 4
+
+    parse_calls.clear()
+    _restart(monkeypatch)
+    list_known_accounts()
+    assert parse_calls == []
+
+
+def test_snapshot_persistence_can_be_disabled(accounts_dir, monkeypatch):
+    """Test an empty ACCOUNT_SNAPSHOT_FILE writes nothing"""
+    monkeypatch.setattr(account_knowledge, "ACCOUNT_SNAPSHOT_FILE", "")
+
+    assert get_account_context("BMO") is not None
+    assert not list(accounts_dir.glob(".account_snapshot*"))
+    assert not list(accounts_dir.glob("account_snapshot*"))
+
+
+def test_snapshot_is_plain_json_outside_accounts_dir(accounts_dir):
+    """Test the snapshot is written as JSON next to the other caches, not into the content tree"""
+    list_known_accounts()
+
+    assert os.path.dirname(account_knowledge.ACCOUNT_SNAPSHOT_FILE) != str(accounts_dir)
+    with open(account_knowledge.ACCOUNT_SNAPSHOT_FILE, encoding="utf-8") as f:
+        persisted = json.load(f)
+    assert persisted["dir"] == os.path.normpath(str(accounts_dir))
+    assert sorted(persisted["files"]) == ["BMO.md", "Colgate-Palmolive.md", "Kroger.md", "Macys.md"]
+
+
+def test_snapshot_for_another_accounts_dir_is_ignored(accounts_dir, parse_calls, monkeypatch, tmp_path_factory):
+    """Test a snapshot written for a different accounts/ directory isn't reused"""
+    list_known_accounts()
+    other = tmp_path_factory.mktemp("other_accounts")
+    _write_account(other, "Kroger.md", "Kroger")
+    monkeypatch.setattr(account_knowledge, "ACCOUNTS_DIR", str(other))
+    _restart(monkeypatch)
+    parse_calls.clear()
+
+    assert list_known_accounts() == ["KROGER"]
+    assert parse_calls == ["Kroger.md"]
+
+
+@pytest.mark.parametrize("path", REPO_ACCOUNT_FILES, ids=os.path.basename)
+def test_parser_matches_legacy_on_repo_accounts(path):
+    """Test the single-pass parser gives identical output to the regex parser for every account"""
+    assert _parse_account_markdown(path) == legacy_parse_account_markdown(path)
+
+
+def test_parser_matches_legacy_on_malformed_input(tmp_path):
+    """Test identical output on randomly assembled files full of edge cases"""
+    rng = random.Random(0)
+    path = tmp_path / "Fuzz.md"
+    for _ in range(2000):
+        content = "\n".join(rng.choice(FUZZ_LINES) for _ in range(rng.randrange(1, 25)))
+        path.write_text(content + rng.choice(["", "\n"]), encoding="utf-8")
+        assert _parse_account_markdown(str(path)) == legacy_parse_account_markdown(str(path)), content
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
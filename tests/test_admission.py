@@ -0,0 +1,170 @@
+"""
+Test token-budget admission control: estimates, fair queueing, rejection and upstream 429s
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from benchmarks.stub_server import StubServer
+from app import model_client
+from app.admission import AdmissionController, AdmissionRejected, billable_tokens, current_tenant, estimate_input_tokens
+from app.main import app
+from app.model_client import call_anthropic, close_anthropic_client, is_retryable
+from app.resilience import RetryPolicy
+
+PROSPECT = {
+    "message_type": "cold_outreach",
+    "prospect_name": "Sarah Chen",
+    "prospect_title": "CTO",
+    "prospect_company": "Acme Corp",
+    "unique_fact": "Led cloud migration",
+    "business_initiative": "Modernization"
+}
+
+
+@pytest.mark.asyncio
+async def test_estimate_follows_prompt_and_observed_output():
+    controller = AdmissionController(worker_tokens_per_minute=60_000)
+    system = [{"text": "s" * 4000, "stable": True}, {"text": "t" * 400}]
+    assert estimate_input_tokens(system, "u" * 400) == 1201
+    assert controller.estimate(system, "u" * 400, 4000) == 1201 + 4000
+
+    ticket = await controller.admit(system, "u" * 400, 4000, tenant="a")
+    assert controller.worker_bucket.snapshot()["available"] == pytest.approx(60_000 - 5201, abs=5)
+    controller.settle(ticket, {"input_tokens": 300, "cache_read_input_tokens": 1000, "output_tokens": 700})
+    assert controller.worker_bucket.snapshot()["available"] == pytest.approx(60_000 - 1000, abs=5)
+    # Later estimates use the output actually seen for this max_tokens
+    assert controller.estimate(system, "u" * 400, 4000) == 1201 + 700
+
+
+@pytest.mark.asyncio
+async def test_callers_take_turns_at_the_worker_budget():
+    """Test a caller queued behind another caller's backlog isn't served last"""
+    controller = AdmissionController(worker_tokens_per_minute=60_000)
+    await controller.admit("", "x" * 4 * 59_900, 0, tenant="a")  # Drain the budget
+    order = []
+
+    async def call(tenant):
+        await controller.admit("", "x" * 396, 0, tenant=tenant)
+        order.append(tenant)
+
+    tasks = [asyncio.create_task(call("a")) for _ in range(3)]
+    await asyncio.sleep(0)
+    tasks.append(asyncio.create_task(call("b")))
+    await asyncio.gather(*tasks)
+
+    assert order == ["a", "b", "a", "a"]
+    assert controller.snapshot()["waited"] == 4
+
+
+def test_configured_budgets_are_split_across_workers():
+    """Test each worker enforces its share of the deployment-wide budgets"""
+    env = {**os.environ, "ADMISSION_TOKENS_PER_MINUTE": "80000", "ADMISSION_TENANT_TOKENS_PER_MINUTE": "8000",
+           "WEB_CONCURRENCY": "4"}
+    run = subprocess.run(
+        [sys.executable, "-c", "import json; from app.admission import admission; print(json.dumps(admission.snapshot()))"],
+        env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True, check=True
+    )
+    stats = json.loads(run.stdout.strip().splitlines()[-1])
+    assert (stats["workers"], stats["worker_tokens_per_minute"], stats["tenant_tokens_per_minute"]) == (4, 20_000, 2000)
+
+
+@pytest.mark.asyncio
+async def test_caller_over_its_budget_doesnt_block_others():
+    controller = AdmissionController(tenant_tokens_per_minute=6000)
+    await controller.admit("", "x" * 4 * 5999, 0, tenant="a")
+
+    waiting = asyncio.create_task(controller.admit("", "x" * 400, 0, tenant="a"))
+    await asyncio.wait_for(controller.admit("", "x" * 400, 0, tenant="b"), 0.1)
+    assert not waiting.done()
+    assert controller.snapshot()["queued"] == 1
+    await asyncio.wait_for(waiting, 2)
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full_or_wait_too_long():
+    controller = AdmissionController(worker_tokens_per_minute=600, max_queue=1, max_wait=0.1)
+    await controller.admit("", "x" * 4 * 599, 0, tenant="a")
+
+    waiting = asyncio.create_task(controller.admit("", "x" * 400, 0, tenant="a"))
+    await asyncio.sleep(0)
+    with pytest.raises(AdmissionRejected, match="Too many"):
+        await controller.admit("", "x" * 400, 0, tenant="b")
+    with pytest.raises(AdmissionRejected, match="within 0.1s") as error:
+        await waiting
+    assert error.value.retry_after >= 1
+    assert controller.snapshot()["queued"] == 0
+    assert controller.snapshot()["rejected"] == 2
+
+
+@pytest.mark.asyncio
+async def test_upstream_rate_limit_requeues_the_call(monkeypatch):
+    """Test a 429 is waited out by admission, not also retried by the retry policy"""
+    controller = AdmissionController(worker_tokens_per_minute=60_000)
+    monkeypatch.setattr(model_client, "admission", controller)
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        server.faults = [429]
+        try:
+            result = await call_anthropic("system", "user")
+        finally:
+            await close_anthropic_client()
+
+    assert len(result["templates"]) == 5
+    assert server.requests["/v1/messages"] == 2
+    stats = controller.snapshot()
+    assert (stats["admitted"], stats["upstream_rate_limited"]) == (2, 1)
+    # Only the successful call is charged
+    assert controller.worker_bucket.snapshot()["settled"] == billable_tokens(result["usage"])
+
+
+@pytest.mark.asyncio
+async def test_one_layer_handles_upstream_rate_limits(monkeypatch):
+    """Test a persistent 429 costs 1 + upstream_retries attempts, and admission stays out of it when disabled"""
+    policy = RetryPolicy("anthropic", is_retryable, max_retries=2, backoff_base=0.01)
+    monkeypatch.setattr(model_client, "anthropic_retry", policy)
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        enabled = AdmissionController(worker_tokens_per_minute=60_000, upstream_retries=1)
+        monkeypatch.setattr(model_client, "admission", enabled)
+        server.faults = [429] * 10
+        try:
+            with pytest.raises(Exception) as error:
+                await call_anthropic("system", "user")
+            assert error.value.status_code == 429
+            assert server.requests["/v1/messages"] == 2
+            assert policy.snapshot()["retries"] == 0
+
+            disabled = AdmissionController()
+            monkeypatch.setattr(model_client, "admission", disabled)
+            server.faults = [429, 529]
+            await call_anthropic("system", "user")
+        finally:
+            await close_anthropic_client()
+
+    assert server.requests["/v1/messages"] == 5
+    assert policy.snapshot()["retries"] == 2
+    assert (disabled.snapshot()["upstream_rate_limited"], disabled.snapshot()["paused_seconds"]) == (0, 0)
+
+
+def test_api_charges_the_caller_and_maps_rejection_to_503(monkeypatch):
+    monkeypatch.setattr(app.state.limiter, "enabled", False)
+    tenants = []
+
+    async def generate(**kwargs):
+        tenants.append(current_tenant.get())
+        raise AdmissionRejected("No token budget", retry_after=2.5)
+
+    with patch("app.main.generate_outreach_emails", generate):
+        response = TestClient(app).post("/api/generate", json=PROSPECT, headers={"X-API-Key": "key-1"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "3"
+    # Charged to the client address, not a header the caller chose
+    assert tenants[0] == "ip:testclient"
@@ -1,9 +1,11 @@
 """
 Test FastAPI endpoints
 """
+import json
 import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
+from benchmarks.stub_server import StubServer, DEFAULT_TEMPLATES
 from app.main import app
 
 client = TestClient(app)
@@ -62,6 +64,16 @@ def test_health_endpoint():
     assert response.json() == {"status": "healthy", "service": "executive-note-gen"}
 
 
+def test_stats_endpoint():
+    """Test cache statistics are exposed"""
+    response = client.get("/api/stats")
+    assert response.status_code == 200
+    cache_stats = response.json()["enrichment_cache"]
+    for key in ["hits", "misses", "evictions", "expirations", "size", "max_size", "hit_ratio", "negative"]:
+        assert key in cache_stats
+    assert response.json()["circuit_breakers"]["perplexity"]["state"] in ("closed", "open", "half_open")
+
+
 @patch('app.main.generate_outreach_emails', new_callable=AsyncMock)
 def test_generate_endpoint_success(mock_generate):
     """Test successful email generation returns 5 templates"""
@@ -140,6 +152,33 @@ def test_generate_endpoint_with_meeting_purpose(mock_generate):
     assert len(data["templates"]) == 5
 
 
+def test_generate_stream_endpoint(monkeypatch):
+    """Test the streaming endpoint emits one event per template then a done event"""
+    with StubServer(chunk_size=5) as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        
+        with TestClient(app) as stream_client:
+            response = stream_client.post("/api/generate/stream", json={
+                "message_type": "cold_outreach",
+                "prospect_name": "Test Person",
+                "prospect_title": "CTO",
+                "prospect_company": "Test Corp",
+                "unique_fact": "Test fact",
+                "business_initiative": "Test initiative"
+            })
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    
+    assert [e["event"] for e in events] == ["template"] * 5 + ["done"]
+    assert [e["template"] for e in events[:5]] == DEFAULT_TEMPLATES["templates"]
+    metadata = events[-1]["metadata"]
+    assert metadata["template_count"] == 5
+    assert metadata["time_to_first_template_ms"] <= metadata["total_ms"]
+
+
 def test_feedback_endpoint_success():
     """Test feedback submission"""
     response = client.post("/api/feedback", json={
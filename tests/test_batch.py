@@ -0,0 +1,315 @@
+"""
+Test batch generation: input parsing, token pacing, the batch runner, endpoint and CLI
+"""
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import pytest
+from fastapi.testclient import TestClient
+from benchmarks.stub_server import StubServer
+from app import batch
+from app.batch import parse_batch_rows, run_batch, load_checkpoint, expire_checkpoints
+from app.main import app
+from app.model_client import close_anthropic_client
+from app.resilience import TokenBucket
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+CSV_BATCH = (
+    "prospect_name,prospect_title,prospect_company,unique_fact,business_initiative,message_type\n"
+    "Ada Lovelace,CTO,Analytical Co,Wrote the first program,Modernize compute,cold_outreach\n"
+    "Grace Hopper,VP Engineering,Navy Systems,Invented the compiler,Developer productivity,cold_outreach\n"
+    "Missing Fields,CIO,,,,cold_outreach\n"
+    "Alan Turing,CDO,Bletchley Data,Broke Enigma,AI strategy,in_person_ask\n"
+)
+
+
+def _row(i: int, **overrides) -> dict:
+    row = {
+        "id": f"p{i}",
+        "message_type": "cold_outreach",
+        "prospect_name": f"Person {i}",
+        "prospect_title": "CTO",
+        "prospect_company": f"Company {i}",
+        "unique_fact": "Led a platform migration",
+        "business_initiative": "Cloud cost reduction"
+    }
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """Start a stub Anthropic server and point the shared client at it"""
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        yield server
+
+
+@pytest.fixture
+def batch_client():
+    """Test client with the per-client rate limits reset"""
+    app.state.limiter.reset()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+async def _collect(rows: list[dict], **kwargs) -> list[dict]:
+    events = [event async for event in run_batch(rows, bucket=TokenBucket("test", 0), **kwargs)]
+    await close_anthropic_client()
+    return events
+
+
+def test_parse_batch_rows_csv():
+    """Test CSV rows are parsed with row numbers as ids and blank lines skipped"""
+    rows = parse_batch_rows(CSV_BATCH + ",,,,,\n", "csv")
+
+    assert [row["id"] for row in rows] == ["1", "2", "3", "4"]
+    assert rows[0]["prospect_name"] == "Ada Lovelace"
+    assert rows[2]["prospect_company"] == ""
+
+
+def test_parse_batch_rows_jsonl_isolates_bad_lines():
+    """Test a malformed JSONL line becomes an error row instead of failing the batch"""
+    rows = parse_batch_rows(json.dumps(_row(1)) + "\n\nnot json\n[1, 2]\n" + json.dumps(_row(2, id="")), "jsonl")
+
+    assert [row["id"] for row in rows] == ["p1", "2", "3", "4"]
+    assert rows[1]["error"].startswith("Line 3:")
+    assert "expected a JSON object" in rows[2]["error"]
+
+
+@pytest.mark.parametrize("data, fmt, match", [
+    ("{}", "xml", "Unknown batch format"),
+    (json.dumps(_row(1)) + "\n" + json.dumps(_row(1)), "jsonl", "Duplicate row id: p1")
+])
+def test_parse_batch_rows_rejects(data, fmt, match):
+    with pytest.raises(ValueError, match=match):
+        parse_batch_rows(data, fmt)
+
+
+def test_token_bucket_paces_reservations():
+    """Test reservations beyond the budget wait for the refill and settle() refunds overestimates"""
+    bucket = TokenBucket("test", tokens_per_minute=60_000)  # 1000 tokens/sec
+
+    assert bucket.reserve(60_000) == 0
+    assert bucket.reserve(500) == pytest.approx(0.5, abs=0.05)
+    assert bucket.reserve(500) == pytest.approx(1.0, abs=0.05)
+
+    bucket.settle(reserved=1000, actual=0)
+    assert bucket.reserve(0) == pytest.approx(0.0, abs=0.05)
+    assert bucket.snapshot()["waits"] == 2
+
+
+def test_token_bucket_disabled():
+    bucket = TokenBucket("test", tokens_per_minute=0)
+    assert bucket.reserve(10**9) == 0
+
+
+@pytest.mark.asyncio
+async def test_run_batch_against_stub_isolates_row_errors(stub_server):
+    """Test every row gets a result, failures don't stop the batch and a done summary follows"""
+    events = await _collect(parse_batch_rows(CSV_BATCH, "csv"))
+
+    results = {event["id"]: event for event in events[:-1]}
+    assert results["1"]["status"] == results["2"]["status"] == results["4"]["status"] == "ok"
+    assert len(results["1"]["result"]["templates"]) == 5
+    assert results["4"]["result"]["metadata"]["message_type"] == "in_person_ask"
+    assert results["3"]["error"] == "Missing required fields: prospect_company, unique_fact, business_initiative"
+
+    done = events[-1]
+    assert done["event"] == "done"
+    assert (done["total"], done["succeeded"], done["failed"], done["resumed"]) == (4, 3, 1, 0)
+    assert done["usage"]["output_tokens"] > 0
+    # Invalid rows never reach the model
+    assert stub_server.requests["/v1/messages"] == 3
+
+
+@pytest.mark.asyncio
+async def test_run_batch_generation_failure_is_reported_per_row(monkeypatch):
+    """Test an exception generating one prospect becomes that row's error"""
+    async def fake_generate(**kwargs):
+        if kwargs["prospect_name"] == "Person 2":
+            raise ValueError("Model response missing 'templates' array")
+        return {"templates": [], "metadata": {"usage": {}}}
+
+    monkeypatch.setattr(batch, "generate_outreach_emails", fake_generate)
+    events = await _collect([_row(i) for i in range(4)])
+
+    failed = [e for e in events[:-1] if e["status"] == "error"]
+    assert failed == [{"event": "result", "id": "p2", "status": "error", "error": "Model response missing 'templates' array"}]
+    assert (events[-1]["succeeded"], events[-1]["failed"]) == (3, 1)
+
+
+@pytest.mark.asyncio
+async def test_run_batch_bounded_concurrency_streams_as_completed(monkeypatch):
+    """Test no more than `concurrency` rows run at once and results arrive in completion order"""
+    in_flight = []
+    peak = []
+
+    async def fake_generate(**kwargs):
+        in_flight.append(kwargs["prospect_name"])
+        peak.append(len(in_flight))
+        await asyncio.sleep(0.2 if kwargs["prospect_name"] == "Person 0" else 0.01)
+        in_flight.remove(kwargs["prospect_name"])
+        return {"templates": [], "metadata": {"usage": {"input_tokens": 10, "output_tokens": 5}}}
+
+    monkeypatch.setattr(batch, "generate_outreach_emails", fake_generate)
+    events = await _collect([_row(i) for i in range(8)], concurrency=3)
+
+    assert max(peak) == 3
+    assert events[-2]["id"] == "p0"  # Slowest row finishes last
+    assert events[-1]["usage"]["input_tokens"] == 80
+
+
+@pytest.mark.asyncio
+async def test_run_batch_reserves_estimate_and_settles_actual(monkeypatch):
+    """Test the token budget is charged the estimate up front and corrected to the actual usage"""
+    async def fake_generate(**kwargs):
+        return {"templates": [], "metadata": {"usage": {"input_tokens": 700, "cache_read_input_tokens": 5000, "output_tokens": 300}}}
+
+    monkeypatch.setattr(batch, "generate_outreach_emails", fake_generate)
+    monkeypatch.setattr(batch, "BATCH_ESTIMATED_TOKENS", 4000)
+    bucket = TokenBucket("test", tokens_per_minute=1_000_000)
+    reservations = []
+    reserve = bucket.reserve
+    monkeypatch.setattr(bucket, "reserve", lambda tokens: reservations.append(tokens) or reserve(tokens))
+
+    async for _ in run_batch([_row(1), _row(2)], concurrency=1, bucket=bucket):
+        pass
+
+    # Second row reserves the first row's actual (cache reads aren't billed against the limit)
+    assert reservations == [4000, 1000]
+    assert bucket.snapshot()["settled"] == 2000
+
+
+@pytest.mark.asyncio
+async def test_run_batch_resumes_from_checkpoint(stub_server, tmp_path):
+    """Test a rerun replays rows that succeeded and retries only the failed ones"""
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    rows = [_row(1), _row(2), _row(3, unique_fact="")]
+
+    first = await _collect(rows, checkpoint_path=checkpoint)
+    assert first[-1]["succeeded"] == 2
+    assert set(load_checkpoint(checkpoint)) == {"p1", "p2"}
+    assert stub_server.requests["/v1/messages"] == 2
+
+    rows[2]["unique_fact"] = "Keynote at a retail summit"
+    second = await _collect(rows, checkpoint_path=checkpoint)
+
+    assert [(e["id"], e.get("resumed", False)) for e in second[:-1]] == [("p1", True), ("p2", True), ("p3", False)]
+    assert second[1]["result"] == {e.get("id"): e for e in first}["p2"]["result"]
+    assert (second[-1]["succeeded"], second[-1]["resumed"]) == (1, 2)
+    assert stub_server.requests["/v1/messages"] == 3
+    assert set(load_checkpoint(checkpoint)) == {"p1", "p2", "p3"}
+
+
+@pytest.mark.asyncio
+async def test_run_batch_regenerates_changed_rows(monkeypatch, tmp_path):
+    """Test a checkpointed result is only replayed for the same row, not just the same id"""
+    async def fake_generate(**kwargs):
+        return {"templates": [kwargs["prospect_company"]], "metadata": {"usage": {}}}
+
+    monkeypatch.setattr(batch, "generate_outreach_emails", fake_generate)
+    checkpoint = str(tmp_path / "checkpoint.jsonl")
+    await _collect([_row(1), _row(2)], checkpoint_path=checkpoint)
+
+    events = await _collect([_row(1), _row(2, prospect_company="Other Co")], checkpoint_path=checkpoint)
+    results = {e["id"]: e for e in events[:-1]}
+    assert results["p1"]["resumed"] and "row_hash" not in results["p1"]
+    assert "resumed" not in results["p2"]
+    assert results["p2"]["result"]["templates"] == ["Other Co"]
+
+
+def test_expire_checkpoints(tmp_path):
+    stale, fresh = tmp_path / "a-old.jsonl", tmp_path / "a-new.jsonl"
+    stale.write_text("", encoding="utf-8")
+    fresh.write_text("", encoding="utf-8")
+    os.utime(stale, (0, 0))
+
+    assert expire_checkpoints(3600, str(tmp_path)) == 1
+    assert not stale.exists() and fresh.exists()
+    assert expire_checkpoints(3600, str(tmp_path / "missing")) == 0
+
+
+def test_load_checkpoint_ignores_truncated_line(tmp_path):
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    ok = {"event": "result", "id": "a", "status": "ok", "result": {}}
+    checkpoint.write_text(json.dumps(ok) + "\n" + '{"event": "result", "id": "b", "sta', encoding="utf-8")
+
+    assert load_checkpoint(str(checkpoint)) == {"a": ok}
+
+
+def test_batch_endpoint_streams_ndjson(stub_server, batch_client, tmp_path, monkeypatch):
+    """Test the endpoint streams a result per row then done, and resumes by batch_id"""
+    monkeypatch.setattr(batch, "BATCH_CHECKPOINT_DIR", str(tmp_path))
+    post = lambda: batch_client.post(
+        "/api/generate/batch", params={"batch_id": "q3-list"}, content=CSV_BATCH, headers={"Content-Type": "text/csv"}
+    )
+    response = post()
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    assert [e["event"] for e in events] == ["result"] * 4 + ["done"]
+    assert (events[-1]["succeeded"], events[-1]["failed"]) == (3, 1)
+    assert [path.name.endswith("-q3-list.jsonl") for path in tmp_path.iterdir()] == [True]
+
+    resumed = [json.loads(line) for line in post().text.splitlines()]
+    assert (resumed[-1]["resumed"], resumed[-1]["failed"]) == (3, 1)
+    assert stub_server.requests["/v1/messages"] == 3
+
+
+def test_batch_endpoint_checkpoints_per_caller_and_removes_when_complete(stub_server, batch_client, tmp_path, monkeypatch):
+    monkeypatch.setattr(batch, "BATCH_CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr("app.main.rate_limit_key", lambda request: request.headers.get("X-Caller", "anon"))
+    complete = CSV_BATCH.replace("Missing Fields,CIO,,,,", "Complete Row,CIO,Some Co,A fact,An initiative,")
+    post = lambda body, caller: [json.loads(line) for line in batch_client.post(
+        "/api/generate/batch", params={"batch_id": "shared"}, content=body,
+        headers={"Content-Type": "text/csv", "X-Caller": caller}
+    ).text.splitlines()]
+
+    assert post(CSV_BATCH, "alice")[-1]["failed"] == 1
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # Same batch_id and row ids from someone else: nothing of alice's is replayed
+    done = post(complete, "bob")[-1]
+    assert (done["succeeded"], done["resumed"]) == (4, 0)
+    # Bob's batch finished, so its checkpoint is gone; alice's is kept for her rerun
+    assert len(list(tmp_path.iterdir())) == 1
+    assert post(CSV_BATCH, "alice")[-1]["resumed"] == 3
+
+
+@pytest.mark.parametrize("params, body, status", [
+    ({"batch_id": "../escape"}, json.dumps(_row(1)), 400),
+    ({"format": "xml"}, json.dumps(_row(1)), 400),
+    ({}, "", 400),
+    ({}, "\n".join(json.dumps(_row(i)) for i in range(3)), 413)
+])
+def test_batch_endpoint_rejects(batch_client, monkeypatch, params, body, status):
+    monkeypatch.setattr("app.main.BATCH_MAX_ROWS", 2)
+    response = batch_client.post("/api/generate/batch", params=params, content=body)
+    assert response.status_code == status
+
+
+def test_batch_cli_end_to_end(stub_server, tmp_path):
+    """Test the CLI writes NDJSON results and skips completed prospects when rerun with the checkpoint"""
+    prospects = tmp_path / "prospects.csv"
+    prospects.write_text(CSV_BATCH, encoding="utf-8")
+    checkpoint = tmp_path / "results.jsonl"
+    run = lambda: subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, "batch_generate.py"), str(prospects), "--checkpoint", str(checkpoint),
+         "--tokens-per-minute", "0"],
+        cwd=tmp_path, env=dict(os.environ, PYTHONPATH=os.path.abspath(REPO_ROOT)), capture_output=True, text=True
+    )
+
+    first = run()
+    assert first.returncode == 1  # One row is missing fields
+    events = [json.loads(line) for line in first.stdout.splitlines()]
+    assert events[-1]["succeeded"] == 3
+    assert "3 succeeded, 1 failed, 0 resumed" in first.stderr
+
+    second = run()
+    assert "0 succeeded, 1 failed, 3 resumed" in second.stderr
+    assert stub_server.requests["/v1/messages"] == 3
@@ -0,0 +1,39 @@
+"""
+Test the load-test harness end to end against the stub upstreams
+"""
+import copy
+import os
+from app.main import app
+from benchmarks.bench_load import run_load_test, compare_results
+
+
+def test_load_test_reports_each_endpoint(monkeypatch):
+    """Test a short run drives the real app and the stub, and leaves the environment as it was"""
+    monkeypatch.setattr(app.state.limiter, "enabled", False)
+    monkeypatch.delenv("PERPLEXITY_API_KEY", raising=False)
+
+    results = run_load_test(["generate", "generate_stream", "summarize_bio"], rps=20, duration=0.5, warmup=1)
+
+    assert "PERPLEXITY_API_KEY" not in os.environ
+    assert results["config"]["rps"] == 20
+    assert set(results["run"]) >= {"commit", "dirty", "timestamp"}
+    for name, result in results["endpoints"].items():
+        assert (result["requests"], result["ok"], result["errors"]) == (10, 10, {}), name
+        assert result["upstream_requests"] == 11, name
+        assert 0 < result["latency_ms"]["p50"] <= result["latency_ms"]["p95"] <= result["latency_ms"]["p99"]
+        assert result["throughput_rps"] > 0
+        assert result["loop_lag_ms"]["p99"] >= 0
+
+
+def test_compare_flags_regressions():
+    baseline = {"endpoints": {"generate": {"throughput_rps": 50.0, "latency_ms": {"p50": 40.0, "p95": 80.0, "p99": 100.0}}}}
+    current = copy.deepcopy(baseline)
+    assert compare_results(baseline, current, threshold=20) == []
+
+    current["endpoints"]["generate"]["latency_ms"]["p99"] = 130.0
+    current["endpoints"]["generate"]["throughput_rps"] = 35.0
+    assert compare_results(baseline, current, threshold=20) == [
+        "generate p99 latency 100.0ms -> 130.0ms (+30%)",
+        "generate throughput 50.0 -> 35.0 rps (-30%)"
+    ]
+    assert compare_results({"endpoints": {}}, current, threshold=20) == []
@@ -0,0 +1,167 @@
+"""
+Test Message Batches bulk jobs against the stub batch service
+"""
+import json
+import os
+import subprocess
+import sys
+import pytest
+from benchmarks.stub_server import StubServer
+from app import bulk
+from app.batch import parse_batch_rows
+from app.bulk import create_job, submit_pending, run_job, job_status, requeue_failed, iter_results
+from app.model_client import close_anthropic_client, message_params
+from app.prompts_v2 import build_prompt
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..')
+
+PROSPECTS = (
+    "id,prospect_name,prospect_title,prospect_company,unique_fact,business_initiative,message_type\n"
+    "ada,Ada Lovelace,CTO,Analytical Co,Wrote the first program,Modernize compute,cold_outreach\n"
+    "grace,Grace Hopper,VP Engineering,Navy Systems,Invented the compiler,Developer productivity,cold_outreach\n"
+    "blank,Missing Fields,CIO,,,,cold_outreach\n"
+    "alan,Alan Turing,CDO,Bletchley Data,Broke Enigma,AI strategy,in_person_ask\n"
+)
+
+
+@pytest.fixture
+def stub_server(monkeypatch, tmp_path):
+    """Stub batch service, with job state in a temporary database"""
+    monkeypatch.setattr(bulk, "BULK_JOBS_DB", str(tmp_path / "bulk_jobs.db"))
+    with StubServer() as server:
+        server.batch_processing_time = 0.2
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        yield server
+
+
+def _batch_requests(server: StubServer) -> list[list[dict]]:
+    return [body["requests"] for path, body in server.bodies if path == "/v1/messages/batches"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_job_end_to_end(stub_server):
+    """Test rows are submitted as one batch, polled to completion and stored as validated templates"""
+    stub_server.batch_errored_ids = {"row-1"}
+    job_id = create_job(parse_batch_rows(PROSPECTS, "csv"), "nightly")
+    polls = []
+
+    final = await run_job(job_id, poll_interval=0.05, on_poll=polls.append)
+    await close_anthropic_client()
+
+    assert final["status"] == "ended"
+    assert final["rows"] == {"succeeded": 2, "errored": 1, "invalid": 1}
+    assert len(polls) > 1  # Polled while the batch was in progress
+    [requests] = _batch_requests(stub_server)
+    assert [r["custom_id"] for r in requests] == ["row-0", "row-1", "row-3"]
+    # Same request parameters as an interactive generation
+    system_prompt, user_prompt = build_prompt(
+        message_type="cold_outreach", prospect_name="Ada Lovelace", prospect_title="CTO", prospect_company="Analytical Co",
+        unique_fact="Wrote the first program", business_initiative="Modernize compute"
+    )
+    assert requests[0]["params"] == message_params(system_prompt, user_prompt)
+
+    results = list(iter_results(job_id))
+    assert [(r["id"], r["status"]) for r in results] == [("ada", "ok"), ("grace", "error"), ("blank", "error"), ("alan", "ok")]
+    assert len(results[0]["result"]["templates"]) == 5
+    metadata = results[3]["result"]["metadata"]
+    assert (metadata["prospect_name"], metadata["message_type"]) == ("Alan Turing", "in_person_ask")
+    assert metadata["generation_mode"] == "message_batches"
+    assert metadata["usage"]["output_tokens"] > 0
+    assert results[1]["error"] == "stub batch error"
+    assert results[2]["error"].startswith("Missing required fields")
+
+
+@pytest.mark.asyncio
+async def test_bulk_job_packs_submissions(stub_server, monkeypatch):
+    """Test rows are split across submissions by request count and size"""
+    monkeypatch.setattr(bulk, "BULK_MAX_BATCH_REQUESTS", 2)
+    rows = parse_batch_rows(PROSPECTS.replace("blank,Missing Fields,CIO,,,,", "eve,Eve,CIO,Eve Co,Fact,Initiative,"), "csv")
+    await submit_pending(create_job(rows, "packed"))
+
+    assert [[r["custom_id"] for r in requests] for requests in _batch_requests(stub_server)] == [["row-0", "row-1"], ["row-2", "row-3"]]
+
+    monkeypatch.setattr(bulk, "BULK_MAX_BATCH_REQUESTS", 100)
+    monkeypatch.setattr(bulk, "BULK_MAX_BATCH_BYTES", 1)
+    await submit_pending(create_job(rows, "one-per-batch"))
+    await close_anthropic_client()
+
+    assert len(_batch_requests(stub_server)) == 2 + 4
+
+
+@pytest.mark.asyncio
+async def test_bulk_job_resumes_after_restart(stub_server):
+    """Test a restarted process polls the batches already submitted instead of resubmitting"""
+    job_id = create_job(parse_batch_rows(PROSPECTS, "csv"), "restarted")
+    await submit_pending(job_id)
+    await close_anthropic_client()
+    assert job_status(job_id)["rows"] == {"submitted": 3, "invalid": 1}
+
+    # New process: fresh database connection and client
+    bulk._local.conn = None
+    final = await run_job(job_id, poll_interval=0.05)
+    await close_anthropic_client()
+
+    assert final["rows"] == {"succeeded": 3, "invalid": 1}
+    assert len(_batch_requests(stub_server)) == 1
+    # Each finished batch's results are fetched once
+    assert sum(count for path, count in stub_server.requests.items() if path.endswith("/results")) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_job_invalid_model_output_is_row_error(stub_server):
+    """Test a response that isn't valid templates JSON fails just that row"""
+    stub_server.response_text = "Sorry, I can't help with that."
+    job_id = create_job(parse_batch_rows(PROSPECTS, "csv"), "bad-output")
+
+    final = await run_job(job_id, poll_interval=0.05)
+    await close_anthropic_client()
+
+    assert final["rows"] == {"errored": 3, "invalid": 1}
+    assert list(iter_results(job_id))[0]["error"].startswith("Failed to parse JSON response")
+
+
+@pytest.mark.asyncio
+async def test_requeue_failed_resubmits_only_failed_rows(stub_server):
+    stub_server.batch_errored_ids = {"row-1"}
+    job_id = create_job(parse_batch_rows(PROSPECTS, "csv"), "retry")
+    await run_job(job_id, poll_interval=0.05)
+
+    stub_server.batch_errored_ids = set()
+    assert requeue_failed(job_id) == 1
+    final = await run_job(job_id, poll_interval=0.05)
+    await close_anthropic_client()
+
+    assert [[r["custom_id"] for r in requests] for requests in _batch_requests(stub_server)][1] == ["row-1"]
+    assert final["rows"] == {"succeeded": 3, "invalid": 1}
+
+
+def test_create_job_rejects_duplicate_id(stub_server):
+    create_job(parse_batch_rows(PROSPECTS, "csv"), "dup")
+    with pytest.raises(ValueError, match="already exists"):
+        create_job(parse_batch_rows(PROSPECTS, "csv"), "dup")
+    assert job_status("missing") is None
+
+
+def test_bulk_cli_end_to_end(stub_server, tmp_path):
+    """Test the CLI creates the job, waits for it and writes results; rerunning resumes the stored job"""
+    prospects = tmp_path / "prospects.csv"
+    prospects.write_text(PROSPECTS, encoding="utf-8")
+    output = tmp_path / "results.jsonl"
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(REPO_ROOT), BULK_JOBS_DB=bulk.BULK_JOBS_DB)
+    run = lambda *args: subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, "bulk_generate.py"), *args, "--job", "cli", "--poll-interval", "0.05"],
+        cwd=tmp_path, env=env, capture_output=True, text=True
+    )
+
+    first = run(str(prospects), "--output", str(output))
+    assert first.returncode == 1, first.stderr  # One row is missing fields
+    assert "Created job cli with 4 rows" in first.stderr
+    assert [json.loads(line)["status"] for line in output.read_text().splitlines()] == ["ok", "ok", "error", "ok"]
+
+    second = run("--output", str(output))
+    assert "Resuming job cli" in second.stderr
+    assert len(_batch_requests(stub_server)) == 1
+
+    status = run("--status")
+    assert json.loads(status.stdout)["rows"] == {"succeeded": 3, "invalid": 1}
@@ -0,0 +1,162 @@
+"""
+Test the SQLite-backed enrichment cache
+"""
+import json
+import time
+import pytest
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from app import enrichment_cache
+from app.enrichment_cache import (
+    cache_enrichment,
+    get_cached_enrichment,
+    get_cache_stats,
+    sweep_expired,
+    clear_cache,
+    _connect,
+    _get_cache_key
+)
+
+
+@pytest.fixture(autouse=True)
+def temp_cache(tmp_path, monkeypatch):
+    """Point the cache at a fresh database and legacy JSON path"""
+    monkeypatch.setattr(enrichment_cache, "CACHE_DB", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(enrichment_cache, "CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(enrichment_cache, "_lru", OrderedDict())
+    monkeypatch.setattr(enrichment_cache, "_negative", OrderedDict())
+    monkeypatch.setattr(enrichment_cache, "_negative_stats", {"hits": 0, "stores": 0})
+    monkeypatch.setattr(enrichment_cache, "_stats", {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0})
+    return tmp_path
+
+
+def _age_entry(linkedin_url: str, prospect_name: str, days: int) -> None:
+    """Backdate a cached entry in SQLite and drop its in-memory copy"""
+    cache_key = _get_cache_key(linkedin_url, prospect_name)
+    _connect().execute(
+        "UPDATE enrichment_cache SET cached_at = ? WHERE cache_key = ?",
+        (time.time() - days * 86400, cache_key)
+    )
+    enrichment_cache._lru.pop(cache_key, None)
+
+
+def test_cache_roundtrip():
+    """Test a cached result is returned for the same URL and name"""
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") is None
+
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "fact", "confidence": 90})
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "ann lee") == {"unique_fact": "fact", "confidence": 90}
+
+
+def test_cache_upsert_overwrites():
+    """Test caching the same key twice keeps a single, latest entry"""
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "old"})
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "new"})
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") == {"unique_fact": "new"}
+    assert _connect().execute("SELECT COUNT(*) FROM enrichment_cache").fetchone()[0] == 1
+
+
+def test_expired_entries_are_misses_until_swept():
+    """Test expired entries are ignored on read and removed by the sweep"""
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "old"})
+    cache_enrichment("https://linkedin.com/in/b", "Bo Kim", {"unique_fact": "fresh"})
+    _age_entry("https://linkedin.com/in/a", "Ann Lee", days=31)
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") is None
+    # Reads don't delete
+    assert _connect().execute("SELECT COUNT(*) FROM enrichment_cache").fetchone()[0] == 2
+
+    assert sweep_expired() == 1
+    assert get_cached_enrichment("https://linkedin.com/in/b", "Bo Kim") == {"unique_fact": "fresh"}
+
+
+def test_sweep_expired_in_batches():
+    """Test the sweep removes more expired entries than one batch"""
+    for i in range(25):
+        cache_enrichment(f"https://linkedin.com/in/{i}", "Name", {"i": i})
+        _age_entry(f"https://linkedin.com/in/{i}", "Name", days=40)
+
+    assert sweep_expired(batch_size=10) == 25
+    assert _connect().execute("SELECT COUNT(*) FROM enrichment_cache").fetchone()[0] == 0
+
+
+def test_migrates_legacy_json_cache(temp_cache):
+    """Test the legacy JSON cache file is imported on first use"""
+    legacy_path = temp_cache / "cache.json"
+    legacy_path.write_text(json.dumps({
+        _get_cache_key("https://linkedin.com/in/a", "Ann Lee"): {
+            "linkedin_url": "https://linkedin.com/in/a",
+            "prospect_name": "Ann Lee",
+            "result": {"unique_fact": "migrated"},
+            "cached_at": (datetime.now() - timedelta(days=1)).isoformat()
+        },
+        "bad": {"result": {}}
+    }))
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") == {"unique_fact": "migrated"}
+    assert not legacy_path.exists()
+    assert (temp_cache / "cache.json.migrated").exists()
+
+
+def test_clear_cache():
+    """Test clearing removes every entry"""
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "fact"})
+    clear_cache()
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") is None
+
+
+def test_lru_serves_repeat_lookups_without_sqlite():
+    """Test write-through entries are served from memory"""
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "fact"})
+    _connect().execute("DELETE FROM enrichment_cache")
+
+    result = get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee")
+    result["from_cache"] = True  # Callers may mutate what they get back
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") == {"unique_fact": "fact"}
+    stats = get_cache_stats()
+    assert stats["hits"] == 2
+    assert stats["misses"] == 0
+    assert stats["hit_ratio"] == 1.0
+
+
+def test_lru_populated_from_sqlite_on_miss():
+    """Test a SQLite hit is promoted into the LRU tier"""
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "fact"})
+    enrichment_cache._lru.clear()
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") == {"unique_fact": "fact"}
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") == {"unique_fact": "fact"}
+    stats = get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_lru_size_bound_evicts_least_recently_used(monkeypatch):
+    """Test the LRU tier evicts the least recently used entry when full"""
+    monkeypatch.setattr(enrichment_cache, "LRU_MAX_ENTRIES", 2)
+    cache_enrichment("https://linkedin.com/in/a", "A", {"v": "a"})
+    cache_enrichment("https://linkedin.com/in/b", "B", {"v": "b"})
+    get_cached_enrichment("https://linkedin.com/in/a", "A")
+    cache_enrichment("https://linkedin.com/in/c", "C", {"v": "c"})
+
+    assert _get_cache_key("https://linkedin.com/in/b", "B") not in enrichment_cache._lru
+    assert _get_cache_key("https://linkedin.com/in/a", "A") in enrichment_cache._lru
+    assert get_cache_stats()["evictions"] == 1
+
+
+def test_lru_ttl_expiry(monkeypatch):
+    """Test entries past the LRU TTL fall through to SQLite"""
+    monkeypatch.setattr(enrichment_cache, "LRU_TTL_SECONDS", 0)
+    cache_enrichment("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "fact"})
+
+    assert get_cached_enrichment("https://linkedin.com/in/a", "Ann Lee") == {"unique_fact": "fact"}
+    stats = get_cache_stats()
+    assert stats["expirations"] == 1
+    assert stats["hits"] == 0
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -0,0 +1,110 @@
+"""
+Test the blocking I/O pool, per-store owner threads and the loop-block watchdog
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+import pytest
+from app import enrichment_cache
+from app.enrichment_cache import cache_enrichment_async, get_cached_enrichment_async, _get_cache_key
+from app.event_loop import run_io, io_stats, shutdown_io, LoopWatchdog
+from app.metrics import LOOP_BLOCKS
+
+
+@pytest.fixture
+def temp_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(enrichment_cache, "CACHE_DB", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(enrichment_cache, "_lru", OrderedDict())
+    monkeypatch.setattr(enrichment_cache, "_negative", OrderedDict())
+    return tmp_path
+
+
+async def _ticks_during(coro, interval: float = 0.01) -> tuple:
+    """Run coro while counting how often a timer on the same loop fires"""
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(interval)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        task.cancel()
+    return result, ticks
+
+
+@pytest.mark.asyncio
+async def test_run_io_keeps_the_loop_running():
+    result, ticks = await _ticks_during(run_io(time.sleep, 0.2))
+    assert result is None
+    assert ticks >= 10
+
+    with pytest.raises(ZeroDivisionError):
+        await run_io(lambda: 1 / 0)
+    assert io_stats()["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_store_calls_run_in_order_on_one_thread():
+    order = []
+    threads = set()
+
+    def write(i):
+        time.sleep(0.01 if i % 2 else 0)
+        order.append(i)
+        threads.add(threading.current_thread().name)
+
+    await asyncio.gather(*(run_io(write, i, store="test_store") for i in range(10)))
+
+    assert order == list(range(10))
+    assert threads == {"test_store-owner_0"}
+    assert "test_store" in io_stats()["owners"]
+    shutdown_io()
+    assert "test_store" not in io_stats()["owners"]
+
+
+@pytest.mark.asyncio
+async def test_enrichment_cache_disk_access_is_off_the_loop(temp_cache, monkeypatch):
+    """Test a slow SQLite read or write doesn't stall other requests on the loop"""
+    write_persisted = enrichment_cache._write_persisted
+    monkeypatch.setattr(enrichment_cache, "_write_persisted", lambda *args: time.sleep(0.2) or write_persisted(*args))
+    _, ticks = await _ticks_during(cache_enrichment_async("https://linkedin.com/in/a", "Ann Lee", {"unique_fact": "fact"}))
+    assert ticks >= 10
+
+    # Visible from the LRU right away, and from SQLite once the LRU copy is gone
+    assert await get_cached_enrichment_async("https://linkedin.com/in/a", "Ann Lee") == {"unique_fact": "fact"}
+    enrichment_cache._lru.pop(_get_cache_key("https://linkedin.com/in/a", "Ann Lee"))
+    read_persisted = enrichment_cache._read_persisted
+    monkeypatch.setattr(enrichment_cache, "_read_persisted", lambda key: time.sleep(0.2) or read_persisted(key))
+    result, ticks = await _ticks_during(get_cached_enrichment_async("https://linkedin.com/in/a", "Ann Lee"))
+    assert result == {"unique_fact": "fact"}
+    assert ticks >= 10
+
+
+def _block_the_loop():
+    time.sleep(0.3)
+
+
+@pytest.mark.asyncio
+async def test_watchdog_reports_blocking_call_with_stack(capsys):
+    watchdog = LoopWatchdog(100)
+    blocks_before = LOOP_BLOCKS.value()
+    task = asyncio.create_task(watchdog.run())
+    await asyncio.sleep(0.1)
+
+    _block_the_loop()
+    await asyncio.sleep(0.1)
+    await asyncio.sleep(0.05)  # Fast calls aren't reported
+    task.cancel()
+
+    output = capsys.readouterr().out
+    assert "Event loop blocked for over" in output
+    assert "in _block_the_loop" in output
+    assert "Event loop was blocked for" in output
+    assert watchdog.stalls == 1
+    assert LOOP_BLOCKS.value() == blocks_before + 1
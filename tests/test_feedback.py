@@ -0,0 +1,118 @@
+"""
+Test the background feedback writer and the feedback endpoint under load
+"""
+import asyncio
+import glob
+import json
+import os
+import threading
+import httpx
+import pytest
+from app import main
+from app.feedback_writer import FeedbackWriter, FeedbackQueueFull, read_feedback
+from app.main import app
+
+
+def _feedback(i: int) -> dict:
+    return {
+        "feedback_type": "positive" if i % 3 else "negative",
+        "original_output": {"subject": f"Subject {i}", "body": "Hi Sarah, ..."},
+        "improved_version": None,
+        "metadata": {"message_type": "cold_outreach", "prospect_name": f"Person {i}"},
+        "timestamp": "2025-01-15T10:30:00Z"
+    }
+
+
+@pytest.mark.asyncio
+async def test_feedback_endpoint_loses_nothing_under_concurrent_load(tmp_path, monkeypatch):
+    """Test 1,000 concurrent submissions are all acknowledged and all on disk, across rotated segments"""
+    writer = FeedbackWriter(str(tmp_path), segment_max_bytes=64 * 1024)
+    monkeypatch.setattr(main, "feedback_writer", writer)
+    monkeypatch.setattr(app.state.limiter, "enabled", False)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        responses = await asyncio.gather(*(client.post("/api/feedback", json=_feedback(i)) for i in range(1000)))
+    writer.close()
+
+    assert [r.status_code for r in responses] == [200] * 1000
+    acknowledged = {r.json()["feedback_id"] for r in responses}
+    records = list(read_feedback(str(tmp_path)))
+    assert len(records) == 1000
+    assert {r["feedback_id"] for r in records} == acknowledged
+    assert {r["metadata"]["prospect_name"] for r in records} == {f"Person {i}" for i in range(1000)}
+
+    stats = writer.stats()
+    assert stats["written"] == 1000
+    assert stats["batches"] < 1000  # fsyncs were shared between submissions
+    assert stats["segments"] == len(glob.glob(str(tmp_path / "feedback-*.jsonl.gz"))) > 1
+
+
+@pytest.mark.asyncio
+async def test_open_and_crashed_segments_are_readable(tmp_path):
+    """Test acknowledged records can be read from the open segment and from one cut short by a crash"""
+    writer = FeedbackWriter(str(tmp_path / "live"))
+    ids = [await writer.submit(_feedback(i)) for i in range(5)]
+
+    [segment] = glob.glob(str(tmp_path / "live" / "*.jsonl.gz"))
+    assert [r["feedback_id"] for r in read_feedback(str(tmp_path / "live"))] == ids
+
+    # A crash leaves no gzip trailer and possibly a torn final write
+    os.makedirs(tmp_path / "crashed")
+    with open(segment, "rb") as f:
+        data = f.read()
+    await writer.submit(_feedback(5))
+    with open(segment, "rb") as f:
+        torn = f.read()[:len(data) + 10]
+    with open(tmp_path / "crashed" / os.path.basename(segment), "wb") as f:
+        f.write(torn)
+    writer.close()
+
+    assert [r["feedback_id"] for r in read_feedback(str(tmp_path / "crashed"))] == ids
+    assert len(list(read_feedback(str(tmp_path / "live")))) == 6
+
+
+def test_read_feedback_includes_legacy_files(tmp_path):
+    legacy = dict(_feedback(1), timestamp="2024-12-01T09:00:00Z")
+    (tmp_path / "feedback_20241201_090000.json").write_text(json.dumps(legacy, indent=2))
+    (tmp_path / "feedback_20241201_090001.json").write_text("{not json")
+
+    assert list(read_feedback(str(tmp_path))) == [legacy]
+
+
+@pytest.mark.asyncio
+async def test_submit_rejects_when_writer_falls_behind(tmp_path, monkeypatch):
+    """Test a full queue is refused instead of silently dropping records"""
+    writer = FeedbackWriter(str(tmp_path), queue_size=1)
+    writing = threading.Event()
+    release = threading.Event()
+    write_batch = writer._write_batch
+
+    def slow_write(records):
+        writing.set()
+        release.wait(5)
+        write_batch(records)
+
+    monkeypatch.setattr(writer, "_write_batch", slow_write)
+    first = asyncio.ensure_future(writer.submit(_feedback(1)))
+    await asyncio.to_thread(writing.wait, 5)
+    second = asyncio.ensure_future(writer.submit(_feedback(2)))
+    await asyncio.sleep(0)
+
+    with pytest.raises(FeedbackQueueFull):
+        await writer.submit(_feedback(3))
+    release.set()
+    await asyncio.gather(first, second)
+    writer.close()
+
+    assert len(list(read_feedback(str(tmp_path)))) == 2
+
+
+@pytest.mark.asyncio
+async def test_write_failure_is_reported_to_submitter(tmp_path):
+    (tmp_path / "not_a_dir").write_text("")
+    writer = FeedbackWriter(str(tmp_path / "not_a_dir"))
+
+    with pytest.raises(OSError):
+        await writer.submit(_feedback(1))
+    writer.close()
+    assert writer.stats()["errors"] == 1
@@ -0,0 +1,157 @@
+"""
+Test incremental feedback ingestion, rollup queries and the analyze_feedback CLI
+"""
+import asyncio
+import gzip
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+import pytest
+from app import feedback_store
+from app.feedback_store import ingest_feedback, feedback_summary, improvement_samples, parse_since
+from app.feedback_writer import FeedbackWriter
+
+REPO_ROOT = os.path.join(os.path.dirname(__file__), '..')
+ANGLES = ["Strategy & Digital Leadership", "Technology Modernization", "Financial Efficiency"]
+
+
+def _record(i: int, day: str = "2025-01-15", **overrides) -> dict:
+    record = {
+        "feedback_id": f"fb{i}",
+        "feedback_type": "positive" if i % 4 else "negative",
+        "original_output": {"angle": ANGLES[i % 3], "subject": f"Subject {i}", "body": "Hi Sarah, ..."},
+        "improved_version": f"Better email {i}" if i % 5 == 0 else None,
+        "metadata": {"message_type": "cold_outreach" if i % 2 else "in_person_ask", "manager_name": f"Sender {i % 2}"},
+        "timestamp": f"{day}T10:30:00Z",
+        "received_at": f"{day}T10:30:01+00:00"
+    }
+    record.update(overrides)
+    return record
+
+
+def _write_segment(path, records: list[dict]) -> None:
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+
+@pytest.fixture
+def feedback_dir(tmp_path, monkeypatch):
+    """Empty feedback directory with its own store"""
+    monkeypatch.setattr(feedback_store, "FEEDBACK_STORE_DB", str(tmp_path / "feedback.db"))
+    directory = tmp_path / "feedback"
+    directory.mkdir()
+    return directory
+
+
+def test_ingest_reads_only_new_records(feedback_dir, monkeypatch):
+    """Test a rerun skips unchanged files and reads a grown segment past what it already has"""
+    (feedback_dir / "feedback_20241201_090000.json").write_text(json.dumps({
+        "feedback_type": "positive", "original_output": {"subject": "Legacy"}, "improved_version": None,
+        "metadata": {"message_type": "cold_outreach", "manager_name": "Sender 0"}, "timestamp": "2024-12-01T09:00:00Z"
+    }, indent=2))
+    _write_segment(feedback_dir / "feedback-20250115_000000-1-000001.jsonl.gz", [_record(i) for i in range(1, 41)])
+    _write_segment(feedback_dir / "feedback-20250116_000000-1-000002.jsonl.gz", [_record(i, "2025-01-16") for i in range(41, 61)])
+
+    assert ingest_feedback(str(feedback_dir)) == 61
+
+    reads = []
+    read_feedback_file = feedback_store.read_feedback_file
+    monkeypatch.setattr(feedback_store, "read_feedback_file", lambda path: reads.append(os.path.basename(path)) or read_feedback_file(path))
+    assert ingest_feedback(str(feedback_dir)) == 0
+    assert reads == []
+
+    _write_segment(feedback_dir / "feedback-20250116_000000-1-000002.jsonl.gz", [_record(i, "2025-01-16") for i in range(61, 66)])
+    assert ingest_feedback(str(feedback_dir)) == 5
+    assert reads == ["feedback-20250116_000000-1-000002.jsonl.gz"]
+
+    [total] = feedback_summary()
+    assert total["count"] == 66
+    assert total["improvements"] == len([i for i in range(1, 66) if i % 5 == 0])
+
+
+def test_ingest_follows_the_live_writer(feedback_dir):
+    """Test records appended to the open segment by the writer are picked up by the next run"""
+    writer = FeedbackWriter(str(feedback_dir))
+
+    async def submit(ids):
+        for i in ids:
+            await writer.submit(_record(i, feedback_id=None))
+
+    asyncio.run(submit(range(1, 4)))
+    assert ingest_feedback(str(feedback_dir)) == 3
+    asyncio.run(submit(range(4, 6)))
+    assert ingest_feedback(str(feedback_dir)) == 2
+    writer.close()
+    assert ingest_feedback(str(feedback_dir)) == 0
+    assert feedback_summary()[0]["count"] == 5
+
+
+def test_summary_matches_a_full_scan(feedback_dir):
+    """Test rollup-backed grouping and --since filtering agree with counting every record"""
+    records = [_record(i, f"2025-01-{10 + i % 7:02d}") for i in range(1, 701)]
+    _write_segment(feedback_dir / "feedback-20250110_000000-1-000001.jsonl.gz", records[:350])
+    ingest_feedback(str(feedback_dir))
+    _write_segment(feedback_dir / "feedback-20250110_000000-1-000001.jsonl.gz", records[350:])
+    ingest_feedback(str(feedback_dir))
+
+    recent = [r for r in records if r["received_at"] >= "2025-01-14"]
+    by_angle = feedback_summary("2025-01-14", ["angle", "feedback_type"])
+    expected = {}
+    for r in recent:
+        key = (r["original_output"]["angle"], r["feedback_type"])
+        expected[key] = expected.get(key, 0) + 1
+
+    assert {(row["angle"], row["feedback_type"]): row["count"] for row in by_angle} == expected
+    assert [row["count"] for row in by_angle] == sorted(expected.values(), reverse=True)
+
+    [sender] = [row for row in feedback_summary(None, ["sender"]) if row["sender"] == "Sender 1"]
+    senders = [r for r in records if r["metadata"]["manager_name"] == "Sender 1"]
+    assert sender["count"] == len(senders)
+    assert sender["positive"] == len([r for r in senders if r["feedback_type"] == "positive"])
+    assert sender["improvements"] == len([r for r in senders if r["improved_version"]])
+
+    assert [s["original_subject"] for s in improvement_samples("2025-01-14", limit=2)] == [
+        r["original_output"]["subject"] for r in recent if r["improved_version"]
+    ][:2]
+
+
+def test_summary_rejects_unknown_group(feedback_dir):
+    with pytest.raises(ValueError, match="Can't group by prospect_name"):
+        feedback_summary(None, ["prospect_name"])
+
+
+def test_parse_since():
+    today = datetime.now(timezone.utc).date()
+    assert parse_since("1d") == today.isoformat()
+    assert parse_since("7d") == (today - timedelta(days=6)).isoformat()
+    assert parse_since("2025-01-15") == "2025-01-15"
+    assert parse_since(None) is None
+    with pytest.raises(ValueError, match="Invalid --since"):
+        parse_since("last week")
+
+
+def test_analyze_feedback_cli(feedback_dir, tmp_path):
+    _write_segment(feedback_dir / "feedback-20250115_000000-1-000001.jsonl.gz",
+                   [_record(i, "2025-01-15") for i in range(1, 9)] + [_record(i, "2025-02-01") for i in range(9, 13)])
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(REPO_ROOT), FEEDBACK_DIR=str(feedback_dir),
+               FEEDBACK_STORE_DB=str(tmp_path / "cli.db"))
+    run = lambda *args: subprocess.run(
+        [sys.executable, os.path.join(REPO_ROOT, "analyze_feedback.py"), *args],
+        cwd=tmp_path, env=env, capture_output=True, text=True
+    )
+
+    overview = run()
+    assert overview.returncode == 0, overview.stderr
+    assert "Ingested 12 new feedback records" in overview.stderr
+    assert "Total feedback submissions: 12" in overview.stdout
+
+    grouped = run("--since", "2025-02-01", "--group-by", "day,sender")
+    assert "Ingested 0 new feedback records" in grouped.stderr
+    lines = grouped.stdout.splitlines()
+    assert lines[0].split() == ["day", "sender", "count", "positive", "%", "improvements"]
+    assert [line.split()[:4] for line in lines[1:]] == [["2025-02-01", "Sender", "0", "2"], ["2025-02-01", "Sender", "1", "2"]]
+
+    assert run("--group-by", "nope").returncode == 2
@@ -1,9 +1,14 @@
 """
 Test generator module with mocked LLM calls
 """
+import asyncio
+import json
+import time
 import pytest
 from unittest.mock import AsyncMock, patch
+from app import generator
 from app.generator import generate_outreach_emails
+from app.prompts_v2 import STRATEGIC_ANGLES
 
 
 def _make_mock_templates():
@@ -238,5 +243,186 @@ async def test_generate_outreach_emails_default_manager():
         assert result["metadata"]["manager_name"] == "[Manager's Name]"
 
 
+def _angle_from_prompt(user_prompt: str) -> str:
+    """Find which strategic angle a per-angle user prompt asks for"""
+    return next(angle for angle in STRATEGIC_ANGLES if f'"{angle}" strategic angle' in user_prompt)
+
+
+async def _stream_from_generate(system_prompt, user_prompt, usage=None, max_tokens=4000):
+    """Stand-in for stream_anthropic streaming whatever the (patched) generate_with_model returns"""
+    yield ""  # The first byte arrives once the prompt is processed, before the completion
+    result = await generator.generate_with_model(system_prompt=system_prompt, user_prompt=user_prompt, max_tokens=max_tokens)
+    yield json.dumps(result)
+
+
+@pytest.fixture
+def cold_prompt_cache(monkeypatch):
+    """Start with no warm prompt prefixes; the warm-up angle is streamed through generate_with_model"""
+    monkeypatch.setattr(generator, "_warm_prefixes", {})
+    monkeypatch.setattr(generator, "stream_anthropic", _stream_from_generate)
+
+
+@pytest.mark.asyncio
+async def test_generate_outreach_emails_parallel(cold_prompt_cache):
+    """Test parallel mode issues one request per angle and keeps angle order"""
+    async def fake_generate(system_prompt, user_prompt, max_tokens):
+        angle = _angle_from_prompt(user_prompt)
+        return {"angle": angle, "subject": f"{angle} subject", "body": "Body"}
+    
+    with patch('app.generator.generate_with_model', side_effect=fake_generate) as mock_generate:
+        result = await generate_outreach_emails(
+            message_type="cold_outreach",
+            prospect_name="Sarah Johnson",
+            prospect_title="CTO",
+            prospect_company="Acme Corp",
+            unique_fact="Test fact",
+            business_initiative="Test initiative",
+            parallel=True
+        )
+    
+    assert mock_generate.call_count == 5
+    system_prompts = [call.kwargs["system_prompt"] for call in mock_generate.call_args_list]
+    assert all(prompt == system_prompts[0] for prompt in system_prompts)
+    assert [t["angle"] for t in result["templates"]] == STRATEGIC_ANGLES
+    assert result["metadata"]["generation_mode"] == "parallel"
+    assert "failed_angles" not in result["metadata"]
+
+
+@pytest.mark.asyncio
+async def test_generate_outreach_emails_parallel_partial_failure(cold_prompt_cache):
+    """Test one failed angle still returns the other 4 templates"""
+    async def fake_generate(system_prompt, user_prompt, max_tokens):
+        angle = _angle_from_prompt(user_prompt)
+        if angle == "Financial Efficiency":
+            raise RuntimeError("upstream overloaded")
+        if angle == "Competitive Advantage":
+            return {"angle": angle, "body": "Missing subject"}
+        return {"angle": angle, "subject": "Subject", "body": "Body"}
+    
+    with patch('app.generator.generate_with_model', side_effect=fake_generate):
+        result = await generate_outreach_emails(
+            message_type="cold_outreach",
+            prospect_name="Test",
+            prospect_title="Test",
+            prospect_company="Test",
+            unique_fact="Test",
+            business_initiative="Test",
+            parallel=True
+        )
+    
+    assert len(result["templates"]) == 3
+    failed = {f["angle"]: f["error"] for f in result["metadata"]["failed_angles"]}
+    assert failed["Financial Efficiency"] == "upstream overloaded"
+    assert "missing 'subject'" in failed["Competitive Advantage"]
+
+
+@pytest.mark.asyncio
+async def test_generate_outreach_emails_parallel_all_failed(cold_prompt_cache):
+    """Test parallel mode raises when every angle fails"""
+    with patch('app.generator.generate_with_model', new_callable=AsyncMock) as mock_generate:
+        mock_generate.side_effect = RuntimeError("down")
+        
+        with pytest.raises(ValueError, match="All 5 angle generations failed: down"):
+            await generate_outreach_emails(
+                message_type="cold_outreach",
+                prospect_name="Test",
+                prospect_title="Test",
+                prospect_company="Test",
+                unique_fact="Test",
+                business_initiative="Test",
+                parallel=True
+            )
+
+
+@pytest.mark.asyncio
+async def test_parallel_angles_warm_the_prompt_cache_first(monkeypatch):
+    """Test on a cold prefix the other angles wait for the first angle's first byte, not its completion"""
+    monkeypatch.setattr(generator, "_warm_prefixes", {})
+    events = []
+    
+    async def fake_stream(system_prompt, user_prompt, usage=None, max_tokens=4000):
+        angle = _angle_from_prompt(user_prompt)
+        events.append(("stream", angle))
+        await asyncio.sleep(0.02)
+        yield '{"angle": "%s", ' % angle
+        await asyncio.sleep(0.05)
+        events.append(("end", angle))
+        yield '"subject": "Subject", "body": "Body"}'
+    
+    async def fake_generate(system_prompt, user_prompt, max_tokens):
+        angle = _angle_from_prompt(user_prompt)
+        events.append(("start", angle))
+        await asyncio.sleep(0.05)
+        events.append(("end", angle))
+        return {"angle": angle, "subject": "Subject", "body": "Body"}
+    
+    prospect = dict(
+        message_type="cold_outreach", prospect_name="Test", prospect_title="Test", prospect_company="Test",
+        unique_fact="Test", business_initiative="Test", parallel=True
+    )
+    monkeypatch.setattr(generator, "stream_anthropic", fake_stream)
+    with patch('app.generator.generate_with_model', side_effect=fake_generate):
+        cold = await generate_outreach_emails(**prospect)
+        assert events[0] == ("stream", STRATEGIC_ANGLES[0])
+        # The others start once the first byte is in, while the first angle is still generating
+        assert [kind for kind, _ in events[1:5]] == ["start"] * 4
+        assert [t["angle"] for t in cold["templates"]] == STRATEGIC_ANGLES
+        
+        events.clear()
+        await generate_outreach_emails(**prospect)
+        assert [kind for kind, _ in events[:5]] == ["start"] * 5
+
+
+@pytest.mark.asyncio
+async def test_generate_outreach_emails_parallel_latency_is_slowest_angle(cold_prompt_cache):
+    """Test parallel wall-clock time tracks the slowest angle, not the sum"""
+    async def fake_generate(system_prompt, user_prompt, max_tokens):
+        await asyncio.sleep(0.2)
+        return {"angle": _angle_from_prompt(user_prompt), "subject": "Subject", "body": "Body"}
+    
+    with patch('app.generator.generate_with_model', side_effect=fake_generate):
+        start = time.perf_counter()
+        await generate_outreach_emails(
+            message_type="cold_outreach",
+            prospect_name="Test",
+            prospect_title="Test",
+            prospect_company="Test",
+            unique_fact="Test",
+            business_initiative="Test",
+            parallel=True
+        )
+        elapsed = time.perf_counter() - start
+    
+    assert elapsed < 0.6
+
+
+@pytest.mark.asyncio
+async def test_generate_outreach_emails_reports_usage():
+    """Test upstream token usage, including prompt cache counts, lands in metadata"""
+    mock_response = _make_mock_templates()
+    mock_response["usage"] = {
+        "input_tokens": 120,
+        "output_tokens": 900,
+        "cache_creation_input_tokens": 0,
+        "cache_read_input_tokens": 4200
+    }
+    
+    with patch('app.generator.generate_with_model', new_callable=AsyncMock) as mock_generate:
+        mock_generate.return_value = mock_response
+        
+        result = await generate_outreach_emails(
+            message_type="cold_outreach",
+            prospect_name="Test",
+            prospect_title="Test",
+            prospect_company="Test",
+            unique_fact="Test",
+            business_initiative="Test"
+        )
+    
+    assert "usage" not in result
+    assert result["metadata"]["usage"]["cache_read_input_tokens"] == 4200
+    assert result["metadata"]["usage"]["output_tokens"] == 900
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
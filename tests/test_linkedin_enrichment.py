@@ -0,0 +1,176 @@
+"""
+Test LinkedIn enrichment against a stub Perplexity server
+"""
+import asyncio
+import pytest
+from collections import OrderedDict
+from benchmarks.stub_server import StubServer, DEFAULT_ENRICHMENT
+from app import enrichment_cache, linkedin_enrichment
+from app.linkedin_enrichment import enrich_linkedin_profile, perplexity_breaker
+from app.resilience import CircuitBreaker
+
+
+@pytest.fixture(autouse=True)
+def temp_cache(tmp_path, monkeypatch):
+    """Use a fresh, empty enrichment cache"""
+    monkeypatch.setattr(enrichment_cache, "CACHE_DB", str(tmp_path / "cache.db"))
+    monkeypatch.setattr(enrichment_cache, "CACHE_FILE", str(tmp_path / "cache.json"))
+    monkeypatch.setattr(enrichment_cache, "_lru", OrderedDict())
+    monkeypatch.setattr(enrichment_cache, "_negative", OrderedDict())
+    monkeypatch.setattr(enrichment_cache, "_negative_stats", {"hits": 0, "stores": 0})
+    monkeypatch.setattr(linkedin_enrichment, "PERPLEXITY_MAX_RETRIES", 0)
+    linkedin_enrichment.perplexity_breaker.reset()
+
+
+@pytest.fixture
+def perplexity_stub(monkeypatch):
+    """Start a slow stub Perplexity server and point enrichment at it"""
+    with StubServer(latency=0.3) as server:
+        monkeypatch.setenv("PERPLEXITY_API_KEY", "test-key")
+        monkeypatch.setattr(linkedin_enrichment, "PERPLEXITY_BASE_URL", server.base_url)
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_upstream_call(perplexity_stub):
+    """Test N concurrent callers for the same profile produce exactly one Perplexity call"""
+    results = await asyncio.gather(*(
+        enrich_linkedin_profile(
+            linkedin_url="https://linkedin.com/in/stub",
+            prospect_name="Stub Person",
+            prospect_company="Stub Corp"
+        )
+        for _ in range(10)
+    ))
+
+    assert perplexity_stub.requests["/chat/completions"] == 1
+    assert all(r["unique_fact"] == DEFAULT_ENRICHMENT["unique_fact"] for r in results)
+    # Each caller gets its own copy
+    assert len({id(r) for r in results}) == 10
+    assert linkedin_enrichment._inflight == {}
+
+    # Later calls are served from the cache
+    cached = await enrich_linkedin_profile("https://linkedin.com/in/stub", "Stub Person")
+    assert cached["from_cache"] is True
+    assert perplexity_stub.requests["/chat/completions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_different_profiles_are_not_coalesced(perplexity_stub):
+    """Test concurrent lookups for different profiles each call upstream"""
+    await asyncio.gather(
+        enrich_linkedin_profile("https://linkedin.com/in/a", "Ann Lee"),
+        enrich_linkedin_profile("https://linkedin.com/in/b", "Bo Kim")
+    )
+
+    assert perplexity_stub.requests["/chat/completions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_lookup(perplexity_stub):
+    """Test a caller that gives up doesn't break the lookup for other waiters"""
+    first = asyncio.ensure_future(enrich_linkedin_profile("https://linkedin.com/in/stub", "Stub Person"))
+    second = asyncio.ensure_future(enrich_linkedin_profile("https://linkedin.com/in/stub", "Stub Person"))
+    await asyncio.sleep(0.05)
+    first.cancel()
+
+    result = await second
+    assert result["unique_fact"] == DEFAULT_ENRICHMENT["unique_fact"]
+    assert perplexity_stub.requests["/chat/completions"] == 1
+
+
+@pytest.mark.asyncio
+async def test_failed_lookup_is_negatively_cached(perplexity_stub, monkeypatch):
+    """Test a failed lookup is served from the negative cache until its TTL lapses"""
+    perplexity_stub.latency = 0
+    perplexity_stub.error_status = 500
+
+    first = await enrich_linkedin_profile("https://linkedin.com/in/bad", "Bad Url")
+    second = await enrich_linkedin_profile("https://linkedin.com/in/bad", "Bad Url")
+
+    assert first["confidence"] == 0
+    assert second["from_cache"] is True
+    assert perplexity_stub.requests["/chat/completions"] == 1
+    assert enrichment_cache.get_cache_stats()["negative"]["hits"] == 1
+
+    # Once the short TTL lapses the profile is retried, and a good result replaces the entry
+    monkeypatch.setattr(enrichment_cache, "NEGATIVE_TTL_SECONDS", 0)
+    enrichment_cache.cache_negative_enrichment("https://linkedin.com/in/bad", "Bad Url", first)
+    perplexity_stub.error_status = None
+    third = await enrich_linkedin_profile("https://linkedin.com/in/bad", "Bad Url")
+    assert third["unique_fact"] == DEFAULT_ENRICHMENT["unique_fact"]
+    assert perplexity_stub.requests["/chat/completions"] == 2
+
+
+@pytest.mark.asyncio
+async def test_config_error_is_not_negatively_cached(perplexity_stub):
+    """Test a rejected key fails every lookup without poisoning the negative cache for the profiles"""
+    perplexity_stub.latency = 0
+    perplexity_stub.error_status = 401
+
+    for _ in range(2):
+        result = await enrich_linkedin_profile("https://linkedin.com/in/ann", "Ann Lee")
+        assert result["confidence"] == 0 and "from_cache" not in result
+    assert perplexity_stub.requests["/chat/completions"] == 2
+    assert enrichment_cache.get_negative_enrichment("https://linkedin.com/in/ann", "Ann Lee") is None
+    assert perplexity_breaker.snapshot()["consecutive_failures"] == 2
+
+    # Once the key is fixed the profile is looked up straight away
+    perplexity_stub.error_status = None
+    result = await enrich_linkedin_profile("https://linkedin.com/in/ann", "Ann Lee")
+    assert result["unique_fact"] == DEFAULT_ENRICHMENT["unique_fact"]
+
+
+@pytest.mark.asyncio
+async def test_low_confidence_result_is_not_kept_long_term(perplexity_stub):
+    """Test low-confidence answers only go into the short-TTL negative cache"""
+    perplexity_stub.latency = 0
+    perplexity_stub.enrichment_text = '{"unique_fact": "An experienced professional driving innovation"}'
+
+    result = await enrich_linkedin_profile("https://linkedin.com/in/vague", "Vague Person", prospect_company="Acme")
+
+    assert result["confidence"] < linkedin_enrichment.MIN_CACHE_CONFIDENCE
+    assert enrichment_cache.get_cached_enrichment("https://linkedin.com/in/vague", "Vague Person") is None
+    assert enrichment_cache.get_negative_enrichment("https://linkedin.com/in/vague", "Vague Person") is not None
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast(perplexity_stub, monkeypatch):
+    """Test repeated upstream failures open the breaker and later calls skip Perplexity"""
+    perplexity_stub.latency = 0
+    perplexity_stub.error_status = 503
+    monkeypatch.setattr(perplexity_breaker, "failure_threshold", 3)
+
+    for i in range(3):
+        await enrich_linkedin_profile(f"https://linkedin.com/in/p{i}", f"Person {i}")
+    assert perplexity_breaker.state == CircuitBreaker.OPEN
+
+    result = await enrich_linkedin_profile("https://linkedin.com/in/other", "Other Person")
+    assert "temporarily unavailable" in result["linkedin_insight"]
+    assert perplexity_stub.requests["/chat/completions"] == 3
+    # Fast-fail results say nothing about the profile, so aren't negatively cached
+    assert enrichment_cache.get_negative_enrichment("https://linkedin.com/in/other", "Other Person") is None
+    assert perplexity_breaker.snapshot()["rejections"] == 1
+
+
+def test_circuit_breaker_half_open_probe(monkeypatch):
+    """Test the breaker lets one probe through after the reset timeout"""
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=0)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+
+    # reset_timeout=0: immediately half-open, but only one probe at a time
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+    breaker.record_failure()
+    assert breaker.snapshot()["opened"] == 2
+
+    assert breaker.allow() is True
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow() is True
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
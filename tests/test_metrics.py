@@ -0,0 +1,134 @@
+"""
+Test the metrics registry, stage instrumentation and the /metrics endpoint
+"""
+import json
+import re
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+from benchmarks.stub_server import StubServer
+from app import metrics
+from app.generator import generate_outreach_emails
+from app.main import app
+from app.metrics import Counter, Histogram, STAGE_LATENCY, UPSTREAM_TOKENS, RATE_LIMIT_REJECTIONS, timed
+from app.model_client import DEFAULT_MODEL, close_anthropic_client
+
+PROSPECT = {
+    "message_type": "cold_outreach",
+    "prospect_name": "Sarah Chen",
+    "prospect_title": "CTO",
+    "prospect_company": "Acme Corp",
+    "unique_fact": "Led cloud migration",
+    "business_initiative": "Modernization"
+}
+
+
+def _sample(text: str, name: str, labels: str = "") -> float:
+    """Value of one sample line in rendered metrics"""
+    match = re.search(rf'^{re.escape(name + labels)} (\S+)$', text, re.MULTILINE)
+    assert match, f"{name}{labels} not in output"
+    return float(match.group(1))
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("test_seconds", "Test histogram", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "a")
+
+    text = "\n".join(histogram.render())
+    assert "# TYPE test_seconds histogram" in text
+    assert _sample(text, "test_seconds_bucket", '{stage="a",le="0.1"}') == 2
+    assert _sample(text, "test_seconds_bucket", '{stage="a",le="1"}') == 3
+    assert _sample(text, "test_seconds_bucket", '{stage="a",le="+Inf"}') == 4
+    assert _sample(text, "test_seconds_sum", '{stage="a"}') == pytest.approx(3.65)
+    assert _sample(text, "test_seconds_count", '{stage="a"}') == 4
+
+
+def test_counter_escapes_labels_and_disabled_is_noop(monkeypatch):
+    counter = Counter("test_total", "Test counter", ("route",))
+    counter.inc('/a"b\\c', amount=2)
+    assert 'test_total{route="/a\\"b\\\\c"} 2' in counter.render()
+
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", False)
+    counter.inc('/a"b\\c')
+    with timed("disabled_stage"):
+        pass
+    assert counter.value('/a"b\\c') == 2
+    assert STAGE_LATENCY.count("disabled_stage") == 0
+
+
+def test_timed_records_failures():
+    before = STAGE_LATENCY.count("failing_stage")
+    with pytest.raises(RuntimeError):
+        with timed("failing_stage"):
+            raise RuntimeError("boom")
+    assert STAGE_LATENCY.count("failing_stage") == before + 1
+
+
+@pytest.mark.asyncio
+async def test_generation_records_stages_and_tokens(monkeypatch):
+    """Test a generation against the stub records each stage once and the response's token usage"""
+    stages = ["build_prompt", "account_lookup", "anthropic_request", "parse_json", "validate"]
+    before = {stage: STAGE_LATENCY.count(stage) for stage in stages}
+    tokens_before = {kind: UPSTREAM_TOKENS.value(DEFAULT_MODEL, kind) for kind in ("input", "output", "cache_creation")}
+
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        try:
+            result = await generate_outreach_emails(**PROSPECT, parallel=False)
+        finally:
+            await close_anthropic_client()
+
+    assert {stage: STAGE_LATENCY.count(stage) - before[stage] for stage in stages} == dict.fromkeys(stages, 1)
+    usage = result["metadata"]["usage"]
+    assert UPSTREAM_TOKENS.value(DEFAULT_MODEL, "input") - tokens_before["input"] == usage["input_tokens"]
+    assert UPSTREAM_TOKENS.value(DEFAULT_MODEL, "output") - tokens_before["output"] == usage["output_tokens"]
+    assert (UPSTREAM_TOKENS.value(DEFAULT_MODEL, "cache_creation") - tokens_before["cache_creation"]
+            == usage["cache_creation_input_tokens"] > 0)
+
+
+@patch('app.main.enrich_linkedin_profile', new_callable=AsyncMock)
+def test_metrics_endpoint(mock_enrich):
+    """Test /metrics reports request latency by route, rate-limit rejections and cache gauges"""
+    mock_enrich.return_value = {"unique_fact": "", "business_initiative": "", "confidence_score": 0}
+    app.state.limiter.reset()
+    rejected_before = RATE_LIMIT_REJECTIONS.value("/api/enrich")
+    client = TestClient(app)
+
+    params = {"linkedin_url": "https://linkedin.com/in/sarah", "prospect_name": "Sarah Chen"}
+    statuses = [client.post("/api/enrich", params=params).status_code for _ in range(21)]
+    app.state.limiter.reset()
+    assert statuses.count(429) == 1
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = response.text
+    assert _sample(text, "executive_notes_rate_limit_rejections_total", '{route="/api/enrich"}') == rejected_before + 1
+    assert _sample(
+        text, "executive_notes_http_request_duration_seconds_count", '{method="POST",route="/api/enrich",status="429"}'
+    ) >= 1
+    assert _sample(text, "executive_notes_enrichment_cache_hit_ratio") >= 0
+    assert _sample(text, "executive_notes_circuit_breaker_open", '{upstream="perplexity"}') in (0, 1)
+
+
+def test_time_to_first_template_reported(monkeypatch):
+    """Test a streamed generation records its time to first template in /metrics"""
+    monkeypatch.setattr(app.state.limiter, "enabled", False)
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        with TestClient(app) as client:
+            before = client.get("/metrics").text
+            count = lambda text: (_sample(text, "executive_notes_time_to_first_template_seconds_count", '{source="model"}')
+                                  if 'source="model"' in text else 0)
+            events = [json.loads(line) for line in client.post("/api/generate/stream", json=PROSPECT).text.splitlines()]
+            after = client.get("/metrics").text
+
+    first_ms = events[-1]["metadata"]["time_to_first_template_ms"]
+    assert count(after) == count(before) + 1
+    total = lambda text: (_sample(text, "executive_notes_time_to_first_template_seconds_sum", '{source="model"}')
+                          if 'source="model"' in text else 0)
+    assert total(after) - total(before) == pytest.approx(first_ms / 1000, abs=0.001)
+    assert "# TYPE executive_notes_time_to_first_template_seconds histogram" in after
@@ -0,0 +1,124 @@
+"""
+Test the Anthropic model client against a local stub server
+"""
+import asyncio
+import json
+import pytest
+from benchmarks.stub_server import StubServer, DEFAULT_TEMPLATES
+from app import model_client
+from app.model_client import (
+    call_anthropic,
+    stream_anthropic,
+    get_anthropic_client,
+    close_anthropic_client,
+    parse_json_response,
+    TemplateStreamParser
+)
+
+
+@pytest.fixture
+def stub_server(monkeypatch):
+    """Start a stub Anthropic server and point the shared client at it"""
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_get_anthropic_client_is_shared(stub_server):
+    """Test the same client is returned for every call on one event loop"""
+    client = get_anthropic_client()
+    assert get_anthropic_client() is client
+
+    await close_anthropic_client()
+    assert asyncio.get_running_loop() not in model_client._clients
+    assert get_anthropic_client() is not client
+    await close_anthropic_client()
+
+
+@pytest.mark.asyncio
+async def test_get_anthropic_client_missing_key(monkeypatch):
+    """Test a missing API key is reported as a ValueError"""
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+
+    with pytest.raises(ValueError, match="ANTHROPIC_API_KEY"):
+        get_anthropic_client()
+
+
+@pytest.mark.asyncio
+async def test_call_anthropic_reuses_connections(stub_server):
+    """Test sequential calls reuse one pooled connection"""
+    for _ in range(5):
+        result = await call_anthropic("system", "user")
+        assert len(result["templates"]) == 5
+    await close_anthropic_client()
+
+    assert stub_server.requests["/v1/messages"] == 5
+    assert stub_server.connections == 1
+
+
+def test_parse_json_response_strips_code_fences():
+    """Test JSON wrapped in markdown fences is parsed"""
+    assert parse_json_response('```json\n{"a": 1}\n```') == {"a": 1}
+
+    with pytest.raises(ValueError, match="Failed to parse JSON"):
+        parse_json_response("not json")
+
+
+@pytest.mark.asyncio
+async def test_stream_anthropic_yields_text_deltas(stub_server):
+    """Test streamed text deltas reassemble into the full response"""
+    stub_server.chunk_size = 7
+    chunks = [chunk async for chunk in stream_anthropic("system", "user")]
+    await close_anthropic_client()
+
+    assert len(chunks) > 1
+    assert json.loads("".join(chunks)) == DEFAULT_TEMPLATES
+
+
+def test_template_stream_parser_emits_each_template_once():
+    """Test templates are emitted as soon as their closing brace arrives"""
+    text = "```json\n" + json.dumps(DEFAULT_TEMPLATES, indent=2) + "\n```"
+    first_end = text.index("}") + 1
+    parser = TemplateStreamParser()
+
+    assert parser.feed(text[:first_end - 1]) == []
+    assert parser.feed(text[first_end - 1:first_end]) == [DEFAULT_TEMPLATES["templates"][0]]
+
+    rest = []
+    for ch in text[first_end:]:
+        rest.extend(parser.feed(ch))
+    assert rest == DEFAULT_TEMPLATES["templates"][1:]
+    assert parser.text == text
+
+
+def test_template_stream_parser_ignores_braces_in_strings():
+    """Test braces, brackets and escaped quotes inside strings don't confuse the parser"""
+    template = {"angle": "A", "subject": "{[x]}", "body": 'He said \\"}\\" then ] left'}
+    parser = TemplateStreamParser()
+
+    assert parser.feed(json.dumps({"templates": [template]})) == [template]
+
+
+@pytest.mark.asyncio
+async def test_call_anthropic_marks_stable_prefix_for_caching(stub_server):
+    """Test the last stable system block carries the cache-control breakpoint"""
+    system_blocks = [
+        {"type": "text", "text": "mega prompt " * 100, "stable": True},
+        {"type": "text", "text": "account context", "stable": False}
+    ]
+    first = await call_anthropic(system_blocks, "user")
+    second = await call_anthropic(system_blocks, "another user")
+    await close_anthropic_client()
+
+    sent = stub_server.bodies[0][1]["system"]
+    assert sent[0]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in sent[1]
+    assert all("stable" not in block for block in sent)
+    assert first["usage"]["cache_creation_input_tokens"] > 0
+    assert second["usage"]["cache_read_input_tokens"] == first["usage"]["cache_creation_input_tokens"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
@@ -2,7 +2,22 @@
 Test prompt building and validation for prompts_v2 (Mega-Prompt v14)
 """
 import pytest
-from app.prompts_v2 import build_prompt, get_message_type_context
+from app.sender_profiles import get_sender_context
+from app.prompts_v2 import (
+    build_prompt as build_prompt_blocks,
+    build_user_prompt,
+    get_message_type_context,
+    render_stable_system_prompt,
+    system_prompt_text,
+    MEGA_PROMPT_SYSTEM,
+    STRATEGIC_ANGLES
+)
+
+
+def build_prompt(**kwargs):
+    """Build prompts with the system blocks joined back into a single string"""
+    system_blocks, user_prompt = build_prompt_blocks(**kwargs)
+    return system_prompt_text(system_blocks), user_prompt
 
 
 def test_build_prompt_cold_outreach():
@@ -209,5 +224,82 @@ def test_build_prompt_all_message_types():
         assert "Test Person" in user_prompt
 
 
+def test_build_user_prompt_single_angle():
+    """Test per-angle user prompts ask for exactly one email"""
+    for angle in STRATEGIC_ANGLES:
+        user_prompt = build_user_prompt(
+            message_type="in_person_ask",
+            prospect_name="Test Person",
+            prospect_title="CTO",
+            prospect_company="Test Corp",
+            unique_fact="Test fact",
+            business_initiative="Test initiative",
+            meeting_purpose="Dinner in Chicago",
+            angle=angle
+        )
+        
+        assert f'"angle": "{angle}"' in user_prompt
+        assert "templates" not in user_prompt
+        assert "Test Person" in user_prompt
+        assert "Meeting Purpose: Dinner in Chicago" in user_prompt
+
+
+def test_build_prompt_system_blocks():
+    """Test the system prompt is split into a stable prefix and a variable account block"""
+    known_blocks, _ = build_prompt_blocks(
+        message_type="cold_outreach",
+        prospect_name="Test Person",
+        prospect_title="CTO",
+        prospect_company="Kroger",
+        unique_fact="Test fact",
+        business_initiative="Test initiative",
+        manager_name="Jake"
+    )
+    unknown_blocks, _ = build_prompt_blocks(
+        message_type="cold_outreach",
+        prospect_name="Other Person",
+        prospect_title="CIO",
+        prospect_company="Unknown Corp",
+        unique_fact="Other fact",
+        business_initiative="Other initiative",
+        manager_name="Jake"
+    )
+    
+    assert [b["stable"] for b in known_blocks] == [True, False]
+    assert "[ACCOUNT KNOWLEDGE]" in known_blocks[1]["text"]
+    assert [b["stable"] for b in unknown_blocks] == [True]
+    # Same message type and sender share an identical cacheable prefix
+    assert known_blocks[0]["text"] == unknown_blocks[0]["text"]
+
+
+def test_render_stable_system_prompt_matches_format():
+    """Test the precompiled system prompt is identical to formatting MEGA_PROMPT_SYSTEM directly"""
+    for message_type in ["cold_outreach", "in_person_ask", "executive_alignment"]:
+        for manager_name in ["Jake", "Graham Smith", "Russell", "[Manager's Name]"]:
+            examples, type_instructions = get_message_type_context(message_type)
+            expected = MEGA_PROMPT_SYSTEM.format(
+                manager_name=manager_name,
+                message_type_instructions=type_instructions,
+                examples=examples
+            ) + get_sender_context(manager_name)
+            
+            assert render_stable_system_prompt(message_type, manager_name) == expected
+    
+    assert render_stable_system_prompt("unknown_type", "Jake") == render_stable_system_prompt("cold_outreach", "Jake")
+
+
+def test_precompiled_stable_prompt_matches_formatted_template():
+    """Test the precompiled stable prompt is exactly the mega-prompt formatted per call (benchmarks/bench_prompts.py times both)"""
+    for message_type in ["cold_outreach", "executive_alignment", "in_person_ask"]:
+        examples, type_instructions = get_message_type_context(message_type)
+        formatted = MEGA_PROMPT_SYSTEM.format(
+            manager_name="Sandeep",
+            message_type_instructions=type_instructions,
+            examples=examples
+        ) + get_sender_context("Sandeep")
+        
+        assert render_stable_system_prompt(message_type, "Sandeep") == formatted
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
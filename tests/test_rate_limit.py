@@ -0,0 +1,254 @@
+"""
+Test the shared rate-limit storage, its sliding window and request keying
+"""
+import threading
+import time
+from fnmatch import fnmatch
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from limits import parse
+from slowapi.errors import RateLimitExceeded
+from app import rate_limit
+from app.rate_limit import RedisRateLimitStorage, create_limiter, rate_limit_key
+
+
+class LocalRedis:
+    """In-process stand-in for the redis-py client methods RedisRateLimitStorage uses"""
+
+    def __init__(self):
+        self.values = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+        self.down = False
+
+    def _live(self, key):
+        if self.down:
+            raise ConnectionError("Redis unavailable")
+        if key in self.expires and self.expires[key] <= time.time():
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.values
+
+    def get(self, key):
+        return str(self.values[key]).encode() if self._live(key) else None
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and self._live(key):
+            return None
+        self.values[key] = int(value)
+        if ex is not None:
+            self.expires[key] = time.time() + ex
+        return True
+
+    def incrby(self, key, amount):
+        self._live(key)
+        self.values[key] = self.values.get(key, 0) + amount
+        return self.values[key]
+
+    def decrby(self, key, amount):
+        with self.lock:
+            return self.incrby(key, -amount)
+
+    def pttl(self, key):
+        if not self._live(key):
+            return -2
+        return int((self.expires[key] - time.time()) * 1000) if key in self.expires else -1
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.expires.pop(key, None)
+
+    def ping(self):
+        if self.down:
+            raise ConnectionError("Redis unavailable")
+        return True
+
+    def scan_iter(self, match):
+        return [key for key in list(self.values) if fnmatch(key, match)]
+
+    def pipeline(self, transaction=True):
+        return LocalPipeline(self)
+
+
+class LocalPipeline:
+    """Queues commands and runs them under the client's lock, like MULTI/EXEC"""
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.commands.append((name, args, kwargs))
+
+    def execute(self):
+        with self.client.lock:
+            return [getattr(self.client, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+def _request(headers: dict = None, client: str = "10.0.0.1") -> Request:
+    raw = [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    return Request({"type": "http", "headers": raw, "client": (client, 1234)})
+
+
+def test_workers_share_one_limit():
+    """Test limiters in different workers admit the limit between them, not each"""
+    redis = LocalRedis()
+    workers = [create_limiter("redis", client=redis) for _ in range(2)]
+    item = parse("10/minute")
+
+    admitted = [worker.limiter.hit(item, "caller") for _ in range(10) for worker in workers]
+
+    assert admitted.count(True) == 10
+    assert not workers[0].limiter.test(item, "caller")
+    assert workers[1].limiter.get_window_stats(item, "caller").remaining == 0
+    assert workers[0].limiter.hit(item, "someone-else")
+
+
+def test_concurrent_hits_never_exceed_limit():
+    storage = RedisRateLimitStorage(client=LocalRedis())
+    barrier = threading.Barrier(20)
+    results = []
+
+    def hit():
+        barrier.wait()
+        results.append(storage.acquire_sliding_window_entry("caller", 15, 60))
+
+    threads = [threading.Thread(target=hit) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(True) == 15
+    assert storage.get_sliding_window("caller", 60)[2] == 15
+
+
+def test_sliding_window_weights_previous_window(monkeypatch):
+    """Test hits late in one window still count early in the next, fading as it slides"""
+    storage = RedisRateLimitStorage(client=LocalRedis())
+    now = [1_000_000 * 60 + 50.0]  # 50s into a 60s window
+    monkeypatch.setattr(rate_limit.time, "time", lambda: now[0])
+
+    assert all(storage.acquire_sliding_window_entry("caller", 10, 60) for _ in range(10))
+    assert not storage.acquire_sliding_window_entry("caller", 10, 60)
+
+    now[0] += 15  # 5s into the next window: the previous one still weighs 10 * 55/60
+    assert storage.acquire_sliding_window_entry("caller", 10, 60)
+    assert not storage.acquire_sliding_window_entry("caller", 10, 60)
+    previous, previous_ttl, current, _ = storage.get_sliding_window("caller", 60)
+    assert (previous, current) == (10, 1)
+    assert previous_ttl == pytest.approx(55)
+
+    now[0] += 30  # 35s in: 10 * 25/60 leaves room for 5 more
+    assert [storage.acquire_sliding_window_entry("caller", 10, 60) for _ in range(6)].count(True) == 5
+
+
+def test_fixed_window_and_reset():
+    storage = RedisRateLimitStorage(client=LocalRedis())
+    assert storage.incr("k", 60) == 1
+    assert storage.incr("k", 60, amount=2) == 3
+    assert storage.get("k") == 3
+    assert time.time() < storage.get_expiry("k") <= time.time() + 60
+    assert storage.reset() == 1
+    assert storage.get("k") == 0
+
+
+def test_falls_back_to_memory_when_redis_is_down():
+    """Test an unreachable Redis degrades to per-process limits instead of failing requests"""
+    redis = LocalRedis()
+    limiter = create_limiter("redis", client=redis)
+    app = FastAPI()
+    app.state.limiter = limiter
+
+    @app.get("/limited")
+    @limiter.limit("2/minute")
+    async def limited(request: Request):
+        return {"ok": True}
+
+    @app.exception_handler(RateLimitExceeded)
+    async def exceeded(request, exc):
+        from slowapi import _rate_limit_exceeded_handler
+        return _rate_limit_exceeded_handler(request, exc)
+
+    client = TestClient(app)
+    redis.down = True
+    assert [client.get("/limited").status_code for _ in range(3)] == [200, 200, 429]
+
+
+def test_rotating_unauthenticated_header_does_not_reset_limit():
+    """Test a client can't get a fresh limit by sending a new X-API-Key each time"""
+    limiter = create_limiter("memory")
+    app = FastAPI()
+    app.state.limiter = limiter
+
+    @app.get("/limited")
+    @limiter.limit("2/minute")
+    async def limited(request: Request):
+        return {"ok": True}
+
+    @app.exception_handler(RateLimitExceeded)
+    async def exceeded(request, exc):
+        from slowapi import _rate_limit_exceeded_handler
+        return _rate_limit_exceeded_handler(request, exc)
+
+    client = TestClient(app)
+    statuses = [client.get("/limited", headers={"X-API-Key": f"key-{i}"}).status_code for i in range(3)]
+    assert statuses == [200, 200, 429]
+    assert rate_limit_key(_request({"X-API-Key": "key-1"})) == "ip:10.0.0.1"
+
+
+def test_issued_api_keys_identify_callers_behind_one_proxy(monkeypatch):
+    """Test callers behind the same balancer address get their own limit by API key, unknown keys don't"""
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_API_KEYS", ["key-ann", "key-bo"])
+
+    ann = rate_limit_key(_request({"X-API-Key": "key-ann"}))
+    assert ann.startswith("api-key:") and "key-ann" not in ann
+    assert ann == rate_limit_key(_request({"X-API-Key": "key-ann"}, client="10.0.0.2"))
+    assert ann != rate_limit_key(_request({"X-API-Key": "key-bo"}))
+    assert rate_limit_key(_request({"X-API-Key": "made-up"})) == "ip:10.0.0.1"
+
+    limiter = create_limiter("memory")
+    item = parse("2/minute")
+    hit = lambda headers: limiter.limiter.hit(item, rate_limit_key(_request(headers)))
+    assert [hit({"X-API-Key": "key-ann"}) for _ in range(3)] == [True, True, False]
+    assert hit({"X-API-Key": "key-bo"})
+
+
+def test_warns_when_shared_limits_would_key_on_the_proxy(monkeypatch, capsys):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_API_KEYS", [])
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_KEY_HEADERS", [])
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+    create_limiter("redis", client=LocalRedis())
+    assert "every caller will share one rate limit" in capsys.readouterr().out
+    create_limiter("memory")
+    assert capsys.readouterr().out == ""
+
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_API_KEYS", ["key-ann"])
+    assert not rate_limit.keys_by_proxy_address("redis")
+
+
+def test_requests_keyed_by_identity_not_proxy(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_KEY_HEADERS", ["X-API-Key", "X-User-Id"])  # As set by a gateway
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 0)
+
+    key = rate_limit_key(_request({"X-API-Key": "secret-key"}))
+    assert key.startswith("x-api-key:") and "secret-key" not in key
+    assert key == rate_limit_key(_request({"X-API-Key": "secret-key"}, client="10.0.0.2"))
+    assert key != rate_limit_key(_request({"X-API-Key": "other-key"}))
+    assert rate_limit_key(_request({"X-User-Id": "ann"})).startswith("x-user-id:")
+
+    # Without trusted proxies every request behind the balancer shares its address
+    forwarded = {"X-Forwarded-For": "203.0.113.7, 198.51.100.2"}
+    assert rate_limit_key(_request(forwarded)) == "ip:10.0.0.1"
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 1)
+    assert rate_limit_key(_request(forwarded)) == "ip:198.51.100.2"
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_TRUSTED_PROXIES", 2)
+    assert rate_limit_key(_request(forwarded)) == "ip:203.0.113.7"
+    assert rate_limit_key(_request()) == "ip:10.0.0.1"
+
+
+def test_unknown_storage():
+    with pytest.raises(ValueError, match="RATE_LIMIT_STORAGE"):
+        create_limiter("memcached")
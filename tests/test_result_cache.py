@@ -0,0 +1,262 @@
+"""
+Test the generation result cache: keys, cache modes, backends and endpoints
+"""
+import json
+import time
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, patch
+from benchmarks.stub_server import StubServer, DEFAULT_TEMPLATES
+from app import result_cache
+from app.generator import generate_outreach_emails
+from app.main import app
+from app.model_client import message_params
+from app.result_cache import (
+    MemoryResultCache,
+    SQLiteResultCache,
+    RedisResultCache,
+    ResultCacheMiss,
+    result_cache_key,
+    set_result_cache,
+    get_result_cache_stats
+)
+
+PROSPECT = {
+    "message_type": "cold_outreach",
+    "prospect_name": "Sarah Johnson",
+    "prospect_title": "Chief Technology Officer",
+    "prospect_company": "Acme Corp",
+    "unique_fact": "Named CIO of the Year finalist",
+    "business_initiative": "Scaling AI use cases from 5 to 50"
+}
+
+
+class LocalRedis:
+    """In-process stand-in for the redis-py client methods RedisResultCache uses"""
+
+    def __init__(self):
+        self.values = {}
+        self.zsets = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value.encode()
+
+    def delete(self, *keys):
+        for key in keys:
+            self.values.pop(key, None)
+            self.zsets.pop(key, None)
+
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def zcard(self, name):
+        return len(self.zsets.get(name, {}))
+
+    def zrange(self, name, start, end):
+        members = sorted(self.zsets.get(name, {}), key=self.zsets[name].get) if name in self.zsets else []
+        return [m.encode() for m in members[start:None if end == -1 else end + 1]]
+
+    def zrem(self, name, *members):
+        for member in members:
+            self.zsets.get(name, {}).pop(member, None)
+
+    def zremrangebyscore(self, name, low, high):
+        zset = self.zsets.get(name, {})
+        for member in [m for m, score in zset.items() if low <= score <= high]:
+            del zset[member]
+
+
+def _templates():
+    return {"templates": [{"angle": f"Angle {i}", "subject": f"Subject {i}", "body": f"Body {i}"} for i in range(5)]}
+
+
+@pytest.fixture
+def memory_cache():
+    """Enable an empty in-memory result cache for the test"""
+    cache = MemoryResultCache()
+    set_result_cache(cache)
+    yield cache
+    set_result_cache(None)
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend_factory(request, tmp_path):
+    """Build each backend type with the given bounds"""
+    def make(ttl=3600, max_entries=100):
+        if request.param == "memory":
+            return MemoryResultCache(ttl, max_entries)
+        if request.param == "sqlite":
+            return SQLiteResultCache(str(tmp_path / "result_cache.db"), ttl, max_entries)
+        return RedisResultCache(ttl=ttl, max_entries=max_entries, client=LocalRedis())
+    return make
+
+
+def test_key_ignores_whitespace_and_cache_markers():
+    """Test formatting-only prompt differences share a key and real differences don't"""
+    system = [{"type": "text", "text": "You write  emails.", "stable": True}, {"type": "text", "text": "\n[ACCOUNT]", "stable": False}]
+    key = result_cache_key(message_params(system, "Prospect: Sarah\n"))
+
+    assert key == result_cache_key(message_params("You write emails. [ACCOUNT]", "Prospect:   Sarah"))
+    assert key != result_cache_key(message_params(system, "Prospect: Sara"))
+    assert key != result_cache_key(message_params(system, "Prospect: Sarah", model="claude-3-5-haiku-latest"))
+    assert key != result_cache_key(message_params(system, "Prospect: Sarah"), mode="parallel")
+
+
+@pytest.mark.asyncio
+async def test_prefer_serves_repeat_requests_from_cache(memory_cache):
+    """Test identical inputs are generated once and the repeat is marked from_cache with no usage"""
+    with patch('app.generator.generate_with_model', new_callable=AsyncMock) as mock_generate:
+        mock_generate.side_effect = lambda **kwargs: dict(_templates(), usage={"input_tokens": 900, "output_tokens": 400})
+        first = await generate_outreach_emails(**PROSPECT)
+        second = await generate_outreach_emails(**dict(PROSPECT, unique_fact="Named CIO  of the Year finalist "))
+        other_sender = await generate_outreach_emails(**PROSPECT, manager_name="John Smith")
+
+    assert mock_generate.call_count == 2
+    assert first["metadata"]["from_cache"] is False
+    assert second["metadata"]["from_cache"] is True
+    assert second["templates"] == first["templates"]
+    assert second["metadata"]["usage"]["output_tokens"] == 0
+    assert second["metadata"]["prospect_name"] == "Sarah Johnson"
+    assert other_sender["metadata"]["from_cache"] is False
+    assert memory_cache.size() == 2
+
+
+@pytest.mark.asyncio
+async def test_bypass_regenerates_and_only_never_calls_model(memory_cache):
+    """Test bypass always calls the model (refreshing the entry) and only serves or raises"""
+    with patch('app.generator.generate_with_model', new_callable=AsyncMock) as mock_generate:
+        with pytest.raises(ResultCacheMiss):
+            await generate_outreach_emails(**PROSPECT, cache="only")
+        assert mock_generate.call_count == 0
+
+        mock_generate.side_effect = lambda **kwargs: _templates()
+        await generate_outreach_emails(**PROSPECT)
+        fresh = _templates()
+        fresh["templates"][0]["subject"] = "Regenerated"
+        mock_generate.side_effect = lambda **kwargs: fresh
+        bypassed = await generate_outreach_emails(**PROSPECT, cache="bypass")
+        cached = await generate_outreach_emails(**PROSPECT, cache="only")
+
+    assert mock_generate.call_count == 2
+    assert bypassed["metadata"]["from_cache"] is False
+    assert cached["metadata"]["from_cache"] is True
+    assert cached["templates"][0]["subject"] == "Regenerated"
+
+
+@pytest.mark.asyncio
+async def test_cache_off_by_default_and_rejects_unknown_mode():
+    with patch('app.generator.generate_with_model', new_callable=AsyncMock) as mock_generate:
+        mock_generate.side_effect = lambda **kwargs: _templates()
+        await generate_outreach_emails(**PROSPECT)
+        result = await generate_outreach_emails(**PROSPECT)
+        with pytest.raises(ValueError, match="Unknown cache mode"):
+            await generate_outreach_emails(**PROSPECT, cache="sometimes")
+
+    assert mock_generate.call_count == 2
+    assert result["metadata"]["from_cache"] is False
+    assert get_result_cache_stats()["backend"] == "off"
+
+
+@pytest.mark.asyncio
+async def test_partial_parallel_result_is_not_cached(memory_cache):
+    """Test a parallel result with failed angles isn't pinned in the cache"""
+    async def fake_generate(system_prompt, user_prompt, max_tokens=4000):
+        if "Financial Efficiency" in user_prompt:
+            raise ValueError("Failed to parse JSON response")
+        return {"angle": "x", "subject": "s", "body": "b"}
+
+    with patch('app.generator.generate_with_model', side_effect=fake_generate):
+        result = await generate_outreach_emails(**PROSPECT, parallel=True)
+
+    assert len(result["metadata"]["failed_angles"]) == 1
+    assert memory_cache.size() == 0
+
+
+@pytest.mark.asyncio
+async def test_backend_failure_falls_back_to_generation(memory_cache, monkeypatch):
+    def broken(*args):
+        raise ConnectionError("cache unavailable")
+    monkeypatch.setattr(memory_cache, "get", broken)
+    monkeypatch.setattr(memory_cache, "put", broken)
+    errors = get_result_cache_stats()["errors"]
+
+    with patch('app.generator.generate_with_model', new_callable=AsyncMock) as mock_generate:
+        mock_generate.side_effect = lambda **kwargs: _templates()
+        result = await generate_outreach_emails(**PROSPECT)
+
+    assert len(result["templates"]) == 5
+    assert get_result_cache_stats()["errors"] == errors + 2
+
+
+def test_backend_round_trip_and_size_bound(backend_factory):
+    """Test each backend stores copies of results and evicts the oldest beyond max_entries"""
+    cache = backend_factory(max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, {"templates": [key]})
+        time.sleep(0.01)
+
+    assert cache.get("a") is None
+    result, cached_at = cache.get("c")
+    assert result == {"templates": ["c"]}
+    assert cached_at <= time.time()
+    assert cache.size() == 2
+
+    cache.clear()
+    assert cache.get("b") is None and cache.size() == 0
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_backend_expires_entries(backend, tmp_path):
+    cache = MemoryResultCache(ttl=0.05) if backend == "memory" else SQLiteResultCache(str(tmp_path / "rc.db"), ttl=0.05)
+    cache.put("a", {"templates": []})
+    assert cache.get("a") is not None
+
+    time.sleep(0.1)
+    assert cache.get("a") is None
+
+
+def test_configured_backend(monkeypatch, tmp_path):
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_BACKEND", "sqlite")
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_DB", str(tmp_path / "rc.db"))
+    monkeypatch.setattr(result_cache, "RESULT_CACHE_MAX_ENTRIES", 10)
+    try:
+        stats = get_result_cache_stats()
+        assert (stats["backend"], stats["max_size"]) == ("sqlite", 10)
+        assert result_cache.get_result_cache().path == str(tmp_path / "rc.db")
+        set_result_cache(None)
+        monkeypatch.setattr(result_cache, "RESULT_CACHE_BACKEND", "memcached")
+        with pytest.raises(ValueError, match="Unknown RESULT_CACHE_BACKEND"):
+            result_cache.get_result_cache()
+    finally:
+        set_result_cache(None)
+
+
+def test_endpoints_share_cached_result(memory_cache, monkeypatch):
+    """Test a streamed generation is served from the cache by both endpoints without another model call"""
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test-key")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        app.state.limiter.reset()
+
+        with TestClient(app) as test_client:
+            assert test_client.post("/api/generate", json=dict(PROSPECT, cache="only")).status_code == 404
+            assert test_client.post("/api/generate", json=dict(PROSPECT, cache="always")).status_code == 422
+
+            streamed = test_client.post("/api/generate/stream", json=PROSPECT)
+            replayed = test_client.post("/api/generate/stream", json=dict(PROSPECT, cache="only"))
+            generated = test_client.post("/api/generate", json=dict(PROSPECT, cache="only"))
+            stats = test_client.get("/api/stats").json()["result_cache"]
+
+    assert server.requests["/v1/messages"] == 1
+    first = [json.loads(line) for line in streamed.text.splitlines()]
+    assert first[-1]["metadata"]["from_cache"] is False
+    events = [json.loads(line) for line in replayed.text.splitlines()]
+    assert [e["template"] for e in events[:-1]] == DEFAULT_TEMPLATES["templates"]
+    assert events[-1]["metadata"]["from_cache"] is True
+    assert events[-1]["metadata"]["template_count"] == 5
+    assert generated.json()["templates"] == DEFAULT_TEMPLATES["templates"]
+    assert generated.json()["metadata"]["from_cache"] is True
+    assert (stats["backend"], stats["size"]) == ("memory", 1)
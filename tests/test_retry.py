@@ -0,0 +1,171 @@
+"""
+Test retries, timeouts, deadlines and hedging of model calls against a faulty stub server
+"""
+import time
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch
+from benchmarks.stub_server import StubServer
+from app import model_client
+from app.admission import AdmissionController
+from app.main import app
+from app.model_client import call_anthropic, stream_anthropic, close_anthropic_client, is_retryable
+from app.resilience import RetryPolicy, DeadlineExceeded, deadline, time_remaining
+
+PROSPECT = {
+    "message_type": "cold_outreach",
+    "prospect_name": "Sarah Chen",
+    "prospect_title": "CTO",
+    "prospect_company": "Acme Corp",
+    "unique_fact": "Led cloud migration",
+    "business_initiative": "Modernization"
+}
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Stub Anthropic server, with a fresh retry policy (short backoff) and admission controller"""
+    policy = RetryPolicy("anthropic", is_retryable, max_retries=2, attempt_timeout=5, backoff_base=0.01)
+    monkeypatch.setattr(model_client, "anthropic_retry", policy)
+    monkeypatch.setattr(model_client, "admission", AdmissionController())
+    with StubServer() as server:
+        monkeypatch.setenv("ANTHROPIC_API_KEY", "test")
+        monkeypatch.setenv("ANTHROPIC_BASE_URL", server.base_url)
+        server.policy = policy
+        yield server
+
+
+async def _call(**kwargs):
+    try:
+        return await call_anthropic("system", "user", **kwargs)
+    finally:
+        await close_anthropic_client()
+
+
+@pytest.mark.asyncio
+async def test_overload_and_server_errors_are_retried(stub):
+    stub.faults = [529, 500]
+    result = await _call()
+    assert len(result["templates"]) == 5
+    assert stub.requests["/v1/messages"] == 3
+    assert stub.policy.snapshot()["retries"] == 2
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_retries_and_on_client_errors(stub):
+    stub.faults = [503, 503, 503]
+    with pytest.raises(Exception) as error:
+        await _call()
+    assert error.value.status_code == 503
+    assert stub.requests["/v1/messages"] == 3
+
+    stub.faults = [400]
+    with pytest.raises(Exception) as error:
+        await _call()
+    assert error.value.status_code == 400
+    assert stub.requests["/v1/messages"] == 4
+
+
+@pytest.mark.asyncio
+async def test_slow_attempt_is_cut_off_and_retried(stub):
+    stub.policy.attempt_timeout = 0.2
+    stub.faults = [1.0]
+    started = time.monotonic()
+    result = await _call()
+    assert len(result["templates"]) == 5
+    assert time.monotonic() - started < 0.8
+    assert stub.policy.snapshot()["timeouts"] == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_bounds_the_whole_call(stub):
+    """Test retries stop at the request deadline, however many are left"""
+    stub.policy.attempt_timeout = 0
+    stub.faults = [1.0, 1.0, 1.0]
+    started = time.monotonic()
+    with deadline(0.3):
+        with pytest.raises(DeadlineExceeded):
+            await _call()
+        # A nested deadline can only shorten the outer one
+        with deadline(10):
+            assert time_remaining() < 0.3
+    assert time.monotonic() - started < 0.8
+    assert stub.requests["/v1/messages"] == 1
+    assert time_remaining() is None
+
+
+@pytest.mark.asyncio
+async def test_slow_request_is_hedged(stub, monkeypatch):
+    """Test a slow call is hedged once its kind has a p95, and the hedge is charged to the budget"""
+    controller = AdmissionController(worker_tokens_per_minute=600_000)
+    monkeypatch.setattr(model_client, "admission", controller)
+    stub.policy.hedge = True
+    stub.policy.hedge_min_samples = 5
+    stub.policy.hedge_min_delay = 0.1
+    for _ in range(5):
+        await _call()
+    assert stub.policy.hedge_delay(4000) == pytest.approx(0.1)
+    # Latencies are kept per max_tokens, so other call sizes have no threshold yet
+    assert stub.policy.hedge_delay(1000) is None
+
+    stub.faults = [2.0]
+    started = time.monotonic()
+    result = await _call()
+    assert len(result["templates"]) == 5
+    assert time.monotonic() - started < 1.0
+    assert stub.requests["/v1/messages"] == 7
+    snapshot = stub.policy.snapshot()
+    assert (snapshot["hedges"], snapshot["hedge_wins"], snapshot["retries"]) == (1, 1, 0)
+    assert controller.snapshot()["admitted"] == 7
+
+
+@pytest.mark.asyncio
+async def test_no_hedge_without_budget(stub, monkeypatch):
+    controller = AdmissionController(worker_tokens_per_minute=6000)
+    monkeypatch.setattr(model_client, "admission", controller)
+    stub.policy.hedge = True
+    stub.policy.hedge_min_samples = 1
+    stub.policy.hedge_min_delay = 0.1
+    await _call()
+
+    # Leave budget for the call but not for a hedge of it as well
+    estimate = controller.estimate("system", "user", 4000)
+    spare = controller.worker_bucket.snapshot()["available"] - 1.5 * estimate
+    await controller.admit("", "x" * 4 * int(spare), 0, tenant="other")
+    stub.faults = [0.3]
+    await _call()
+    assert stub.requests["/v1/messages"] == 2
+    assert (stub.policy.snapshot()["hedges"], stub.policy.snapshot()["hedges_skipped"]) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_stream_retried_until_first_text(stub):
+    stub.faults = [529, 1.0]
+    stub.policy.attempt_timeout = 0.3
+    usage = {}
+    try:
+        text = "".join([chunk async for chunk in stream_anthropic("system", "user", usage=usage)])
+    finally:
+        await close_anthropic_client()
+    assert text == stub.response_text
+    assert usage["output_tokens"] > 0
+    assert stub.requests["/v1/messages"] == 3
+    assert (stub.policy.snapshot()["retries"], stub.policy.snapshot()["timeouts"]) == (2, 1)
+
+
+def test_api_applies_request_timeout_and_maps_deadline_to_504(monkeypatch):
+    monkeypatch.setattr(app.state.limiter, "enabled", False)
+    remaining = []
+
+    async def generate(**kwargs):
+        remaining.append(time_remaining())
+        raise DeadlineExceeded("anthropic call ran past the request deadline")
+
+    with patch("app.main.generate_outreach_emails", generate):
+        client = TestClient(app)
+        response = client.post("/api/generate", json=PROSPECT, headers={"X-Request-Timeout": "5"})
+        assert response.status_code == 504
+        client.post("/api/generate", json=PROSPECT, headers={"X-Request-Timeout": "9999"})
+
+    assert 0 < remaining[0] <= 5
+    assert 5 < remaining[1] <= 120